@@ -4,19 +4,21 @@
 #
 # note that we require cython>=0.29.15
 
-from libc.stdlib cimport malloc
+from libc.stdlib cimport malloc, free
 import cython
+from cython.operator cimport dereference as deref
 
 import numpy as np
 cimport numpy as cnp
 
-from chemreac cimport ReactionDiffusion
-from cvodes_cxx cimport lmm_from_name, iter_type_from_name, linear_solver_from_name
-from cvodes_anyode cimport simple_predefined, simple_adaptive
+from chemreac cimport ReactionDiffusion, Schedule, Event, rxn_kernel_t
+from anyode cimport Info
+from cvodes_cxx cimport LMM, IterType, LinSol, lmm_from_name, iter_type_from_name, linear_solver_from_name
 
 from libcpp cimport bool
 from libcpp.vector cimport vector
 from libcpp.utility cimport pair
+from libcpp.string cimport string
 
 cdef extern from "numpy/arrayobject.h":
     void PyArray_ENABLEFLAGS(cnp.ndarray arr, int flags)
@@ -25,9 +27,220 @@ cdef extern from "cvodes_cxx.hpp":
      ctypedef double realtype
      ctypedef int indextype
 
+# As in pycvodes' cvodes_anyode.pxd, but declared nogil (the callbacks of ReactionDiffusion
+# do not touch any Python objects)
+cdef extern from "cvodes_anyode.hpp" namespace "cvodes_anyode":
+    cdef int simple_adaptive[U](
+        realtype **, int *, U * const, vector[realtype], const realtype, const LMM, const realtype,
+        vector[int]&, long int, const realtype, const realtype, const realtype, const bool,
+        IterType, LinSol, const int, const realtype, const unsigned, const bool, const int,
+        const bool, const int, int, realtype **, vector[double]&, long int, bool
+    ) nogil except +
+
+    cdef int simple_predefined[U](
+        U * const, vector[realtype], const realtype, const LMM, const realtype * const,
+        const size_t, const realtype * const, realtype * const, vector[int]&, vector[realtype]&,
+        const long int, realtype, const realtype, const realtype, const bool, IterType, LinSol,
+        const int, const realtype, const unsigned, const int, const bool, const int, realtype *,
+        vector[double]&, long int, bool
+    ) nogil except +
+
+    cdef cppclass SolverSettings:
+        realtype rtol
+        vector[realtype] atol
+        int mxsteps
+        realtype dx0, dx_min, dx_max
+        string method, iter_type, linear_solver
+        int maxl
+        realtype eps_lin
+        unsigned nderiv
+        int autorestart
+        bool return_on_error, with_jacobian
+        int with_jtimes
+        bool stab_lim_det
+        vector[double] constraints
+        long int msbj
+
+cdef extern from "chemreac_batch.hpp" namespace "chemreac":
+    cdef cppclass BatchResult:
+        int nreached
+        Info info
+        string error
+
+cdef extern from "chemreac_observables.hpp" namespace "chemreac":
+    cdef cppclass Observables[T]:
+        long nrows
+        T x_last
+        vector[T] tout, values, vmin, vmax, tmin, tmax, integral
+        Observables(const ReactionDiffusion[T]&, int, const T * const, bool) except +
+
+cdef extern from "chemreac_dense.hpp" namespace "chemreac":
+    cdef cppclass NordsieckHistory[T]:
+        vector[T] t
+        vector[int] q
+        NordsieckHistory(int) except +
+        size_t nsteps()
+        void eval(size_t, const T * const, T * const, T * const) nogil except +
+
+cdef extern from "chemreac_cvodes.hpp" namespace "chemreac":
+    cdef vector[BatchResult] _cvode_predefined_batch "chemreac::cvode_predefined_batch" [T](
+        const ReactionDiffusion[T]&, int, const T * const, size_t, const T * const, T * const,
+        const T * const, const T * const, const SolverSettings&, int
+    ) nogil except +
+
+    cdef cppclass _CvodeSession "chemreac::CvodeSession" [T]:
+        bool keep_step
+        T last_step
+        long ncalls
+        NordsieckHistory[T] * history
+        vector[int] event_index
+        vector[T] event_x, event_y
+        bool event_stop
+        _CvodeSession(ReactionDiffusion[T] *, const SolverSettings&, bool) except +
+        const SolverSettings& settings()
+        void reset_info() except +
+        int predefined(const T * const, size_t, const T * const, T * const, T * const) nogil except +
+        size_t stream(const T * const, size_t, const T * const, bool, size_t, T * const, T * const,
+                      int (*)(void *, size_t) noexcept, void *) nogil except +
+        size_t observe(const T * const, size_t, const T * const, bool, Observables[T]&) nogil except +
+
+cdef extern from "chemreac_periodic.hpp" namespace "chemreac":
+    cdef cppclass PeriodicShooting[T]:
+        T tol, eta, sigma
+        int maxl, max_iter, max_halvings
+        long niter, nperiods, nlinear
+        vector[T] residuals
+        PeriodicShooting(ReactionDiffusion[T] *, _CvodeSession[T] *, size_t, const T * const,
+                         const T * const) except +
+        int solve(T * const) nogil except +
+
+cdef extern from "chemreac_sensitivity.hpp" namespace "chemreac":
+    cdef cppclass ForwardSensitivity[T]:
+        ForwardSensitivity(ReactionDiffusion[T] *, const vector[int]&, const vector[int]&) except +
+        int predefined(const SolverSettings&, const T * const, size_t, const T * const, T * const,
+                       T * const, const vector[T]&) nogil except +
+
+cdef extern from "chemreac_adjoint.hpp" namespace "chemreac":
+    cdef cppclass AdjointGradient[T]:
+        bool checkpointing
+        vector[T] atol, pbar
+        T rtol
+        Info backward_info
+        long nfev_backward, njev_backward
+        AdjointGradient(ReactionDiffusion[T] *, _CvodeSession[T] *, const vector[int]&,
+                        const vector[int]&) except +
+        int forward(const T * const, size_t, const T * const, T * const) nogil except +
+        void backward(const T * const, T * const, T * const) nogil except +
+
+cdef extern from "chemreac_fit.hpp" namespace "chemreac":
+    cdef cppclass _ExperimentSet "chemreac::ExperimentSet" [T]:
+        int nthreads
+        vector[BatchResult] results
+        _ExperimentSet(const ReactionDiffusion[T]&, const SolverSettings&, const vector[int]&,
+                       const vector[int]&, int) except +
+        int nparams()
+        size_t size()
+        size_t get_nt(size_t) except +
+        size_t add(const T * const, size_t, const T * const, const T * const) except +
+        int evaluate(const T * const, T * const *, T * const *) nogil except +
+
+cdef extern from "chemreac_lockstep.hpp" namespace "chemreac":
+    cdef cppclass LockstepKinetics[T]:
+        long nfev, njev, nsweeps
+        vector[long] nsteps, nrejected
+        LockstepKinetics(const ReactionDiffusion[T]&, int) except +
+        void set_k(const T * const)
+        void set_fields(const T * const)
+        vector[int] predefined(const T * const, size_t, const T * const, T * const,
+                               const vector[T]&, T, T, T, long) nogil except +
+
+cdef extern from "chemreac_steady.hpp" namespace "chemreac":
+    cdef cppclass SteadyStateSolver[T]:
+        T ftol_rel, ftol_abs, dtau0, dtau_growth, dtau_max, dtau_min, max_growth, atol
+        long max_iter
+        long niter, nrejected, nfev, njev
+        vector[T] residuals, dtaus
+        SteadyStateSolver(ReactionDiffusion[T] *) except +
+        int solve(T, T * const) nogil except +
+
+    cdef cppclass SteadyStateContinuation[T]:
+        SteadyStateSolver[T] solver
+        bool arclength
+        T ds0, ds_min, ds_max, xtol, gamma
+        int nopt, max_corr_iter
+        long max_points
+        vector[T] params, ys
+        vector[int] niters, folds
+        long nrejected, nfev, njev
+        SteadyStateContinuation(ReactionDiffusion[T] *, int, int) except +
+        int run(T, const T * const, T, T) nogil except +
+
 cnp.import_array()  # Numpy C-API initialization
 
 
+cdef vector[Schedule[double]] _schedules_from_py(schedules) except *:
+    # [(t, values[, linear]) or None, ...] -> vector of Schedule
+    cdef vector[Schedule[double]] result
+    cdef vector[double] tv, vv
+    cdef bool linear
+    for sched in schedules or []:
+        if sched is None:
+            sched = ([0.0], [1.0])
+        tv = np.asarray(sched[0], dtype=np.float64)
+        vv = np.asarray(sched[1], dtype=np.float64)
+        linear = len(sched) > 2 and sched[2]
+        result.push_back(Schedule[double](tv, vv, linear))
+    return result
+
+
+cdef list _schedules_to_py(vector[Schedule[double]]& schedules):
+    return [(np.array(sched.t), np.array(sched.v), sched.linear) for sched in schedules]
+
+
+EVENT_KINDS = ('threshold', 'amount', 'steady_state')
+
+
+cdef vector[Event[double]] _events_from_py(PyReactionDiffusion rd, events) except *:
+    # [dict(kind=..., value=..., ...), ...] -> vector of Event (see PyReactionDiffusion.events)
+    cdef vector[Event[double]] result
+    cdef vector[int] idx
+    cdef vector[double] w
+    for spec in events or []:
+        spec = dict(spec)
+        kind = spec.pop('kind')
+        if kind not in EVENT_KINDS:
+            raise ValueError("Unknown event kind: %s" % kind)
+        value = spec.pop('value')
+        direction = spec.pop('direction', 0)
+        terminal = spec.pop('terminal', False)
+        idx.clear()
+        w.clear()
+        if 'idx' in spec:
+            idx = spec.pop('idx')
+            w = spec.pop('w', [])
+        elif kind == 'threshold':
+            idx.push_back(spec.pop('bin', 0)*rd.n + spec.pop('species'))
+        elif kind == 'amount':
+            weights = spec.pop('weights', None)
+            if weights is None:
+                species = np.atleast_1d(spec.pop('species'))
+                weights = np.zeros((rd.N, rd.n))
+                weights[:, species] = rd.bin_volumes()[:, None]
+            weights = np.asarray(weights, dtype=np.float64).reshape(rd.N*rd.n)
+            for i in np.flatnonzero(weights):
+                idx.push_back(i)
+                w.push_back(weights[i])
+        if spec:
+            raise KeyError("Unknown keys in event specification: %s" % ', '.join(spec))
+        result.push_back(Event[double](EVENT_KINDS.index(kind), idx, w, value, direction, terminal))
+    return result
+
+
+cdef dict _event_to_py(Event[double]& ev):
+    return dict(kind=EVENT_KINDS[ev.kind_index()], idx=list(ev.idx), w=list(ev.w),
+                value=ev.value, direction=ev.direction, terminal=ev.terminal)
+
+
 cdef class ArrayWrapper(object):
     cdef public dict __array_interface__
 
@@ -55,40 +268,47 @@ cdef class PyReactionDiffusion:
     cdef public vector[double] k_err, D_err
     cdef public list names, tex_names
 
-    def __cinit__(self,
-                  int n,
-                  vector[vector[int]] stoich_active,
-                  vector[vector[int]] stoich_prod,
-                  vector[double] k,
-                  int N,
-                  vector[double] D,
-                  vector[int] z_chg,
-                  vector[double] mobility,
-                  vector[double] x,
-                  vector[vector[int]] stoich_inact,
-                  int geom,
-                  bint logy,
-                  bint logt,
-                  bint logx,
-                  vector[vector[double]] g_values,
-                  vector[int] g_value_parents,
-                  vector[vector[double]] fields,
-                  vector[int] modulated_rxns,
-                  vector[vector[double]] modulation,
-                  int nstencil=3,
-                  bint lrefl=True,
-                  bint rrefl=True,
-                  bint auto_efield=False,
-                  pair[double, double] surf_chg=(0, 0),
-                  double eps_rel=1.0,
-                  double faraday_const=9.64853399e4,
-                  double vacuum_permittivity=8.854187817e-12,
-                  double ilu_limit=1000.0,
-                  int n_jac_diags=1,
-                  bint use_log2=False,
-                  bint clip_to_pos=False
+    def __cinit__(self, *args, **kwargs):
+        if args or kwargs:
+            self._init(*args, **kwargs)
+        # otherwise thisptr is assigned by the caller (see clone)
+
+    def _init(self,
+              int n,
+              vector[vector[int]] stoich_active,
+              vector[vector[int]] stoich_prod,
+              vector[double] k,
+              int N,
+              vector[double] D,
+              vector[int] z_chg,
+              vector[double] mobility,
+              vector[double] x,
+              vector[vector[int]] stoich_inact,
+              int geom,
+              bint logy,
+              bint logt,
+              bint logx,
+              vector[vector[double]] g_values,
+              vector[int] g_value_parents,
+              vector[vector[double]] fields,
+              vector[int] modulated_rxns,
+              vector[vector[double]] modulation,
+              int nstencil=3,
+              bint lrefl=True,
+              bint rrefl=True,
+              bint auto_efield=False,
+              pair[double, double] surf_chg=(0, 0),
+              double eps_rel=1.0,
+              double faraday_const=9.64853399e4,
+              double vacuum_permittivity=8.854187817e-12,
+              double ilu_limit=1000.0,
+              int n_jac_diags=1,
+              bint use_log2=False,
+              bint clip_to_pos=False
               ):
         cdef size_t i
+        if self.thisptr != NULL:
+            raise RuntimeError("Already initialized")
         if D.size() == <unsigned>(n):
             D = list(D)*N
 
@@ -104,6 +324,25 @@ cdef class PyReactionDiffusion:
     def __dealloc__(self):
         del self.thisptr
 
+    def clone(self):
+        """
+        Returns a copy for use in another thread.
+
+        Parameters and precomputed tables are copied while work arrays, cached
+        Jacobians/preconditioners, memoized state and counters are private to the
+        copy. The integration functions release the GIL, so one clone per worker of e.g.
+        a ``concurrent.futures.ThreadPoolExecutor`` integrates concurrently.
+        """
+        cdef PyReactionDiffusion other = PyReactionDiffusion.__new__(type(self))
+        other.thisptr = new ReactionDiffusion[double](deref(self.thisptr))
+        other.k_err = self.k_err
+        other.D_err = self.D_err
+        other.names = self.names
+        other.tex_names = self.tex_names
+        if hasattr(self, '__dict__'):
+            other.__dict__.update(self.__dict__)
+        return other
+
     def f(self, double t, cnp.ndarray[cnp.float64_t, ndim=1] y,
           cnp.ndarray[cnp.float64_t, ndim=1] fout):
         assert y.size == fout.size
@@ -144,26 +383,40 @@ cdef class PyReactionDiffusion:
         self.thisptr.compressed_jac_cmaj(
             t, &y[0], NULL, <double *>Jout.data, self.n)
 
+    def _set_rxn_kernels(self, size_t rhs_addr, size_t jac_addr, vector[int] jac_rows, vector[int] jac_cols):
+        """
+        Install specialized reaction kernels given as addresses of C functions
+        (see :mod:`chemreac.codegen`), addresses of 0 restore the generic kernel.
+        """
+        self.thisptr.set_rxn_kernels(<rxn_kernel_t>rhs_addr, <rxn_kernel_t>jac_addr, jac_rows, jac_cols)
+
     def calc_efield(self, cnp.ndarray[cnp.float64_t, ndim=1] linC):
         self.thisptr.calc_efield(&linC[0])
         return self.efield  # convenience
 
-    def integrated_conc(self, linC):
+    def bin_volumes(self):
         """
-        Integrates the concentration over the volume of the system.
-        Pass linear concentration "linC"
+        Volumes of the N bins (lengths for flat geometry, areas for cylindrical
+        geometry per unit length).
         """
-        if linC.shape != (self.N,):
-            raise ValueError("linC must be of length N")
         if self.geom == 'f':
-            return np.sum(np.diff(self.lin_x)*linC)
+            return np.diff(self.lin_x)
         elif self.geom == 'c':
-            return np.sum(np.pi*np.diff(self.lin_x**2)*linC)
+            return np.pi*np.diff(self.lin_x**2)
         elif self.geom == 's':
-            return np.sum(4*np.pi/3*np.diff(self.lin_x**3)*linC)
+            return 4*np.pi/3*np.diff(self.lin_x**3)
         else:
             raise NotImplementedError("Unkown geom %s" % self.geom)
 
+    def integrated_conc(self, linC):
+        """
+        Integrates the concentration over the volume of the system.
+        Pass linear concentration "linC"
+        """
+        if linC.shape != (self.N,):
+            raise ValueError("linC must be of length N")
+        return np.sum(self.bin_volumes()*linC)
+
     property lin_x:
         def __get__(self):
             if self.logx:
@@ -205,6 +458,8 @@ cdef class PyReactionDiffusion:
         def __set__(self, vector[double] k):
             assert len(k) == self.nr
             self.thisptr.k = k
+            self.thisptr.clear_memo()
+            self.thisptr.m_eff_k_stale = True
 
     property D:
         def __get__(self):
@@ -214,6 +469,7 @@ cdef class PyReactionDiffusion:
             cdef size_t i
             assert len(D) == self.n
             self.thisptr.D = D
+            self.thisptr.clear_memo()
 
     property z_chg:
         def __get__(self):
@@ -222,6 +478,7 @@ cdef class PyReactionDiffusion:
         def __set__(self, vector[int] z_chg):
             assert len(z_chg) == self.n
             self.thisptr.z_chg = z_chg
+            self.thisptr.clear_memo()
 
     property mobility:
         def __get__(self):
@@ -231,6 +488,7 @@ cdef class PyReactionDiffusion:
             cdef size_t i
             assert len(mobility) == self.n
             self.thisptr.mobility = mobility
+            self.thisptr.clear_memo()
 
     property x:
         def __get__(self):
@@ -289,12 +547,14 @@ cdef class PyReactionDiffusion:
             return self.thisptr.g_values
         def __set__(self, vector[vector[double]] g_values):
             self.thisptr.g_values = g_values
+            self.thisptr.clear_memo()
 
     property g_value_parents:
         def __get__(self):
             return self.thisptr.g_value_parents
         def __set__(self, vector[int] g_value_parents):
             self.thisptr.g_value_parents = g_value_parents
+            self.thisptr.clear_memo()
 
     property fields:
         def __get__(self):
@@ -302,18 +562,88 @@ cdef class PyReactionDiffusion:
         def __set__(self, vector[vector[double]] fields):
             assert len(fields) == len(self.g_values)
             self.thisptr.fields = fields
+            self.thisptr.clear_memo()
 
     property modulated_rxns:
         def __get__(self):
             return self.thisptr.modulated_rxns
         def __set__(self, vector[int] modulated_rxns):
             self.thisptr.modulated_rxns = modulated_rxns
+            self.thisptr.clear_memo()
+            self.thisptr.m_eff_k_stale = True
 
     property modulation:
         def __get__(self):
             return self.thisptr.modulation
         def __set__(self, vector[vector[double]] modulation):
             self.thisptr.modulation = modulation
+            self.thisptr.clear_memo()
+            self.thisptr.m_eff_k_stale = True
+
+    property field_schedules:
+        """ Time profiles scaling ``fields`` (empty, or one per field type).
+
+        Each profile is given as ``(t, values)`` (piecewise constant) or ``(t, values, linear)``,
+        ``None`` denotes a constant factor of one. Discontinuities are used as stop times by
+        :func:`cvode_predefined` (& :class:`CvodeSession`).
+        """
+        def __get__(self):
+            return _schedules_to_py(self.thisptr.field_schedules)
+        def __set__(self, schedules):
+            cdef vector[Schedule[double]] scheds = _schedules_from_py(schedules)
+            if scheds.size() not in (0, len(self.g_values)):
+                raise ValueError("field_schedules needs to be of the same length as fields")
+            self.thisptr.field_schedules = scheds
+            self.thisptr.clear_memo()
+            self.thisptr.m_eff_k_stale = True
+
+    property modulation_schedules:
+        """ Time profiles scaling ``modulation`` (empty, or one per modulated reaction).
+
+        See :attr:`field_schedules`.
+        """
+        def __get__(self):
+            return _schedules_to_py(self.thisptr.modulation_schedules)
+        def __set__(self, schedules):
+            cdef vector[Schedule[double]] scheds = _schedules_from_py(schedules)
+            if scheds.size() not in (0, len(self.modulated_rxns)):
+                raise ValueError("modulation_schedules needs to be of the same length as modulated_rxns")
+            self.thisptr.modulation_schedules = scheds
+            self.thisptr.clear_memo()
+            self.thisptr.m_eff_k_stale = True
+
+    property events:
+        """ Events (roots) located during integrations with CVODE.
+
+        Each event is a dict with keys ``kind`` (one of :data:`EVENT_KINDS`), ``value``,
+        ``direction`` (1: increasing, -1: decreasing, 0: either; default 0) and
+        ``terminal`` (stop the integration, default False), and depending on ``kind``:
+
+        - ``'threshold'``: ``species`` & ``bin`` (default 0), ``C[bin, species] - value``
+        - ``'amount'``: ``species`` (int or list, weighted by the bin volumes) or
+          ``weights`` of shape ``(N, n)``, ``sum(weights*C) - value``
+        - ``'steady_state'``: ``max(abs(dC/dt)) - value``
+
+        (alternatively the native form ``idx`` & ``w`` as returned by the getter).
+        Occurrences are reported in the info dict: ``event_index``, ``event_t`` &
+        ``event_y`` (integration variables), ``event_stop``.
+        """
+        def __get__(self):
+            return [_event_to_py(self.thisptr.events[i]) for i in range(self.thisptr.events.size())]
+        def __set__(self, events):
+            self.thisptr.events = _events_from_py(self, events)
+
+    def roots(self, double t, cnp.ndarray[cnp.float64_t, ndim=1] y):
+        """ Values of the event functions (see :attr:`events`) """
+        cdef cnp.ndarray[cnp.float64_t, ndim=1] out = np.empty(self.thisptr.get_nroots())
+        assert y.size == self.n*self.N
+        if out.size:
+            self.thisptr.roots(t, &y[0], &out[0])
+        return out
+
+    def schedule_breakpoints(self, double x0, double xend):
+        """ Discontinuities of the schedules in (x0, xend) (in the integration variable). """
+        return np.array(self.thisptr.schedule_breakpoints(x0, xend))
 
     property ilu_limit:
         def __get__(self):
@@ -338,6 +668,7 @@ cdef class PyReactionDiffusion:
             if len(val) != <unsigned>(self.thisptr.n*self.thisptr.N):
                 raise ValueError("upper_bounds of incorrect size")
             self.thisptr.m_upper_bounds = val
+            self.thisptr.clear_memo()
 
     property lower_bounds:
         def __get__(self):
@@ -346,6 +677,7 @@ cdef class PyReactionDiffusion:
             if len(val) != <unsigned>(self.thisptr.n*self.thisptr.N):
                 raise ValueError("lower_bounds of incorrect size")
             self.thisptr.m_lower_bounds = val
+            self.thisptr.clear_memo()
 
     property get_dx_max_factor:
         def __get__(self):
@@ -388,7 +720,21 @@ cdef class PyReactionDiffusion:
             assert self.thisptr.m_upper_bounds.size() == <unsigned>(self.thisptr.n*self.thisptr.N), "upper_bounds of incorrect length"
             assert val in (True, False), "need boolean for error_outside_bounds"
             self.thisptr.m_error_outside_bounds = val
+            self.thisptr.clear_memo()
 
+    property jtimes_fd:
+        def __get__(self):
+            return self.thisptr.m_jtimes_fd
+        def __set__(self, val):
+            assert val in (True, False), "need boolean for jtimes_fd"
+            self.thisptr.m_jtimes_fd = val
+
+    property efield_jac:
+        def __get__(self):
+            return self.thisptr.m_efield_jac
+        def __set__(self, val):
+            assert val in (True, False), "need boolean for efield_jac"
+            self.thisptr.m_efield_jac = val
 
     def logb(self, x):
         """ log_2 if self.use_log2 else log_e """
@@ -425,6 +771,14 @@ cdef class PyReactionDiffusion:
         def __get__(self):
             return self.thisptr.njacvec_dot
 
+    property njacvec_setup:
+        def __get__(self):
+            return self.thisptr.njacvec_setup
+
+    property njacvec_dot_fd:
+        def __get__(self):
+            return self.thisptr.njacvec_dot_fd
+
     property nprec_solve_ilu:
         def __get__(self):
             return self.thisptr.nprec_solve_ilu
@@ -433,6 +787,30 @@ cdef class PyReactionDiffusion:
         def __get__(self):
             return self.thisptr.nprec_solve_lu
 
+    property nprec_cache_hit:
+        def __get__(self):
+            return self.thisptr.nprec_cache_hit
+
+    property nprec_cache_miss:
+        def __get__(self):
+            return self.thisptr.nprec_cache_miss
+
+    property nmemo_state_hit:
+        def __get__(self):
+            return self.thisptr.nmemo_state_hit
+
+    property nmemo_state_miss:
+        def __get__(self):
+            return self.thisptr.nmemo_state_miss
+
+    property nmemo_rhs_hit:
+        def __get__(self):
+            return self.thisptr.nmemo_rhs_hit
+
+    property nheap_alloc:
+        def __get__(self):
+            return self.thisptr.nheap_alloc
+
     property last_integration_info:
         def __get__(self):
             return {str(k.decode('utf-8')): v for k, v
@@ -460,6 +838,10 @@ cdef class PyReactionDiffusion:
         # info.update(self.last_integration_info_vecint)
         info['nfev'] = self.nfev
         info['njev'] = self.njev
+        info['nmemo_state_hit'] = self.nmemo_state_hit
+        info['nmemo_state_miss'] = self.nmemo_state_miss
+        info['nmemo_rhs_hit'] = self.nmemo_rhs_hit
+        info['nheap_alloc'] = self.nheap_alloc
         info['success'] = success
         return info
 
@@ -490,6 +872,36 @@ cdef class PyReactionDiffusion:
         """
         self.thisptr.per_rxn_contrib_to_fi(t, &y[0], si, &out[0])
 
+    def dfdp(self, double t, y, param):
+        """
+        Partial derivative of :meth:`f` with respect to a parameter (at fixed ``y``).
+
+        Parameters
+        ----------
+        t : float
+            independent variable (logarithmic with logt)
+        y : array_like
+            dependent variables
+        param : tuple
+            ``('k', ri)``, ``('D', si)`` (species ``si`` in every bin) or
+            ``('g_values', (fi, si))``, see :func:`cvode_predefined_sensitivity`.
+
+        Returns
+        -------
+        Array of shape ``(N, n)``.
+        """
+        cdef:
+            cnp.ndarray[cnp.float64_t, ndim=1] yarr = np.ascontiguousarray(y, dtype=np.float64).flatten()
+            cnp.ndarray[cnp.float64_t, ndim=1] out = np.empty(self.n*self.N)
+            int kind, index
+        if yarr.size != self.n*self.N:
+            raise ValueError("y of incorrect size")
+        kind, index, _ = _sensitivity_param(self, param)
+        if kind == 3:
+            raise ValueError("f does not depend on y0")
+        self.thisptr.dfdp(t, &yarr[0], kind, index, &out[0])
+        return out.reshape((self.N, self.n))
+
     property xcenters:
         def __get__(self):
             return fromaddress(<long>(
@@ -523,6 +935,7 @@ cdef class PyReactionDiffusion:
             assert efield.size == self.thisptr.N
             for i in range(self.thisptr.N):
                 self.thisptr.efield[i] = efield[i]
+            self.thisptr.clear_memo()
 
 # sundials wrapper:
 
@@ -532,22 +945,46 @@ def cvode_predefined(
         vector[realtype] atol, double rtol, basestring method, bool with_jacobian=True,
         basestring iter_type='undecided', str linear_solver="default", int maxl=5, double eps_lin=0.05,
         double first_step=0.0, double dx_min=0.0, double dx_max=0.0, int nsteps=500, int autorestart=0,
-        bool return_on_error=False, bool with_jtimes=False, bool ew_ele=False, vector[double] constraints=[], int msbj=0, bool stab_lim_det=False):
+        bool return_on_error=False, bool with_jtimes=False, bool ew_ele=False, vector[double] constraints=[], int msbj=0, bool stab_lim_det=False,
+        out=None):
+    """
+    Integrates ``rd`` from ``y0`` at ``tout[0]`` through ``tout``.
+
+    ``out`` may be given as a C-contiguous float64 array of size ``tout.size*N*n`` (e.g. an
+    ``np.memmap``) which the integrator then writes to directly (nothing of the size of the
+    output is allocated). Returns ``yout`` of shape ``(tout.size, N, n)`` (a view of ``out``
+    if given) & an info dict.
+    """
     cdef:
         int ny = rd.n*rd.N
-        cnp.ndarray[cnp.float64_t, ndim=1] yout = np.empty(tout.size*ny)
-        cnp.ndarray[cnp.float64_t, ndim=4] ew_ele_arr = np.empty((tout.size, 2, rd.N, rd.n))
+        cnp.ndarray[cnp.float64_t, ndim=1] yout
+        cnp.ndarray[cnp.float64_t, ndim=4] ew_ele_arr = np.empty((tout.size, 2, rd.N, rd.n)) if ew_ele else None
         vector[int] root_indices
         vector[realtype] roots_output
-        int nderiv = 0
+        int nderiv = 0, nreached
+        LMM lmm = lmm_from_name(method.lower().encode('utf-8'))
+        IterType itype = iter_type_from_name(iter_type.lower().encode('UTF-8'))
+        LinSol linsol = linear_solver_from_name(linear_solver.encode('UTF-8'))
+        double * ew_ele_out = <double *>ew_ele_arr.data if ew_ele else NULL
+        size_t nt = tout.size
     assert y0.size == rd.n*rd.N
     assert atol.size() in (1, rd.n*rd.N)
-    nreached = simple_predefined[ReactionDiffusion[double]](
-        rd.thisptr, atol, rtol, lmm_from_name(method.lower().encode('utf-8')),
-        &y0[0], tout.size, &tout[0], &yout[0], root_indices, roots_output, nsteps, first_step, dx_min,
-        dx_max, with_jacobian, iter_type_from_name(iter_type.lower().encode('UTF-8')),
-        linear_solver_from_name(linear_solver.encode('UTF-8')),
-        maxl, eps_lin, nderiv, autorestart, return_on_error, 2 if with_jtimes else 0, <double *>ew_ele_arr.data if ew_ele else NULL, constraints, msbj, stab_lim_det)
+    if (rd.thisptr.field_schedules.size() or rd.thisptr.modulation_schedules.size() or
+            rd.thisptr.events.size()):
+        # restarted at the discontinuities of the schedules, events recorded by the session
+        session = CvodeSession(
+            rd, atol, rtol, method, False, with_jacobian, iter_type, linear_solver, maxl,
+            eps_lin, first_step, dx_min, dx_max, nsteps, autorestart, return_on_error,
+            with_jtimes, constraints, msbj, stab_lim_det)
+        yout_sched, info = session.predefined(y0, tout, ew_ele, out)
+        info['success'] = info['success'] or not return_on_error
+        return yout_sched, info
+    yout = _output_array(out, tout.size*ny)
+    with nogil:
+        nreached = simple_predefined[ReactionDiffusion[double]](
+            rd.thisptr, atol, rtol, lmm, &y0[0], nt, &tout[0], &yout[0], root_indices, roots_output,
+            nsteps, first_step, dx_min, dx_max, with_jacobian, itype, linsol, maxl, eps_lin, nderiv,
+            autorestart, return_on_error, 2 if with_jtimes else 0, ew_ele_out, constraints, msbj, stab_lim_det)
     info = rd.get_last_info(success=False if return_on_error and nreached < tout.size else True)
     info['nreached'] = nreached
     if ew_ele:
@@ -556,61 +993,1161 @@ def cvode_predefined(
     return yout.reshape((tout.size, rd.N, rd.n)), info
 
 
+SENSITIVITY_PARAMS = ('k', 'D', 'g_values', 'y0')
+
+
+def _sensitivity_param(PyReactionDiffusion rd, param):
+    # -> (kind, index, nominal value) of a parameter as in cvode_predefined_sensitivity
+    kind, index = param
+    if kind not in SENSITIVITY_PARAMS:
+        raise ValueError("Unknown parameter kind: %s" % kind)
+    if kind in ('g_values', 'y0') and not isinstance(index, (int, np.integer)):
+        major, si = index
+        if not 0 <= si < rd.n:
+            raise ValueError("Species index out of bounds: %d" % si)
+        index = major*rd.n + si
+    nmax = {'k': rd.nr, 'D': rd.n, 'g_values': len(rd.g_values)*rd.n, 'y0': rd.n*rd.N}[kind]
+    if not 0 <= index < nmax:
+        raise ValueError("Index out of bounds for %s: %d" % (kind, index))
+    if kind == 'k':
+        pbar = rd.k[index]
+    elif kind == 'D':
+        pbar = max(abs(d) for d in rd.D[index::rd.n]) if rd.N > 1 else 0.0
+    elif kind == 'g_values':
+        pbar = rd.g_values[index // rd.n][index % rd.n]
+    else:
+        pbar = 1.0
+    return SENSITIVITY_PARAMS.index(kind), index, pbar
+
+
+def cvode_predefined_sensitivity(
+        PyReactionDiffusion rd, cnp.ndarray[cnp.float64_t, ndim=1] y0,
+        cnp.ndarray[cnp.float64_t, ndim=1] tout, params,
+        vector[realtype] atol, double rtol, basestring method, bool with_jacobian=True,
+        basestring iter_type='undecided', str linear_solver="gmres", int maxl=5, double eps_lin=0.05,
+        double first_step=0.0, double dx_min=0.0, double dx_max=0.0, int nsteps=500, int autorestart=0,
+        bool return_on_error=False, bool with_jtimes=False, vector[double] constraints=[], int msbj=0,
+        bool stab_lim_det=False):
+    """
+    Integrates ``rd`` from ``y0`` at ``tout[0]`` through ``tout`` together with the forward
+    sensitivities ``dy/dp`` of the parameters ``params``.
+
+    The sensitivities are integrated as part of one system (``ny*(1 + P)`` unknowns) whose
+    right hand side is assembled from the Jacobian of ``rd`` and analytic derivatives with
+    respect to the parameters (:meth:`PyReactionDiffusion.dfdp`). The Newton systems are
+    solved by GMRES with the preconditioner of ``rd`` applied to each block, i.e. one
+    factorization is shared by ``y`` and all sensitivities (``linear_solver``,
+    ``with_jacobian`` & ``with_jtimes`` are ignored). See ``chemreac_sensitivity.hpp``.
+
+    Parameters
+    ----------
+    rd : PyReactionDiffusion
+    y0 : array
+    tout : array
+    params : iterable of tuples
+        ``('k', ri)`` (rate constant), ``('D', si)`` (diffusion coefficient of species
+        ``si``, shifted in every bin), ``('g_values', (fi, si))`` or ``('y0', (bi, si))``
+        (initial value of ``y``, flat indices are also accepted for these two).
+    atol, rtol, method :
+        Tolerances (the absolute tolerance of a sensitivity is ``atol`` over the
+        magnitude of the parameter) and linear multistep method.
+
+    Remaining arguments are solver settings as in :func:`cvode_predefined`.
+
+    Returns
+    -------
+    yout : array of shape ``(tout.size, N, n)``
+    sens : array of shape ``(tout.size, N, n, len(params))``, ``dy/dp`` in the variables
+        integrated (i.e. of ``log(C)`` with logy)
+    info : dict
+
+    """
+    cdef:
+        int ny = rd.n*rd.N
+        size_t nt = tout.size
+        vector[int] kinds, indices
+        vector[double] pbar
+        int nreached
+        SolverSettings settings
+        ForwardSensitivity[double] * sensptr
+    assert y0.size == ny
+    assert atol.size() in (1, ny)
+    if rd.thisptr.events.size():
+        raise ValueError("events are not supported with sensitivities")
+    for param in params:
+        kind, index, nominal = _sensitivity_param(rd, param)
+        kinds.push_back(kind)
+        indices.push_back(index)
+        pbar.push_back(nominal)
+    cdef cnp.ndarray[cnp.float64_t, ndim=1] yout = np.empty(nt*ny)
+    cdef cnp.ndarray[cnp.float64_t, ndim=1] sout = np.empty(nt*ny*kinds.size() or 1)
+    settings = _solver_settings(
+        atol, rtol, method, with_jacobian, iter_type, linear_solver, maxl, eps_lin, first_step,
+        dx_min, dx_max, nsteps, autorestart, return_on_error, with_jtimes, constraints, msbj,
+        stab_lim_det)
+    y0 = np.ascontiguousarray(y0)
+    tout = np.ascontiguousarray(tout)
+    sensptr = new ForwardSensitivity[double](rd.thisptr, kinds, indices)
+    try:
+        with nogil:
+            nreached = sensptr.predefined(settings, &y0[0], nt, &tout[0], &yout[0], &sout[0], pbar)
+    finally:
+        del sensptr
+    info = rd.get_last_info(success=False if return_on_error and nreached < <int>nt else True)
+    info.update(rd.last_integration_info_dbl)
+    info['nreached'] = nreached
+    return (yout.reshape((nt, rd.N, rd.n)),
+            sout[:nt*ny*kinds.size()].reshape((nt, rd.N, rd.n, kinds.size())), info)
+
+
+def _output_array(out, size_t size):
+    # Returns a flat view of out (a new array if None) to be written by the integrators
+    if out is None:
+        return np.empty(size)
+    if not isinstance(out, np.ndarray) or out.dtype != np.float64 or not out.flags.c_contiguous:
+        raise ValueError("out needs to be a C-contiguous float64 array")
+    if out.size != size:
+        raise ValueError("out of incorrect size (expected %d)" % size)
+    if not out.flags.writeable:
+        raise ValueError("out is not writeable")
+    return out.reshape(-1)
+
+
+cdef SolverSettings _solver_settings(
+        vector[realtype] atol, double rtol, basestring method, bool with_jacobian,
+        basestring iter_type, str linear_solver, int maxl, double eps_lin, double first_step,
+        double dx_min, double dx_max, int nsteps, int autorestart, bool return_on_error,
+        bool with_jtimes, vector[double] constraints, int msbj, bool stab_lim_det):
+    # Packs the solver keyword arguments of e.g. cvode_predefined into a SolverSettings struct
+    cdef SolverSettings settings
+    settings.atol = atol
+    settings.rtol = rtol
+    settings.method = method.lower().encode('utf-8')
+    settings.iter_type = iter_type.lower().encode('utf-8')
+    settings.linear_solver = linear_solver.encode('utf-8')
+    settings.mxsteps = nsteps
+    settings.dx0 = first_step
+    settings.dx_min = dx_min
+    settings.dx_max = dx_max
+    settings.with_jacobian = with_jacobian
+    settings.maxl = maxl
+    settings.eps_lin = eps_lin
+    settings.nderiv = 0
+    settings.autorestart = autorestart
+    settings.return_on_error = return_on_error
+    settings.with_jtimes = 2 if with_jtimes else 0
+    settings.constraints = constraints
+    settings.msbj = msbj
+    settings.stab_lim_det = stab_lim_det
+    return settings
+
+
+cdef class CvodeSession:
+    """
+    A CVODE integrator bound to ``rd`` which is reused between integrations.
+
+    The solver memory and linear solver workspace are allocated by the first call to
+    :meth:`predefined`, later calls only reinitialize the integrator with the new initial
+    values and output times. Parameters (e.g. ``rd.k`` or ``rd.fields``) may be changed
+    on ``rd`` in between calls.
+
+    Parameters
+    ----------
+    rd : PyReactionDiffusion
+    atol : float or array_like
+    rtol : float
+    method : str
+    keep_step : bool
+        Start every call (but the first) with the step size the previous call ended with
+        instead of an estimated first step (pays off for chained segments of smooth
+        problems, but a stiff problem may fail to converge right after a large jump in
+        the fields).
+
+    Remaining arguments are solver settings as in :func:`cvode_predefined`.
+
+    Examples
+    --------
+    >>> session = CvodeSession(rd, [1e-10], 1e-8, 'bdf')  # doctest: +SKIP
+    >>> for y0 in y0s:  # doctest: +SKIP
+    ...     yout, info = session.predefined(y0, tout)
+
+    """
+    cdef _CvodeSession[double] * thisptr
+    cdef readonly PyReactionDiffusion rd
+
+    def __cinit__(self, PyReactionDiffusion rd, vector[realtype] atol, double rtol,
+                  basestring method, bool keep_step=False, bool with_jacobian=True,
+                  basestring iter_type='undecided', str linear_solver="default", int maxl=5,
+                  double eps_lin=0.05, double first_step=0.0, double dx_min=0.0,
+                  double dx_max=0.0, int nsteps=500, int autorestart=0,
+                  bool return_on_error=False, bool with_jtimes=False,
+                  vector[double] constraints=[], int msbj=0, bool stab_lim_det=False):
+        cdef SolverSettings settings = _solver_settings(
+            atol, rtol, method, with_jacobian, iter_type, linear_solver, maxl, eps_lin,
+            first_step, dx_min, dx_max, nsteps, autorestart, return_on_error, with_jtimes,
+            constraints, msbj, stab_lim_det)
+        self.rd = rd
+        self.thisptr = new _CvodeSession[double](rd.thisptr, settings, keep_step)
+
+    def __dealloc__(self):
+        del self.thisptr
+
+    property keep_step:
+        def __get__(self):
+            return self.thisptr.keep_step
+        def __set__(self, bool keep_step):
+            self.thisptr.keep_step = keep_step
+
+    property last_step:
+        def __get__(self):
+            return self.thisptr.last_step
+
+    property ncalls:
+        def __get__(self):
+            return self.thisptr.ncalls
+
+    def reset_info(self):
+        """ Clears the statistics (and the counters of ``rd``) accumulated so far. """
+        self.thisptr.reset_info()
+
+    def predefined(self, cnp.ndarray[cnp.float64_t, ndim=1] y0,
+                   cnp.ndarray[cnp.float64_t, ndim=1] tout, bool ew_ele=False, out=None):
+        """
+        Integrates from ``y0`` at ``tout[0]`` through ``tout``.
+
+        Parameters
+        ----------
+        y0 : array
+        tout : array
+        ew_ele : bool
+            Record error weights and estimated local errors.
+        out : array, optional
+            C-contiguous float64 array of size ``tout.size*N*n`` (e.g. an ``np.memmap``)
+            to write the output to (instead of a newly allocated array).
+
+        Returns
+        -------
+        yout : array of shape ``(tout.size, N, n)`` (a view of ``out`` if given), rows
+            from ``info['nreached']`` on (not reached, e.g. after a terminal event) are
+            ``nan``
+        info : dict (statistics accumulated over all calls since the last
+            :meth:`reset_info`)
+
+        """
+        cdef:
+            int ny = self.rd.n*self.rd.N
+            size_t nt = tout.size
+            int nreached
+            cnp.ndarray[cnp.float64_t, ndim=1] yout = _output_array(out, tout.size*ny)
+            cnp.ndarray[cnp.float64_t, ndim=4] ew_ele_arr
+            double * ew_ele_out = NULL
+        assert y0.size == ny
+        y0 = np.ascontiguousarray(y0)
+        tout = np.ascontiguousarray(tout)
+        if ew_ele:
+            ew_ele_arr = np.empty((tout.size, 2, self.rd.N, self.rd.n))
+            ew_ele_out = <double *>ew_ele_arr.data
+        with nogil:
+            nreached = self.thisptr.predefined(&y0[0], nt, &tout[0], &yout[0], ew_ele_out)
+        if nreached < <int>nt:
+            yout[max(nreached, 0)*ny:] = np.nan
+            if ew_ele:
+                ew_ele_arr[max(nreached, 0):] = np.nan
+        info = self.rd.last_integration_info
+        info.update(self.rd.last_integration_info_dbl)
+        info['nreached'] = nreached
+        info['success'] = nreached == <int>nt or self.thisptr.event_stop
+        self._add_event_info(info)
+        if ew_ele:
+            info['ew_ele'] = ew_ele_arr.squeeze()
+        return yout.reshape((tout.size, self.rd.N, self.rd.n)), info
+
+    cdef _add_event_info(self, dict info):
+        if self.rd.thisptr.get_nroots() == 0:
+            return
+        info['event_index'] = np.asarray(self.thisptr.event_index, dtype=np.int32)
+        info['event_t'] = np.asarray(self.thisptr.event_x)
+        info['event_y'] = np.asarray(self.thisptr.event_y).reshape((-1, self.rd.N, self.rd.n))
+        info['event_stop'] = self.thisptr.event_stop
+
+    def stream(self, cnp.ndarray[cnp.float64_t, ndim=1] y0,
+               cnp.ndarray[cnp.float64_t, ndim=1] tout, sink, int chunk_size=1024,
+               bool adaptive=False, NordsieckInterpolant history=None):
+        """
+        Integrates from ``y0`` at ``tout[0]`` handing the output to ``sink`` in chunks.
+
+        Only one chunk is held in memory, i.e. memory use does not grow with the number
+        of output rows.
+
+        Parameters
+        ----------
+        y0 : array
+        tout : array
+            Output times, with ``adaptive``: ``tout[0]`` & ``tout[-1]`` (every internal
+            step in between is reported).
+        sink : callable
+            Called as ``sink(t, y)`` with arrays of shape ``(m,)`` & ``(m, N, n)``
+            (``m <= chunk_size``). The arrays are reused for the next chunk (copy them to
+            keep them). An exception raised by ``sink`` stops the integration and is
+            re-raised.
+        chunk_size : int
+        adaptive : bool
+        history : NordsieckInterpolant, optional
+            Records the interpolating polynomial of every step (requires ``adaptive``).
+
+        Returns
+        -------
+        info : dict (``nrows``: number of rows handed to sink)
+
+        """
+        cdef:
+            int ny = self.rd.n*self.rd.N
+            size_t nt = tout.size
+            size_t nrows
+            _StreamSink state
+            cnp.ndarray[cnp.float64_t, ndim=1] tbuf
+            cnp.ndarray[cnp.float64_t, ndim=3] ybuf
+        assert y0.size == ny
+        if chunk_size < 1:
+            raise ValueError("chunk_size needs to be positive")
+        if nt < 2:
+            raise ValueError("tout needs at least two values")
+        y0 = np.ascontiguousarray(y0)
+        tout = np.ascontiguousarray(tout)
+        state = _StreamSink(sink, chunk_size, self.rd.N, self.rd.n)
+        tbuf, ybuf = state.tbuf, state.ybuf
+        if history is not None:
+            if history.N != self.rd.N or history.n != self.rd.n:
+                raise ValueError("history of incorrect shape")
+            self.thisptr.history = history.thisptr
+        try:
+            with nogil:
+                nrows = self.thisptr.stream(&y0[0], nt, &tout[0], adaptive, chunk_size, &tbuf[0],
+                                            &ybuf[0, 0, 0], _stream_chunk, <void *>state)
+        finally:
+            self.thisptr.history = NULL
+        if state.exc is not None:
+            raise state.exc
+        info = self.rd.last_integration_info
+        info.update(self.rd.last_integration_info_dbl)
+        info['nrows'] = nrows
+        info['success'] = ((not adaptive and nrows == nt) or (adaptive and state.t_last == tout[nt - 1])
+                           or self.thisptr.event_stop)
+        self._add_event_info(info)
+        return info
+
+    def observe(self, cnp.ndarray[cnp.float64_t, ndim=1] y0,
+                cnp.ndarray[cnp.float64_t, ndim=1] tout, weights, bool adaptive=False,
+                bool record=True):
+        """
+        Integrates from ``y0`` at ``tout[0]`` evaluating observables (weighted sums of the
+        linear concentrations) at every output time (or internal step with ``adaptive``).
+
+        The trajectory itself is not stored, only the reductions are returned.
+
+        Parameters
+        ----------
+        y0 : array
+        tout : array
+            Output times, with ``adaptive``: ``tout[0]`` & ``tout[-1]``.
+        weights : array_like of shape ``(nobs, N, n)``
+            Observable ``i`` is ``sum(weights[i]*C)``, e.g. bin volumes (amounts) or
+            0/1 masks (see :func:`chemreac.integrate.observable_weights`).
+        adaptive : bool
+        record : bool
+            Also return the value of the observables at every point.
+
+        Returns
+        -------
+        obs : dict with keys ``'min'``, ``'max'``, ``'t_min'``, ``'t_max'``, ``'integral'``
+            (arrays of shape ``(nobs,)``, the integral being over time by the trapezoidal
+            rule over the points) and with ``record``: ``'tout'`` (of shape ``(nrows,)``)
+            & ``'values'`` (of shape ``(nrows, nobs)``)
+        info : dict
+
+        """
+        cdef:
+            int ny = self.rd.n*self.rd.N
+            size_t nt = tout.size
+            size_t nrows
+            double x_last
+            cnp.ndarray[cnp.float64_t, ndim=2] w = np.ascontiguousarray(
+                weights, dtype=np.float64).reshape((-1, ny))
+            Observables[double] * obsptr
+        assert y0.size == ny
+        if w.shape[0] == 0:
+            raise ValueError("No observables given")
+        if nt < 2:
+            raise ValueError("tout needs at least two values")
+        y0 = np.ascontiguousarray(y0)
+        tout = np.ascontiguousarray(tout)
+        obsptr = new Observables[double](deref(self.rd.thisptr), w.shape[0], &w[0, 0], record)
+        try:
+            with nogil:
+                nrows = self.thisptr.observe(&y0[0], nt, &tout[0], adaptive, deref(obsptr))
+            x_last = obsptr.x_last
+            obs = {
+                'min': np.asarray(obsptr.vmin),
+                'max': np.asarray(obsptr.vmax),
+                't_min': np.asarray(obsptr.tmin),
+                't_max': np.asarray(obsptr.tmax),
+                'integral': np.asarray(obsptr.integral),
+            }
+            if record:
+                obs['tout'] = np.asarray(obsptr.tout)
+                obs['values'] = np.asarray(obsptr.values).reshape((nrows, w.shape[0]))
+        finally:
+            del obsptr
+        info = self.rd.last_integration_info
+        info.update(self.rd.last_integration_info_dbl)
+        info['nrows'] = nrows
+        info['success'] = ((not adaptive and nrows == nt) or (adaptive and x_last == tout[nt - 1])
+                           or self.thisptr.event_stop)
+        self._add_event_info(info)
+        return obs, info
+
+
+cdef class NordsieckInterpolant:
+    """
+    Piecewise polynomial interpolant recorded by :meth:`CvodeSession.stream` (with
+    ``history``): the Taylor coefficients (Nordsieck array) of every step, giving the
+    solution between the steps to the accuracy of the integration.
+
+    Times and dependent variables are those of the integration (i.e. transformed when
+    ``rd.logt`` / ``rd.logy``), see :class:`chemreac.integrate.DenseOutput` for the
+    back-transformed interpolant.
+
+    Parameters
+    ----------
+    N : int
+    n : int
+
+    """
+    cdef NordsieckHistory[double] * thisptr
+    cdef readonly int N, n
+
+    def __cinit__(self, int N, int n):
+        self.N, self.n = N, n
+        self.thisptr = new NordsieckHistory[double](N*n)
+
+    def __dealloc__(self):
+        del self.thisptr
+
+    property t:
+        def __get__(self):
+            """ End points of the steps (including the initial time) """
+            return np.asarray(self.thisptr.t)
+
+    property orders:
+        def __get__(self):
+            return np.asarray(self.thisptr.q, dtype=np.int32)
+
+    property nsteps:
+        def __get__(self):
+            return self.thisptr.nsteps()
+
+    def __call__(self, x, bool deriv=False):
+        """
+        Evaluates the interpolant at ``x`` (scalar or array).
+
+        Returns
+        -------
+        y : array of shape ``x.shape + (N, n)``
+        dydx : array (same shape as ``y``), only with ``deriv``
+
+        """
+        cdef:
+            cnp.ndarray[cnp.float64_t, ndim=1] xarr = np.ascontiguousarray(x, dtype=np.float64).ravel()
+            cnp.ndarray[cnp.float64_t, ndim=2] y = np.empty((xarr.size, self.N*self.n))
+            cnp.ndarray[cnp.float64_t, ndim=2] dydx
+            double * dydx_ptr = NULL
+            size_t nx = xarr.size
+        if self.thisptr.nsteps() == 0:
+            raise ValueError("No steps recorded")
+        if nx and (np.min(xarr) < self.thisptr.t.front() or np.max(xarr) > self.thisptr.t.back()):
+            raise ValueError("x outside the recorded interval")
+        if deriv:
+            dydx = np.empty((xarr.size, self.N*self.n))
+            dydx_ptr = &dydx[0, 0] if nx else NULL
+        if nx:
+            with nogil:
+                self.thisptr.eval(nx, &xarr[0], &y[0, 0], dydx_ptr)
+        shape = np.shape(x) + (self.N, self.n)
+        if deriv:
+            return y.reshape(shape), dydx.reshape(shape)
+        return y.reshape(shape)
+
+
+cdef class _StreamSink:
+    # State of CvodeSession.stream passed (as void *) to _stream_chunk
+    cdef object sink, exc
+    cdef readonly object tbuf, ybuf
+    cdef double t_last
+
+    def __cinit__(self, sink, int chunk_size, int N, int n):
+        self.sink = sink
+        self.exc = None
+        self.tbuf = np.empty(chunk_size)
+        self.ybuf = np.empty((chunk_size, N, n))
+
+
+cdef int _stream_chunk(void * ctx, size_t nrows) noexcept with gil:
+    cdef _StreamSink state = <_StreamSink>ctx
+    state.t_last = state.tbuf[nrows - 1]
+    try:
+        state.sink(state.tbuf[:nrows], state.ybuf[:nrows])
+    except BaseException as exc:
+        state.exc = exc
+        return 1
+    return 0
+
+
 def cvode_predefined_durations_fields(
         PyReactionDiffusion rd, cnp.ndarray[cnp.float64_t, ndim=1] y0,
-        cnp.ndarray[cnp.float64_t, ndim=1] durations,
-        cnp.ndarray[cnp.float64_t, ndim=1] fields,
+        cnp.ndarray[cnp.float64_t, ndim=1] durations, fields,
         vector[realtype] atol, double rtol, basestring method,
         int npoints=2,
         bool with_jacobian=True,
         basestring iter_type='undecided', str linear_solver='default', int maxl=5, double eps_lin=0.05,
         double first_step=0.0, double dx_min=0.0, double dx_max=0.0, int nsteps=500, int autorestart=0,
-        bool return_on_error=False, bool with_jtimes=False, ew_ele=False, vector[double] constraints=[], int msbj=0, bool stab_lim_det=False):
+        bool return_on_error=False, bool with_jtimes=False, ew_ele=False, vector[double] constraints=[], int msbj=0, bool stab_lim_det=False,
+        bool keep_step=False):
+    """
+    Integrates through consecutive segments (``durations``) of constant field strength.
+
+    ``fields`` are the (spatially uniform) field strengths of each segment, of shape
+    ``(durations.size,)`` (one field type) or ``(durations.size, len(rd.g_values))``.
+    They are integrated as a piecewise constant :attr:`PyReactionDiffusion.field_schedules`
+    (replacing those of ``rd`` during the integration) in one call of
+    :meth:`CvodeSession.predefined` starting at ``t = 0``, i.e. the integration is restarted
+    at the start of each segment (and at the discontinuities of
+    :attr:`PyReactionDiffusion.modulation_schedules`). With ``keep_step`` each restart uses
+    the step size the previous segment ended with (see :class:`CvodeSession`).
+
+    Returns
+    -------
+    tout : array of size ``durations.size*npoints + 1``
+    yout : array of shape ``(tout.size, N, n)``
+
+    """
     cdef:
         cnp.ndarray[cnp.float64_t, ndim=1, mode='c'] tout = np.empty(durations.size*npoints + 1)
-        cnp.ndarray[cnp.float64_t, ndim=1, mode='c'] yout = np.empty(tout.size*rd.n*rd.N)
-        cnp.ndarray[cnp.float64_t, ndim=1, mode='c'] tbuf = np.zeros(npoints+1)
-        cnp.ndarray[cnp.float64_t, ndim=4, mode='c'] ew_ele_arr
-        double * ew_ele_out = NULL
-        vector[int] root_indices
-        vector[realtype] roots_output
-        int nderiv = 0
-        int i, offset, j
+        int i, nreached
+        CvodeSession session
     assert npoints > 0
-    assert durations.size == fields.size
     assert y0.size == rd.n*rd.N
     assert atol.size() in (1, rd.n*rd.N)
-    assert len(rd.g_values) == 1, 'only field type assumed for now'
-    for i in range(rd.n*rd.N):
-        yout[i] = y0[i]
-    if ew_ele:
-        ew_ele_arr = np.empty((tout.size, 2, rd.N, rd.n))
+    fields = np.asarray(fields, dtype=np.float64).reshape((durations.size, -1))
+    if fields.shape[1] != len(rd.g_values):
+        raise ValueError("fields of incorrect shape")
 
     tout[0] = 0.0
     tout[npoints::npoints] = np.cumsum(durations)
     for i in range(1, npoints):
         tout[i::npoints] = tout[:-1:npoints] + i*durations/npoints
     assert np.all(np.diff(tout) > 0)
-    rd.zero_counters()
-    for i in range(durations.size):
-        offset = i*npoints*rd.n*rd.N
-        rd.fields = [[fields[i]]]
-        for j in range(1, npoints+1):
-            tbuf[j] = j*durations[i]/npoints
-        if ew_ele:
-            ew_ele_out = <double *>ew_ele_arr.data + offset
+    ori_fields, ori_schedules = rd.fields, rd.field_schedules
+    rd.fields = [[1.0]*rd.N for _ in range(fields.shape[1])]
+    rd.field_schedules = [(tout[:-1:npoints], fields[:, fi]) for fi in range(fields.shape[1])]
+    try:
+        # One integrator for all segments (reinitialized at the start of each)
+        session = CvodeSession(
+            rd, atol, rtol, method, keep_step, with_jacobian, iter_type, linear_solver, maxl,
+            eps_lin, first_step, dx_min, dx_max, nsteps, autorestart, return_on_error, with_jtimes,
+            constraints, msbj, stab_lim_det)
+        yout, info = session.predefined(y0, tout, ew_ele)
+    finally:
+        rd.fields, rd.field_schedules = ori_fields, ori_schedules
+    nreached = info['nreached']
+    if nreached != tout.size:
+        raise ValueError("Did not reach all points for index %d" % (max(nreached - 1, 0)//npoints))
+    return tout, yout
+
+
+PERIODIC_STATUS = ('converged', 'max_iter')
+
+
+def cvode_periodic_steady_state(
+        PyReactionDiffusion rd, y0, durations, fields, vector[realtype] atol, double rtol,
+        basestring method, double tol=10.0, double eta=1e-2, double sigma=0.0,
+        int krylov_maxl=20, int max_iter=20, int max_halvings=3, bool with_jacobian=True,
+        basestring iter_type='undecided', str linear_solver='default', int maxl=5,
+        double eps_lin=0.05, double first_step=0.0, double dx_min=0.0, double dx_max=0.0,
+        int nsteps=500, int autorestart=0, bool return_on_error=False, bool with_jtimes=False,
+        vector[double] constraints=[], int msbj=0, bool stab_lim_det=False):
+    """
+    Periodic steady state (limit cycle) under a repeated sequence of segments of constant
+    fields, e.g. identical dose pulses.
+
+    Finds ``y`` with ``Phi(y) = y`` where ``Phi`` is the map over one period (the segments
+    integrated in turn, cf. :func:`cvode_predefined_durations_fields`) by Newton's method
+    (shooting). The Newton steps are solved by GMRES using finite differences of ``Phi``
+    along the Krylov vectors (one period integration each), i.e. the monodromy matrix is
+    never formed (see ``chemreac_periodic.hpp``).
+
+    Parameters
+    ----------
+    rd : PyReactionDiffusion
+    y0 : array_like
+        Initial guess (dependent variables of ``rd``), e.g. the state after a few periods.
+    durations : array_like of shape ``(nseg,)``
+    fields : array_like of shape ``(nseg, len(rd.g_values))`` or ``(nseg,)``
+        Field strengths during each segment (the same in all bins), ``rd.fields`` is
+        restored afterwards.
+    atol, rtol, method :
+        Settings of the integrator (also defining the error weights of the iterations).
+    tol : float
+        Converged when the weighted RMS norm (error weights of the integration) of
+        ``Phi(y) - y`` is below ``tol``.
+    eta : float
+        Relative tolerance of the linear solves.
+    sigma : float
+        Finite difference step in weighted units (``0``: ``1/sqrt(rtol)``).
+    krylov_maxl : int
+        Maximum number of GMRES iterations per Newton iteration.
+    max_iter : int
+        Maximum number of Newton iterations.
+    max_halvings : int
+        Step halvings when the residual does not decrease.
+
+    Remaining arguments are solver settings as in :func:`cvode_predefined`.
+
+    Returns
+    -------
+    y : array of shape ``(N, n)`` (state at the start of the period)
+    info : dict with ``status`` (one of :data:`PERIODIC_STATUS`), ``success``, ``niter``,
+        ``nperiods`` (number of period integrations), ``nlinear`` (GMRES iterations),
+        ``residuals`` (weighted RMS norm of ``Phi(y) - y`` for each iterate) and the
+        integration statistics (accumulated over all periods).
 
-        nreached = simple_predefined[ReactionDiffusion[double]](
-            rd.thisptr, atol, rtol, lmm_from_name(method.lower().encode('utf-8')),
-            &yout[offset], npoints+1, &tbuf[0], &yout[offset],
-            root_indices, roots_output, nsteps, first_step, dx_min,
-            dx_max, with_jacobian, iter_type_from_name(iter_type.lower().encode('UTF-8')),
-            linear_solver_from_name(linear_solver.encode('UTF-8')), maxl, eps_lin, nderiv,
-            autorestart, return_on_error, 2 if with_jtimes else 0, ew_ele_out, constraints, msbj, stab_lim_det)
+    """
+    cdef:
+        cnp.ndarray[cnp.float64_t, ndim=1] y = np.array(y0, dtype=np.float64).flatten()
+        cnp.ndarray[cnp.float64_t, ndim=1] durs = np.ascontiguousarray(durations, dtype=np.float64).flatten()
+        cnp.ndarray[cnp.float64_t, ndim=2] flds = np.ascontiguousarray(fields, dtype=np.float64).reshape(
+            (durs.size, -1))
+        CvodeSession session
+        PeriodicShooting[double] * shooting
+        int status
+    if y.size != rd.n*rd.N:
+        raise ValueError("y0 of incorrect size")
+    if flds.shape[1] != len(rd.g_values):
+        raise ValueError("fields of incorrect shape")
+    session = CvodeSession(
+        rd, atol, rtol, method, False, with_jacobian, iter_type, linear_solver, maxl,
+        eps_lin, first_step, dx_min, dx_max, nsteps, autorestart, return_on_error, with_jtimes,
+        constraints, msbj, stab_lim_det)
+    shooting = new PeriodicShooting[double](rd.thisptr, session.thisptr, durs.size, &durs[0],
+                                            &flds[0, 0])
+    try:
+        shooting.tol = tol
+        shooting.eta = eta
+        shooting.sigma = sigma
+        shooting.maxl = krylov_maxl
+        shooting.max_iter = max_iter
+        shooting.max_halvings = max_halvings
+        with nogil:
+            status = shooting.solve(&y[0])
+        info = rd.last_integration_info
+        info.update(rd.last_integration_info_dbl)
+        info.update({
+            'status': PERIODIC_STATUS[status],
+            'success': status == 0,
+            'niter': shooting.niter,
+            'nperiods': shooting.nperiods,
+            'nlinear': shooting.nlinear,
+            'residuals': np.array(shooting.residuals),
+        })
+    finally:
+        del shooting
+    return y.reshape((rd.N, rd.n)), info
+
+
+def cvode_adjoint_gradient(
+        PyReactionDiffusion rd, y0, tout, params, objective, vector[realtype] atol,
+        double rtol, basestring method, atol_adj=None, double rtol_adj=0.0,
+        bool checkpointing=True, CvodeSession session=None, bool with_jacobian=True,
+        basestring iter_type='undecided', str linear_solver='default', int maxl=5,
+        double eps_lin=0.05, double first_step=0.0, double dx_min=0.0, double dx_max=0.0,
+        int nsteps=500, int autorestart=0, bool return_on_error=False, bool with_jtimes=False,
+        vector[double] constraints=[], int msbj=0, bool stab_lim_det=False):
+    """
+    Gradient of an objective defined on the output of an integration with respect to
+    ``params`` (and the initial values) by the adjoint method.
+
+    ``rd`` is integrated from ``y0`` through ``tout``, ``objective`` is evaluated on the
+    output and the adjoint problem (``dlambda/dx = -J^T lambda`` with jumps ``dg_k/dy``
+    at the output times) is integrated backwards using the Jacobian of ``rd``, the
+    parameter derivatives being quadratures over ``lambda^T df/dp``. The cost is about
+    that of two integrations of ``rd`` (the forward solution of each output interval is
+    recomputed from the values at the output times, i.e. checkpoints) and one of the
+    adjoint problem, regardless of the number of parameters. See ``chemreac_adjoint.hpp``.
+
+    Parameters
+    ----------
+    rd : PyReactionDiffusion
+    y0 : array_like
+    tout : array_like
+        Output times (increasing).
+    params : iterable of tuples
+        As in :func:`cvode_predefined_sensitivity`.
+    objective : callable
+        ``objective(yout) -> (G, dGdy)`` with ``yout`` and ``dGdy`` of shape
+        ``(tout.size, N, n)`` (in the variables integrated, i.e. ``log(C)`` with logy).
+    atol, rtol, method :
+        Settings of the forward integration.
+    atol_adj : float or array_like
+        Absolute tolerance of ``lambda`` (default: ``rtol_adj`` times the largest
+        ``abs(dGdy)``), the tolerance of the quadrature of a parameter is this over its
+        magnitude.
+    rtol_adj : float
+        Relative tolerance of the adjoint problem (``0``: ``rtol``).
+    checkpointing : bool
+        When ``False`` the steps of the forward integration are kept in memory instead of
+        being recomputed (one integration less).
+    session : CvodeSession
+        Session of ``rd`` used for the forward integrations (reused between calls, e.g.
+        during optimization), its settings replace those given here.
+
+    Remaining arguments are solver settings as in :func:`cvode_predefined`.
+
+    Returns
+    -------
+    G : float
+    grad : array of shape ``(len(params),)``
+    dGdy0 : array of shape ``(N, n)``
+    yout : array of shape ``(tout.size, N, n)``
+    info : dict with the statistics of the forward integrations (accumulated in
+        ``session`` if given), ``nfev_adj``, ``njev_adj`` and ``adjoint`` (statistics of
+        the backward integrations).
+
+    """
+    cdef:
+        int ny = rd.n*rd.N
+        cnp.ndarray[cnp.float64_t, ndim=1] y = np.ascontiguousarray(y0, dtype=np.float64).flatten()
+        cnp.ndarray[cnp.float64_t, ndim=1] xout = np.ascontiguousarray(tout, dtype=np.float64).flatten()
+        cnp.ndarray[cnp.float64_t, ndim=1] yout = np.empty(xout.size*ny)
+        cnp.ndarray[cnp.float64_t, ndim=1] dgdy, grad, lambda0 = np.empty(ny)
+        size_t nt = xout.size
+        vector[int] kinds, indices
+        vector[double] pbar
+        int nreached
+        AdjointGradient[double] * adj
+    if y.size != ny:
+        raise ValueError("y0 of incorrect size")
+    if np.any(np.diff(xout) < 0):
+        raise ValueError("tout needs to be increasing")
+    if rd.thisptr.events.size():
+        raise ValueError("events are not supported with adjoint sensitivities")
+    for param in params:
+        kind, index, nominal = _sensitivity_param(rd, param)
+        kinds.push_back(kind)
+        indices.push_back(index)
+        pbar.push_back(nominal)
+    grad = np.zeros(kinds.size())
+    if session is None:
+        session = CvodeSession(
+            rd, atol, rtol, method, False, with_jacobian, iter_type, linear_solver, maxl,
+            eps_lin, first_step, dx_min, dx_max, nsteps, autorestart, return_on_error,
+            with_jtimes, constraints, msbj, stab_lim_det)
+    elif session.rd is not rd:
+        raise ValueError("session of another ReactionDiffusion instance")
+    adj = new AdjointGradient[double](rd.thisptr, session.thisptr, kinds, indices)
+    try:
+        adj.checkpointing = checkpointing
+        adj.pbar = pbar
+        adj.rtol = rtol_adj
+        with nogil:
+            nreached = adj.forward(&y[0], nt, &xout[0], &yout[0])
+        if nreached < <int>nt:
+            raise RuntimeError("forward integration did not reach all output times")
+        G, dGdy = objective(yout.reshape((nt, rd.N, rd.n)))
+        G = float(G)
+        dgdy = np.ascontiguousarray(dGdy, dtype=np.float64).flatten()
+        if dgdy.size != nt*ny:
+            raise ValueError("dGdy of incorrect size")
+        if atol_adj is None:
+            atol_adj = (rtol_adj or session.thisptr.settings().rtol)*np.max(np.abs(dgdy))
+        atol_adj = np.asarray(atol_adj, dtype=np.float64).reshape(-1)
+        if atol_adj.size not in (1, ny):
+            raise ValueError("atol_adj of incorrect size")
+        if np.any(atol_adj > 0):  # otherwise: atol of the forward integration
+            adj.atol = atol_adj
+        with nogil:
+            adj.backward(&dgdy[0], &grad[0] if kinds.size() else NULL, &lambda0[0])
+        info = rd.last_integration_info
+        info.update(rd.last_integration_info_dbl)
+        info['nfev_adj'] = adj.nfev_backward
+        info['njev_adj'] = adj.njev_backward
+        info['adjoint'] = {str(k.decode('utf-8')): v for k, v
+                           in dict(adj.backward_info.nfo_int).items()}
+        info['success'] = True
+    finally:
+        del adj
+    return G, grad, lambda0.reshape((rd.N, rd.n)), yout.reshape((nt, rd.N, rd.n)), info
+
+
+def _ensemble_arrays(PyReactionDiffusion rd, y0s, k_sets, fields_sets):
+    # Returns y0s, k_sets & fields_sets (or None) as C-contiguous arrays of shape
+    # (M, N*n), (M, nr) & (M, len(g_values)*N) respectively
+    ny = rd.n*rd.N
+    sets = [s for s in (k_sets, fields_sets) if s is not None]
+    y0s = np.asarray(y0s, dtype=np.float64)
+    if y0s.size == ny:
+        y0s = np.tile(y0s.flatten(), (len(sets[0]) if sets else 1, 1))
+    nmembers = y0s.shape[0]
+    y0s = np.ascontiguousarray(y0s.reshape((nmembers, -1)))
+    if y0s.shape[1] != ny:
+        raise ValueError("y0s of incorrect shape")
+    if any(len(s) != nmembers for s in sets):
+        raise ValueError("Inconsistent number of members")
+    if k_sets is not None:
+        k_sets = np.ascontiguousarray(k_sets, dtype=np.float64).reshape((nmembers, -1))
+        if k_sets.shape[1] != rd.nr:
+            raise ValueError("k_sets of incorrect shape")
+    if fields_sets is not None:
+        fields_sets = np.asarray(fields_sets, dtype=np.float64)
+        if fields_sets.ndim == 2:
+            fields_sets = np.repeat(fields_sets[:, :, np.newaxis], rd.N, axis=2)
+        fields_sets = np.ascontiguousarray(fields_sets).reshape((nmembers, -1))
+        if fields_sets.shape[1] != len(rd.g_values)*rd.N:
+            raise ValueError("fields_sets of incorrect shape")
+    return y0s, k_sets, fields_sets
+
+
+def cvode_predefined_batch(
+        PyReactionDiffusion rd, y0s, cnp.ndarray[cnp.float64_t, ndim=1] tout,
+        vector[realtype] atol, double rtol, basestring method, k_sets=None, fields_sets=None,
+        int nthreads=0, bool with_jacobian=True, basestring iter_type='undecided',
+        str linear_solver="default", int maxl=5, double eps_lin=0.05, double first_step=0.0,
+        double dx_min=0.0, double dx_max=0.0, int nsteps=500, int autorestart=0,
+        bool return_on_error=False, bool with_jtimes=False, vector[double] constraints=[],
+        int msbj=0, bool stab_lim_det=False):
+    """
+    Integrates an ensemble of variants of ``rd`` to the output times ``tout``.
+
+    The members are integrated natively on a pool of threads, each thread working on its
+    own copy of ``rd`` with one CVODE integrator (so work arrays, Jacobian/preconditioner
+    storage and the solver memory are reused between the members it handles, see
+    :class:`CvodeSession`). ``rd`` itself is not modified.
+
+    Parameters
+    ----------
+    rd : PyReactionDiffusion
+    y0s : array_like
+        Initial values (in the transformed variables) of shape ``(M, N*n)`` or
+        ``(M, N, n)``, or of size ``N*n`` (the same for all members).
+    tout : 1-dimensional array
+    k_sets : array_like, optional
+        Rate constants per member, shape ``(M, nr)``.
+    fields_sets : array_like, optional
+        Fields per member, shape ``(M, len(g_values), N)`` or ``(M, len(g_values))``
+        (uniform over the bins).
+    nthreads : int
+        Number of threads (``0``: one per hardware thread).
+
+    Remaining arguments are solver settings as in :func:`cvode_predefined`.
+
+    Returns
+    -------
+    yout : array of shape ``(M, tout.size, N, n)`` (NaN beyond the points reached)
+    infos : list of dicts (one per member)
+
+    """
+    cdef:
+        int ny = rd.n*rd.N
+        int nf = len(rd.g_values)*rd.N
+        int nmembers
+        size_t nt = tout.size
+        cnp.ndarray[cnp.float64_t, ndim=2, mode='c'] y0_arr, k_arr, f_arr, yout
+        double * k_ptr = NULL
+        double * f_ptr = NULL
+        SolverSettings settings
+        vector[BatchResult] results
+    y0_arr, k_arr, f_arr = _ensemble_arrays(rd, y0s, k_sets, fields_sets)
+    nmembers = y0_arr.shape[0]
+    if k_arr is not None and nmembers > 0:
+        k_ptr = &k_arr[0, 0]
+    if f_arr is not None and nmembers > 0 and nf > 0:
+        f_ptr = &f_arr[0, 0]
+    assert atol.size() in (1, ny)
+    settings = _solver_settings(
+        atol, rtol, method, with_jacobian, iter_type, linear_solver, maxl, eps_lin, first_step,
+        dx_min, dx_max, nsteps, autorestart, return_on_error, with_jtimes, constraints, msbj,
+        stab_lim_det)
+    yout = np.full((nmembers, nt*ny), np.nan)
+    if nmembers == 0:
+        return yout.reshape((0, nt, rd.N, rd.n)), []
+    with nogil:
+        results = _cvode_predefined_batch[double](
+            deref(rd.thisptr), nmembers, &y0_arr[0, 0], nt, &tout[0], &yout[0, 0], k_ptr, f_ptr,
+            settings, nthreads)
+    infos = []
+    for mi in range(nmembers):
+        error = results[mi].error.decode('utf-8')
+        if error and not return_on_error:
+            raise RuntimeError("Integration of member %d failed: %s" % (mi, error))
+        info = {str(k.decode('utf-8')): v for k, v in dict(results[mi].info.nfo_int).items()}
+        info.update({str(k.decode('utf-8')): v for k, v in dict(results[mi].info.nfo_dbl).items()})
+        info['nreached'] = results[mi].nreached
+        info['success'] = not error and results[mi].nreached == <int>nt
+        if error:
+            info['error'] = error
+        infos.append(info)
+    return yout.reshape((nmembers, nt, rd.N, rd.n)), infos
+
+
+cdef class ExperimentSet:
+    """
+    Experiments (initial values, fields and output times) on one model whose rate
+    constants and/or g-values are to be estimated.
+
+    Every experiment integrates its own copy of ``rd`` with a solver kept between calls to
+    :meth:`evaluate` (see :class:`CvodeSession`), the experiments are integrated on a pool
+    of threads. Later changes to ``rd`` do not affect the experiments.
+
+    Parameters
+    ----------
+    rd : PyReactionDiffusion
+    params : iterable of tuples
+        ``('k', ri)`` or ``('g_values', (fi, si))`` (see
+        :func:`cvode_predefined_sensitivity`).
+    atol : float or array_like
+    rtol : float
+    method : str
+    nthreads : int
+        Number of threads (``0``: one per hardware thread).
+
+    Remaining arguments are solver settings as in :func:`cvode_predefined` (the
+    sensitivities are always solved with GMRES, see :func:`cvode_predefined_sensitivity`).
+
+    Examples
+    --------
+    >>> es = ExperimentSet(rd, [('k', 0), ('k', 1)], [1e-10], 1e-8, 'bdf')  # doctest: +SKIP
+    >>> es.add(y0, tout, fields=[0.5])  # doctest: +SKIP
+    >>> youts, souts, infos = es.evaluate([2.0, 0.3], sensitivities=True)  # doctest: +SKIP
+
+    """
+    cdef _ExperimentSet[double] * thisptr
+    cdef readonly PyReactionDiffusion rd
+    cdef readonly list params
+
+    def __cinit__(self, PyReactionDiffusion rd, params, vector[realtype] atol, double rtol,
+                  basestring method, int nthreads=0, bool with_jacobian=True,
+                  basestring iter_type='undecided', str linear_solver="default", int maxl=5,
+                  double eps_lin=0.05, double first_step=0.0, double dx_min=0.0,
+                  double dx_max=0.0, int nsteps=500, int autorestart=0,
+                  bool return_on_error=False, bool with_jtimes=False,
+                  vector[double] constraints=[], int msbj=0, bool stab_lim_det=False):
+        cdef:
+            vector[int] kinds, indices
+            SolverSettings settings
+        self.params = list(params)
+        for param in self.params:
+            kind, index, _ = _sensitivity_param(rd, param)
+            if SENSITIVITY_PARAMS[kind] not in ('k', 'g_values'):
+                raise ValueError("Only rate constants & g_values can be estimated")
+            kinds.push_back(kind)
+            indices.push_back(index)
+        if rd.thisptr.events.size():
+            raise ValueError("events are not supported in parameter estimation")
+        settings = _solver_settings(
+            atol, rtol, method, with_jacobian, iter_type, linear_solver, maxl, eps_lin,
+            first_step, dx_min, dx_max, nsteps, autorestart, return_on_error, with_jtimes,
+            constraints, msbj, stab_lim_det)
+        self.rd = rd
+        self.thisptr = new _ExperimentSet[double](deref(rd.thisptr), settings, kinds, indices,
+                                                  nthreads)
+
+    def __dealloc__(self):
+        del self.thisptr
+
+    def __len__(self):
+        return self.thisptr.size()
+
+    property nthreads:
+        def __get__(self):
+            return self.thisptr.nthreads
+        def __set__(self, int nthreads):
+            self.thisptr.nthreads = nthreads
+
+    def add(self, y0, tout, fields=None):
+        """
+        Adds an experiment.
+
+        Parameters
+        ----------
+        y0 : array_like
+            Initial values (in the transformed variables) of size ``N*n``.
+        tout : array_like
+            Output times (increasing, at least two).
+        fields : array_like, optional
+            Shape ``(len(g_values), N)`` or ``(len(g_values),)`` (uniform over the bins),
+            default: ``rd.fields``.
+
+        Returns
+        -------
+        Index of the experiment.
+
+        """
+        cdef:
+            cnp.ndarray[cnp.float64_t, ndim=1] y = np.ascontiguousarray(y0, dtype=np.float64).flatten()
+            cnp.ndarray[cnp.float64_t, ndim=1] xout = np.ascontiguousarray(tout, dtype=np.float64).flatten()
+            cnp.ndarray[cnp.float64_t, ndim=1] flds
+            double * f_ptr = NULL
+            int ng = len(self.rd.g_values)
+        if y.size != self.rd.n*self.rd.N:
+            raise ValueError("y0 of incorrect size")
+        if np.any(np.diff(xout) < 0):
+            raise ValueError("tout needs to be increasing")
+        if fields is not None and ng > 0:
+            flds = np.ascontiguousarray(np.broadcast_to(
+                np.asarray(fields, dtype=np.float64).reshape((ng, -1)), (ng, self.rd.N))).flatten()
+            f_ptr = &flds[0]
+        return self.thisptr.add(&y[0], xout.size, &xout[0], f_ptr)
+
+    def evaluate(self, p, bool sensitivities=False):
+        """
+        Integrates all experiments with the parameter values ``p``.
+
+        Parameters
+        ----------
+        p : array_like
+            Values of ``params``.
+        sensitivities : bool
+            Also integrate the forward sensitivities (see
+            :func:`cvode_predefined_sensitivity`).
+
+        Returns
+        -------
+        youts : list of arrays of shape ``(nt, N, n)``
+        souts : list of arrays of shape ``(nt, N, n, len(params))`` or None
+        infos : list of dicts
+
+        Raises
+        ------
+        RuntimeError when the integration of an experiment fails.
+
+        """
+        cdef:
+            cnp.ndarray[cnp.float64_t, ndim=1] pv = np.ascontiguousarray(p, dtype=np.float64).flatten()
+            cnp.ndarray[cnp.float64_t, ndim=1] arr
+            size_t ei, nexp = self.thisptr.size()
+            int ny = self.rd.n*self.rd.N
+            int npar = self.thisptr.nparams()
+            vector[double *] yptrs, sptrs
+            int nfailed
+        if pv.size != npar:
+            raise ValueError("p of incorrect size")
+        youts, souts = [], []
+        for ei in range(nexp):
+            arr = np.empty(self.thisptr.get_nt(ei)*ny)
+            youts.append(arr)
+            yptrs.push_back(&arr[0])
+            if sensitivities:
+                arr = np.empty(self.thisptr.get_nt(ei)*ny*npar or 1)
+                souts.append(arr)
+                sptrs.push_back(&arr[0])
+        if nexp == 0:
+            return [], ([] if sensitivities else None), []
+        with nogil:
+            nfailed = self.thisptr.evaluate(&pv[0] if npar else NULL, yptrs.data(),
+                                            sptrs.data() if sensitivities else NULL)
+        infos = []
+        for ei in range(nexp):
+            error = self.thisptr.results[ei].error.decode('utf-8')
+            if error:
+                raise RuntimeError("Integration of experiment %d failed: %s" % (ei, error))
+            info = {str(k.decode('utf-8')): v for k, v
+                    in dict(self.thisptr.results[ei].info.nfo_int).items()}
+            info.update({str(k.decode('utf-8')): v for k, v
+                         in dict(self.thisptr.results[ei].info.nfo_dbl).items()})
+            info['nreached'] = self.thisptr.results[ei].nreached
+            infos.append(info)
+        shapes = [(self.thisptr.get_nt(ei), self.rd.N, self.rd.n) for ei in range(nexp)]
+        youts = [y.reshape(shape) for y, shape in zip(youts, shapes)]
+        if sensitivities:
+            souts = [s[:shape[0]*ny*npar].reshape(shape + (npar,)) for s, shape in zip(souts, shapes)]
+        else:
+            souts = None
+        return youts, souts, infos
 
-        if nreached != npoints+1:
-            raise ValueError("Did not reach all points for index %d" % i)
-    return tout, yout.reshape((tout.size, rd.N, rd.n))
+
+def lockstep_predefined(
+        PyReactionDiffusion rd, y0s, cnp.ndarray[cnp.float64_t, ndim=1] tout,
+        vector[realtype] atol, double rtol, k_sets=None, fields_sets=None, double first_step=0.0,
+        double dx_max=0.0, long nsteps=500):
+    """
+    Integrates an ensemble of homogeneous (``N == 1``) kinetics problems in lockstep.
+
+    All members share the reaction network of ``rd`` and are advanced together by a
+    Rosenbrock method (RODAS3) with one step size per member, the rate expressions,
+    Jacobians and LU factorizations are evaluated for all members at once. Intended for
+    large ensembles of small systems where the per-integration overhead of
+    :func:`cvode_predefined` dominates. Only linear concentrations are supported
+    (``rd.logy == rd.logt == False``).
+
+    Parameters
+    ----------
+    rd : PyReactionDiffusion
+    y0s : array_like
+        Initial concentrations, shape ``(M, n)`` (or size ``n``: the same for all members).
+    tout : 1-dimensional array
+    atol : float or array_like of length n
+    rtol : float
+    k_sets : array_like, optional
+        Rate constants per member, shape ``(M, nr)``.
+    fields_sets : array_like, optional
+        Fields per member, shape ``(M, len(g_values))``.
+    first_step : float
+        ``0``: estimated per member.
+    dx_max : float
+        Maximum step size (``0``: unlimited).
+    nsteps : int
+        Maximum number of step attempts per output interval.
+
+    Returns
+    -------
+    Cout : array of shape ``(M, tout.size, 1, n)`` (NaN beyond the points reached)
+    info : dict (per member arrays: ``nsteps``, ``nrejected``, ``nreached`` & ``success``)
+
+    """
+    cdef:
+        int nmembers
+        size_t nt = tout.size
+        cnp.ndarray[cnp.float64_t, ndim=2, mode='c'] y0_arr, k_arr, f_arr, yout
+        LockstepKinetics[double] * batch
+        vector[int] nreached
+    if rd.N != 1:
+        raise ValueError("lockstep_predefined requires N == 1")
+    y0_arr, k_arr, f_arr = _ensemble_arrays(rd, y0s, k_sets, fields_sets)
+    nmembers = y0_arr.shape[0]
+    if atol.size() not in (1, rd.n):
+        raise ValueError("atol of incorrect length")
+    yout = np.full((nmembers, nt*rd.n), np.nan)
+    if nmembers == 0:
+        return yout.reshape((0, nt, 1, rd.n)), {}
+    batch = new LockstepKinetics[double](deref(rd.thisptr), nmembers)
+    try:
+        if k_arr is not None:
+            batch.set_k(&k_arr[0, 0])
+        if f_arr is not None and f_arr.shape[1] > 0:
+            batch.set_fields(&f_arr[0, 0])
+        with nogil:
+            nreached = batch.predefined(&y0_arr[0, 0], nt, &tout[0], &yout[0, 0], atol, rtol,
+                                        first_step, dx_max, nsteps)
+        info = {
+            'nfev': batch.nfev,
+            'njev': batch.njev,
+            'nsweeps': batch.nsweeps,
+            'nsteps': np.array(batch.nsteps),
+            'nrejected': np.array(batch.nrejected),
+            'nreached': np.array(nreached),
+        }
+    finally:
+        del batch
+    info['success'] = info['nreached'] == nt
+    return yout.reshape((nmembers, nt, 1, rd.n)), info
 
 
 def cvode_adaptive(
@@ -631,10 +2168,27 @@ def cvode_adaptive(
         cnp.npy_intp xyout_dims[2]
         cnp.npy_intp ew_ele_dims[4]
         int ny = rd.n*rd.N
+        LMM lmm = lmm_from_name(method.lower().encode('utf-8'))
+        IterType itype = iter_type_from_name(iter_type.lower().encode('UTF-8'))
+        LinSol linsol = linear_solver_from_name(linear_solver.encode('UTF-8'))
     if y0.size != ny:
         raise ValueError("y0 of incorrect size")
 
     assert atol.size() in (1, rd.n*rd.N)
+    if rd.thisptr.events.size():
+        # every step (and event) is emitted by the session, terminal events end the integration
+        free(xyout)
+        if ew_ele:
+            raise ValueError("ew_ele is not supported with events")
+        session = CvodeSession(
+            rd, atol, rtol, method, False, with_jacobian, iter_type, linear_solver, maxl,
+            eps_lin, first_step, dx_min, dx_max, nsteps, autorestart, return_on_error,
+            with_jtimes, constraints, msbj, stab_lim_det)
+        chunks = []
+        info = session.stream(y0, np.array([t0, tend]), lambda t, y: chunks.append((t.copy(), y.copy())),
+                              adaptive=True)
+        info['success'] = info['success'] or not return_on_error
+        return (np.concatenate([t for t, _ in chunks]), np.concatenate([y for _, y in chunks]), info)
     xyout[0] = t0
     for i in range(y0.size):
         xyout[i+1] = y0[i]
@@ -643,13 +2197,12 @@ def cvode_adaptive(
         for i in range(ny):
             ew_ele_out[i] = 0.0
 
-    nout = simple_adaptive[ReactionDiffusion[double]](
-        &xyout, &td, rd.thisptr, atol, rtol, lmm_from_name(method.lower().encode('utf-8')),
-        tend, root_indices, nsteps, first_step, dx_min,
-        dx_max, with_jacobian, iter_type_from_name(iter_type.lower().encode('UTF-8')),
-        linear_solver_from_name(linear_solver.encode('UTF-8')), maxl, eps_lin, nderiv,
-        return_on_root, autorestart, return_on_error,
-        2 if with_jtimes else 0, 0, &ew_ele_out if ew_ele else NULL, constraints, msbj, stab_lim_det)
+    with nogil:
+        nout = simple_adaptive[ReactionDiffusion[double]](
+            &xyout, &td, rd.thisptr, atol, rtol, lmm, tend, root_indices, nsteps, first_step, dx_min,
+            dx_max, with_jacobian, itype, linsol, maxl, eps_lin, nderiv, return_on_root, autorestart,
+            return_on_error, 2 if with_jtimes else 0, 0, &ew_ele_out if ew_ele else NULL,
+            constraints, msbj, stab_lim_det)
     xyout_dims[0] = nout + 1
     xyout_dims[1] = y0.size*(nderiv+1) + 1
     xyout_arr = cnp.PyArray_SimpleNewFromData(2, xyout_dims, cnp.NPY_DOUBLE, <void *>xyout)
@@ -729,6 +2282,187 @@ cdef void _rk4(ReactionDiffusion[double] * rd,
                     1.0, h/6, h/3, h/3, h/6, &y0out[i, 0])
 
 
+STEADY_STATE_STATUS = ('converged', 'stalled', 'max_iter')
+
+
+def steady_state_newton(
+        PyReactionDiffusion rd, y0, double x=0.0, double ftol_rel=1e-10, double ftol_abs=0.0,
+        double dtau0=0.0, double dtau_growth=2.0, double dtau_max=1e10, double dtau_min=0.0,
+        double max_growth=10.0, double atol=1e-12, long max_iter=200):
+    """
+    Steady state by damped Newton iterations with pseudo-transient continuation.
+
+    Solves ``rhs(x, y) = 0`` by the steps ``(I/dtau - J) dy = f`` where the pseudo time step
+    ``dtau`` grows as the residual decreases (the linear systems are solved as in the
+    preconditioner of the iterative linear solvers, see ``chemreac_steady.hpp``).
+
+    Parameters
+    ----------
+    rd : PyReactionDiffusion
+    y0 : array_like
+        Initial guess (in the dependent variables of ``rd``, i.e. logarithmic with logy).
+    x : float
+        Value of the independent variable at which rhs is evaluated (logarithmic with logt).
+    ftol_rel, ftol_abs : float
+        Converged when ``norm(f) <= ftol_rel*norm(f0) + ftol_abs`` (2-norm).
+    dtau0 : float
+        Initial pseudo time step (``0``: relative change of about 1%).
+    dtau_growth : float
+        Minimum growth factor of ``dtau`` per iteration.
+    dtau_max, dtau_min : float
+        Bounds of ``dtau``, stalled when a step is rejected at ``dtau < dtau_min``
+        (``0``: ``1e-12*dtau0``).
+    max_growth : float
+        Steps increasing the residual by more than this factor are rejected.
+    atol : float
+        Negative concentrations tolerated (linear ``y``).
+    max_iter : int
+
+    Returns
+    -------
+    y : array of shape ``(N, n)`` (last accepted iterate)
+    info : dict with ``status`` (one of :data:`STEADY_STATE_STATUS`), ``success``,
+        ``niter``, ``nrejected``, ``nfev``, ``njev``, ``residuals`` (``norm(f)`` of the
+        initial guess and after each iteration) and ``dtaus``.
+
+    """
+    cdef:
+        cnp.ndarray[cnp.float64_t, ndim=1] y = np.array(y0, dtype=np.float64).flatten()
+        SteadyStateSolver[double] * solver
+        int status
+    if y.size != rd.n*rd.N:
+        raise ValueError("y0 of incorrect size")
+    solver = new SteadyStateSolver[double](rd.thisptr)
+    try:
+        solver.ftol_rel = ftol_rel
+        solver.ftol_abs = ftol_abs
+        solver.dtau0 = dtau0
+        solver.dtau_growth = dtau_growth
+        solver.dtau_max = dtau_max
+        solver.dtau_min = dtau_min
+        solver.max_growth = max_growth
+        solver.atol = atol
+        solver.max_iter = max_iter
+        with nogil:
+            status = solver.solve(x, &y[0])
+        info = {
+            'status': STEADY_STATE_STATUS[status],
+            'success': status == 0,
+            'niter': solver.niter,
+            'nrejected': solver.nrejected,
+            'nfev': solver.nfev,
+            'njev': solver.njev,
+            'residuals': np.array(solver.residuals),
+            'dtaus': np.array(solver.dtaus),
+        }
+    finally:
+        del solver
+    return y.reshape((rd.N, rd.n)), info
+
+
+CONTINUATION_STATUS = ('reached_end', 'stalled', 'max_points', 'left_range', 'no_start')
+CONTINUATION_PARAMS = ('k', 'fields')
+
+
+def steady_state_continuation(
+        PyReactionDiffusion rd, y0, param, double p0, double p_end, double x=0.0,
+        bool arclength=True, double ds0=1e-2, double ds_min=1e-8, double ds_max=0.1,
+        double xtol=1e-9, int nopt=4, int max_corr_iter=10, long max_points=1000,
+        double gamma=1e10, newton_kwargs=None):
+    """
+    Branch of steady states as a parameter is varied from ``p0`` to ``p_end``.
+
+    Each point is warm-started from the previous one along the tangent of the branch and
+    corrected by Newton iterations, either at fixed parameter value (natural parameter
+    continuation) or with a pseudo-arclength condition which follows the branch around
+    turning points (see ``SteadyStateContinuation`` in ``chemreac_steady.hpp``). The step
+    length adapts to the number of corrector iterations.
+
+    Parameters
+    ----------
+    rd : PyReactionDiffusion
+    y0 : array_like
+        Guess for the steady state at ``p0`` (dependent variables of ``rd``), converged by
+        :func:`steady_state_newton` first.
+    param : tuple
+        ``('k', ri)`` (rate constant of reaction ``ri``) or ``('fields', fi)`` (field
+        ``fi``, the same value in all bins). Restored after the continuation.
+    p0, p_end : float
+    x : float
+        Independent variable at which rhs is evaluated (see :func:`steady_state_newton`).
+    arclength : bool
+        Pseudo-arclength (``False``: natural parameter) continuation.
+    ds0, ds_min, ds_max : float
+        Step length (initial, smallest & largest), in units scaled by ``abs(p_end - p0)``
+        and the largest concentration on the branch (logy: relative changes).
+    xtol : float
+        Corrector converged when the (scaled, RMS) Newton step is smaller.
+    nopt : int
+        Number of corrector iterations aimed at by the step length adaptation.
+    max_corr_iter : int
+    max_points : int
+    gamma : float
+        Regularization of the linear solves, ``(I/gamma - J) z = r``.
+    newton_kwargs : dict
+        Settings of the iterations converging ``y0`` (see :func:`steady_state_newton`).
+
+    Returns
+    -------
+    params : array of shape ``(npoints,)``
+    yout : array of shape ``(npoints, N, n)``
+    info : dict with ``status`` (one of :data:`CONTINUATION_STATUS`), ``success`` (reached
+        ``p_end``), ``niters`` (corrector iterations per point), ``folds`` (indices ``i``
+        where the parameter turns between points ``i - 1`` and ``i``), ``nrejected``,
+        ``nfev`` & ``njev``.
+
+    """
+    cdef:
+        cnp.ndarray[cnp.float64_t, ndim=1] y = np.array(y0, dtype=np.float64).flatten()
+        SteadyStateContinuation[double] * cont
+        int status
+    kind, index = param
+    if kind not in CONTINUATION_PARAMS:
+        raise ValueError("Unknown parameter kind: %s" % kind)
+    if y.size != rd.n*rd.N:
+        raise ValueError("y0 of incorrect size")
+    cont = new SteadyStateContinuation[double](rd.thisptr, CONTINUATION_PARAMS.index(kind), index)
+    try:
+        for k, v in (newton_kwargs or {}).items():
+            if k == 'ftol_rel':
+                cont.solver.ftol_rel = v
+            elif k == 'ftol_abs':
+                cont.solver.ftol_abs = v
+            elif k == 'max_iter':
+                cont.solver.max_iter = v
+            else:
+                raise KeyError("Unsupported key in newton_kwargs: %s" % k)
+        cont.arclength = arclength
+        cont.ds0 = ds0
+        cont.ds_min = ds_min
+        cont.ds_max = ds_max
+        cont.xtol = xtol
+        cont.nopt = nopt
+        cont.max_corr_iter = max_corr_iter
+        cont.max_points = max_points
+        cont.gamma = gamma
+        with nogil:
+            status = cont.run(x, &y[0], p0, p_end)
+        params = np.array(cont.params)
+        yout = np.array(cont.ys).reshape((params.size, rd.N, rd.n))
+        info = {
+            'status': CONTINUATION_STATUS[status],
+            'success': status == 0,
+            'niters': np.array(cont.niters),
+            'folds': np.array(cont.folds, dtype=int),
+            'nrejected': cont.nrejected,
+            'nfev': cont.nfev,
+            'njev': cont.njev,
+        }
+    finally:
+        del cont
+    return params, yout, info
+
+
 def rk4(PyReactionDiffusion rd, y0, tout):
     """
     simple explicit, fixed step size, Runge Kutta 4th order integrator.
@@ -87,7 +87,6 @@ class ODESys(_ODESys):
             _dedim(drate*density),
             atol=atol, rtol=rtol, method=method, npoints=npoints, **integrate_kwargs)
         info = dict(
-            nsteps=-1,
             nfev=self.rd.nfev,
             njev=self.rd.njev,
             time_wall=time.time() - time_wall,
@@ -98,5 +97,6 @@ class ODESys(_ODESys):
             linear_solver=0,  # pyodesys.results.Result work-around for now (not important)
         )
         info.update(self.rd.last_integration_info)
+        info['nsteps'] = info.get('n_steps', -1)
         dr_out = np.concatenate((np.repeat(drate, npoints), drate[-1:]))
         return Result(tout*time_u, yout[:, 0, :]*conc_u, dr_out.reshape((-1, 1))*dr_u, info, self)
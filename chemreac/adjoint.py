@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+chemreac.adjoint
+================
+
+This module provides :py:func:`least_squares` which evaluates a weighted least
+squares mismatch between the concentrations of a
+:py:class:`~chemreac.core.ReactionDiffusion` object integrated in time and
+measured data, together with its gradient with respect to any number of
+parameters (rate constants, diffusion coefficients, g-values and initial
+concentrations) by the adjoint method (see
+:py:func:`chemreac._chemreac.cvode_adjoint_gradient`), i.e. at a cost which does
+not grow with the number of parameters (cf. the forward sensitivities of
+:class:`chemreac.integrate.Integration`).
+
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import time
+
+import numpy as np
+
+from .integrate import DEFAULTS, _dedim, _integration_variables
+
+
+def least_squares(rd, C0, tout, data, params=(), weights=None, C0_is_log=False,
+                  tiny=None, **kwargs):
+    """
+    Objective ``G = sum(weights*(C - data)**2)/2`` over the output times ``tout`` and
+    its gradient with respect to ``params`` and ``C0``.
+
+    Parameters
+    ----------
+    rd : ReactionDiffusion
+    C0 : array_like
+        Initial concentrations (linear).
+    tout : array_like
+        Times (increasing) of the data, ``tout[0]`` is the initial time.
+    data : array_like of shape ``(tout.size, rd.N, rd.n)``
+        Measured concentrations, ``nan`` for missing values.
+    params : iterable of tuples
+        ``('k', ri)``, ``('D', si)``, ``('g_values', (fi, si))`` or ``('y0', (bi, si))``
+        (see :func:`chemreac._chemreac.cvode_predefined_sensitivity`), derivatives with
+        respect to initial values are with respect to the linear concentrations.
+    weights : array_like
+        Broadcastable to the shape of ``data`` (default: 1), e.g. zero for species not
+        measured or including quadrature weights of the times.
+    C0_is_log, tiny :
+        See :class:`chemreac.integrate.Integration`.
+    \\*\\*kwargs :
+        Settings passed to :func:`chemreac._chemreac.cvode_adjoint_gradient` (e.g.
+        ``atol``, ``rtol``, ``method``, ``checkpointing``, ``session``).
+
+    Returns
+    -------
+    G : float
+    grad : array of shape ``(len(params),)``
+    dGdC0 : array of shape ``(rd.N, rd.n)``
+    info : dict
+        See :func:`chemreac._chemreac.cvode_adjoint_gradient`, with ``Cout``,
+        ``residuals`` (``C - data``, zero where missing), ``time_wall`` & ``time_cpu``.
+
+    Examples
+    --------
+    >>> G, grad, dGdC0, info = least_squares(rd, C0, tout, data,
+    ...                                      [('k', ri) for ri in range(rd.nr)])  # doctest: +SKIP
+
+    """
+    from ._chemreac import cvode_adjoint_gradient
+    y0, tout, x = _integration_variables(rd, C0, tout, C0_is_log, tiny)
+    if rd.unit_registry is not None:
+        data = _dedim(data, 'concentration', rd.unit_registry)
+    data = np.asarray(data, dtype=np.float64).reshape((tout.size, rd.N, rd.n))
+    weights = np.broadcast_to(1.0 if weights is None else np.asarray(weights, dtype=np.float64),
+                              data.shape)
+    missing = np.isnan(data)
+    weights = np.where(missing, 0, weights)
+    data = np.where(missing, 0, data)
+    ln_b = np.log(2) if rd.use_log2 else 1
+    params = list(params)
+    kwargs['atol'] = np.asarray(kwargs.pop('atol', DEFAULTS['atol'])).reshape(-1)
+    kwargs['rtol'] = kwargs.pop('rtol', DEFAULTS['rtol'])
+    kwargs['method'] = kwargs.pop('method', 'bdf')
+    residuals = []
+
+    def objective(yout):
+        C = rd.expb(yout) if rd.logy else yout
+        res = np.where(missing, 0, C - data)
+        residuals.append(res)
+        dGdC = weights*res
+        return np.sum(dGdC*res)/2, dGdC*C*ln_b if rd.logy else dGdC
+
+    time_wall = time.time()
+    time_cpu = time.process_time()
+    G, grad, dGdy0, yout, info = cvode_adjoint_gradient(rd, y0, x, params, objective, **kwargs)
+    info['time_wall'] = time.time() - time_wall
+    info['time_cpu'] = time.process_time() - time_cpu
+    info['Cout'] = rd.expb(yout) if rd.logy else yout
+    info['residuals'] = residuals[0]
+    if rd.logy:  # dy0/dC0 = 1/(C0*ln(b))
+        dCdy0 = (rd.expb(y0)*ln_b).reshape((rd.N, rd.n))
+        dGdC0 = dGdy0/dCdy0
+        for j, (kind, index) in enumerate(params):
+            if kind == 'y0':
+                i = index if np.ndim(index) == 0 else index[0]*rd.n + index[1]
+                grad[j] /= dCdy0.flat[i]
+    else:
+        dGdC0 = dGdy0
+    return G, grad, dGdC0, info
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+chemreac.codegen
+================
+
+Per-network code generation of the reaction kernels. The generic kernels in
+``chemreac.cpp`` loop over ``stoich_active`` and the net stoichiometry of
+every reaction. For a network which is fixed, a kernel unrolled for that
+network (products of reactants and integer powers written out, only the
+nonzero Jacobian entries evaluated) may be rendered using Mako, compiled
+by the local C++ compiler and installed in a
+:py:class:`~chemreac.core.ReactionDiffusion` instance.
+
+Compiled kernels are cached on disk (see :py:func:`get_cache_dir`), keyed
+by a hash of the stoichiometry, the compiler and its flags.
+
+Examples
+--------
+>>> from chemreac.codegen import CompiledReactionDiffusion
+>>> rd = CompiledReactionDiffusion(2, [[0, 0]], [[1]], [3.0])  # doctest: +SKIP
+
+"""
+from __future__ import (absolute_import, division, print_function)
+
+from collections import OrderedDict
+import ctypes
+import functools
+import hashlib
+import inspect
+import json
+import os
+import subprocess
+import sysconfig
+import tempfile
+
+from .core import ReactionDiffusion
+
+_KERNEL_VERSION = 1  # bump when the template (or its ABI) changes
+
+_template = r"""// Reaction kernel generated by chemreac.codegen, do not edit.
+// hash: ${key}
+extern "C" const int chemreac_kernel_version = ${version};
+extern "C" const int chemreac_kernel_n = ${n};
+extern "C" const int chemreac_kernel_nr = ${nr};
+extern "C" const int chemreac_kernel_nnz = ${len(jac)};
+extern "C" const int chemreac_kernel_rows[${max(len(jac), 1)}] = {${', '.join(str(si) for si, _, _ in jac) or '-1'}};
+extern "C" const int chemreac_kernel_cols[${max(len(jac), 1)}] = {${', '.join(str(dsi) for _, dsi, _ in jac) or '-1'}};
+
+extern "C" void chemreac_rxn_rhs(const double * const k, const double * const C, double * const f){
+    (void)k; (void)C; (void)f;
+%for ri, expr in rates:
+    const double r${ri} = ${expr};
+%endfor
+%for si, expr in rhs:
+    f[${si}] += ${expr};
+%endfor
+}
+
+extern "C" void chemreac_rxn_jac(const double * const k, const double * const C, double * const vals){
+    (void)k; (void)C; (void)vals;
+%for i, (si, dsi, expr) in enumerate(jac):
+    vals[${i}] = ${expr};  // df[${si}]/dC[${dsi}]
+%endfor
+}
+"""
+
+
+def _power(si, order):
+    return '*'.join(['C[%d]' % si]*order)
+
+
+def _signed_sum(terms):
+    """ Formats [(coeff, expr), ...] as a sum """
+    out = ''
+    for coeff, expr in terms:
+        sign = '-' if coeff < 0 else '+'
+        factor = '' if abs(coeff) == 1 else '%d*' % abs(coeff)
+        if out:
+            out += ' %s %s%s' % (sign, factor, expr)
+        else:
+            out = ('-' if coeff < 0 else '') + factor + expr
+    return out
+
+
+def _normalized_stoich(n, stoich_active, stoich_prod, stoich_inact):
+    if len(stoich_active) != len(stoich_prod) or len(stoich_active) != len(stoich_inact):
+        raise ValueError("length mismatch")
+    for stoich in (stoich_active, stoich_prod, stoich_inact):
+        for indices in stoich:
+            if any(si < 0 or si >= n for si in indices):
+                raise ValueError("Species index out of bounds")
+    return tuple([[sorted(map(int, indices)) for indices in stoich]
+                  for stoich in (stoich_active, stoich_prod, stoich_inact)])
+
+
+def render_kernel(n, stoich_active, stoich_prod, stoich_inact=None, key=''):
+    """ Renders C++ source code of reaction kernels for a network
+
+    Parameters
+    ----------
+    n : int
+        Number of species.
+    stoich_active : list of lists of integer indices
+    stoich_prod : list of lists of integer indices
+    stoich_inact : list of lists of integer indices (optional)
+    key : str
+        Identifier put in a comment of the generated source.
+
+    Returns
+    -------
+    str : source code
+    list of (row, col) pairs : sparsity pattern of the reaction Jacobian
+
+    """
+    from mako.template import Template
+    if stoich_inact is None:
+        stoich_inact = [[] for _ in stoich_active]
+    actv, prod, inact = _normalized_stoich(n, stoich_active, stoich_prod, stoich_inact)
+    rates = []
+    rhs_terms = OrderedDict((si, []) for si in range(n))
+    jac_terms = {}
+    for ri in range(len(actv)):
+        coeffs = OrderedDict()
+        for si in sorted(set(actv[ri] + prod[ri] + inact[ri])):
+            coeff = prod[ri].count(si) - actv[ri].count(si) - inact[ri].count(si)
+            if coeff != 0:
+                coeffs[si] = coeff
+        if not coeffs:
+            continue  # reaction does not alter any concentration
+        orders = OrderedDict((si, actv[ri].count(si)) for si in sorted(set(actv[ri])))
+        rates.append((ri, '*'.join(['k[%d]' % ri] + [_power(si, o) for si, o in orders.items()])))
+        for si, coeff in coeffs.items():
+            rhs_terms[si].append((coeff, 'r%d' % ri))
+        for dsi, order in orders.items():
+            factors = ['k[%d]' % ri] + ([] if order == 1 else ['%d' % order])
+            if order > 1:
+                factors.append(_power(dsi, order - 1))
+            factors += [_power(si, o) for si, o in orders.items() if si != dsi]
+            for si, coeff in coeffs.items():
+                jac_terms.setdefault((si, dsi), []).append((coeff, '*'.join(factors)))
+    rhs = [(si, _signed_sum(terms)) for si, terms in rhs_terms.items() if terms]
+    jac = [(si, dsi, _signed_sum(jac_terms[si, dsi])) for si, dsi in sorted(jac_terms)]
+    src = Template(_template).render(key=key, version=_KERNEL_VERSION, n=n, nr=len(actv),
+                                     rates=rates, rhs=rhs, jac=jac)
+    return src, [(si, dsi) for si, dsi, _ in jac]
+
+
+def get_cache_dir(cache_dir=None):
+    """ Directory holding compiled kernels
+
+    Defaults to ``$CHEMREAC_CACHE_DIR`` or ``$XDG_CACHE_HOME/chemreac``
+    (``~/.cache/chemreac``).
+    """
+    if cache_dir is None:
+        cache_dir = os.environ.get('CHEMREAC_CACHE_DIR', None)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(
+            os.path.expanduser('~'), '.cache')), 'chemreac')
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    return cache_dir
+
+
+def _compiler_and_flags(compiler=None, flags=None):
+    if compiler is None:
+        compiler = os.environ.get('CXX', 'c++')
+    if flags is None:
+        flags = os.environ.get('CHEMREAC_CODEGEN_FLAGS', '-O2').split()
+    return compiler, list(flags) + ['-std=c++11', '-fPIC', '-shared']
+
+
+def kernel_key(n, stoich_active, stoich_prod, stoich_inact=None, compiler=None, flags=None):
+    """ Hash identifying a compiled kernel (stoichiometry, compiler & flags) """
+    if stoich_inact is None:
+        stoich_inact = [[] for _ in stoich_active]
+    actv, prod, inact = _normalized_stoich(n, stoich_active, stoich_prod, stoich_inact)
+    compiler, flags = _compiler_and_flags(compiler, flags)
+    data = json.dumps([_KERNEL_VERSION, int(n), actv, prod, inact, compiler, flags])
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def compile_kernel(rd, cache_dir=None, compiler=None, flags=None):
+    """ Renders and compiles a kernel for ``rd`` (unless already cached)
+
+    Parameters
+    ----------
+    rd : ReactionDiffusion instance (or any object with ``n``, ``stoich_active``,
+         ``stoich_prod`` & ``stoich_inact``)
+    cache_dir : str
+        see :py:func:`get_cache_dir`
+    compiler : str
+        Defaults to ``$CXX`` or "c++"
+    flags : list of str
+        Optimization flags, defaults to ``$CHEMREAC_CODEGEN_FLAGS`` or "-O2"
+
+    Returns
+    -------
+    Path to the shared object.
+
+    """
+    key = kernel_key(rd.n, rd.stoich_active, rd.stoich_prod, rd.stoich_inact, compiler, flags)
+    dest = os.path.join(get_cache_dir(cache_dir), 'rxn_kernel_%s%s' % (
+        key[:32], sysconfig.get_config_var('SHLIB_SUFFIX') or '.so'))
+    if os.path.exists(dest):
+        return dest
+    src, _ = render_kernel(rd.n, rd.stoich_active, rd.stoich_prod, rd.stoich_inact, key=key)
+    compiler, flags = _compiler_and_flags(compiler, flags)
+    tmpdir = tempfile.mkdtemp(dir=os.path.dirname(dest))
+    try:
+        src_path = os.path.join(tmpdir, 'rxn_kernel.cpp')
+        with open(src_path, 'wt') as ofh:
+            ofh.write(src)
+        obj_path = os.path.join(tmpdir, os.path.basename(dest))
+        proc = subprocess.Popen([compiler] + flags + ['-o', obj_path, src_path],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        stdout, _ = proc.communicate()
+        if proc.returncode != 0:
+            raise RuntimeError("Compilation of reaction kernel failed:\n%s" % stdout.decode('utf-8'))
+        os.rename(obj_path, dest)  # atomic: concurrent compilations are harmless
+    finally:
+        for fname in os.listdir(tmpdir):
+            os.unlink(os.path.join(tmpdir, fname))
+        os.rmdir(tmpdir)
+    return dest
+
+
+_loaded = {}
+
+
+def load_kernel(path, n=None, nr=None):
+    """ Loads a compiled kernel
+
+    Returns
+    -------
+    lib : ctypes.CDLL (needs to be kept alive while the kernel is in use)
+    rhs_addr : int
+    jac_addr : int
+    rows, cols : lists of int (sparsity pattern of the values from the jac kernel)
+
+    """
+    if path not in _loaded:
+        _loaded[path] = ctypes.CDLL(path)
+    lib = _loaded[path]
+    if ctypes.c_int.in_dll(lib, 'chemreac_kernel_version').value != _KERNEL_VERSION:
+        raise ValueError("Kernel version mismatch: %s" % path)
+    for name, val in [('n', n), ('nr', nr)]:
+        if val is not None and ctypes.c_int.in_dll(lib, 'chemreac_kernel_' + name).value != val:
+            raise ValueError("Kernel in %s does not match the network (%s)" % (path, name))
+    nnz = ctypes.c_int.in_dll(lib, 'chemreac_kernel_nnz').value
+    rows = list((ctypes.c_int*max(nnz, 1)).in_dll(lib, 'chemreac_kernel_rows'))[:nnz]
+    cols = list((ctypes.c_int*max(nnz, 1)).in_dll(lib, 'chemreac_kernel_cols'))[:nnz]
+    rhs_addr = ctypes.cast(lib.chemreac_rxn_rhs, ctypes.c_void_p).value
+    jac_addr = ctypes.cast(lib.chemreac_rxn_jac, ctypes.c_void_p).value
+    return lib, rhs_addr, jac_addr, rows, cols
+
+
+class CompiledReactionDiffusion(ReactionDiffusion):
+    """ ReactionDiffusion using reaction kernels compiled for its network
+
+    Takes the same arguments as :py:class:`~chemreac.core.ReactionDiffusion`
+    and additionally (as keyword arguments) ``cache_dir``, ``compiler`` &
+    ``flags`` (see :py:func:`compile_kernel`).
+
+    Attributes
+    ----------
+    kernel_path : str
+        Path to the compiled kernel.
+
+    """
+
+    def __new__(cls, *args, **kwargs):
+        codegen_kwargs = {k: kwargs.pop(k) for k in ('cache_dir', 'compiler', 'flags') if k in kwargs}
+        rd = super(CompiledReactionDiffusion, cls).__new__(cls, *args, **kwargs)
+        rd.codegen_kwargs = codegen_kwargs
+        rd.kernel_path = compile_kernel(rd, **codegen_kwargs)
+        lib, rhs_addr, jac_addr, rows, cols = load_kernel(rd.kernel_path, rd.n, rd.nr)
+        rd._kernel_lib = lib
+        rd._set_rxn_kernels(rhs_addr, jac_addr, rows, cols)
+        return rd
+
+    def __reduce__(self):
+        args = inspect.getfullargspec(ReactionDiffusion.__new__).args[1:]
+        return (functools.partial(self.__class__, **self.codegen_kwargs),
+                tuple(getattr(self, attr) for attr in args))
@@ -353,6 +353,15 @@ class ReactionDiffusion(PyReactionDiffusion, ReactionDiffusionBase):
         ``nstencil - 1 / 2``.
     use_log2: bool
         Use base 2 for logarithmic transform instead of e.
+    field_schedules: sequence of ``(t, values[, linear])`` tuples (optional)
+        Time profiles (piecewise constant, or piecewise linear if ``linear``)
+        scaling each field type, ``None`` for a constant field.
+    modulation_schedules: sequence of ``(t, values[, linear])`` tuples (optional)
+        Time profiles scaling the modulation of each reaction in modulated_rxns.
+    events: sequence of dicts (optional)
+        Threshold crossings, amount thresholds or steady-state detection located
+        by CVODE (optionally stopping the integration), see ``events`` of
+        :class:`chemreac._chemreac.PyReactionDiffusion`.
     unit_registry: dict (optional)
         See ``chemreac.units.SI_base_registry`` for an example (default: None).
 
@@ -403,6 +412,9 @@ class ReactionDiffusion(PyReactionDiffusion, ReactionDiffusionBase):
                 clip_to_pos=False,
                 faraday_const=None,
                 vacuum_permittivity=None,
+                field_schedules=None,
+                modulation_schedules=None,
+                events=None,
                 **kwargs):
         if N == 0:
             if x is None:
@@ -510,6 +522,12 @@ class ReactionDiffusion(PyReactionDiffusion, ReactionDiffusionBase):
             clip_to_pos=clip_to_pos
         )
 
+        if field_schedules:
+            rd.field_schedules = field_schedules
+        if modulation_schedules:
+            rd.modulation_schedules = modulation_schedules
+        if events:
+            rd.events = events
         rd.unit_registry = unit_registry
 
         for attr in cls.kwarg_attrs:
@@ -521,7 +539,7 @@ class ReactionDiffusion(PyReactionDiffusion, ReactionDiffusionBase):
         return rd
 
     def __reduce__(self):
-        args = inspect.getargspec(self.__new__).args[1:]
+        args = inspect.getfullargspec(self.__new__).args[1:]
         return (self.__class__, tuple(getattr(self, attr) for attr in args))
 
     _prop_unit = {
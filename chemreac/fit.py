@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+chemreac.fit
+============
+
+This module provides :py:func:`fit` which estimates rate constants (and
+g-values) of a :py:class:`~chemreac.core.ReactionDiffusion` model from time
+series measured in several experiments (:py:class:`Experiment`, e.g. differing in
+initial concentrations, dose rates and sampling times) by minimizing the weighted
+sum of squared residuals with Levenberg-Marquardt or Gauss-Newton iterations.
+
+The Jacobian of the residuals is obtained from the forward sensitivities of the
+integrations (no finite differences), the experiments are integrated in parallel
+and each keeps its solver between iterations (see
+:py:class:`chemreac._chemreac.ExperimentSet`).
+
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import time
+
+import numpy as np
+
+from .integrate import DEFAULTS, _dedim, _integration_variables
+
+
+FIT_STATUS = ('gtol', 'xtol', 'ftol', 'max_iter', 'no_progress')
+
+
+class Experiment(object):
+    """
+    Measured concentrations of one experiment.
+
+    Parameters
+    ----------
+    C0 : array_like
+        Initial concentrations (linear), size ``rd.N*rd.n``.
+    tout : array_like
+        Times (increasing) of the data, ``tout[0]`` is the initial time.
+    data : array_like of shape ``(tout.size, rd.N, rd.n)``
+        Measured concentrations, ``nan`` for species/times not measured (the values at
+        ``tout[0]`` are typically ``nan``).
+    weights : array_like
+        Broadcastable to the shape of ``data`` (default: 1), e.g. ``1/sigma**2``.
+    fields : array_like
+        Field strengths (e.g. dose rates times density) during the experiment, shape
+        ``(len(rd.g_values),)`` or ``(len(rd.g_values), rd.N)`` (default: ``rd.fields``).
+
+    """
+
+    def __init__(self, C0, tout, data, weights=None, fields=None):
+        self.C0 = C0
+        self.tout = tout
+        self.data = data
+        self.weights = weights
+        self.fields = fields
+
+
+def _prepare(rd, exp, C0_is_log, tiny):
+    # -> y0, x (integration variables), data & sqrt(weights) (zero where missing)
+    y0, tout, x = _integration_variables(rd, exp.C0, exp.tout, C0_is_log, tiny)
+    data = exp.data
+    if rd.unit_registry is not None:
+        data = _dedim(data, 'concentration', rd.unit_registry)
+    data = np.asarray(data, dtype=np.float64).reshape((tout.size, rd.N, rd.n))
+    weights = np.broadcast_to(
+        1.0 if exp.weights is None else np.asarray(exp.weights, dtype=np.float64), data.shape)
+    if np.any(weights < 0):
+        raise ValueError("Negative weights")
+    missing = np.isnan(data)
+    return y0, x, np.where(missing, 0, data), np.where(missing, 0, np.sqrt(weights))
+
+
+def fit(rd, experiments, params, p0=None, method='lm', log_k=True, C0_is_log=False,
+        tiny=None, max_iter=50, gtol=1e-8, xtol=1e-8, ftol=1e-12, lambda0=1e-3,
+        max_halvings=10, nthreads=0, **kwargs):
+    """
+    Least squares estimate of parameters of ``rd`` from several experiments.
+
+    Minimizes ``S = sum(weights*(C - data)**2)/2`` summed over ``experiments``. Each
+    iteration integrates all experiments together with their forward sensitivities
+    (``dC/dp``, the Jacobian of the residuals) and takes a Levenberg-Marquardt step
+    (Marquardt's diagonal scaling, damping adapted to the ratio of actual to predicted
+    reduction) or a Gauss-Newton step (halved until ``S`` decreases). Trial points only
+    integrate the concentrations.
+
+    Parameters
+    ----------
+    rd : ReactionDiffusion
+    experiments : iterable of :class:`Experiment`
+    params : iterable of tuples
+        ``('k', ri)`` or ``('g_values', (fi, si))``.
+    p0 : array_like
+        Initial guess (default: the values in ``rd``), needs to be positive for rate
+        constants with ``log_k``.
+    method : str
+        ``'lm'`` (Levenberg-Marquardt) or ``'gn'`` (Gauss-Newton).
+    log_k : bool
+        Iterate on the logarithms of the rate constants (keeps them positive and
+        balances parameters of different magnitudes).
+    C0_is_log, tiny :
+        See :class:`chemreac.integrate.Integration`.
+    max_iter : int
+        Maximum number of iterations (Jacobian evaluations).
+    gtol : float
+        Converged when the largest gradient component (of ``S`` wrt. the iterated
+        parameters, relative to ``S``) is below ``gtol``.
+    xtol : float
+        Converged when the step is below ``xtol`` (relative to the parameters).
+    ftol : float
+        Converged when an accepted step reduces ``S`` by less than ``ftol*S``.
+    lambda0 : float
+        Initial damping of Levenberg-Marquardt.
+    max_halvings : int
+        Maximum number of step halvings of Gauss-Newton (and of consecutive rejected
+        steps of Levenberg-Marquardt).
+    nthreads : int
+        Number of threads integrating the experiments (``0``: one per hardware thread).
+    \\*\\*kwargs :
+        Solver settings, see :class:`chemreac._chemreac.ExperimentSet`.
+
+    Returns
+    -------
+    p : array of shape ``(len(params),)``
+    info : dict
+        ``success``, ``status`` (one of :data:`FIT_STATUS`), ``niter``, ``nfev``
+        (integrations of all experiments without sensitivities), ``njev`` (with),
+        ``cost`` (``S`` of each accepted iterate), ``pcov`` (covariance estimate of
+        ``p``: ``S/(m - P)`` times the inverse of ``J^T J``), ``residuals`` (per
+        experiment, weighted, zero where missing), ``Cout`` (per experiment),
+        ``time_wall`` & ``time_cpu``.
+
+    Examples
+    --------
+    >>> exps = [Experiment(C0, tout, data), Experiment(C0, tout2, data2, fields=[0.3])]  # doctest: +SKIP
+    >>> p, info = fit(rd, exps, [('k', 0), ('k', 1)])  # doctest: +SKIP
+    >>> np.sqrt(np.diag(info['pcov']))  # standard errors  # doctest: +SKIP
+
+    """
+    from ._chemreac import ExperimentSet, _sensitivity_param
+    if method not in ('lm', 'gn'):
+        raise ValueError("Unknown method: %s" % method)
+    params = list(params)
+    npar = len(params)
+    if p0 is None:
+        p0 = [_sensitivity_param(rd, param)[2] for param in params]
+    p0 = np.array(p0, dtype=np.float64).flatten()
+    if p0.size != npar:
+        raise ValueError("p0 of incorrect size")
+    is_log = np.array([log_k and kind == 'k' for kind, _ in params], dtype=bool)
+    if np.any(p0[is_log] <= 0):
+        raise ValueError("Rate constants need to be positive with log_k")
+
+    atol = np.asarray(kwargs.pop('atol', DEFAULTS['atol'])).reshape(-1)
+    rtol = kwargs.pop('rtol', DEFAULTS['rtol'])
+    es = ExperimentSet(rd, params, atol, rtol, kwargs.pop('method', 'bdf'), nthreads=nthreads,
+                       **kwargs)
+    data, sqrt_w = [], []
+    for exp in experiments:
+        y0, x, d, sw = _prepare(rd, exp, C0_is_log, tiny)
+        es.add(y0, x, exp.fields)
+        data.append(d)
+        sqrt_w.append(sw)
+    if len(es) == 0:
+        raise ValueError("No experiments")
+    ln_b = np.log(2) if rd.use_log2 else 1
+    nres = sum(sw.size for sw in sqrt_w)
+    nfev, njev = [0], [0]
+
+    def to_p(theta):
+        return np.where(is_log, np.exp(np.where(is_log, theta, 0)), theta)
+
+    def residuals(theta, jac=False):
+        # -> r (weighted), C per experiment, J (dr/dtheta) if jac
+        p = to_p(theta)
+        youts, souts, _ = es.evaluate(p, sensitivities=jac)
+        (njev if jac else nfev)[0] += 1
+        Cs = [rd.expb(y) if rd.logy else y for y in youts]
+        r = np.concatenate([(sw*(C - d)).ravel() for C, d, sw in zip(Cs, data, sqrt_w)])
+        if not jac:
+            return r, Cs, None
+        J = np.empty((nres, npar))
+        offset = 0
+        for C, s, sw in zip(Cs, souts, sqrt_w):
+            Cs_ = s*(C*ln_b)[..., np.newaxis] if rd.logy else s  # dC/dp
+            J[offset:offset + sw.size] = (sw[..., np.newaxis]*Cs_).reshape((sw.size, npar))
+            offset += sw.size
+        J[:, is_log] *= p[is_log]  # dp/dtheta = p
+        return r, Cs, J
+
+    def try_residuals(theta):
+        try:
+            return residuals(theta)
+        except RuntimeError:  # e.g. integration failure for unreasonable parameters
+            return None, None, None
+
+    time_wall = time.time()
+    time_cpu = time.process_time()
+    theta = np.where(is_log, np.log(np.where(is_log, p0, 1)), p0)
+    r, Cs, J = residuals(theta, jac=True)
+    S = r.dot(r)/2
+    costs = [S]
+    mu = None
+    nu = 2.0
+    status = 'max_iter'
+    niter = 0
+    while niter < max_iter:
+        niter += 1
+        g = J.T.dot(r)
+        if np.max(np.abs(g), initial=0) <= gtol*max(S, np.finfo(np.float64).tiny):
+            status = 'gtol'
+            break
+        A = J.T.dot(J)
+        accepted = False
+        if method == 'gn':
+            step = np.linalg.lstsq(J, -r, rcond=None)[0]
+            for _ in range(max_halvings + 1):
+                r_new, Cs_new, _ = try_residuals(theta + step)
+                if r_new is not None and r_new.dot(r_new)/2 < S:
+                    accepted = True
+                    break
+                step = step/2
+        else:
+            D = np.maximum(np.diag(A), np.finfo(np.float64).tiny)
+            if mu is None:
+                mu = lambda0
+            for _ in range(max_halvings + 1):
+                step = np.linalg.solve(A + mu*np.diag(D), -g)
+                predicted = -(step.dot(g) + step.dot(A).dot(step)/2)
+                r_new, Cs_new, _ = try_residuals(theta + step)
+                if r_new is not None:
+                    rho = (S - r_new.dot(r_new)/2)/predicted if predicted > 0 else -1
+                    if rho > 1e-4:
+                        mu *= max(1/3, 1 - (2*rho - 1)**3)
+                        nu = 2.0
+                        accepted = True
+                        break
+                mu *= nu
+                nu *= 2
+        small_step = np.all(np.abs(step) <= xtol*(np.abs(theta) + xtol))
+        if not accepted:  # converged to within the accuracy of the integration?
+            status = 'xtol' if small_step else 'no_progress'
+            break
+        S_new = r_new.dot(r_new)/2
+        small_reduction = S - S_new <= ftol*S
+        theta = theta + step
+        r, Cs, J = residuals(theta, jac=True)
+        S = r.dot(r)/2
+        costs.append(S)
+        if small_step or small_reduction:
+            status = 'xtol' if small_step else 'ftol'
+            break
+
+    p = to_p(theta)
+    Jp = J.copy()
+    Jp[:, is_log] /= p[is_log]  # dr/dp
+    dof = max(sum(np.count_nonzero(sw) for sw in sqrt_w) - npar, 1)
+    pcov = np.linalg.pinv(Jp.T.dot(Jp))*2*S/dof
+    info = {
+        'success': status in ('gtol', 'xtol', 'ftol'),
+        'status': status,
+        'niter': niter,
+        'nfev': nfev[0],
+        'njev': njev[0],
+        'cost': np.array(costs),
+        'pcov': pcov,
+        'residuals': [rr.reshape(sw.shape) for rr, sw in zip(
+            np.split(r, np.cumsum([sw.size for sw in sqrt_w])[:-1]), sqrt_w)],
+        'Cout': Cs,
+        'time_wall': time.time() - time_wall,
+        'time_cpu': time.process_time() - time_cpu,
+    }
+    return p, info
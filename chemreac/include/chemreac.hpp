@@ -1,6 +1,9 @@
 #ifndef CHEMREAC_PVHQOBGMVZECTIJSMOKFUXJXXM
 #define CHEMREAC_PVHQOBGMVZECTIJSMOKFUXJXXM
 
+#include <algorithm> // std::find_if
+#include <cmath> // std::isnan
+#include <iterator> // std::distance
 #include <vector>
 #include <utility>
 #include <stdexcept>
@@ -9,6 +12,7 @@
 #include "block_diag_ilu.hpp"
 #include "anyode/anyode.hpp"
 #include "anyode/anyode_buffer.hpp"
+#include "anyode/anyode_decomposition_lapack.hpp"
 
 
 namespace chemreac {
@@ -23,6 +27,205 @@ using AnyODE::buffer_factory;
 
 template<class T> void ignore( const T& ) { } // ignore compiler warnings about unused parameter
 
+// Network specific reaction kernels (see chemreac/codegen.py) acting on one bin:
+// rhs kernel: f[si] += sum_ri S[ri, si]*r_ri(k, C)
+// jac kernel: vals[i] = d(sum_ri S[ri, rows[i]]*r_ri)/dC[cols[i]]  (nonzero entries only)
+template<typename Real_t> using rxn_rhs_kernel_t = void (*)(const Real_t * const k, const Real_t * const C,
+                                                             Real_t * const f);
+template<typename Real_t> using rxn_jac_kernel_t = void (*)(const Real_t * const k, const Real_t * const C,
+                                                             Real_t * const vals);
+
+// Derivative of the advection terms wrt. the concentrations through the self-consistent
+// field (auto_efield), kept in factored form (it couples every pair of bins):
+//   K[(bi,si), (bj,sj)] = wv[bj*n+sj]*(A1[bi*n+si]*G[bi]*c(bi, bj) +
+//                                      sum_li A2[(bi*n+si)*nstencil+li]*G[biw]*c(biw, bj))
+// where biw = biw[bi*nstencil+li] and c(b, j) = [j < b] - flat*[j > b] (enclosed charge).
+template<typename Real_t>
+struct EfieldJacobian {
+    buffer_t<Real_t> wv, A1, A2, G, w, dE; // w & dE: work arrays (N)
+    buffer_t<int> biw;
+    bool flat {false};
+    bool valid {false};
+};
+
+// Time profile tabulated as values v at increasing times t: piecewise constant (v[i] on
+// [t[i], t[i+1])) or piecewise linear, constant beyond the first and last point. Segment
+// lookup is O(1) for (roughly) evenly spaced tables through a uniform bucket index.
+template<typename Real_t>
+struct Schedule {
+    vector<Real_t> t, v;
+    bool linear {false};
+    vector<int> bucket_first; // index of the last point at or before the start of each bucket
+    Real_t bucket_width {0};
+    Schedule() = default;
+    Schedule(vector<Real_t> t_, vector<Real_t> v_, bool linear_=false) :
+        t(t_), v(v_), linear(linear_)
+    {
+        if (t.size() != v.size() || t.size() == 0)
+            throw std::length_error("Schedule: t & v need to be of equal (non-zero) length");
+        for (size_t i=1; i<t.size(); ++i)
+            if (!(t[i] > t[i-1]))
+                throw std::logic_error("Schedule: t needs to be strictly increasing");
+        const int nb = t.size();
+        bucket_width = (t.back() - t.front())/nb;
+        bucket_first.resize(nb);
+        for (int bi=0, i=0; bi<nb; ++bi){
+            while (i + 1 < nb && t[i+1] <= t.front() + bi*bucket_width)
+                ++i;
+            bucket_first[bi] = i;
+        }
+    }
+    int segment(Real_t time) const {
+        // index of the last point at or before time (0 before t[0])
+        const int np = t.size();
+        if (!(time > t.front()))
+            return 0;
+        if (time >= t.back())
+            return np - 1;
+        int i = bucket_first[std::min(np - 1, static_cast<int>((time - t.front())/bucket_width))];
+        while (t[i+1] <= time)
+            ++i;
+        return i;
+    }
+    Real_t operator()(Real_t time) const {
+        const int i = segment(time);
+        if (!linear || time <= t[i] || i + 1 == static_cast<int>(t.size()))
+            return v[i];
+        return v[i] + (v[i+1] - v[i])*(time - t[i])/(t[i+1] - t[i]);
+    }
+    // Times in (t0, tend) where the profile (piecewise constant) or its slope is discontinuous
+    vector<Real_t> breakpoints(Real_t t0, Real_t tend) const {
+        vector<Real_t> result;
+        for (size_t i=0; i<t.size(); ++i){
+            if (t[i] <= t0 || t[i] >= tend)
+                continue;
+            if (linear){
+                const Real_t sl = (i == 0) ? 0 : (v[i] - v[i-1])/(t[i] - t[i-1]);
+                const Real_t sr = (i + 1 == t.size()) ? 0 : (v[i+1] - v[i])/(t[i+1] - t[i]);
+                if (sl != sr)
+                    result.push_back(t[i]);
+            } else if (i > 0 && v[i] != v[i-1]) {
+                result.push_back(t[i]);
+            }
+        }
+        return result;
+    }
+};
+
+// Event function g(t, y) located (as a root) by CVODE, see ReactionDiffusion::roots:
+//   THRESHOLD:    C[idx[0]] - value (evaluated as y[idx[0]] - log(value) with logy)
+//   AMOUNT:       sum_i w[i]*C[idx[i]] - value (e.g. w: bin volumes)
+//   STEADY_STATE: max_i |dC_i/dt| - value
+// Only crossings in direction (1: increasing, -1: decreasing, 0: either) are reported,
+// a terminal event stops the integration.
+enum class EventKind {THRESHOLD, AMOUNT, STEADY_STATE};
+
+template<typename Real_t>
+struct Event {
+    EventKind kind;
+    vector<int> idx;
+    vector<Real_t> w;
+    Real_t value;
+    int direction;
+    bool terminal;
+    Event() : kind(EventKind::THRESHOLD), value(0), direction(0), terminal(false) {} // e.g. for Cython temporaries
+    Event(int kind_, vector<int> idx_, vector<Real_t> w_, Real_t value_, int direction_=0, bool terminal_=false) :
+        kind(static_cast<EventKind>(kind_)), idx(idx_), w(w_), value(value_), direction(direction_),
+        terminal(terminal_)
+    {
+        if (kind_ < 0 || kind_ > 2)
+            throw std::logic_error("Event: unknown kind");
+        if (kind == EventKind::THRESHOLD && idx.size() != 1)
+            throw std::length_error("Event: threshold needs exactly one index");
+        if (kind == EventKind::AMOUNT && idx.size() != w.size())
+            throw std::length_error("Event: idx & w need to be of equal length");
+        if (direction < -1 || direction > 1)
+            throw std::logic_error("Event: direction needs to be -1, 0 or 1");
+    }
+    int kind_index() const { return static_cast<int>(kind); }
+};
+
+// Incomplete LU factorization of a BlockDiagMatrix (same algorithm as block_diag_ilu::ILU_inplace)
+// with all storage allocated once: factorize() may be called repeatedly on the (re-assembled) view.
+template<typename Real_t>
+struct BlockILU {
+    block_diag_ilu::BlockDiagMatrix<Real_t> * m_view;
+    buffer_t<int> m_ipiv, m_rowbycol, m_colbyrow;
+    buffer_t<Real_t> m_y;
+    BlockILU(block_diag_ilu::BlockDiagMatrix<Real_t> * view) :
+        m_view(view),
+        m_ipiv(buffer_factory<int>(view->m_blockw*view->m_nblocks)),
+        m_rowbycol(buffer_factory<int>(view->m_blockw*view->m_nblocks)),
+        m_colbyrow(buffer_factory<int>(view->m_blockw*view->m_nblocks)),
+        m_y(buffer_factory<Real_t>(view->m_blockw*view->m_nblocks))
+    {}
+    int factorize(){
+        // factorizes m_view in place, returns 0 on success
+        int info_ = 0;
+        const int nblocks = m_view->m_nblocks;
+        const int ndiag = m_view->m_ndiag;
+        const int blockw = m_view->m_blockw;
+        int ld = m_view->m_ld;
+        constexpr AnyODE::getrf_callback<Real_t> getrf{};
+        for (int bi=0; bi<nblocks; ++bi){
+            int info;
+            getrf(&blockw, &blockw, &(m_view->block(bi, 0, 0)), &ld, &(m_ipiv[bi*blockw]), &info);
+            if ((info != 0) && (info_ == 0))
+                info_ = info;
+            for (int ci = 0; ci < blockw; ++ci){
+                for (int di = 0; (di < ndiag) && (bi+di < (nblocks - 1)); ++di){
+                    m_view->sub(di, bi, ci) /= m_view->block(bi, ci, ci);
+                }
+            }
+            if (bi < m_view->m_nsat)
+                for (int sati=bi; sati < m_view->m_nsat; ++sati)
+                    for (int ci=0; ci < blockw; ++ci)
+                        m_view->bot(sati, bi, ci) /= m_view->block(bi, ci, ci);
+            block_diag_ilu::rowpiv2rowbycol(blockw, &m_ipiv[bi*blockw], &m_rowbycol[bi*blockw]);
+            block_diag_ilu::rowbycol2colbyrow(blockw, &m_rowbycol[bi*blockw], &m_colbyrow[bi*blockw]);
+        }
+        return info_;
+    }
+    int solve(const Real_t * const ANYODE_RESTRICT b, Real_t * const ANYODE_RESTRICT x){
+        // see block_diag_ilu::ILU_inplace::solve
+        const int nblk = m_view->m_nblocks;
+        const int blkw = m_view->m_blockw;
+        const int ndia = m_view->m_ndiag;
+        Real_t * const y = AnyODE::buffer_get_raw_ptr(m_y);
+        const auto first_nan_idx = std::distance(b, std::find_if(b, b + nblk*blkw, [](Real_t d) { return std::isnan(d); }));
+        int info = (first_nan_idx == nblk*blkw) ? 0 : first_nan_idx + 1;
+        for (int bri = 0; bri < nblk; ++bri){ // Solves Ly = b (from LUx = b)
+            for (int li = 0; li < blkw; ++li){
+                Real_t s = 0.0;
+                for (int lci = 0; lci < li; ++lci)
+                    s += m_view->block(bri, li, lci)*y[bri*blkw + lci];
+                const int ci = m_colbyrow[bri*blkw + li];
+                for (int di = 1; di <= std::min(ndia, bri); ++di)
+                    s += m_view->sub(di-1, bri-di, ci) * y[(bri-di)*blkw + ci];
+                for (int bci=0; bci <= m_view->m_nsat + bri - nblk; ++bci)
+                    s += m_view->bot(nblk+bci-bri-1, bci, ci) * y[bci*blkw + ci];
+                y[bri*blkw + li] = b[bri*blkw + m_rowbycol[bri*blkw + li]] - s;
+            }
+        }
+        for (int bri = nblk-1; bri >= 0; --bri){ // Solves Ux = y
+            for (int li = blkw; li > 0; --li){
+                Real_t s = 0.0;
+                for (int ci = li; ci < blkw; ++ci)
+                    s += m_view->block(bri, li-1, ci)*x[bri*blkw + ci];
+                const int ci = m_colbyrow[bri*blkw + li-1];
+                for (int di = 1; di <= std::min(nblk - bri - 1, ndia); ++di)
+                    s += m_view->sup(di-1, bri, ci)*x[(bri+di)*blkw + ci];
+                for (int sati=m_view->m_nsat; sati > bri; --sati)
+                    s += m_view->top(sati-1, bri, ci)*x[(nblk - sati + bri)*blkw + ci];
+                x[bri*blkw+li-1] = (y[bri*blkw + li-1] - s)/(m_view->block(bri, li-1, li-1));
+                if (m_view->block(bri, li-1, li-1) == 0 && info == 0)
+                    info = nblk*blkw + bri*blkw + (li-1);
+            }
+        }
+        return info;
+    }
+};
+
 template <typename Real_t = double>
 class ReactionDiffusion : public AnyODE::OdeSysBase<Real_t>
 {
@@ -33,7 +236,15 @@ public:
     const int nsidep; // (nstencil-1)/2
     const int nr; // number of reactions
     buffer_t<int> coeff_active, coeff_prod, coeff_total, coeff_inact;
-    buffer_t<Real_t> lap_weight, div_weight, grad_weight, efield, netchg, gradD, xc, work1, work2, work3;
+    // Net stoichiometry (CSR): reaction ri changes species net_stoich_si[net_stoich_ptr[ri]:net_stoich_ptr[ri+1]]
+    // by the (nonzero) coefficients in net_stoich_coeff
+    vector<int> net_stoich_ptr, net_stoich_si, net_stoich_coeff;
+    // Sparse reaction contributions to the Jacobian, pair pi is (reaction jac_pair_ri[pi],
+    // derivative wrt species jac_pair_dsi[pi]) contributing to species
+    // jac_pair_si[jac_pair_ptr[pi]:jac_pair_ptr[pi+1]] with net coefficients jac_pair_S[...]
+    vector<int> jac_pair_ri, jac_pair_dsi, jac_pair_ptr, jac_pair_si, jac_pair_S;
+    buffer_t<Real_t> lap_weight, div_weight, grad_weight, efield, netchg, gradD, xc, work1, work2, work3, work_jtimes;
+    buffer_t<Real_t> work_fout, work_fd; // rhs output (Jacobians with logy & get_dx_max) / weights in apply_fd_
     int n_factor_affected_k;
     Geom geom; // Geometry: 0: 1D flat, 1: 1D Cylind, 2: 1D Spherical.
     void * integrator {nullptr};
@@ -41,6 +252,8 @@ public:
     void fill_local_r_(int, const Real_t * const ANYODE_RESTRICT, Real_t * const ANYODE_RESTRICT) const;
     void apply_fd_(int);
     void populate_linC(Real_t * const ANYODE_RESTRICT, const Real_t * const ANYODE_RESTRICT, bool=false, bool=false) const;
+    template<bool LOG2>
+    void populate_linC_(Real_t * const ANYODE_RESTRICT, const Real_t * const ANYODE_RESTRICT, bool, bool) const;
     int stencil_bi_lbound_(int bi) const;
     int xc_bi_map_(int xci) const;
     const bool logy; // use logarithmic concenctraction
@@ -65,6 +278,15 @@ public:
     vector<vector<Real_t>> fields;
     vector<int> modulated_rxns;
     vector<vector<Real_t> > modulation;
+    // Optional time profiles (empty or one per field type / modulated reaction) scaling
+    // fields[fi] and modulation[mi] respectively, set m_eff_k_stale after modifying.
+    vector<Schedule<Real_t>> field_schedules, modulation_schedules;
+    // Event functions (one root function each, see Event), located by CVODE
+    vector<Event<Real_t>> events;
+    // Effective (modulated) rate constants per bin (N*nr), rebuilt lazily by the kernels:
+    // set m_eff_k_stale after modifying k, modulated_rxns or modulation.
+    buffer_t<Real_t> eff_k;
+    bool m_eff_k_stale {true};
     vector<Real_t> m_upper_bounds;
     vector<Real_t> m_lower_bounds;
     const Real_t ilu_limit;
@@ -74,15 +296,84 @@ public:
     const bool use_log2;
     const bool clip_to_pos;
     bool m_error_outside_bounds {false};
-    const int nroots = 0;
+    bool m_jtimes_fd {false}; // matrix-free jtimes (finite difference of rhs)
+    bool m_efield_jac {true}; // include the dependence of efield on y in Jacobians (auto_efield)
+    // Optional specialized reaction kernels (replacing the generic mass action loops)
+    rxn_rhs_kernel_t<Real_t> m_rxn_rhs_kernel {nullptr};
+    rxn_jac_kernel_t<Real_t> m_rxn_jac_kernel {nullptr};
+    vector<int> m_rxn_jac_rows, m_rxn_jac_cols;
 private:
     std::unique_ptr<block_diag_ilu::BlockDiagMatrix<Real_t>> jac_cache;
     std::unique_ptr<block_diag_ilu::BlockDiagMatrix<Real_t>> jac_times_cache;
     std::unique_ptr<block_diag_ilu::BlockDiagMatrix<Real_t>> prec_cache;
-    bool update_prec_cache = false;
-    Real_t old_gamma;
+    // factorization of prec_cache, keyed on (jac_version, gamma):
+    std::unique_ptr<BlockILU<Real_t>> prec_ilu;
+    std::unique_ptr<AnyODE::BandedMatrix<Real_t>> prec_banded;
+    std::unique_ptr<AnyODE::BandedLU<Real_t>> prec_lu;
+    long jac_version = 0; // incremented each time jac_cache is re-assembled
+    long prec_jac_version = -1;
+    buffer_t<Real_t> work_kernel; // nonzero values from m_rxn_jac_kernel (per thread)
+    Real_t prec_gamma = 0;
+    bool prec_valid = false; // invalidated by prec_setup
+    bool prec_use_ilu = false; // decided once per prec_setup
+    bool prec_redecide = true;
+    void prec_factorize_(Real_t gamma);
+    // Nonlocal Jacobian contributions from auto_efield: from the latest Jacobian evaluation,
+    // and the ones captured by jtimes_setup and prec_setup respectively.
+    EfieldJacobian<Real_t> ej_last, ej_jtimes, ej_prec;
+    // Banded LU of P bordered with the enclosed charges as extra unknowns (one per bin),
+    // exact for I - gamma*(J + K) (the total charge term, flat geometry, by Sherman-Morrison).
+    std::unique_ptr<AnyODE::BandedMatrix<Real_t>> prec_ext;
+    std::unique_ptr<AnyODE::BandedLU<Real_t>> prec_ext_lu;
+    buffer_t<Real_t> prec_ext_work; // 3*N*(n+1): rhs, solution, (I - gamma*(J + K'))^-1 u
+    Real_t prec_ext_denom = 1;
+    bool prec_ext_used = false; // ej_prec folded into the current factorization
+    bool efield_jac_active_() const;
+    template<bool LOGY>
+    void efield_jac_update_(const Real_t * const ANYODE_RESTRICT, const Real_t * const ANYODE_RESTRICT, Real_t);
+    Real_t efield_jac_coeff_(const EfieldJacobian<Real_t>&, int bi, int si, int bj, bool excl_total=false) const;
+    void efield_jac_dot_(EfieldJacobian<Real_t>&, const Real_t * const ANYODE_RESTRICT,
+                         Real_t * const ANYODE_RESTRICT) const;
+    void efield_prec_factorize_(Real_t gamma);
+    void alloc_efield_jac_();
+    // Kernel variants specialized on (logy, logt, use_log2, clip_to_pos), chosen by select_kernels_
+    using rhs_impl_t = AnyODE::Status (ReactionDiffusion::*)(Real_t, const Real_t * const, Real_t * const);
+    using jac_impl_t = AnyODE::Status (ReactionDiffusion::*)(Real_t, const Real_t * const, const Real_t * const,
+                                                             Real_t * const, long int);
+    rhs_impl_t m_rhs_impl {nullptr};
+    jac_impl_t m_dense_jac_rmaj_impl {nullptr}, m_dense_jac_cmaj_impl {nullptr},
+        m_banded_jac_cmaj_impl {nullptr}, m_compressed_jac_cmaj_impl {nullptr};
+    void select_kernels_();
+    // Memoization of quantities derived from the state y (rhs and Jacobian are commonly
+    // evaluated for the same state), see memo_same_state_ & clear_memo
+    buffer_t<Real_t> memo_y, memo_f;
+    Real_t memo_t = 0;
+    bool memo_y_valid = false, memo_linC_valid = false, memo_efield_valid = false, memo_f_valid = false;
+    bool memo_same_state_(const Real_t * const ANYODE_RESTRICT y);
+    template<bool LOGY, bool LOG2, bool CLIP>
+    void populate_work_linC_(const Real_t * const ANYODE_RESTRICT y);
+    template<bool LOGY, bool LOGT, bool LOG2, bool CLIP>
+    AnyODE::Status rhs_(Real_t, const Real_t * const, Real_t * const ANYODE_RESTRICT);
+    template<bool LOGY, bool LOGT, bool LOG2, bool CLIP>
+    AnyODE::Status dense_jac_rmaj_(Real_t, const Real_t * const ANYODE_RESTRICT, const Real_t * const ANYODE_RESTRICT,
+                                   Real_t * const ANYODE_RESTRICT, long int);
+    template<bool LOGY, bool LOGT, bool LOG2, bool CLIP>
+    AnyODE::Status dense_jac_cmaj_(Real_t, const Real_t * const ANYODE_RESTRICT, const Real_t * const ANYODE_RESTRICT,
+                                   Real_t * const ANYODE_RESTRICT, long int);
+    template<bool LOGY, bool LOGT, bool LOG2, bool CLIP>
+    AnyODE::Status banded_jac_cmaj_(Real_t, const Real_t * const ANYODE_RESTRICT, const Real_t * const ANYODE_RESTRICT,
+                                    Real_t * const ANYODE_RESTRICT, long int);
+    template<bool LOGY, bool LOGT, bool LOG2, bool CLIP>
+    AnyODE::Status compressed_jac_cmaj_(Real_t, const Real_t * const ANYODE_RESTRICT, const Real_t * const ANYODE_RESTRICT,
+                                        Real_t * const ANYODE_RESTRICT, long int);
     int start_idx_(int bi) const;
     int biw_(int bi, int li) const;
+    // Factors of field_schedules & modulation_schedules at time m_sched_time, see set_schedule_time_
+    vector<Real_t> m_field_fact, m_mod_fact;
+    Real_t m_sched_time = 0;
+    bool m_sched_valid = false;
+    void set_schedule_time_(Real_t time);
+    void modulate_eff_k_();
 
 public:
     // counters
@@ -92,8 +383,15 @@ public:
     long nprec_solve {0};
     long njacvec_dot {0};
     long njacvec_setup {0};
+    long njacvec_dot_fd {0};
     long nprec_solve_ilu {0};
     long nprec_solve_lu {0};
+    long nprec_cache_hit {0};
+    long nprec_cache_miss {0};
+    long nmemo_state_hit {0};
+    long nmemo_state_miss {0};
+    long nmemo_rhs_hit {0};
+    long nheap_alloc {0}; // allocations made by the callbacks (scratch, matrices, factorizations)
 
     ReactionDiffusion(int,
 		      const vector<vector<int> >,
@@ -127,6 +425,9 @@ public:
                       bool use_log2=false,
                       bool clip_to_pos=false
                       );
+    // Copy for concurrent use: parameters & precomputed tables are copied, work arrays,
+    // caches, memoized state and counters are private to the new instance.
+    ReactionDiffusion(const ReactionDiffusion<Real_t>&);
     ~ReactionDiffusion();
 
     void zero_counters();
@@ -138,7 +439,8 @@ public:
     Real_t get_dx0(Real_t x, const Real_t * const y) override;
 
     AnyODE::Status rhs(Real_t, const Real_t * const, Real_t * const ANYODE_RESTRICT) override;
-    // AnyODE::Status roots(Real_t xval, const Real_t * const y, Real_t * const out) override;
+    int get_nroots() const override;
+    AnyODE::Status roots(Real_t xval, const Real_t * const y, Real_t * const out) override;
 
     AnyODE::Status dense_jac_rmaj(Real_t, const Real_t * const ANYODE_RESTRICT, const Real_t * const ANYODE_RESTRICT, Real_t * const ANYODE_RESTRICT, long int, double * const ANYODE_RESTRICT dfdt=nullptr) override;
     AnyODE::Status dense_jac_cmaj(Real_t, const Real_t * const ANYODE_RESTRICT, const Real_t * const ANYODE_RESTRICT, Real_t * const ANYODE_RESTRICT, long int, double * const ANYODE_RESTRICT dfdt=nullptr) override;
@@ -146,6 +448,12 @@ public:
     AnyODE::Status compressed_jac_cmaj(Real_t, const Real_t * const ANYODE_RESTRICT, const Real_t * const ANYODE_RESTRICT, Real_t * const ANYODE_RESTRICT, long int);
 
     Real_t get_mod_k(int bi, int ri) const;
+    void update_eff_k();
+    void clear_memo(); // call after modifying parameters (k, D, fields, ...)
+    // Times (in the integration variable, i.e. log(t) with logt) in (x0, xend) where
+    // field_schedules or modulation_schedules are discontinuous (to be used as stop times)
+    vector<Real_t> schedule_breakpoints(Real_t x0, Real_t xend) const;
+    void set_rxn_kernels(rxn_rhs_kernel_t<Real_t>, rxn_jac_kernel_t<Real_t>, vector<int>, vector<int>);
 
     // For iterative linear solver
     // void local_reaction_jac(const int, const Real_t * const, Real_t * const ANYODE_RESTRICT, Real_t) const;
@@ -169,8 +477,12 @@ public:
                                    Real_t delta,
                                    const Real_t * const ANYODE_RESTRICT ewt
                                    ) override;
+    void prec_add_to_diag(const Real_t * const ANYODE_RESTRICT d);
 
-    void per_rxn_contrib_to_fi(Real_t, const Real_t * const ANYODE_RESTRICT, int, Real_t * const ANYODE_RESTRICT) const;
+    void per_rxn_contrib_to_fi(Real_t, const Real_t * const ANYODE_RESTRICT, int, Real_t * const ANYODE_RESTRICT);
+    // d(rhs)/dp at fixed y for p: k[index] (kind 0), D of species index (1, all bins) or
+    // g_values[index / n][index % n] (2), see chemreac_sensitivity.hpp
+    AnyODE::Status dfdp(Real_t, const Real_t * const ANYODE_RESTRICT, int kind, int index, Real_t * const ANYODE_RESTRICT);
     int get_geom_as_int() const;
     void calc_efield(const Real_t * const);
 
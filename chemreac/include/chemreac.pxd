@@ -9,7 +9,25 @@ from libcpp.string cimport string
 
 from anyode cimport Info
 
+# signature of both rxn_rhs_kernel_t<double> and rxn_jac_kernel_t<double>
+ctypedef void (*rxn_kernel_t)(const double *, const double *, double *)
+
 cdef extern from "chemreac.hpp" namespace "chemreac":
+    cdef cppclass Schedule[T]:
+        vector[T] t, v
+        bool linear
+        Schedule()
+        Schedule(vector[T], vector[T], bool) except +
+
+    cdef cppclass Event[T]:
+        vector[int] idx
+        vector[T] w
+        T value
+        int direction
+        bool terminal
+        Event(int, vector[int], vector[T], T, int, bool) except +
+        int kind_index()
+
     cdef cppclass ReactionDiffusion[T]:
         # (Private)
         T * lap_weight
@@ -35,6 +53,9 @@ cdef extern from "chemreac.hpp" namespace "chemreac":
         vector[vector[T]] fields
         vector[int] modulated_rxns
         vector[vector[T]] modulation
+        vector[Schedule[T]] field_schedules, modulation_schedules
+        vector[Event[T]] events
+        bool m_eff_k_stale
         vector[T] m_upper_bounds
         vector[T] m_lower_bounds
         T ilu_limit
@@ -44,6 +65,8 @@ cdef extern from "chemreac.hpp" namespace "chemreac":
         bool use_log2
         bool clip_to_pos
         bool m_error_outside_bounds
+        bool m_jtimes_fd
+        bool m_efield_jac
         T * efield
         vector[T] gradD
         T * xc
@@ -53,8 +76,16 @@ cdef extern from "chemreac.hpp" namespace "chemreac":
         long nprec_setup
         long nprec_solve
         long njacvec_dot
+        long njacvec_setup
+        long njacvec_dot_fd
         long nprec_solve_ilu
         long nprec_solve_lu
+        long nprec_cache_hit
+        long nprec_cache_miss
+        long nmemo_state_hit
+        long nmemo_state_miss
+        long nmemo_rhs_hit
+        long nheap_alloc
 
         Info current_info
         bool autonomous_exprs, use_get_dx_max
@@ -91,14 +122,22 @@ cdef extern from "chemreac.hpp" namespace "chemreac":
                           bool,
                           bool
                           ) except +
+        ReactionDiffusion(const ReactionDiffusion[T]&) except +
         void zero_counters() except +
+        void clear_memo() except +
+        vector[T] schedule_breakpoints(T, T) except +
+        int get_nroots()
+        void roots(T, const T * const, T * const) except +
         void rhs(T, const T * const, T * const) except +
         void dense_jac_rmaj(T, const T * const, const T * const, T * const, long int) except +
         void dense_jac_cmaj(T, const T * const, const T * const, T * const, long int) except +
         void banded_jac_cmaj(T, const T * const, const T * const, T * const, long int) except +
         void compressed_jac_cmaj(T, const T * const, const T * const, T * const, long int) except +
 
+        void set_rxn_kernels(rxn_kernel_t, rxn_kernel_t, vector[int], vector[int]) except +
+
         void per_rxn_contrib_to_fi(T, const T * const, int, T * const) except +
+        void dfdp(T, const T * const, int, int, T * const) except +
         int get_geom_as_int() except +
         void calc_efield(const T * const) except +
 
@@ -0,0 +1,310 @@
+#pragma once
+
+#include <algorithm> // std::copy, std::fill, std::min, std::max
+#include <cmath> // std::abs
+#include <cstddef>
+#include <limits>
+#include <memory>
+#include <stdexcept>
+#include <vector>
+#include "cvodes_anyode.hpp"
+#include "chemreac.hpp"
+#include "chemreac_cvodes.hpp"
+#include "chemreac_dense.hpp"
+
+namespace chemreac {
+
+    // Backward (adjoint) problem of rd for an objective G = sum_k g_k(y(x_k)) evaluated on
+    // the output times. With lambda(x) = dG/dy(x):
+    //   dlambda/dx = -J(x, y(x))^T lambda,  lambda jumps by dg_k/dy at each x_k
+    //   dG/dp_j = int lambda^T df/dp_j(x, y(x)) dx,  dG/dy0 = lambda(x_0)
+    // The problem is posed in s = -x (so that CVODE integrates forward) with the
+    // integrals as quadratures; y(x) is interpolated from the recorded steps of the forward
+    // integration (history). The Jacobian is that of rd (dense or banded, transposed) and
+    // is cached per x (all Newton iterations of a step evaluate it at the same x).
+    template<typename Real_t = double>
+    class AdjointSystem : public AnyODE::OdeSysBase<Real_t> {
+        ReactionDiffusion<Real_t> * const m_rd;
+        const int m_ny, m_bw; // bandwidth (-1: dense)
+        const int m_ld;
+        std::vector<Real_t> m_jac, m_y, m_work;
+        Real_t m_jac_x {std::numeric_limits<Real_t>::quiet_NaN()};
+        Real_t m_y_x {std::numeric_limits<Real_t>::quiet_NaN()};
+    public:
+        const NordsieckHistory<Real_t> * history {nullptr};
+        const std::vector<int> kinds, indices; // see ForwardSensitivity (Y0: not integrated)
+
+        AdjointSystem(ReactionDiffusion<Real_t> * rd, const std::vector<int>& kinds,
+                      const std::vector<int>& indices) :
+            m_rd(rd), m_ny(rd->get_ny()), m_bw(rd->get_mlower()),
+            m_ld((m_bw == -1) ? m_ny : 3*m_bw + 1),
+            m_jac(m_ld*m_ny), m_y(m_ny), m_work(m_ny), kinds(kinds), indices(indices)
+        {
+            if (kinds.size() != indices.size())
+                throw std::length_error("kinds & indices need to be of equal length");
+        }
+
+        int get_ny() const override { return m_ny; }
+        int get_mlower() const override { return m_bw; }
+        int get_mupper() const override { return m_bw; }
+        int get_nquads() const override { return kinds.size(); }
+
+        void invalidate(){ m_jac_x = m_y_x = std::numeric_limits<Real_t>::quiet_NaN(); }
+
+        AnyODE::Status rhs(Real_t s, const Real_t * const lmb, Real_t * const ANYODE_RESTRICT f) override {
+            // d(lambda)/ds = J^T lambda
+            const Real_t * const jac = jac_(-s);
+            for (int i=0; i<m_ny; ++i){
+                Real_t acc = 0;
+                if (m_bw == -1){
+                    for (int k=0; k<m_ny; ++k)
+                        acc += jac[k + i*m_ld]*lmb[k];
+                } else {
+                    const int k0 = std::max(0, i - m_bw), k1 = std::min(m_ny - 1, i + m_bw);
+                    for (int k=k0; k<=k1; ++k)
+                        acc += jac[2*m_bw + k - i + i*m_ld]*lmb[k];
+                }
+                f[i] = acc;
+            }
+            this->nfev++;
+            return AnyODE::Status::success;
+        }
+
+        AnyODE::Status quads(Real_t s, const Real_t * const lmb, Real_t * const out) override {
+            const Real_t * const y = y_(-s);
+            for (std::size_t j=0; j<kinds.size(); ++j){
+                out[j] = 0;
+                if (kinds[j] == 3) // initial value: lambda(x0)
+                    continue;
+                const auto status = m_rd->dfdp(-s, y, kinds[j], indices[j], m_work.data());
+                if (status != AnyODE::Status::success)
+                    return status;
+                for (int i=0; i<m_ny; ++i)
+                    out[j] += lmb[i]*m_work[i];
+            }
+            return AnyODE::Status::success;
+        }
+
+        AnyODE::Status dense_jac_cmaj(Real_t s, const Real_t * const ANYODE_RESTRICT,
+                                      const Real_t * const ANYODE_RESTRICT,
+                                      Real_t * const ANYODE_RESTRICT ja, long int ldj,
+                                      double * const ANYODE_RESTRICT dfdt=nullptr) override {
+            AnyODE::ignore(dfdt);
+            const Real_t * const jac = jac_(-s);
+            for (int ci=0; ci<m_ny; ++ci)
+                for (int ri=0; ri<m_ny; ++ri)
+                    ja[ri + ci*ldj] = jac[ci + ri*m_ld];
+            this->njev++;
+            return AnyODE::Status::success;
+        }
+
+        AnyODE::Status banded_jac_cmaj(Real_t s, const Real_t * const ANYODE_RESTRICT,
+                                       const Real_t * const ANYODE_RESTRICT,
+                                       Real_t * const ANYODE_RESTRICT ja, long int ldj) override {
+            // element (ri, ci) at ja[m_bw + ri - ci + ci*ldj] (see tests-native)
+            const Real_t * const jac = jac_(-s);
+            for (int ci=0; ci<m_ny; ++ci){
+                const int r0 = std::max(0, ci - m_bw), r1 = std::min(m_ny - 1, ci + m_bw);
+                for (int ri=r0; ri<=r1; ++ri)
+                    ja[m_bw + ri - ci + ci*ldj] = jac[2*m_bw + ci - ri + ri*m_ld];
+            }
+            this->njev++;
+            return AnyODE::Status::success;
+        }
+
+    private:
+        const Real_t * y_(Real_t x){
+            if (x != m_y_x){
+                // CVODE does not step beyond the stop time, guard against round-off only
+                x = std::min(std::max(x, history->t.front()), history->t.back());
+                history->eval(x, m_y.data());
+                m_y_x = x;
+            }
+            return m_y.data();
+        }
+
+        const Real_t * jac_(Real_t x){
+            if (x != m_jac_x){
+                const Real_t * const y = y_(x);
+                std::fill(m_jac.begin(), m_jac.end(), 0);
+                const auto status = (m_bw == -1) ?
+                    m_rd->dense_jac_cmaj(x, y, nullptr, m_jac.data(), m_ld) :
+                    m_rd->banded_jac_cmaj(x, y, nullptr, m_jac.data() + m_bw, m_ld);
+                if (status != AnyODE::Status::success)
+                    throw std::runtime_error("Jacobian evaluation failed");
+                m_jac_x = x;
+            }
+            return m_jac.data();
+        }
+    };
+
+    // Gradient of an objective defined on the output times with respect to parameters (as
+    // in ForwardSensitivity) and the initial values by the adjoint method: forward() integrates
+    // y (session) and keeps the values at the output times as checkpoints, backward() takes
+    // dg_k/dy (provided by the caller from the output of forward) and integrates the adjoint
+    // problem (AdjointSystem) from the last output time to the first. Before each interval
+    // the forward solution is recomputed from its checkpoint with the steps recorded
+    // (NordsieckHistory), i.e. memory is bounded by one interval at the cost of a second
+    // forward pass (as in the checkpointing of CVODES). Without checkpointing the steps of
+    // the whole first pass are kept instead. The cost is independent of the number of
+    // parameters but for the quadratures (one rd->dfdp per parameter and evaluation).
+    template<typename Real_t = double>
+    class AdjointGradient {
+        ReactionDiffusion<Real_t> * const m_rd;
+        CvodeSession<Real_t> * const m_session;
+        AdjointSystem<Real_t> m_sys;
+        NordsieckHistory<Real_t> m_history;
+        std::vector<Real_t> m_tout, m_yout;
+        const int m_ny;
+    public:
+        bool checkpointing {true};
+        std::vector<Real_t> atol; // of lambda (size 1 or ny, default: as the forward problem)
+        Real_t rtol {0}; // default: as the forward problem
+        std::vector<Real_t> pbar; // nominal parameter values (quadrature tolerances atol/|pbar|)
+        AnyODE::Info backward_info; // statistics of the backward integrations
+        long nfev_backward {0}, njev_backward {0};
+
+        AdjointGradient(ReactionDiffusion<Real_t> * rd, CvodeSession<Real_t> * session,
+                        const std::vector<int>& kinds, const std::vector<int>& indices) :
+            m_rd(rd), m_session(session), m_sys(rd, kinds, indices), m_history(rd->get_ny()),
+            m_ny(rd->get_ny())
+        {
+            const int nmax[4] {rd->nr, rd->n, static_cast<int>(rd->g_values.size())*rd->n, m_ny};
+            for (std::size_t j=0; j<kinds.size(); ++j){
+                if (kinds[j] < 0 || kinds[j] > 3)
+                    throw std::logic_error("Unknown parameter kind");
+                if (indices[j] < 0 || indices[j] >= nmax[kinds[j]])
+                    throw std::logic_error("Parameter index out of bounds");
+            }
+        }
+
+        int nparams() const { return m_sys.kinds.size(); }
+
+        // Integrates y0 from tout[0] through tout (nt values, increasing), yout: nt*ny.
+        // Returns the number of output times reached (backward requires all of them).
+        int forward(const Real_t * const y0, std::size_t nt, const Real_t * const tout,
+                    Real_t * const yout){
+            if (m_rd->get_nroots() > 0)
+                throw std::logic_error("events are not supported with adjoint sensitivities");
+            if (m_rd->auto_efield)
+                throw std::logic_error("auto_efield is not supported with adjoint sensitivities");
+            m_tout.assign(tout, tout + nt);
+            m_yout.clear();
+            int nreached;
+            if (checkpointing || nt < 2){
+                nreached = m_session->predefined(y0, nt, tout, yout);
+            } else {
+                record_(y0, tout[0], tout[nt - 1]);
+                m_history.eval(nt, tout, yout);
+                nreached = nt;
+            }
+            m_yout.assign(yout, yout + nreached*m_ny);
+            return nreached;
+        }
+
+        // dgdy: nt*ny (dg_k/dy at each output time), grad: nparams, lambda0: ny (dG/dy0)
+        void backward(const Real_t * const dgdy, Real_t * const grad, Real_t * const lambda0){
+            const std::size_t nt = m_tout.size();
+            if (nt == 0 || m_yout.size() != nt*m_ny)
+                throw std::logic_error("backward requires a complete forward integration");
+            const int nq = nparams();
+            const auto& settings = m_session->settings();
+            std::vector<Real_t> uq(m_ny + nq, 0), atol_b(m_ny + nq);
+            for (int i=0; i<m_ny; ++i){
+                const auto& src = (atol.empty()) ? settings.atol : atol;
+                atol_b[i] = src[(src.size() == 1) ? 0 : i];
+            }
+            const Real_t atol_q = *std::min_element(atol_b.begin(), atol_b.begin() + m_ny);
+            for (int j=0; j<nq; ++j){
+                const Real_t scale = (pbar.empty() || pbar[j] == 0) ? 1 : std::abs(pbar[j]);
+                atol_b[m_ny + j] = atol_q/scale;
+            }
+            std::copy(dgdy + (nt - 1)*m_ny, dgdy + nt*m_ny, uq.begin());
+            backward_info.clear();
+            nfev_backward = njev_backward = 0;
+            m_sys.nfev = m_sys.njev = 0;
+            m_sys.history = &m_history;
+            std::unique_ptr<cvodes_cxx::Integrator> integr;
+            const auto lmm = cvodes_cxx::lmm_from_name(settings.method);
+            const auto linsol = (m_sys.get_mlower() == -1) ? cvodes_cxx::LinSol::DENSE : cvodes_cxx::LinSol::BANDED;
+            if (!checkpointing && nt > 1 && m_history.nsteps() == 0)
+                throw std::logic_error("no recorded steps");
+            for (std::size_t k=nt - 1; k > 0; --k){
+                if (m_tout[k] > m_tout[k - 1]){
+                    if (checkpointing)
+                        record_(&m_yout[(k - 1)*m_ny], m_tout[k - 1], m_tout[k]);
+                    m_sys.invalidate();
+                    if (!integr){
+                        integr = cvodes_anyode::get_integrator<AdjointSystem<Real_t>>(
+                            &m_sys, atol_b, (rtol == 0) ? settings.rtol : rtol, lmm, uq.data(), -m_tout[k],
+                            settings.mxsteps, settings.dx0, settings.dx_min, settings.dx_max, true,
+                            cvodes_cxx::IterType::Newton, linsol, 0, 0.0, 0, {}, 0, settings.stab_lim_det);
+                        m_sys.integrator = static_cast<void*>(integr.get());
+                    }
+                    step_(*integr, uq, -m_tout[k], -m_tout[k - 1], linsol);
+                }
+                for (int i=0; i<m_ny; ++i)
+                    uq[i] += dgdy[(k - 1)*m_ny + i];
+            }
+            std::copy(uq.begin(), uq.begin() + m_ny, lambda0);
+            for (int j=0; j<nq; ++j)
+                grad[j] = (m_sys.kinds[j] == 3) ? uq[m_sys.indices[j]] : uq[m_ny + j];
+            nfev_backward = m_sys.nfev;
+            njev_backward = m_sys.njev;
+        }
+
+    private:
+        void record_(const Real_t * const y0, Real_t x0, Real_t xend){
+            // integrates from x0 to xend recording every step in m_history
+            const std::size_t chunk = 64;
+            std::vector<Real_t> tbuf(chunk), ybuf(chunk*m_ny);
+            const Real_t xs[2] {x0, xend};
+            auto history = m_session->history;
+            m_session->history = &m_history;
+            try {
+                m_session->stream(y0, 2, xs, true, chunk, tbuf.data(), ybuf.data(),
+                                  [](void *, std::size_t) -> int { return 0; }, nullptr);
+            } catch (...) {
+                m_session->history = history;
+                throw;
+            }
+            m_session->history = history;
+            if (m_history.t.back() < xend)
+                throw std::runtime_error("forward integration did not reach the end of the interval");
+        }
+
+        void step_(cvodes_cxx::Integrator& integr, std::vector<Real_t>& uq, Real_t s0, Real_t send,
+                   cvodes_cxx::LinSol linsol){
+            // integrates the adjoint problem from s0 to send, uq: lambda (ny) & quadratures
+            const int nq = nparams();
+            cvodes_cxx::SVector q {nq, uq.data() + m_ny
+#if SUNDIALS_VERSION_MAJOR >= 6
+                    , *integr.ctx
+#endif
+            };
+            integr.reinit(s0, uq.data(), m_ny);
+            if (nq > 0)
+                integr.quad_reinit(q);
+            integr.set_init_step(m_session->settings().dx0);
+            integr.set_stop_time(send);
+            cvodes_cxx::SVector u {m_ny, uq.data()
+#if SUNDIALS_VERSION_MAJOR >= 6
+                    , *integr.ctx
+#endif
+            };
+            Real_t scur = s0;
+            const int status = integr.step(send, u, &scur, cvodes_cxx::Task::Normal);
+            cvodes_cxx::update_integration_info(
+                backward_info.nfo_int, backward_info.nfo_dbl, backward_info.nfo_vecdbl,
+                backward_info.nfo_vecint, integr, cvodes_cxx::IterType::Newton, linsol);
+            if (status < 0)
+                integr.unsuccessful_step_throw_(status);
+            std::copy(u.get_data_ptr(), u.get_data_ptr() + m_ny, uq.begin());
+            if (nq > 0){
+                integr.get_quad(&scur, q.n_vec);
+                std::copy(q.get_data_ptr(), q.get_data_ptr() + nq, uq.begin() + m_ny);
+            }
+        }
+    };
+
+}
@@ -0,0 +1,108 @@
+#pragma once
+
+#include <algorithm> // std::min
+#include <atomic>
+#include <exception>
+#include <memory>
+#include <string>
+#include <thread>
+#include <vector>
+#include "chemreac.hpp"
+
+namespace chemreac {
+
+    // Outcome of integrating one member of an ensemble (see e.g. cvode_predefined_batch)
+    struct BatchResult {
+        int nreached {0};
+        AnyODE::Info info;
+        std::string error; // empty on success
+    };
+
+    // Number of worker threads used for nmembers tasks (nthreads < 1: one per hardware thread)
+    inline int batch_nthreads(int nmembers, int nthreads){
+        if (nthreads < 1)
+            nthreads = std::max(1u, std::thread::hardware_concurrency());
+        return std::max(1, std::min(nthreads, nmembers));
+    }
+
+    // Calls cb(mi, rd, state) for each member index mi in [0, nmembers) on a pool of threads.
+    // Every thread works on its own copy of proto, so work arrays and Jacobian/preconditioner
+    // storage are allocated once per thread and reused by all members it handles, and on its
+    // own state, *make_state(rd) (e.g. a solver bound to rd, make_state returns a unique_ptr),
+    // created before its first member. Exceptions (also of make_state, which is then retried
+    // for the next member) are caught per member, the returned vector holds their messages
+    // (empty on success).
+    template<typename Real_t, typename MakeState, typename Callback>
+    std::vector<std::string> for_each_member(const ReactionDiffusion<Real_t>& proto, int nmembers,
+                                             int nthreads, MakeState make_state, Callback cb){
+        std::vector<std::string> errors(nmembers);
+        std::atomic<int> next {0};
+        auto worker = [&](){
+            ReactionDiffusion<Real_t> rd(proto);
+            decltype(make_state(rd)) state;
+            for (int mi = next++; mi < nmembers; mi = next++){
+                try {
+                    if (!state)
+                        state = make_state(rd);
+                    cb(mi, rd, *state);
+                } catch (const std::exception& exc) {
+                    errors[mi] = exc.what();
+                    if (errors[mi].empty())
+                        errors[mi] = "unknown error";
+                } catch (...) {
+                    errors[mi] = "unknown error";
+                }
+            }
+        };
+        const int nt = batch_nthreads(nmembers, nthreads);
+        std::vector<std::thread> threads;
+        for (int ti = 1; ti < nt; ++ti)
+            threads.emplace_back(worker);
+        worker();
+        for (auto& thr : threads)
+            thr.join();
+        return errors;
+    }
+
+    // As above without per thread state: calls cb(mi, rd).
+    template<typename Real_t, typename Callback>
+    std::vector<std::string> for_each_member(const ReactionDiffusion<Real_t>& proto, int nmembers,
+                                             int nthreads, Callback cb){
+        return for_each_member(
+            proto, nmembers, nthreads,
+            [](ReactionDiffusion<Real_t>&){ return std::unique_ptr<bool>(new bool(true)); },
+            [&](int mi, ReactionDiffusion<Real_t>& rd, bool&){ cb(mi, rd); });
+    }
+
+    // Sets the parameters varied over an ensemble: k (nr values) and fields (g_values.size()*N
+    // values, field type major), nullptr leaves the respective parameter unchanged.
+    template<typename Real_t>
+    void set_member_params(ReactionDiffusion<Real_t>& rd, const Real_t * const k, const Real_t * const fields){
+        if (k){
+            rd.k.assign(k, k + rd.nr);
+            rd.m_eff_k_stale = true;
+        }
+        if (fields){
+            for (std::size_t fi = 0; fi < rd.fields.size(); ++fi)
+                rd.fields[fi].assign(fields + fi*rd.N, fields + (fi + 1)*rd.N);
+        }
+        rd.clear_memo();
+    }
+
+    // Adds the counters of rd (accumulated since zero_counters) to info.
+    template<typename Real_t>
+    void add_counters_to_info(const ReactionDiffusion<Real_t>& rd, AnyODE::Info& info){
+        info.nfo_int["nfev"] = rd.nfev;
+        info.nfo_int["njev"] = rd.njev;
+        info.nfo_int["njvev"] = rd.njvev; // (as set by simple_predefined)
+        info.nfo_int["nprec_setup"] = rd.nprec_setup;
+        info.nfo_int["nprec_solve"] = rd.nprec_solve;
+        info.nfo_int["njacvec_dot"] = rd.njacvec_dot;
+        info.nfo_int["njacvec_setup"] = rd.njacvec_setup;
+        info.nfo_int["nmemo_state_hit"] = rd.nmemo_state_hit;
+        info.nfo_int["nmemo_state_miss"] = rd.nmemo_state_miss;
+        info.nfo_int["nmemo_rhs_hit"] = rd.nmemo_rhs_hit;
+        info.nfo_int["nheap_alloc"] = rd.nheap_alloc;
+    }
+
+}
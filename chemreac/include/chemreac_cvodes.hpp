@@ -0,0 +1,405 @@
+#pragma once
+
+#include <algorithm> // std::min
+#include <chrono>
+#include <cstddef>
+#include <ctime>
+#include <functional> // std::bind
+#include <memory>
+#include <stdexcept>
+#include <vector>
+#include "cvodes_anyode.hpp"
+#include "chemreac.hpp"
+#include "chemreac_batch.hpp"
+#include "chemreac_dense.hpp"
+#include "chemreac_observables.hpp"
+
+namespace chemreac {
+
+    // A CVODE integrator bound to *rd which is kept between calls to predefined: the solver
+    // memory and the linear solver workspace are allocated on the first call and subsequent
+    // calls only reinitialize the integrator (CVodeReInit) with new initial values and times.
+    // Parameters (k, fields) may be changed on rd in between calls. With keep_step the
+    // first step of a call is the step size the previous call ended with (rather than an
+    // estimate), which suits chained segments of a schedule. rd->current_info accumulates
+    // statistics over all calls since construction or the last reset_info(). Discontinuities
+    // of the schedules of rd are treated as stop times (see predefined).
+    template<typename Real_t>
+    class CvodeSession {
+        ReactionDiffusion<Real_t> * const m_rd;
+        cvodes_anyode::SolverSettings m_settings;
+        cvodes_cxx::LMM m_lmm;
+        cvodes_cxx::IterType m_iter_type;
+        cvodes_cxx::LinSol m_linear_solver;
+        std::unique_ptr<cvodes_cxx::Integrator> m_integr;
+        int m_nroots {0};
+    public:
+        bool keep_step;
+        Real_t last_step {0};
+        long ncalls {0};
+        NordsieckHistory<Real_t> * history {nullptr}; // when set: recorded by stream (adaptive)
+        // Occurrences of rd->events during the last call: event index, x & y (ny each)
+        std::vector<int> event_index;
+        std::vector<Real_t> event_x, event_y;
+        bool event_stop {false}; // last call stopped by a terminal event
+
+        CvodeSession(ReactionDiffusion<Real_t> * rd, const cvodes_anyode::SolverSettings& settings,
+                     bool keep_step=false) :
+            m_rd(rd), m_settings(settings),
+            m_lmm(cvodes_cxx::lmm_from_name(settings.method)),
+            m_iter_type(cvodes_cxx::iter_type_from_name(settings.iter_type)),
+            m_linear_solver(cvodes_cxx::linear_solver_from_name(settings.linear_solver)),
+            keep_step(keep_step)
+        {
+            if (m_iter_type == cvodes_cxx::IterType::Undecided)
+                m_iter_type = (m_lmm == cvodes_cxx::LMM::Adams) ? cvodes_cxx::IterType::Functional : cvodes_cxx::IterType::Newton;
+            if (m_linear_solver == cvodes_cxx::LinSol::DEFAULT)
+                m_linear_solver = (rd->get_mlower() == -1) ? cvodes_cxx::LinSol::DENSE : cvodes_cxx::LinSol::BANDED;
+            const int ny = rd->get_ny();
+            if (m_settings.atol.size() != 1 && m_settings.atol.size() != static_cast<std::size_t>(ny))
+                throw std::runtime_error("atol of incorrect length");
+            reset_info();
+        }
+
+        const cvodes_anyode::SolverSettings& settings() const { return m_settings; }
+
+        // Clears the statistics accumulated in rd->current_info (and the counters of rd).
+        void reset_info(){
+            m_rd->current_info.clear();
+            m_rd->zero_counters();
+        }
+
+        // Integrates from y0 at tout[0] through tout (nt values), yout: nt*ny (ew_ele: nt*2*ny).
+        // Discontinuities of the schedules of rd (see schedule_breakpoints) are used as stop
+        // times, i.e. the integration is restarted at each of them. Returns the number of
+        // output times reached.
+        int predefined(const Real_t * const y0, std::size_t nt, const Real_t * const tout,
+                       Real_t * const yout, Real_t * const ew_ele=nullptr){
+            if (m_rd->get_nroots() > 0){
+                // output times are emitted by stream directly into yout (a single chunk)
+                if (ew_ele)
+                    throw std::logic_error("ew_ele is not supported with events");
+                std::vector<Real_t> tbuf(nt);
+                return stream(y0, nt, tout, false, nt, tbuf.data(), yout,
+                              [](void *, std::size_t) -> int { return 0; }, nullptr);
+            }
+            clear_events_();
+            const auto bps = m_rd->schedule_breakpoints(tout[0], tout[nt - 1]);
+            if (bps.empty())
+                return predefined_(y0, nt, tout, yout, ew_ele);
+            const int ny = m_rd->get_ny();
+            std::vector<Real_t> ycur(y0, y0 + ny), seg_t, seg_y, seg_ew;
+            std::vector<long> seg_dst; // index in tout of each point in seg_t (-1: none)
+            std::size_t ti = 1;
+            int nreached = 0;
+            for (std::size_t bi = 0; bi <= bps.size(); ++bi){
+                const Real_t tend = (bi < bps.size()) ? bps[bi] : tout[nt - 1];
+                seg_t.assign(1, (bi == 0) ? tout[0] : bps[bi - 1]);
+                seg_dst.assign(1, (bi == 0) ? 0 : -1);
+                for (; ti < nt && tout[ti] <= tend; ++ti){
+                    seg_t.push_back(tout[ti]);
+                    seg_dst.push_back(ti);
+                }
+                if (seg_t.back() != tend){
+                    seg_t.push_back(tend);
+                    seg_dst.push_back(-1);
+                }
+                seg_y.resize(seg_t.size()*ny);
+                if (ew_ele)
+                    seg_ew.resize(seg_t.size()*2*ny);
+                const int nseg = predefined_(ycur.data(), seg_t.size(), seg_t.data(), seg_y.data(),
+                                             ew_ele ? seg_ew.data() : nullptr, bi < bps.size());
+                for (int i = 0; i < nseg; ++i){
+                    if (seg_dst[i] < 0)
+                        continue;
+                    std::copy(&seg_y[i*ny], &seg_y[(i + 1)*ny], yout + seg_dst[i]*ny);
+                    if (ew_ele)
+                        std::copy(&seg_ew[i*2*ny], &seg_ew[(i + 1)*2*ny], ew_ele + seg_dst[i]*2*ny);
+                    ++nreached;
+                }
+                if (nseg < static_cast<int>(seg_t.size()))
+                    break;
+                std::copy(&seg_y[(nseg - 1)*ny], &seg_y[nseg*ny], ycur.begin());
+            }
+            return nreached;
+        }
+
+        // Called with (ctx, number of rows) whenever the chunk buffers of stream are full and
+        // for the final rows, a nonzero return value stops the integration.
+        typedef int (*chunk_cb_t)(void *, std::size_t);
+
+        // Integrates from y0 at tout[0], emitting rows (t, y) at the output times tout (as in
+        // predefined) or, with adaptive, at every internal step from tout[0] to tout[nt - 1].
+        // Rows are collected in tbuf (chunk) & ybuf (chunk*ny) and handed over to cb whenever
+        // chunk rows have been filled, so memory use does not grow with the number of rows.
+        // With history set (requires adaptive) the interpolating polynomial of every step is
+        // recorded (see NordsieckHistory). Occurrences of rd->events are recorded (event_index,
+        // event_x, event_y), in adaptive mode also emitted as rows, a terminal event ends the
+        // integration. Returns the number of rows emitted.
+        std::size_t stream(const Real_t * const y0, std::size_t nt, const Real_t * const tout, bool adaptive,
+                           std::size_t chunk, Real_t * const tbuf, Real_t * const ybuf,
+                           chunk_cb_t cb, void * ctx){
+            const int ny = m_rd->get_ny();
+            if (history && !adaptive)
+                throw std::logic_error("history requires adaptive");
+            if (history && history->ny != ny)
+                throw std::logic_error("history of incorrect size");
+            auto bps = m_rd->schedule_breakpoints(tout[0], tout[nt - 1]);
+            bps.push_back(tout[nt - 1]);
+            std::time_t cput0 = std::clock();
+            auto t_start = std::chrono::high_resolution_clock::now();
+            auto& integr = integrator_(y0, tout[0]);
+            integr.reinit(tout[0], y0, ny);
+            // in adaptive mode the last step ends exactly at tout[nt - 1] (as in simple_adaptive)
+            start_(integr, y0, tout[0], bps[0], adaptive || bps.size() > 1);
+            cvodes_cxx::SVector y {ny, y0
+#if SUNDIALS_VERSION_MAJOR >= 6
+                    , *integr.ctx
+#endif
+            };
+            cvodes_cxx::SVector dky {ny
+#if SUNDIALS_VERSION_MAJOR >= 6
+                    , *integr.ctx
+#endif
+            };
+            std::vector<Real_t> nordsieck;
+            if (history)
+                history->start(tout[0]);
+            clear_events_();
+            std::vector<int> rootsfound(m_rd->get_nroots());
+            std::size_t nrows = 0, nfill = 0, iout = 1, bi = 0;
+            bool stop = false; // requested by cb
+            auto emit = [&](Real_t t){
+                tbuf[nfill] = t;
+                std::copy(y.get_data_ptr(), y.get_data_ptr() + ny, ybuf + nfill*ny);
+                ++nrows;
+                if (++nfill == chunk){
+                    stop = cb(ctx, nfill) != 0;
+                    nfill = 0;
+                }
+            };
+            emit(tout[0]);
+            Real_t tcur = tout[0];
+            while (!stop){ // (stop: the initial row filled a chunk of size 1)
+                if (m_rd->use_get_dx_max)
+                    integr.set_max_step(m_rd->get_dx_max(tcur, y.get_data_ptr()));
+                const Real_t target = (adaptive) ? bps[bi] : std::min(tout[iout], bps[bi]);
+                const int status = integr.step(target, y, &tcur, (adaptive) ? cvodes_cxx::Task::One_Step
+                                               : cvodes_cxx::Task::Normal);
+                if (status < 0){
+                    accumulate_(integr);
+                    if (m_settings.return_on_error)
+                        break;
+                    integr.unsuccessful_step_throw_(status);
+                }
+                if (history)
+                    record_step_(integr, tcur, dky, nordsieck);
+                if (status == CV_ROOT_RETURN){
+                    if (CVodeGetRootInfo(integr.mem, rootsfound.data()) < 0)
+                        throw std::runtime_error("CVodeGetRootInfo failed");
+                    for (std::size_t ei = 0; ei < rootsfound.size(); ++ei){
+                        if (rootsfound[ei] == 0)
+                            continue;
+                        event_index.push_back(ei);
+                        event_x.push_back(tcur);
+                        event_y.insert(event_y.end(), y.get_data_ptr(), y.get_data_ptr() + ny);
+                        event_stop = event_stop || m_rd->events[ei].terminal;
+                    }
+                }
+                if (adaptive){
+                    emit(tcur);
+                } else if (tcur == tout[iout]){
+                    emit(tcur);
+                    ++iout;
+                }
+                if (stop || event_stop){
+                    accumulate_(integr);
+                    break;
+                }
+                if (tcur >= bps[bi]){ // end of tout or a discontinuity of the schedules
+                    accumulate_(integr);
+                    if (++bi == bps.size())
+                        break;
+                    integr.reinit(tcur, y);
+                    start_(integr, y.get_data_ptr(), tcur, bps[bi], adaptive || bi + 1 < bps.size());
+                }
+            }
+            if (nfill > 0 && !stop)
+                cb(ctx, nfill);
+            auto& info = m_rd->current_info;
+            info.nfo_dbl["time_cpu"] += (std::clock() - cput0) / (double)CLOCKS_PER_SEC;
+            info.nfo_dbl["time_wall"] += std::chrono::duration<double>(
+                std::chrono::high_resolution_clock::now() - t_start).count();
+            return nrows;
+        }
+
+        // Integrates as stream does but only feeds the rows to obs (see Observables), the
+        // trajectory is never stored beyond a small work buffer. Returns the number of rows.
+        std::size_t observe(const Real_t * const y0, std::size_t nt, const Real_t * const tout, bool adaptive,
+                            Observables<Real_t>& obs, std::size_t chunk=64){
+            struct Sink {
+                Observables<Real_t> * obs;
+                std::vector<Real_t> tbuf, ybuf;
+                int ny;
+            } sink {&obs, std::vector<Real_t>(chunk), std::vector<Real_t>(chunk*m_rd->get_ny()), m_rd->get_ny()};
+            auto cb = [](void * ctx, std::size_t nrows) -> int {
+                auto& snk = *static_cast<Sink*>(ctx);
+                for (std::size_t ri = 0; ri < nrows; ++ri)
+                    snk.obs->observe(snk.tbuf[ri], &snk.ybuf[ri*snk.ny]);
+                return 0;
+            };
+            return stream(y0, nt, tout, adaptive, chunk, sink.tbuf.data(), sink.ybuf.data(), cb,
+                          static_cast<void*>(&sink));
+        }
+
+    private:
+        cvodes_cxx::Integrator& integrator_(const Real_t * const y0, Real_t t0){
+            // the integrator is created (and its workspace allocated) only once
+            if (!m_integr){
+                m_nroots = m_rd->get_nroots(); // root functions set up by get_integrator
+                m_integr = cvodes_anyode::get_integrator<ReactionDiffusion<Real_t>>(
+                    m_rd, m_settings.atol, m_settings.rtol, m_lmm, y0, t0, m_settings.mxsteps,
+                    m_settings.dx0, m_settings.dx_min, m_settings.dx_max, m_settings.with_jacobian,
+                    m_iter_type, m_linear_solver, m_settings.maxl, m_settings.eps_lin,
+                    m_settings.with_jtimes, m_settings.constraints, m_settings.msbj,
+                    m_settings.stab_lim_det);
+            }
+            m_rd->integrator = static_cast<void*>(m_integr.get());
+            const int nroots = m_rd->get_nroots();
+            if (nroots != m_nroots){ // events changed since the integrator was set up
+                if (nroots > 0)
+                    m_integr->root_init(nroots, cvodes_anyode::roots_cb<ReactionDiffusion<Real_t>>);
+                else if (CVodeRootInit(m_integr->mem, 0, nullptr) < 0)
+                    throw std::runtime_error("CVodeRootInit failed");
+                m_nroots = nroots;
+            }
+            return *m_integr;
+        }
+
+        void clear_events_(){
+            event_index.clear();
+            event_x.clear();
+            event_y.clear();
+            event_stop = false;
+        }
+
+        void start_(cvodes_cxx::Integrator& integr, const Real_t * const y0, Real_t t0, Real_t tend,
+                    bool stop){
+            // called after (re)initialization at t0: CVodeSetStopTime is checked against the
+            // current time of the integrator, which is that of the previous call otherwise
+            if (keep_step && last_step > 0)
+                integr.set_init_step(std::min(last_step, tend - t0));
+            else
+                integr.set_init_step((m_settings.dx0 == 0) ? m_rd->get_dx0(t0, y0) : m_settings.dx0);
+            if (stop)
+                integr.set_stop_time(tend); // never step beyond a discontinuity of the schedules
+#if SUNDIALS_VERSION_MAJOR >= 7 || (SUNDIALS_VERSION_MAJOR == 6 && SUNDIALS_VERSION_MINOR >= 5)
+            else if (CVodeClearStopTime(integr.mem) < 0) // (one of a previous call not reached)
+                throw std::runtime_error("CVodeClearStopTime failed");
+#endif
+            if (m_nroots > 0){
+                std::vector<int> dirs;
+                for (const auto& ev : m_rd->events)
+                    dirs.push_back(ev.direction);
+                if (CVodeSetRootDirection(integr.mem, dirs.data()) < 0)
+                    throw std::runtime_error("CVodeSetRootDirection failed");
+            }
+            // the integrator accumulates these over its lifetime, rd->current_info holds the sums
+            integr.time_rhs = integr.time_jac = integr.time_roots = integr.time_quads = 0;
+            integr.time_prec = integr.time_jtimes = integr.time_jtsetup = 0;
+            integr.orders_seen.clear();
+            integr.fpes_seen.clear();
+            integr.steps_seen.clear();
+        }
+
+        void record_step_(cvodes_cxx::Integrator& integr, Real_t tcur, cvodes_cxx::SVector& dky,
+                          std::vector<Real_t>& work){
+            // Taylor coefficients about tcur of the polynomial used in the last step
+            const int ny = m_rd->get_ny();
+            int q;
+            if (CVodeGetLastOrder(integr.mem, &q) < 0)
+                throw std::runtime_error("CVodeGetLastOrder failed");
+            work.resize((q + 1)*ny);
+            Real_t kfact = 1;
+            for (int k=0; k<=q; ++k){
+                if (k > 1)
+                    kfact *= k;
+                integr.get_dky(tcur, k, dky);
+                for (int i=0; i<ny; ++i)
+                    work[k*ny + i] = dky.get_data_ptr()[i]/kfact;
+            }
+            history->append(tcur, q, work.data());
+        }
+
+        void accumulate_(cvodes_cxx::Integrator& integr){
+            // adds the statistics since the last (re)initialization to rd->current_info
+            auto& info = m_rd->current_info;
+            cvodes_cxx::update_integration_info(info.nfo_int, info.nfo_dbl, info.nfo_vecdbl, info.nfo_vecint,
+                                                integr, m_iter_type, m_linear_solver);
+            last_step = integr.get_current_step();
+            ++ncalls;
+            info.nfo_int["ncalls"] = ncalls;
+            add_counters_to_info(*m_rd, info);
+        }
+
+        int predefined_(const Real_t * const y0, std::size_t nt, const Real_t * const tout,
+                        Real_t * const yout, Real_t * const ew_ele, bool stop=false){
+            // stop: tout[nt - 1] is a discontinuity of the schedules (otherwise the last step
+            // may overshoot it and the output is interpolated, as in simple_predefined)
+            std::vector<int> root_indices;
+            std::vector<Real_t> root_out;
+            std::time_t cput0 = std::clock();
+            auto t_start = std::chrono::high_resolution_clock::now();
+            auto& integr = integrator_(y0, tout[0]);
+            integr.reinit(tout[0], y0, m_rd->get_ny()); // (again in Integrator::predefined)
+            start_(integr, y0, tout[0], tout[nt - 1], stop);
+            const int nreached = integr.predefined(
+                nt, tout, y0, yout, m_settings.nderiv, root_indices, root_out, m_settings.autorestart,
+                m_settings.return_on_error,
+                ((m_rd->use_get_dx_max) ? static_cast<cvodes_cxx::get_dx_max_fn>(
+                    std::bind(&ReactionDiffusion<Real_t>::get_dx_max, m_rd, std::placeholders::_1, std::placeholders::_2))
+                 : cvodes_cxx::get_dx_max_fn()), ew_ele);
+            auto& info = m_rd->current_info;
+            info.nfo_dbl["time_cpu"] += (std::clock() - cput0) / (double)CLOCKS_PER_SEC;
+            info.nfo_dbl["time_wall"] += std::chrono::duration<double>(
+                std::chrono::high_resolution_clock::now() - t_start).count();
+            accumulate_(integr);
+            return nreached;
+        }
+    };
+
+    // Integrates nmembers variants of rd to the same output times tout (nt values) with
+    // CVODE, members differ in y0 (y0s: nmembers*ny) and optionally in k (k_sets:
+    // nmembers*nr) and fields (fields_sets: nmembers*g_values.size()*N). yout
+    // (nmembers*nt*ny) is written up to each member's nreached. Every worker thread integrates
+    // its members with one CvodeSession (reinitialized per member).
+    template<typename Real_t>
+    std::vector<BatchResult> cvode_predefined_batch(const ReactionDiffusion<Real_t>& rd, int nmembers,
+                                                    const Real_t * const y0s, std::size_t nt,
+                                                    const Real_t * const tout, Real_t * const yout,
+                                                    const Real_t * const k_sets,
+                                                    const Real_t * const fields_sets,
+                                                    const cvodes_anyode::SolverSettings& settings,
+                                                    int nthreads=0){
+        const int ny = rd.get_ny();
+        const int nf = rd.fields.size()*rd.N;
+        std::vector<BatchResult> results(nmembers);
+        auto errors = for_each_member(
+            rd, nmembers, nthreads,
+            [&](ReactionDiffusion<Real_t>& mrd){ // one CVODE memory per thread, reinitialized per member
+                return std::unique_ptr<CvodeSession<Real_t>>(new CvodeSession<Real_t>(&mrd, settings));
+            },
+            [&](int mi, ReactionDiffusion<Real_t>& mrd, CvodeSession<Real_t>& session){
+                set_member_params(mrd, k_sets ? k_sets + mi*mrd.nr : nullptr,
+                                  fields_sets ? fields_sets + mi*nf : nullptr);
+                session.reset_info();
+                session.ncalls = 0;
+                results[mi].nreached = session.predefined(y0s + mi*ny, nt, tout, yout + mi*nt*ny);
+                results[mi].info = mrd.current_info;
+            });
+        for (int mi = 0; mi < nmembers; ++mi)
+            results[mi].error = errors[mi];
+        return results;
+    }
+
+}
@@ -0,0 +1,82 @@
+#pragma once
+
+#include <algorithm> // std::lower_bound
+#include <cstddef>
+#include <stdexcept>
+#include <vector>
+
+namespace chemreac {
+
+    // Record of the interpolating polynomials of a linear multistep integration (e.g. the
+    // Nordsieck arrays of CVODE): step n (from t[n] to t[n + 1]) is stored as the Taylor
+    // coefficients c_k = y^(k)(t[n + 1])/k!, k = 0..q[n], about the end of the step, so that
+    // y(x) = sum_k c_k (x - t[n + 1])^k for x in [t[n], t[n + 1]] (to the accuracy of the
+    // integration). Everything is in the integration variables (i.e. transformed with
+    // logt/logy), see NordsieckInterpolant in _chemreac.pyx for the back-transformation.
+    template<typename Real_t=double>
+    class NordsieckHistory {
+    public:
+        const int ny;
+        std::vector<Real_t> t;      // nsteps + 1
+        std::vector<int> q;         // nsteps
+        std::vector<long> offset;   // nsteps + 1, start of the coefficients of each step
+        std::vector<Real_t> coeffs; // sum over steps of (q + 1)*ny
+
+        NordsieckHistory(int ny) : ny(ny) {}
+
+        void start(Real_t t0){
+            t.assign(1, t0);
+            q.clear();
+            offset.assign(1, 0);
+            coeffs.clear();
+        }
+
+        std::size_t nsteps() const { return q.size(); }
+
+        // c: (order + 1)*ny Taylor coefficients about tn
+        void append(Real_t tn, int order, const Real_t * const c){
+            if (t.empty())
+                throw std::logic_error("start not called");
+            if (tn < t.back())
+                throw std::logic_error("steps need to be appended in order");
+            t.push_back(tn);
+            q.push_back(order);
+            coeffs.insert(coeffs.end(), c, c + (order + 1)*ny);
+            offset.push_back(coeffs.size());
+        }
+
+        // Index of the step covering x (at a step boundary: the step ending there)
+        std::size_t step_index(Real_t x) const {
+            if (q.empty() || x < t.front() || x > t.back())
+                throw std::out_of_range("x outside the recorded interval");
+            const auto it = std::lower_bound(t.begin() + 1, t.end() - 1, x);
+            return (it - t.begin()) - 1;
+        }
+
+        // Evaluates y (ny) & optionally dy/dx (ny, unless nullptr) at x (Horner scheme)
+        void eval(Real_t x, Real_t * const y, Real_t * const dydx=nullptr) const {
+            const std::size_t si = step_index(x);
+            const Real_t dx = x - t[si + 1];
+            const Real_t * const c = &coeffs[offset[si]];
+            const int order = q[si];
+            for (int i=0; i<ny; ++i){
+                Real_t val = c[order*ny + i];
+                Real_t der = 0;
+                for (int k=order - 1; k >= 0; --k){
+                    der = der*dx + val;
+                    val = val*dx + c[k*ny + i];
+                }
+                y[i] = val;
+                if (dydx)
+                    dydx[i] = der;
+            }
+        }
+
+        // Vectorized eval: y & dydx (unless nullptr) of size nx*ny
+        void eval(std::size_t nx, const Real_t * const x, Real_t * const y, Real_t * const dydx=nullptr) const {
+            for (std::size_t xi=0; xi<nx; ++xi)
+                eval(x[xi], y + xi*ny, (dydx) ? dydx + xi*ny : nullptr);
+        }
+    };
+
+}
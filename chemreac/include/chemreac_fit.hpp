@@ -0,0 +1,143 @@
+#pragma once
+
+#include <atomic>
+#include <cmath> // std::abs
+#include <cstddef>
+#include <exception>
+#include <memory>
+#include <stdexcept>
+#include <thread>
+#include <vector>
+#include "chemreac.hpp"
+#include "chemreac_batch.hpp"
+#include "chemreac_cvodes.hpp"
+#include "chemreac_sensitivity.hpp"
+
+namespace chemreac {
+
+    // A set of experiments (initial values, fields & output times) on one model whose
+    // parameters are estimated: rate constants (kind 0) & g_values (kind 2), see
+    // ReactionDiffusion::dfdp. Every experiment owns a copy of the model and a CvodeSession
+    // which are kept between evaluations, i.e. between the iterations of an optimizer only
+    // the parameters change (and the integrators are reinitialized rather than rebuilt).
+    // evaluate() integrates all experiments on a pool of threads, optionally together with
+    // the forward sensitivities of the parameters (ForwardSensitivity).
+    template<typename Real_t = double>
+    class ExperimentSet {
+        struct Experiment {
+            std::unique_ptr<ReactionDiffusion<Real_t>> rd;
+            std::unique_ptr<CvodeSession<Real_t>> session;
+            std::vector<Real_t> y0, tout;
+        };
+        const ReactionDiffusion<Real_t> m_proto;
+        const cvodes_anyode::SolverSettings m_settings;
+        std::vector<Experiment> m_experiments;
+    public:
+        const std::vector<int> kinds, indices;
+        int nthreads;
+        std::vector<BatchResult> results; // of the last evaluation, one per experiment
+
+        ExperimentSet(const ReactionDiffusion<Real_t>& proto, const cvodes_anyode::SolverSettings& settings,
+                      const std::vector<int>& kinds, const std::vector<int>& indices, int nthreads=0) :
+            m_proto(proto), m_settings(settings), kinds(kinds), indices(indices), nthreads(nthreads)
+        {
+            if (kinds.size() != indices.size())
+                throw std::length_error("kinds & indices need to be of equal length");
+            for (std::size_t j=0; j<kinds.size(); ++j){
+                if (kinds[j] != 0 && kinds[j] != 2)
+                    throw std::logic_error("Only rate constants & g_values can be estimated");
+                if (indices[j] < 0 || indices[j] >= ((kinds[j] == 0) ? proto.nr :
+                                                     static_cast<int>(proto.g_values.size())*proto.n))
+                    throw std::logic_error("Parameter index out of bounds");
+            }
+            if (proto.get_nroots() > 0)
+                throw std::logic_error("events are not supported in parameter estimation");
+        }
+
+        int nparams() const { return kinds.size(); }
+        std::size_t size() const { return m_experiments.size(); }
+        std::size_t get_nt(std::size_t ei) const { return m_experiments.at(ei).tout.size(); }
+
+        // Adds an experiment: y0 (ny), tout (nt, increasing) & fields (g_values.size()*N
+        // values, field type major, nullptr: those of the model). Returns its index.
+        std::size_t add(const Real_t * const y0, std::size_t nt, const Real_t * const tout,
+                        const Real_t * const fields=nullptr){
+            if (nt < 2)
+                throw std::logic_error("An experiment needs at least two output times");
+            const int ny = m_proto.get_ny();
+            Experiment experiment;
+            experiment.rd.reset(new ReactionDiffusion<Real_t>(m_proto));
+            set_member_params(*experiment.rd, static_cast<const Real_t *>(nullptr), fields);
+            experiment.session.reset(new CvodeSession<Real_t>(experiment.rd.get(), m_settings));
+            experiment.y0.assign(y0, y0 + ny);
+            experiment.tout.assign(tout, tout + nt);
+            m_experiments.push_back(std::move(experiment));
+            return m_experiments.size() - 1;
+        }
+
+        // Sets the parameters p (nparams) on all experiments and integrates them: youts[ei]
+        // (nt*ny), with souts the forward sensitivities souts[ei] (nt*ny*nparams, parameter
+        // index fastest) are computed as well. Failures are caught per experiment (see
+        // results), returns the number of failed experiments.
+        int evaluate(const Real_t * const p, Real_t * const * youts, Real_t * const * souts=nullptr){
+            const int nexp = m_experiments.size();
+            results.assign(nexp, BatchResult());
+            std::vector<Real_t> pbar(p, p + nparams());
+            for (auto& v : pbar)
+                v = std::abs(v);
+            std::atomic<int> next {0};
+            auto worker = [&](){
+                for (int ei = next++; ei < nexp; ei = next++){
+                    auto& xp = m_experiments[ei];
+                    auto& res = results[ei];
+                    try {
+                        set_params_(*xp.rd, p);
+                        if (souts){
+                            ForwardSensitivity<Real_t> fs(xp.rd.get(), kinds, indices);
+                            res.nreached = fs.predefined(m_settings, xp.y0.data(), xp.tout.size(),
+                                                         xp.tout.data(), youts[ei], souts[ei], pbar);
+                        } else {
+                            xp.session->reset_info();
+                            res.nreached = xp.session->predefined(xp.y0.data(), xp.tout.size(),
+                                                                  xp.tout.data(), youts[ei]);
+                        }
+                        res.info = xp.rd->current_info;
+                        add_counters_to_info(*xp.rd, res.info);
+                        if (res.nreached < static_cast<int>(xp.tout.size()))
+                            res.error = "not all output times were reached";
+                    } catch (const std::exception& exc) {
+                        res.error = exc.what();
+                        if (res.error.empty())
+                            res.error = "unknown error";
+                    } catch (...) {
+                        res.error = "unknown error";
+                    }
+                }
+            };
+            const int nt = batch_nthreads(nexp, nthreads);
+            std::vector<std::thread> threads;
+            for (int ti = 1; ti < nt; ++ti)
+                threads.emplace_back(worker);
+            worker();
+            for (auto& thr : threads)
+                thr.join();
+            int nfailed = 0;
+            for (const auto& res : results)
+                nfailed += !res.error.empty();
+            return nfailed;
+        }
+
+    private:
+        void set_params_(ReactionDiffusion<Real_t>& rd, const Real_t * const p) const {
+            for (int j=0; j<nparams(); ++j){
+                if (kinds[j] == 0)
+                    rd.k[indices[j]] = p[j];
+                else
+                    rd.g_values[indices[j] / rd.n][indices[j] % rd.n] = p[j];
+            }
+            rd.m_eff_k_stale = true;
+            rd.clear_memo();
+        }
+    };
+
+}
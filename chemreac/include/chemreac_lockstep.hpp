@@ -0,0 +1,416 @@
+#pragma once
+
+#include <algorithm> // std::max, std::min, std::fill
+#include <cmath> // std::abs, std::sqrt, std::pow, std::isfinite
+#include <cstddef>
+#include <limits>
+#include <stdexcept>
+#include <vector>
+#include "chemreac.hpp"
+
+namespace chemreac {
+
+    // Integrates an ensemble of homogeneous (N=1) kinetics problems sharing the reaction network
+    // of a ReactionDiffusion instance, the members differ in y0, k and fields. All members are
+    // advanced together (one step attempt per member and sweep, each with its own step size)
+    // using the L-stable Rosenbrock method RODAS3 (Sandu et al. 1997: order 3, embedded error
+    // estimate of order 2). State, Jacobians and LU factorizations are stored as structure of
+    // arrays (member index fastest) so that the loops over the members vectorize.
+    template<typename Real_t = double>
+    class LockstepKinetics {
+    public:
+        const int n; // number of species
+        const int nr; // number of reactions
+        const int nm; // number of members
+        // counters
+        long nfev {0}; // batched rhs evaluations
+        long njev {0}; // batched Jacobian evaluations
+        long nsweeps {0};
+        std::vector<long> nsteps, nrejected; // per member
+
+        LockstepKinetics(const ReactionDiffusion<Real_t>& rd, int nmembers);
+        // Rate constants (nm*nr, member major), nullptr: those of rd for all members
+        void set_k(const Real_t * const k_sets);
+        // Fields (nm*nfields, member major), nullptr: those of rd for all members
+        void set_fields(const Real_t * const fields_sets);
+        // Batched rhs and Jacobian: y[si*nm + mi], f[si*nm + mi], jac[(ri*n + ci)*nm + mi]
+        void rhs(const Real_t * const ANYODE_RESTRICT y, Real_t * const ANYODE_RESTRICT f);
+        void jac(const Real_t * const ANYODE_RESTRICT y, Real_t * const ANYODE_RESTRICT jout);
+        // Integrates to the output times tout (nt values), y0: nm*n, yout: nm*nt*n (member major).
+        // mxsteps limits the number of steps per output interval. Returns the number of output
+        // times reached per member.
+        std::vector<int> predefined(const Real_t * const y0, std::size_t nt, const Real_t * const tout,
+                                    Real_t * const yout, const std::vector<Real_t>& atol, Real_t rtol,
+                                    Real_t dx0=0, Real_t dx_max=0, long mxsteps=500);
+    private:
+        // Network (from ReactionDiffusion): active reactants (CSR, with repetition), net stoichiometry
+        // (CSR) and the sparse reaction contributions to the Jacobian
+        std::vector<int> active_ptr, active_si, net_ptr, net_si, net_coeff;
+        std::vector<int> pair_ri, pair_dsi, pair_order, pair_ptr, pair_si, pair_S;
+        std::vector<Real_t> mod_k; // modulation (bin 0) per reaction
+        std::vector<Real_t> rd_k, rd_fields; // defaults
+        std::vector<std::vector<Real_t>> g_values;
+        std::vector<int> g_value_parents;
+        std::vector<Real_t> eff_k; // ri*nm + mi
+        std::vector<Real_t> fields; // fi*nm + mi
+        // work arrays
+        std::vector<Real_t> w_r, w_y, w_ynew, w_f, w_jac, w_lu, w_K, w_h, w_hs, w_t, w_err;
+        std::vector<int> w_piv;
+        std::vector<char> w_singular;
+        void lu_factorize_();
+        void lu_solve_(Real_t * const b);
+    };
+
+    template<typename Real_t>
+    LockstepKinetics<Real_t>::LockstepKinetics(const ReactionDiffusion<Real_t>& rd, int nmembers) :
+        n(rd.n), nr(rd.nr), nm(nmembers), nsteps(nmembers), nrejected(nmembers),
+        net_ptr(rd.net_stoich_ptr), net_si(rd.net_stoich_si), net_coeff(rd.net_stoich_coeff),
+        pair_ri(rd.jac_pair_ri), pair_dsi(rd.jac_pair_dsi), pair_ptr(rd.jac_pair_ptr),
+        pair_si(rd.jac_pair_si), pair_S(rd.jac_pair_S), mod_k(rd.nr, 1), rd_k(rd.k),
+        g_values(rd.g_values), g_value_parents(rd.g_value_parents),
+        eff_k(rd.nr*nmembers), fields(rd.fields.size()*nmembers),
+        w_r(nmembers), w_y(rd.n*nmembers), w_ynew(rd.n*nmembers), w_f(rd.n*nmembers),
+        w_jac(rd.n*rd.n*nmembers), w_lu(rd.n*rd.n*nmembers), w_K(4*rd.n*nmembers), w_h(nmembers),
+        w_hs(nmembers), w_t(nmembers), w_err(nmembers), w_piv(rd.n*nmembers), w_singular(nmembers)
+    {
+        if (rd.N != 1)
+            throw std::invalid_argument("LockstepKinetics requires N == 1");
+        if (rd.logy || rd.logt)
+            throw std::invalid_argument("LockstepKinetics integrates linear concentrations (logy & logt false)");
+        if (nmembers < 1)
+            throw std::invalid_argument("nmembers < 1");
+        active_ptr.push_back(0);
+        for (int ri=0; ri<nr; ++ri){
+            active_si.insert(active_si.end(), rd.stoich_active[ri].begin(), rd.stoich_active[ri].end());
+            active_ptr.push_back(active_si.size());
+        }
+        for (unsigned pi=0; pi<pair_ri.size(); ++pi)
+            pair_order.push_back(rd.coeff_active[pair_ri[pi]*n + pair_dsi[pi]]);
+        for (unsigned i=0; i<rd.modulated_rxns.size(); ++i)
+            mod_k[rd.modulated_rxns[i]] *= rd.modulation[i][0];
+        for (const auto& fs : rd.fields)
+            rd_fields.push_back(fs[0]);
+        set_k(nullptr);
+        set_fields(nullptr);
+    }
+
+    template<typename Real_t>
+    void LockstepKinetics<Real_t>::set_k(const Real_t * const k_sets){
+        for (int ri=0; ri<nr; ++ri)
+            for (int mi=0; mi<nm; ++mi)
+                eff_k[ri*nm + mi] = (k_sets ? k_sets[mi*nr + ri] : rd_k[ri])*mod_k[ri];
+    }
+
+    template<typename Real_t>
+    void LockstepKinetics<Real_t>::set_fields(const Real_t * const fields_sets){
+        const int nf = g_values.size();
+        for (int fi=0; fi<nf; ++fi)
+            for (int mi=0; mi<nm; ++mi)
+                fields[fi*nm + mi] = fields_sets ? fields_sets[mi*nf + fi] : rd_fields[fi];
+    }
+
+    template<typename Real_t>
+    void LockstepKinetics<Real_t>::rhs(const Real_t * const ANYODE_RESTRICT y, Real_t * const ANYODE_RESTRICT f){
+        Real_t * const ANYODE_RESTRICT r = w_r.data();
+        std::fill(f, f + n*nm, 0);
+        for (int ri=0; ri<nr; ++ri){
+            if (net_ptr[ri] == net_ptr[ri+1])
+                continue;
+            for (int mi=0; mi<nm; ++mi)
+                r[mi] = eff_k[ri*nm + mi];
+            for (int i=active_ptr[ri]; i<active_ptr[ri+1]; ++i){
+                const Real_t * const ANYODE_RESTRICT yi = y + active_si[i]*nm;
+                for (int mi=0; mi<nm; ++mi)
+                    r[mi] *= yi[mi];
+            }
+            for (int i=net_ptr[ri]; i<net_ptr[ri+1]; ++i){
+                Real_t * const ANYODE_RESTRICT fi = f + net_si[i]*nm;
+                const Real_t coeff = net_coeff[i];
+                for (int mi=0; mi<nm; ++mi)
+                    fi[mi] += coeff*r[mi];
+            }
+        }
+        for (unsigned fi=0; fi<g_values.size(); ++fi){
+            const int parent = g_value_parents[fi];
+            const Real_t * const ANYODE_RESTRICT fld = fields.data() + fi*nm;
+            for (int si=0; si<n; ++si){
+                const Real_t g = g_values[fi][si];
+                if (g == 0)
+                    continue;
+                Real_t * const ANYODE_RESTRICT fs = f + si*nm;
+                if (parent == -1){
+                    for (int mi=0; mi<nm; ++mi)
+                        fs[mi] += fld[mi]*g;
+                } else {
+                    const Real_t * const ANYODE_RESTRICT yp = y + parent*nm;
+                    for (int mi=0; mi<nm; ++mi)
+                        fs[mi] += fld[mi]*g*yp[mi];
+                }
+            }
+        }
+        nfev++;
+    }
+
+    template<typename Real_t>
+    void LockstepKinetics<Real_t>::jac(const Real_t * const ANYODE_RESTRICT y, Real_t * const ANYODE_RESTRICT jout){
+        Real_t * const ANYODE_RESTRICT q = w_r.data();
+        std::fill(jout, jout + n*n*nm, 0);
+        for (unsigned pi=0; pi<pair_ri.size(); ++pi){
+            // reaction ri, derivative wrt species dsi (of order pair_order in the rate law)
+            const int ri = pair_ri[pi];
+            const int dsi = pair_dsi[pi];
+            const int order = pair_order[pi];
+            for (int mi=0; mi<nm; ++mi)
+                q[mi] = order*eff_k[ri*nm + mi];
+            for (int i=active_ptr[ri]; i<active_ptr[ri+1]; ++i){
+                if (active_si[i] == dsi)
+                    continue;
+                const Real_t * const ANYODE_RESTRICT yi = y + active_si[i]*nm;
+                for (int mi=0; mi<nm; ++mi)
+                    q[mi] *= yi[mi];
+            }
+            const Real_t * const ANYODE_RESTRICT yd = y + dsi*nm;
+            for (int o=1; o<order; ++o)
+                for (int mi=0; mi<nm; ++mi)
+                    q[mi] *= yd[mi];
+            for (int ci=pair_ptr[pi]; ci<pair_ptr[pi+1]; ++ci){
+                Real_t * const ANYODE_RESTRICT jd = jout + (pair_si[ci]*n + dsi)*nm;
+                const Real_t S = pair_S[ci];
+                for (int mi=0; mi<nm; ++mi)
+                    jd[mi] += S*q[mi];
+            }
+        }
+        for (unsigned fi=0; fi<g_values.size(); ++fi){
+            const int parent = g_value_parents[fi];
+            if (parent == -1)
+                continue;
+            const Real_t * const ANYODE_RESTRICT fld = fields.data() + fi*nm;
+            for (int si=0; si<n; ++si){
+                const Real_t g = g_values[fi][si];
+                if (g == 0)
+                    continue;
+                Real_t * const ANYODE_RESTRICT jd = jout + (si*n + parent)*nm;
+                for (int mi=0; mi<nm; ++mi)
+                    jd[mi] += fld[mi]*g;
+            }
+        }
+        njev++;
+    }
+
+    template<typename Real_t>
+    void LockstepKinetics<Real_t>::lu_factorize_(){
+        // In-place LU factorization (partial pivoting, rows swapped as in LAPACK's getrf) of the
+        // matrices in w_lu, members with a singular matrix are flagged in w_singular.
+        Real_t * const A = w_lu.data();
+        std::fill(w_singular.begin(), w_singular.end(), 0);
+        for (int k=0; k<n; ++k){
+            for (int mi=0; mi<nm; ++mi){
+                int piv = k;
+                Real_t amax = std::abs(A[(k*n + k)*nm + mi]);
+                for (int ri=k+1; ri<n; ++ri){
+                    const Real_t a = std::abs(A[(ri*n + k)*nm + mi]);
+                    if (a > amax){
+                        amax = a;
+                        piv = ri;
+                    }
+                }
+                w_piv[k*nm + mi] = piv;
+                if (piv != k)
+                    for (int ci=0; ci<n; ++ci)
+                        std::swap(A[(k*n + ci)*nm + mi], A[(piv*n + ci)*nm + mi]);
+                if (!(amax > 0) || !std::isfinite(amax)){
+                    w_singular[mi] = 1;
+                    A[(k*n + k)*nm + mi] = 1; // keeps the (rejected) step of this member finite
+                }
+            }
+            const Real_t * const ANYODE_RESTRICT akk = A + (k*n + k)*nm;
+            for (int ri=k+1; ri<n; ++ri){
+                Real_t * const ANYODE_RESTRICT l = A + (ri*n + k)*nm;
+                for (int mi=0; mi<nm; ++mi)
+                    l[mi] /= akk[mi];
+                for (int ci=k+1; ci<n; ++ci){
+                    Real_t * const ANYODE_RESTRICT a = A + (ri*n + ci)*nm;
+                    const Real_t * const ANYODE_RESTRICT u = A + (k*n + ci)*nm;
+                    for (int mi=0; mi<nm; ++mi)
+                        a[mi] -= l[mi]*u[mi];
+                }
+            }
+        }
+    }
+
+    template<typename Real_t>
+    void LockstepKinetics<Real_t>::lu_solve_(Real_t * const b){
+        const Real_t * const A = w_lu.data();
+        for (int k=0; k<n; ++k){
+            for (int mi=0; mi<nm; ++mi){
+                const int piv = w_piv[k*nm + mi];
+                if (piv != k)
+                    std::swap(b[k*nm + mi], b[piv*nm + mi]);
+            }
+        }
+        for (int ri=1; ri<n; ++ri){
+            Real_t * const ANYODE_RESTRICT br = b + ri*nm;
+            for (int ci=0; ci<ri; ++ci){
+                const Real_t * const ANYODE_RESTRICT l = A + (ri*n + ci)*nm;
+                const Real_t * const ANYODE_RESTRICT bc = b + ci*nm;
+                for (int mi=0; mi<nm; ++mi)
+                    br[mi] -= l[mi]*bc[mi];
+            }
+        }
+        for (int ri=n-1; ri>=0; --ri){
+            Real_t * const ANYODE_RESTRICT br = b + ri*nm;
+            for (int ci=ri+1; ci<n; ++ci){
+                const Real_t * const ANYODE_RESTRICT u = A + (ri*n + ci)*nm;
+                const Real_t * const ANYODE_RESTRICT bc = b + ci*nm;
+                for (int mi=0; mi<nm; ++mi)
+                    br[mi] -= u[mi]*bc[mi];
+            }
+            const Real_t * const ANYODE_RESTRICT d = A + (ri*n + ri)*nm;
+            for (int mi=0; mi<nm; ++mi)
+                br[mi] /= d[mi];
+        }
+    }
+
+    template<typename Real_t>
+    std::vector<int> LockstepKinetics<Real_t>::predefined(
+        const Real_t * const y0, std::size_t nt, const Real_t * const tout, Real_t * const yout,
+        const std::vector<Real_t>& atol, Real_t rtol, Real_t dx0, Real_t dx_max, long mxsteps)
+    {
+        if (atol.size() != 1 && atol.size() != (unsigned)n)
+            throw std::invalid_argument("atol of incorrect length");
+        if (nt < 1)
+            throw std::invalid_argument("no output times");
+        for (std::size_t i=1; i<nt; ++i)
+            if (!(tout[i] > tout[i-1]))
+                throw std::invalid_argument("tout not strictly increasing");
+        constexpr Real_t gam = 0.5; // RODAS3, the stages are written out below
+        const int ny = n*nm;
+        Real_t * const y = w_y.data();
+        Real_t * const ynew = w_ynew.data();
+        Real_t * const f = w_f.data();
+        Real_t * const K1 = w_K.data();
+        Real_t * const K2 = K1 + ny;
+        Real_t * const K3 = K2 + ny;
+        Real_t * const K4 = K3 + ny;
+        Real_t * const h = w_h.data();
+        Real_t * const hs = w_hs.data();
+        Real_t * const t = w_t.data();
+        Real_t * const err = w_err.data();
+        std::vector<int> nreached(nm, 1);
+        std::vector<long> nattempts(nm, 0); // in the current output interval
+        std::vector<char> active(nm, nt > 1), hit(nm);
+        auto scale = [&](int si, Real_t yabs) -> Real_t {
+            return (atol.size() == 1 ? atol[0] : atol[si]) + rtol*yabs;
+        };
+        for (int mi=0; mi<nm; ++mi){
+            for (int si=0; si<n; ++si){
+                y[si*nm + mi] = y0[mi*n + si];
+                yout[mi*nt*n + si] = y0[mi*n + si];
+            }
+            t[mi] = tout[0];
+            nsteps[mi] = 0;
+            nrejected[mi] = 0;
+        }
+        if (dx0 > 0) {
+            std::fill(h, h + nm, dx0);
+        } else { // see Hairer, Norsett & Wanner: Solving ODEs I, II.4
+            rhs(y, f);
+            for (int mi=0; mi<nm; ++mi){
+                Real_t d0 = 0, d1 = 0;
+                for (int si=0; si<n; ++si){
+                    const Real_t s = scale(si, std::abs(y[si*nm + mi]));
+                    d0 += (y[si*nm + mi]/s)*(y[si*nm + mi]/s);
+                    d1 += (f[si*nm + mi]/s)*(f[si*nm + mi]/s);
+                }
+                d0 = std::sqrt(d0/n);
+                d1 = std::sqrt(d1/n);
+                h[mi] = (d0 < 1e-5 || d1 < 1e-5) ? 1e-6 : 0.01*d0/d1;
+            }
+        }
+        while (std::find(active.begin(), active.end(), 1) != active.end()){
+            ++nsweeps;
+            for (int mi=0; mi<nm; ++mi){
+                hs[mi] = (dx_max > 0) ? std::min(h[mi], dx_max) : h[mi];
+                hit[mi] = active[mi] && hs[mi] >= tout[nreached[mi]] - t[mi];
+                if (hit[mi])
+                    hs[mi] = tout[nreached[mi]] - t[mi];
+            }
+            rhs(y, f);
+            jac(y, w_jac.data());
+            for (int i=0; i<n*n; ++i){
+                const bool diag = i/n == i % n;
+                for (int mi=0; mi<nm; ++mi)
+                    w_lu[i*nm + mi] = (diag ? 1/(gam*hs[mi]) : 0) - w_jac[i*nm + mi];
+            }
+            lu_factorize_();
+            // Stage 1
+            std::copy(f, f + ny, K1);
+            lu_solve_(K1);
+            // Stage 2 (no new rhs evaluation)
+            for (int si=0; si<n; ++si)
+                for (int mi=0; mi<nm; ++mi)
+                    K2[si*nm + mi] = f[si*nm + mi] + 4*K1[si*nm + mi]/hs[mi];
+            lu_solve_(K2);
+            // Stage 3
+            for (int i=0; i<ny; ++i)
+                ynew[i] = y[i] + 2*K1[i];
+            rhs(ynew, f);
+            for (int si=0; si<n; ++si)
+                for (int mi=0; mi<nm; ++mi)
+                    K3[si*nm + mi] = f[si*nm + mi] + (K1[si*nm + mi] - K2[si*nm + mi])/hs[mi];
+            lu_solve_(K3);
+            // Stage 4
+            for (int i=0; i<ny; ++i)
+                ynew[i] = y[i] + 2*K1[i] + K3[i];
+            rhs(ynew, f);
+            for (int si=0; si<n; ++si)
+                for (int mi=0; mi<nm; ++mi)
+                    K4[si*nm + mi] = f[si*nm + mi] + (K1[si*nm + mi] - K2[si*nm + mi] -
+                                                      Real_t(8)/3*K3[si*nm + mi])/hs[mi];
+            lu_solve_(K4);
+            // Solution (stiffly accurate: stage 4 plus K4) and error estimate (K4)
+            for (int i=0; i<ny; ++i)
+                ynew[i] += K4[i];
+            std::fill(err, err + nm, 0);
+            for (int si=0; si<n; ++si){
+                for (int mi=0; mi<nm; ++mi){
+                    const Real_t e = K4[si*nm + mi]/scale(si, std::max(std::abs(y[si*nm + mi]),
+                                                                       std::abs(ynew[si*nm + mi])));
+                    err[mi] += e*e;
+                }
+            }
+            for (int mi=0; mi<nm; ++mi){
+                if (!active[mi])
+                    continue;
+                const Real_t e = w_singular[mi] ? std::numeric_limits<Real_t>::infinity() : std::sqrt(err[mi]/n);
+                const Real_t fac = std::isfinite(e) ? std::min(Real_t(6), std::max(Real_t(0.2), Real_t(0.9)*(
+                    e > 0 ? std::pow(e, -Real_t(1)/3) : Real_t(6)))) : Real_t(0.2);
+                if (e <= 1) {
+                    nsteps[mi]++;
+                    for (int si=0; si<n; ++si)
+                        y[si*nm + mi] = ynew[si*nm + mi];
+                    if (hit[mi]){
+                        t[mi] = tout[nreached[mi]];
+                        for (int si=0; si<n; ++si)
+                            yout[(mi*nt + nreached[mi])*n + si] = y[si*nm + mi];
+                        nreached[mi]++;
+                        nattempts[mi] = 0;
+                        active[mi] = nreached[mi] < (int)nt;
+                        h[mi] = std::max(h[mi], hs[mi]*fac); // hs may have been shortened
+                    } else {
+                        t[mi] += hs[mi];
+                        h[mi] = hs[mi]*fac;
+                    }
+                } else {
+                    nrejected[mi]++;
+                    h[mi] = hs[mi]*std::min(Real_t(1), fac);
+                }
+                if (active[mi] && (++nattempts[mi] > mxsteps ||
+                                   h[mi] < 16*std::numeric_limits<Real_t>::epsilon()*std::abs(t[mi])))
+                    active[mi] = false; // failure: too many steps or too small step size
+            }
+        }
+        return nreached;
+    }
+
+}
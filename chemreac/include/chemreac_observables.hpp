@@ -0,0 +1,100 @@
+#pragma once
+
+#include <cmath>
+#include <cstddef>
+#include <limits>
+#include <stdexcept>
+#include <vector>
+#include "chemreac.hpp"
+
+namespace chemreac {
+
+    // Reductions of the (linear) concentrations evaluated at every point reported by an
+    // integration (output times or internal steps), so that the trajectory itself need not
+    // be stored. Observable oi is the weighted sum sum_i w_i*C[i] over (bin, species) with
+    // weights given as a dense nobs*ny array (stored sparsely), e.g. bin volumes for amounts
+    // or 0/1 masks. Per observable the running minimum & maximum (with the times they were
+    // attained) and the time integral (trapezoidal rule over the reported points) are kept,
+    // optionally also the value at every point (record).
+    template<typename Real_t=double>
+    class Observables {
+        int m_ny;
+        bool m_logy, m_logt, m_use_log2;
+        std::vector<Real_t> m_cur, m_prev;
+        Real_t m_t_prev {0};
+    public:
+        const int nobs;
+        const bool record;
+        std::vector<int> ptr, idx; // CSR: weights w[ptr[oi]:ptr[oi+1]] of y[idx[...]]
+        std::vector<Real_t> w;
+        long nrows {0};
+        Real_t x_last {0}; // integration variable of the last point
+        std::vector<Real_t> tout, values; // (record) nrows & nrows*nobs
+        std::vector<Real_t> vmin, vmax, tmin, tmax, integral;
+
+        Observables(const ReactionDiffusion<Real_t>& rd, int nobs, const Real_t * const weights,
+                    bool record=true) :
+            m_ny(rd.get_ny()), m_logy(rd.logy), m_logt(rd.logt), m_use_log2(rd.use_log2),
+            m_cur(nobs), m_prev(nobs), nobs(nobs), record(record)
+        {
+            if (nobs < 0)
+                throw std::logic_error("nobs < 0");
+            ptr.push_back(0);
+            for (int oi=0; oi<nobs; ++oi){
+                for (int i=0; i<m_ny; ++i){
+                    if (weights[oi*m_ny + i] != 0){
+                        idx.push_back(i);
+                        w.push_back(weights[oi*m_ny + i]);
+                    }
+                }
+                ptr.push_back(idx.size());
+            }
+            reset();
+        }
+
+        void reset(){
+            nrows = 0;
+            x_last = 0;
+            tout.clear();
+            values.clear();
+            vmin.assign(nobs, std::numeric_limits<Real_t>::infinity());
+            vmax.assign(nobs, -std::numeric_limits<Real_t>::infinity());
+            tmin.assign(nobs, 0);
+            tmax.assign(nobs, 0);
+            integral.assign(nobs, 0);
+        }
+
+        // x & y: integration variable and dependent variables (i.e. transformed with logt/logy)
+        void observe(Real_t x, const Real_t * const y){
+            const Real_t t = (m_logt) ? expb_(x) : x;
+            for (int oi=0; oi<nobs; ++oi){
+                Real_t val = 0;
+                for (int i=ptr[oi]; i<ptr[oi+1]; ++i)
+                    val += w[i]*((m_logy) ? expb_(y[idx[i]]) : y[idx[i]]);
+                m_cur[oi] = val;
+                if (val < vmin[oi]){
+                    vmin[oi] = val;
+                    tmin[oi] = t;
+                }
+                if (val > vmax[oi]){
+                    vmax[oi] = val;
+                    tmax[oi] = t;
+                }
+                if (nrows > 0)
+                    integral[oi] += (t - m_t_prev)*(val + m_prev[oi])/2;
+            }
+            if (record){
+                tout.push_back(t);
+                values.insert(values.end(), m_cur.begin(), m_cur.end());
+            }
+            m_prev.swap(m_cur);
+            m_t_prev = t;
+            x_last = x;
+            ++nrows;
+        }
+
+    private:
+        Real_t expb_(Real_t arg) const { return (m_use_log2) ? std::exp2(arg) : std::exp(arg); }
+    };
+
+}
@@ -0,0 +1,212 @@
+#pragma once
+
+#include <algorithm> // std::copy, std::fill
+#include <cmath> // std::sqrt, std::abs
+#include <cstddef>
+#include <stdexcept>
+#include <utility> // std::swap
+#include <vector>
+#include "chemreac.hpp"
+#include "chemreac_cvodes.hpp"
+
+namespace chemreac {
+
+    // Periodic steady state under a repeated sequence of segments of constant fields (e.g. a
+    // pulse train: dose rate on & off), found by shooting: Newton's method on
+    // G(y0) = Phi(y0) - y0 where Phi is the map over one period (integrated by session).
+    // The Newton steps solve (M - I) s = -G with GMRES, the monodromy matrix M entering only
+    // through directional derivatives (Phi(y0 + sigma*v) - Phi(y0))/sigma, i.e. one period
+    // integration per Krylov iteration. Since M has small eigenvalues for the fast (decaying)
+    // modes, few Krylov iterations are needed. Vectors are scaled by the error weights of the
+    // integration (1/(atol + rtol*|y|)), convergence: weighted RMS norm of G below tol.
+    template<typename Real_t = double>
+    class PeriodicShooting {
+        ReactionDiffusion<Real_t> * const m_rd;
+        CvodeSession<Real_t> * const m_session;
+        const int m_ny;
+        const std::size_t m_nseg;
+        const std::vector<Real_t> m_durations, m_fields;
+        std::vector<Real_t> m_w, m_phi, m_ypert, m_phipert;
+    public:
+        enum Status {CONVERGED=0, MAX_ITER=1};
+        // settings
+        Real_t tol {10}; // weighted RMS norm of Phi(y0) - y0
+        Real_t eta {1e-2}; // relative tolerance of GMRES
+        Real_t sigma {0}; // finite difference step (scaled units), 0: 1/sqrt(rtol)
+        int maxl {20}; // maximum Krylov dimension (per Newton iteration)
+        int max_iter {20};
+        int max_halvings {3}; // step halvings when the residual does not decrease
+        // results of the last call to solve
+        long niter {0}, nperiods {0}, nlinear {0};
+        std::vector<Real_t> residuals; // weighted RMS norm of G at each iterate
+
+        // durations: nseg, fields: nseg*fields.size() (values of the field types during each
+        // segment, the same in all bins)
+        PeriodicShooting(ReactionDiffusion<Real_t> * rd, CvodeSession<Real_t> * session,
+                         std::size_t nseg, const Real_t * const durations, const Real_t * const fields) :
+            m_rd(rd), m_session(session), m_ny(rd->get_ny()), m_nseg(nseg),
+            m_durations(durations, durations + nseg), m_fields(fields, fields + nseg*rd->fields.size()),
+            m_w(m_ny), m_phi(m_ny), m_ypert(m_ny), m_phipert(m_ny)
+        {
+            if (rd->logt)
+                throw std::logic_error("PeriodicShooting does not support logt");
+            if (nseg == 0)
+                throw std::logic_error("no segments");
+            for (auto dur : m_durations)
+                if (!(dur > 0))
+                    throw std::logic_error("durations need to be positive");
+        }
+
+        // Integrates y0 (ny) over one period into yout (ny), rd->fields are restored.
+        void period(const Real_t * const y0, Real_t * const yout){
+            const auto fields_ori = m_rd->fields;
+            const std::size_t nf = m_rd->fields.size();
+            std::vector<Real_t> ybuf(2*m_ny);
+            std::copy(y0, y0 + m_ny, ybuf.begin());
+            try {
+                for (std::size_t si=0; si<m_nseg; ++si){
+                    for (std::size_t fi=0; fi<nf; ++fi)
+                        std::fill(m_rd->fields[fi].begin(), m_rd->fields[fi].end(), m_fields[si*nf + fi]);
+                    m_rd->clear_memo();
+                    const Real_t tbuf[2] {0, m_durations[si]};
+                    if (m_session->predefined(ybuf.data(), 2, tbuf, ybuf.data()) != 2)
+                        throw std::runtime_error("Integration over a segment failed");
+                    std::copy(ybuf.begin() + m_ny, ybuf.end(), ybuf.begin());
+                }
+            } catch (...) {
+                m_rd->fields = fields_ori;
+                m_rd->clear_memo();
+                throw;
+            }
+            m_rd->fields = fields_ori;
+            m_rd->clear_memo();
+            std::copy(ybuf.begin(), ybuf.begin() + m_ny, yout);
+            ++nperiods;
+        }
+
+        // Iterates from y (overwritten by the last iterate).
+        Status solve(Real_t * const y){
+            const auto& settings = m_session->settings();
+            const Real_t rtol = settings.rtol;
+            const Real_t sig = (sigma == 0) ? 1/std::sqrt(rtol) : sigma;
+            niter = nperiods = nlinear = 0;
+            residuals.clear();
+            std::vector<Real_t> g(m_ny), b(m_ny), s(m_ny), ynew(m_ny), phinew(m_ny);
+            period(y, m_phi.data());
+            for (;;){
+                for (int i=0; i<m_ny; ++i){
+                    const Real_t atol = settings.atol[(settings.atol.size() == 1) ? 0 : i];
+                    m_w[i] = 1/(atol + rtol*std::abs(y[i]));
+                    g[i] = m_phi[i] - y[i];
+                }
+                const Real_t res = wrms_(g.data());
+                residuals.push_back(res);
+                if (res <= tol)
+                    return CONVERGED;
+                if (niter >= max_iter)
+                    return MAX_ITER;
+                ++niter;
+                for (int i=0; i<m_ny; ++i)
+                    b[i] = -m_w[i]*g[i];
+                // (M - I) in scaled variables: W*(M - I)*W^-1
+                auto matvec = [&](const Real_t * const v, Real_t * const out){
+                    for (int i=0; i<m_ny; ++i)
+                        m_ypert[i] = y[i] + sig*v[i]/m_w[i];
+                    period(m_ypert.data(), m_phipert.data());
+                    for (int i=0; i<m_ny; ++i)
+                        out[i] = m_w[i]*(m_phipert[i] - m_phi[i])/sig - v[i];
+                };
+                nlinear += gmres_(b.data(), s.data(), matvec);
+                // damped update: halve the step while the residual does not decrease
+                Real_t lambda = 1, res_new = 0;
+                for (int h=0; ; ++h){
+                    for (int i=0; i<m_ny; ++i)
+                        ynew[i] = y[i] + lambda*s[i]/m_w[i];
+                    period(ynew.data(), phinew.data());
+                    for (int i=0; i<m_ny; ++i)
+                        g[i] = phinew[i] - ynew[i];
+                    res_new = wrms_(g.data());
+                    if (res_new < res || h >= max_halvings)
+                        break;
+                    lambda /= 2;
+                }
+                std::copy(ynew.begin(), ynew.end(), y);
+                std::swap(m_phi, phinew);
+            }
+        }
+
+    private:
+        Real_t wrms_(const Real_t * const v) const {
+            Real_t s = 0;
+            for (int i=0; i<m_ny; ++i)
+                s += std::pow(m_w[i]*v[i], 2);
+            return std::sqrt(s/m_ny);
+        }
+
+        // GMRES (modified Gram-Schmidt, Givens rotations) for A x = b from x = 0, at most maxl
+        // iterations, stopping at |b - A x| <= eta*|b|. Returns the number of iterations.
+        template<typename MatVec>
+        int gmres_(const Real_t * const b, Real_t * const x, MatVec& matvec){
+            const int n = m_ny;
+            std::fill(x, x + n, 0);
+            Real_t beta = 0;
+            for (int i=0; i<n; ++i)
+                beta += b[i]*b[i];
+            beta = std::sqrt(beta);
+            if (beta == 0)
+                return 0;
+            const int m = std::min(maxl, n);
+            std::vector<Real_t> V((m + 1)*n), H((m + 1)*m), cs(m), sn(m), gv(m + 1), w(n);
+            for (int i=0; i<n; ++i)
+                V[i] = b[i]/beta;
+            gv[0] = beta;
+            int k = 0;
+            for (int j=0; j<m; ++j){
+                matvec(&V[j*n], w.data());
+                for (int i=0; i<=j; ++i){
+                    Real_t h = 0;
+                    for (int l=0; l<n; ++l)
+                        h += w[l]*V[i*n + l];
+                    H[i*m + j] = h;
+                    for (int l=0; l<n; ++l)
+                        w[l] -= h*V[i*n + l];
+                }
+                Real_t hn = 0;
+                for (int l=0; l<n; ++l)
+                    hn += w[l]*w[l];
+                hn = std::sqrt(hn);
+                for (int i=0; i<j; ++i){
+                    const Real_t tmp = cs[i]*H[i*m + j] + sn[i]*H[(i + 1)*m + j];
+                    H[(i + 1)*m + j] = -sn[i]*H[i*m + j] + cs[i]*H[(i + 1)*m + j];
+                    H[i*m + j] = tmp;
+                }
+                const Real_t den = std::sqrt(H[j*m + j]*H[j*m + j] + hn*hn);
+                if (den == 0)
+                    break;
+                cs[j] = H[j*m + j]/den;
+                sn[j] = hn/den;
+                H[j*m + j] = den;
+                gv[j + 1] = -sn[j]*gv[j];
+                gv[j] = cs[j]*gv[j];
+                k = j + 1;
+                if (std::abs(gv[j + 1]) <= eta*beta || hn == 0)
+                    break;
+                for (int l=0; l<n; ++l)
+                    V[(j + 1)*n + l] = w[l]/hn;
+            }
+            // back substitution (upper triangular k x k)
+            std::vector<Real_t> yk(k);
+            for (int i=k - 1; i>=0; --i){
+                Real_t acc = gv[i];
+                for (int l=i + 1; l<k; ++l)
+                    acc -= H[i*m + l]*yk[l];
+                yk[i] = acc/H[i*m + i];
+            }
+            for (int i=0; i<k; ++i)
+                for (int l=0; l<n; ++l)
+                    x[l] += yk[i]*V[i*n + l];
+            return k;
+        }
+    };
+
+}
@@ -0,0 +1,151 @@
+#pragma once
+
+#include <algorithm> // std::copy, std::fill
+#include <cmath> // std::abs
+#include <stdexcept>
+#include <vector>
+#include "chemreac.hpp"
+#include "cvodes_anyode.hpp"
+
+namespace chemreac {
+
+    // Forward sensitivities s_j = dy/dp_j integrated together with y as one system of size
+    // ny*(1 + P):
+    //   ds_j/dx = J(x, y) s_j + df/dp_j(x, y),  s_j(x0) = e_i (initial value y_i) or 0
+    // where J is the Jacobian of rd (rd->jtimes) and df/dp_j is analytic (rd->dfdp). The
+    // Newton systems of the combined system are solved by GMRES preconditioned with the
+    // factorization of I - gamma*J of rd applied to every block (the block diagonal of the
+    // Newton matrix), i.e. one factorization serves y and all sensitivities. Sensitivities
+    // are with respect to the variables integrated (logarithmic with logy, with x = log(t)
+    // with logt the values at the output times are unaffected).
+    template<typename Real_t = double>
+    class ForwardSensitivity : public AnyODE::OdeSysBase<Real_t> {
+        ReactionDiffusion<Real_t> * const m_rd;
+        const int m_ny;
+        std::vector<Real_t> m_work;
+    public:
+        enum ParamKind {K=0, D=1, G_VALUE=2, Y0=3};
+        // parameter j: kinds[j] with index indices[j] (see ReactionDiffusion::dfdp, Y0: index in y)
+        const std::vector<int> kinds, indices;
+        const int nparams;
+
+        ForwardSensitivity(ReactionDiffusion<Real_t> * rd, const std::vector<int>& kinds,
+                           const std::vector<int>& indices) :
+            m_rd(rd), m_ny(rd->get_ny()), m_work(rd->get_ny()), kinds(kinds), indices(indices),
+            nparams(kinds.size())
+        {
+            if (kinds.size() != indices.size())
+                throw std::length_error("kinds & indices need to be of equal length");
+            const int nmax[4] {rd->nr, rd->n, static_cast<int>(rd->g_values.size())*rd->n, m_ny};
+            for (int j=0; j<nparams; ++j){
+                if (kinds[j] < 0 || kinds[j] > 3)
+                    throw std::logic_error("Unknown parameter kind");
+                if (indices[j] < 0 || indices[j] >= nmax[kinds[j]])
+                    throw std::logic_error("Parameter index out of bounds");
+            }
+            this->use_get_dx_max = rd->use_get_dx_max;
+        }
+
+        int get_ny() const override { return m_ny*(1 + nparams); }
+        Real_t get_dx0(Real_t x, const Real_t * const y) override { return m_rd->get_dx0(x, y); }
+        Real_t get_dx_max(Real_t x, const Real_t * const y) override { return m_rd->get_dx_max(x, y); }
+
+        AnyODE::Status rhs(Real_t x, const Real_t * const y, Real_t * const ANYODE_RESTRICT f) override {
+            auto status = m_rd->rhs(x, y, f);
+            if (status != AnyODE::Status::success || nparams == 0)
+                return status;
+            status = m_rd->jtimes_setup(x, y, f);
+            if (status != AnyODE::Status::success)
+                return status;
+            for (int j=0; j<nparams; ++j){
+                Real_t * const fs = f + (1 + j)*m_ny;
+                status = m_rd->jtimes(y + (1 + j)*m_ny, fs, x, y, f);
+                if (status != AnyODE::Status::success)
+                    return status;
+                if (kinds[j] == Y0)
+                    continue;
+                status = m_rd->dfdp(x, y, kinds[j], indices[j], m_work.data());
+                if (status != AnyODE::Status::success)
+                    return status;
+                for (int i=0; i<m_ny; ++i)
+                    fs[i] += m_work[i];
+            }
+            this->nfev++;
+            return status;
+        }
+
+        AnyODE::Status prec_setup(Real_t x, const Real_t * const ANYODE_RESTRICT y,
+                                  const Real_t * const ANYODE_RESTRICT fy, bool jok,
+                                  bool& jac_recomputed, Real_t gamma) override {
+            const auto status = m_rd->prec_setup(x, y, fy, jok, jac_recomputed, gamma);
+            if (jac_recomputed)
+                this->njev++;
+            return status;
+        }
+
+        AnyODE::Status prec_solve_left(const Real_t x, const Real_t * const ANYODE_RESTRICT y,
+                                       const Real_t * const ANYODE_RESTRICT fy,
+                                       const Real_t * const ANYODE_RESTRICT r,
+                                       Real_t * const ANYODE_RESTRICT z, Real_t gamma, Real_t delta,
+                                       const Real_t * const ANYODE_RESTRICT ewt) override {
+            for (int j=0; j<=nparams; ++j){
+                const auto status = m_rd->prec_solve_left(
+                    x, y, fy, r + j*m_ny, z + j*m_ny, gamma, delta, (ewt) ? ewt + j*m_ny : nullptr);
+                if (status != AnyODE::Status::success)
+                    return status;
+            }
+            return AnyODE::Status::success;
+        }
+
+        // Integrates y0 (ny) from tout[0] through tout (nt values): yout (nt*ny) and
+        // sout (nt*ny*nparams, parameter index fastest). The absolute tolerance of s_j is
+        // atol/|pbar_j| (pbar: nominal parameter values, 0 is treated as 1), the linear solver
+        // is always GMRES (settings.maxl & settings.eps_lin apply). rd->current_info holds the
+        // statistics of the integration. Returns the number of output times reached.
+        int predefined(const cvodes_anyode::SolverSettings& settings, const Real_t * const y0,
+                       std::size_t nt, const Real_t * const tout, Real_t * const yout,
+                       Real_t * const sout, const std::vector<Real_t>& pbar={}){
+            if (m_rd->get_nroots() > 0)
+                throw std::logic_error("events are not supported with sensitivities");
+            if (!pbar.empty() && static_cast<int>(pbar.size()) != nparams)
+                throw std::length_error("pbar of incorrect length");
+            const int nyt = get_ny();
+            std::vector<Real_t> yq0(nyt, 0), yqout(nt*nyt), atol(nyt);
+            std::copy(y0, y0 + m_ny, yq0.begin());
+            for (int j=0; j<nparams; ++j)
+                if (kinds[j] == Y0)
+                    yq0[(1 + j)*m_ny + indices[j]] = 1;
+            for (int j=0; j<=nparams; ++j){
+                const Real_t scale = (j == 0 || pbar.empty() || pbar[j - 1] == 0) ? 1 : std::abs(pbar[j - 1]);
+                for (int i=0; i<m_ny; ++i)
+                    atol[j*m_ny + i] = settings.atol[(settings.atol.size() == 1) ? 0 : i]/scale;
+            }
+            std::vector<Real_t> constraints;
+            if (!settings.constraints.empty()){
+                constraints.assign(nyt, 0); // sensitivities are unconstrained
+                std::copy(settings.constraints.begin(), settings.constraints.end(), constraints.begin());
+            }
+            std::vector<int> root_indices;
+            std::vector<Real_t> root_out;
+            const auto lmm = cvodes_cxx::lmm_from_name(settings.method);
+            m_rd->zero_counters();
+            this->nfev = this->njev = 0;
+            const int nreached = cvodes_anyode::simple_predefined<ForwardSensitivity<Real_t>>(
+                this, atol, settings.rtol, lmm, yq0.data(), nt, tout, yqout.data(), root_indices,
+                root_out, settings.mxsteps, settings.dx0, settings.dx_min, settings.dx_max, true,
+                cvodes_cxx::IterType::Newton, cvodes_cxx::LinSol::GMRES, settings.maxl,
+                settings.eps_lin, 0, settings.autorestart, settings.return_on_error, 0, nullptr,
+                constraints, settings.msbj, settings.stab_lim_det);
+            for (int ti=0; ti<nreached; ++ti){
+                const Real_t * const row = &yqout[ti*nyt];
+                std::copy(row, row + m_ny, yout + ti*m_ny);
+                for (int j=0; j<nparams; ++j)
+                    for (int i=0; i<m_ny; ++i)
+                        sout[(ti*m_ny + i)*nparams + j] = row[(1 + j)*m_ny + i];
+            }
+            m_rd->current_info = this->current_info;
+            return nreached;
+        }
+    };
+
+}
@@ -0,0 +1,417 @@
+#pragma once
+
+#include <algorithm> // std::min, std::max
+#include <cmath> // std::sqrt, std::isfinite, std::abs
+#include <cstddef>
+#include <limits>
+#include <stdexcept>
+#include <vector>
+#include "chemreac.hpp"
+
+namespace chemreac {
+
+    // Finds a steady state (rhs(x, y) = 0) of a ReactionDiffusion instance by pseudo-transient
+    // continuation (Kelley & Keyes 1998): damped Newton steps (I/dtau - J) dC = f, where the
+    // pseudo time step dtau grows as the residual decreases (switched evolution relaxation:
+    // dtau *= max(dtau_growth, |f_old|/|f_new|)), approaching Newton's method close to the
+    // solution while keeping the iteration matrix non-singular (e.g. for conserved quantities,
+    // which every step preserves to the accuracy of the linear solve, i.e. approximately
+    // while rd chooses ILU for the diagonally dominant I - dtau*J of the first iterations). The linear systems are solved through prec_setup &
+    // prec_solve_left of rd, i.e. with the block-tridiagonal Jacobian (compressed_jac_cmaj) and
+    // its ILU/banded LU factorization. With logy the Jacobian is shifted by diag(f) so that the
+    // step is the one of the linear concentrations (scaled by C), applied as
+    // y += log(1 + dC/C). Steps giving non-finite values, (near) negative concentrations or
+    // residuals growing by more than max_growth are rejected (dtau reduced).
+    template<typename Real_t = double>
+    class SteadyStateSolver {
+        ReactionDiffusion<Real_t> * const m_rd;
+        const Real_t m_lnb; // d(ln C)/dy with logy
+        std::vector<Real_t> m_f, m_fnew, m_ynew, m_r, m_dy;
+    public:
+        enum Status {CONVERGED=0, STALLED=1, MAX_ITER=2};
+        // settings
+        Real_t ftol_rel {1e-10}, ftol_abs {0}; // converged: |f| <= ftol_rel*|f0| + ftol_abs
+        Real_t dtau0 {0}; // 0: 1e-2*max|C|/max|f0| (logy: 1e-2/max|f0|)
+        Real_t dtau_growth {2}; // minimum growth factor of dtau per accepted iteration
+        Real_t dtau_max {1e10}; // cap (keeps I/dtau - J well-posed for singular J)
+        Real_t dtau_min {0}; // stalled below this (0: 1e-12*dtau0)
+        Real_t max_growth {10};
+        Real_t atol {1e-12}; // linear y: tolerated negative concentrations
+        long max_iter {200};
+        // results of the last call to solve (|f|: 2-norm of the rhs), nfev & njev: increments
+        // of the counters of rd
+        long niter {0}, nrejected {0}, nfev {0}, njev {0};
+        std::vector<Real_t> residuals, dtaus; // |f| after each accepted iteration (first: |f0|), dtau used
+
+        SteadyStateSolver(ReactionDiffusion<Real_t> * rd) :
+            m_rd(rd), m_lnb((rd->use_log2) ? std::log(Real_t(2)) : 1), m_f(rd->get_ny()),
+            m_fnew(rd->get_ny()), m_ynew(rd->get_ny()), m_r(rd->get_ny()), m_dy(rd->get_ny()) {}
+
+        // Iterates from y (overwritten by the last accepted iterate), x: integration variable
+        // at which time dependent parameters (schedules, logt) are evaluated.
+        Status solve(Real_t x, Real_t * const y){
+            const long nfev0 = m_rd->nfev, njev0 = m_rd->njev;
+            niter = nrejected = 0;
+            residuals.clear();
+            dtaus.clear();
+            const Status status = iterate_(x, y);
+            nfev = m_rd->nfev - nfev0;
+            njev = m_rd->njev - njev0;
+            return status;
+        }
+
+        // prec_setup of rd (for the solves (I - gamma*J) z = r by prec_solve_left), with logy
+        // the Jacobian is shifted so that z is the relative step dC/C (over ln(2) with use_log2).
+        // Returns whether the Jacobian was recomputed.
+        bool setup_jacobian(Real_t x, const Real_t * const y, const Real_t * const f, bool jok, Real_t gamma){
+            bool jac_recomputed;
+            if (m_rd->prec_setup(x, y, f, jok, jac_recomputed, gamma) != AnyODE::Status::success)
+                throw std::runtime_error("Jacobian evaluation failed");
+            if (m_rd->logy && jac_recomputed){
+                // J_logy = diag(1/C) J diag(C) - diag(f_logy) (times ln(2) with use_log2)
+                for (int i=0; i<m_rd->get_ny(); ++i)
+                    m_r[i] = m_lnb*f[i];
+                m_rd->prec_add_to_diag(m_r.data());
+            }
+            return jac_recomputed;
+        }
+
+        // ynew = y + dy (logy: y + log(1 + dC/C)), false if the step is invalid (non-finite or
+        // negative concentrations below -atol)
+        bool apply_step(const Real_t * const y, const Real_t * const dy, Real_t * const ynew) const {
+            bool valid = true;
+            for (int i=0; i<m_rd->get_ny(); ++i){
+                if (m_rd->logy){
+                    const Real_t rel = m_lnb*dy[i]; // dC/C
+                    ynew[i] = y[i] + std::log1p(std::max(rel, Real_t(-1)))/m_lnb;
+                } else {
+                    ynew[i] = y[i] + dy[i];
+                    if (ynew[i] < -atol)
+                        valid = false;
+                }
+                if (!std::isfinite(ynew[i]))
+                    valid = false;
+            }
+            return valid;
+        }
+
+    private:
+        Status iterate_(Real_t x, Real_t * const y){
+            const int ny = m_rd->get_ny();
+            if (m_rd->rhs(x, y, m_f.data()) != AnyODE::Status::success)
+                throw std::runtime_error("rhs failed for the initial guess");
+            Real_t fnorm = norm_(m_f.data());
+            residuals.push_back(fnorm);
+            const Real_t ftol = ftol_rel*fnorm + ftol_abs;
+            if (fnorm <= ftol)
+                return CONVERGED;
+            Real_t dtau = dtau0;
+            if (dtau == 0){
+                // relative change of at most ~1% (logy: of any concentration)
+                Real_t ymax = (m_rd->logy) ? 1/m_lnb : 0, fmax = 0;
+                for (int i=0; i<ny; ++i){
+                    if (!m_rd->logy)
+                        ymax = std::max(ymax, std::abs(y[i]));
+                    fmax = std::max(fmax, std::abs(m_f[i]));
+                }
+                dtau = 1e-2*std::max(ymax, Real_t(1e-8))/fmax;
+            }
+            const Real_t dtau_stall = (dtau_min == 0) ? 1e-12*dtau : dtau_min;
+            bool jok = false;
+            for (niter=0; niter < max_iter;){
+                dtau = std::min(dtau, dtau_max);
+                setup_jacobian(x, y, m_f.data(), jok, dtau);
+                for (int i=0; i<ny; ++i)
+                    m_r[i] = dtau*m_f[i];
+                // (I - dtau*J) dy = dtau*f
+                const bool solved = m_rd->prec_solve_left(x, y, m_f.data(), m_r.data(), m_dy.data(), dtau, 0, nullptr)
+                    == AnyODE::Status::success;
+                bool accept = solved && apply_step(y, m_dy.data(), m_ynew.data());
+                Real_t fnorm_new = 0;
+                if (accept){
+                    accept = m_rd->rhs(x, m_ynew.data(), m_fnew.data()) == AnyODE::Status::success;
+                    fnorm_new = norm_(m_fnew.data());
+                    accept = accept && std::isfinite(fnorm_new) && fnorm_new <= max_growth*fnorm;
+                }
+                if (!accept){
+                    ++nrejected;
+                    dtau *= 0.25;
+                    jok = true; // same y: only the factorization of I - dtau*J is redone
+                    if (dtau < dtau_stall)
+                        return STALLED;
+                    continue;
+                }
+                ++niter;
+                std::copy(m_ynew.begin(), m_ynew.end(), y);
+                std::swap(m_f, m_fnew);
+                dtaus.push_back(dtau);
+                residuals.push_back(fnorm_new);
+                if (fnorm_new <= ftol)
+                    return CONVERGED;
+                dtau *= std::min(Real_t(1e3), std::max(dtau_growth, fnorm/fnorm_new));
+                fnorm = fnorm_new;
+                jok = false;
+            }
+            return MAX_ITER;
+        }
+
+        Real_t norm_(const Real_t * const f) const {
+            Real_t s = 0;
+            for (int i=0; i<m_rd->get_ny(); ++i)
+                s += f[i]*f[i];
+            return std::sqrt(s);
+        }
+    };
+
+    // Continuation of steady states in one parameter: a rate constant (k[index]) or a field
+    // (fields[index], the same value in all bins, e.g. density times dose rate). Each point is
+    // predicted from the previous one along the tangent (dy/dp = -J^-1 dF/dp) and corrected by
+    // Newton iterations on F(y, p) = 0 bordered with either p = const (natural parameter) or
+    // the pseudo-arclength condition (which follows the branch around turning points).
+    // Distances are measured in scaled units: p over |p_end - p0| and y as concentrations over
+    // their maximum on the branch so far (logy: relative changes), the arclength step ds adapts to the number
+    // of corrector iterations (towards nopt). The linear solves are those of
+    // SteadyStateSolver (I/gamma - J with a large gamma: conserved quantities are preserved),
+    // dF/dp is exact by finite difference since rhs is linear in every k and field.
+    template<typename Real_t = double>
+    class SteadyStateContinuation {
+        ReactionDiffusion<Real_t> * const m_rd;
+        const int m_kind, m_index;
+        const int m_ny;
+        std::vector<Real_t> m_f, m_fp, m_r, m_z1, m_z2, m_y, m_ynew, m_dy, m_ty, m_du;
+        Real_t m_wy {1}, m_ps {1}, m_tq {1};
+    public:
+        enum ParamKind {K=0, FIELD=1};
+        enum Status {REACHED_END=0, STALLED=1, MAX_POINTS=2, LEFT_RANGE=3, NO_START=4};
+        SteadyStateSolver<Real_t> solver; // converges the starting point
+        // settings
+        bool arclength {true};
+        Real_t ds0 {1e-2}, ds_min {1e-8}, ds_max {0.1}; // scaled units (see above)
+        Real_t xtol {1e-9}; // corrector converged when the scaled Newton step (RMS) is below xtol
+        Real_t gamma {1e10};
+        int nopt {4}, max_corr_iter {10};
+        long max_points {1000};
+        // results of the last call to run: the branch (npoints & npoints*ny), corrector
+        // iterations per point, turning points (i: dp/ds changes sign between point i-1 and i)
+        std::vector<Real_t> params, ys;
+        std::vector<int> niters, folds;
+        long nrejected {0}, nfev {0}, njev {0};
+
+        SteadyStateContinuation(ReactionDiffusion<Real_t> * rd, int kind, int index) :
+            m_rd(rd), m_kind(kind), m_index(index), m_ny(rd->get_ny()), m_f(m_ny), m_fp(m_ny),
+            m_r(m_ny), m_z1(m_ny), m_z2(m_ny), m_y(m_ny), m_ynew(m_ny), m_dy(m_ny), m_ty(m_ny),
+            m_du(m_ny), solver(rd)
+        {
+            if (kind == K){
+                if (index < 0 || index >= rd->nr)
+                    throw std::out_of_range("index of k out of range");
+            } else if (kind == FIELD){
+                if (index < 0 || index >= static_cast<int>(rd->fields.size()))
+                    throw std::out_of_range("index of fields out of range");
+            } else
+                throw std::logic_error("Unknown parameter kind");
+        }
+
+        Real_t get_param() const {
+            return (m_kind == K) ? m_rd->k[m_index] : m_rd->fields[m_index][0];
+        }
+
+        void set_param(Real_t p){
+            if (m_kind == K){
+                m_rd->k[m_index] = p;
+                m_rd->m_eff_k_stale = true;
+            } else
+                std::fill(m_rd->fields[m_index].begin(), m_rd->fields[m_index].end(), p);
+            m_rd->clear_memo();
+        }
+
+        // Follows the branch from the steady state near y0 at p0 towards p_end (x: see
+        // SteadyStateSolver::solve), the parameter of rd is restored afterwards.
+        Status run(Real_t x, const Real_t * const y0, Real_t p0, Real_t p_end){
+            const long nfev0 = m_rd->nfev, njev0 = m_rd->njev;
+            params.clear();
+            ys.clear();
+            niters.clear();
+            folds.clear();
+            nrejected = 0;
+            const Real_t p_ori = get_param();
+            const std::vector<Real_t> fields_ori = (m_kind == FIELD) ? m_rd->fields[m_index] : std::vector<Real_t>();
+            Status status;
+            try {
+                status = trace_(x, y0, p0, p_end);
+            } catch (...) {
+                restore_(p_ori, fields_ori);
+                throw;
+            }
+            restore_(p_ori, fields_ori);
+            nfev = m_rd->nfev - nfev0;
+            njev = m_rd->njev - njev0;
+            return status;
+        }
+
+    private:
+        void restore_(Real_t p_ori, const std::vector<Real_t>& fields_ori){
+            if (m_kind == K)
+                set_param(p_ori);
+            else {
+                m_rd->fields[m_index] = fields_ori;
+                m_rd->clear_memo();
+            }
+        }
+
+        void accept_(Real_t p, int niter){
+            if (!m_rd->logy){ // scale: largest concentration on the branch so far
+                Real_t ymax = (params.empty()) ? 0 : 1/m_wy;
+                for (int i=0; i<m_ny; ++i)
+                    ymax = std::max(ymax, std::abs(m_y[i]));
+                m_wy = 1/std::max(ymax, std::numeric_limits<Real_t>::min());
+            }
+            params.push_back(p);
+            ys.insert(ys.end(), m_y.begin(), m_y.end());
+            niters.push_back(niter);
+        }
+
+        // Linear solves at (y, p): m_z1 = -J^-1 F, m_z2 = -J^-1 dF/dp (in steps of
+        // SteadyStateSolver::apply_step)
+        bool linearize_(Real_t x, const Real_t * const y, Real_t p){
+            set_param(p);
+            if (m_rd->rhs(x, y, m_f.data()) != AnyODE::Status::success)
+                return false;
+            // dF/dp, rhs being linear in p
+            const Real_t h = (p != 0) ? std::abs(p) : 1;
+            set_param(p + h);
+            const bool ok = m_rd->rhs(x, y, m_fp.data()) == AnyODE::Status::success;
+            set_param(p);
+            if (!ok)
+                return false;
+            for (int i=0; i<m_ny; ++i)
+                m_fp[i] = (m_fp[i] - m_f[i])/h;
+            solver.setup_jacobian(x, y, m_f.data(), false, gamma);
+            for (int i=0; i<m_ny; ++i)
+                m_r[i] = gamma*m_f[i];
+            if (m_rd->prec_solve_left(x, y, m_f.data(), m_r.data(), m_z1.data(), gamma, 0, nullptr) != AnyODE::Status::success)
+                return false;
+            for (int i=0; i<m_ny; ++i)
+                m_r[i] = gamma*m_fp[i];
+            return m_rd->prec_solve_left(x, y, m_f.data(), m_r.data(), m_z2.data(), gamma, 0, nullptr)
+                == AnyODE::Status::success;
+        }
+
+        // Unit tangent (m_ty, m_tq) in scaled units from m_z2, oriented along (ty_prev, tq_prev)
+        void tangent_(){
+            Real_t nrm = 1;
+            for (int i=0; i<m_ny; ++i)
+                nrm += std::pow(m_z2[i]*m_wy*m_ps, 2)/m_ny;
+            nrm = std::sqrt(nrm);
+            Real_t dot = m_tq/nrm;
+            for (int i=0; i<m_ny; ++i)
+                dot += m_ty[i]*m_z2[i]*m_wy*m_ps/nrm/m_ny;
+            const Real_t sgn = (dot < 0) ? -1 : 1;
+            for (int i=0; i<m_ny; ++i)
+                m_ty[i] = sgn*m_z2[i]*m_wy*m_ps/nrm;
+            m_tq = sgn/nrm;
+        }
+
+        Status trace_(Real_t x, const Real_t * const y0, Real_t p0, Real_t p_end){
+            const Real_t dir = (p_end < p0) ? -1 : 1;
+            std::copy(y0, y0 + m_ny, m_y.begin());
+            set_param(p0);
+            if (solver.solve(x, m_y.data()) != SteadyStateSolver<Real_t>::CONVERGED)
+                return NO_START;
+            m_ps = std::abs(p_end - p0);
+            if (m_ps == 0)
+                m_ps = (p0 != 0) ? std::abs(p0) : 1;
+            m_wy = (m_rd->use_log2) ? std::log(Real_t(2)) : 1;
+            accept_(p0, solver.niter);
+            if (p0 == p_end)
+                return REACHED_END;
+            if (!linearize_(x, m_y.data(), p0))
+                return STALLED;
+            std::fill(m_ty.begin(), m_ty.end(), 0);
+            m_tq = dir;
+            tangent_();
+            Real_t p = p0, ds = ds0;
+            while (static_cast<long>(params.size()) < max_points){
+                // predictor
+                bool last = false;
+                Real_t dp = (arclength) ? ds*m_tq*m_ps : dir*ds*m_ps;
+                if ((p + dp - p_end)*dir >= 0 && dp*dir > 0){
+                    dp = p_end - p;
+                    last = true;
+                }
+                const bool natural = last || !arclength;
+                for (int i=0; i<m_ny; ++i)
+                    m_dy[i] = (natural) ? m_z2[i]*dp : ds*m_ty[i]/m_wy;
+                // corrector
+                Real_t pc = p + dp, dq_acc = dp/m_ps;
+                bool converged = apply_step(m_y.data(), m_dy.data(), m_ynew.data());
+                for (int i=0; i<m_ny; ++i)
+                    m_du[i] = m_dy[i]*m_wy;
+                int it = 0;
+                if (converged){
+                    converged = false;
+                    for (it=1; it<=max_corr_iter; ++it){
+                        if (!linearize_(x, m_ynew.data(), pc))
+                            break;
+                        Real_t dq;
+                        if (natural)
+                            dq = 0;
+                        else {
+                            Real_t res = m_tq*dq_acc - ds, ta = 0, tb = m_tq;
+                            for (int i=0; i<m_ny; ++i){
+                                res += m_ty[i]*m_du[i]/m_ny;
+                                ta += m_ty[i]*m_z1[i]*m_wy/m_ny;
+                                tb += m_ty[i]*m_z2[i]*m_wy*m_ps/m_ny;
+                            }
+                            dq = -(res + ta)/tb;
+                        }
+                        Real_t sq = 0;
+                        for (int i=0; i<m_ny; ++i){
+                            m_dy[i] = m_z1[i] + m_z2[i]*dq*m_ps;
+                            m_du[i] += m_dy[i]*m_wy;
+                            sq += std::pow(m_dy[i]*m_wy, 2);
+                        }
+                        pc += dq*m_ps;
+                        dq_acc += dq;
+                        std::copy(m_ynew.begin(), m_ynew.end(), m_r.begin());
+                        if (!apply_step(m_r.data(), m_dy.data(), m_ynew.data()))
+                            break;
+                        if (std::sqrt(sq/m_ny) <= xtol && std::abs(dq) <= xtol){
+                            converged = true;
+                            break;
+                        }
+                    }
+                }
+                if (!converged){
+                    ++nrejected;
+                    ds *= 0.5;
+                    if (ds < ds_min)
+                        return STALLED;
+                    if (!linearize_(x, m_y.data(), p)) // restores m_z2 at the last point
+                        return STALLED;
+                    continue;
+                }
+                p = pc;
+                std::copy(m_ynew.begin(), m_ynew.end(), m_y.begin());
+                accept_(p, it);
+                if (last)
+                    return REACHED_END;
+                if ((p - p0)*dir < 0)
+                    return LEFT_RANGE;
+                if (!linearize_(x, m_y.data(), p))
+                    return STALLED;
+                const Real_t tq_prev = m_tq;
+                tangent_();
+                if (m_tq*tq_prev < 0)
+                    folds.push_back(params.size() - 1);
+                ds = std::min(ds_max, ds*std::min(Real_t(2), std::max(Real_t(0.5), Real_t(nopt)/it)));
+            }
+            return MAX_POINTS;
+        }
+
+        bool apply_step(const Real_t * const y, const Real_t * const dy, Real_t * const ynew) const {
+            return solver.apply_step(y, dy, ynew);
+        }
+    };
+
+}
@@ -45,9 +45,17 @@ def integrate_cvode(rd, y0, tout, dense_output=None, **kwargs):
 
     kwargs:
       method: linear multistep method: 'bdf' or 'adams'
+      out: array written to by the integrator (see
+        :func:`chemreac._chemreac.cvode_predefined`), e.g. an ``np.memmap``
+      interpolant: bool, record the interpolating polynomial of every step (requires
+        dense_output), returned as ``info['interpolant']`` (a
+        :class:`chemreac._chemreac.NordsieckInterpolant`)
+      sensitivities: iterable of parameters (see
+        :func:`chemreac._chemreac.cvode_predefined_sensitivity`), the forward
+        sensitivities are returned as ``info['sens']``
 
     """
-    from ._chemreac import cvode_predefined, cvode_adaptive
+    from ._chemreac import cvode_predefined, cvode_adaptive, cvode_predefined_sensitivity
 
     # Handle kwargs
     kwargs['atol'] = np.asarray(kwargs.pop('atol', DEFAULTS['atol']))
@@ -55,25 +63,46 @@ def integrate_cvode(rd, y0, tout, dense_output=None, **kwargs):
         kwargs['atol'] = kwargs['atol'].reshape((1,))
     kwargs['rtol'] = kwargs.pop('rtol', DEFAULTS['rtol'])
     kwargs['method'] = kwargs.pop('method', 'bdf')
+    sensitivities = kwargs.pop('sensitivities', None)
     if dense_output is None:
-        dense_output = (len(tout) == 2)
+        dense_output = (len(tout) == 2) and sensitivities is None
+    out = kwargs.pop('out', None)
+    if out is not None and dense_output:
+        raise ValueError("out is not supported with dense_output")
+    interpolant = kwargs.pop('interpolant', False)
+    if interpolant and not dense_output:
+        raise ValueError("interpolant requires dense_output")
+    if sensitivities is not None and (dense_output or out is not None):
+        raise ValueError("sensitivities are not supported with dense_output or out")
 
     # Run the integration
     rd.zero_counters()
     time_wall = time.time()
     time_cpu = time.process_time()
     try:
-        if dense_output:
+        if interpolant:
+            if not len(tout) == 2:
+                raise ValueError("dense_output implies tout == (t0, tend)")
+            tout, yout, info = _cvode_adaptive_interpolant(
+                rd, np.asarray(y0).flatten(), tout[0], tout[-1],
+                kwargs.pop('atol'), kwargs.pop('rtol'), kwargs.pop('method'),
+                **kwargs)
+        elif dense_output:
             if not len(tout) == 2:
                 raise ValueError("dense_output implies tout == (t0, tend)")
             tout, yout, info = cvode_adaptive(
                 rd, np.asarray(y0).flatten(), tout[0], tout[-1],
                 kwargs.pop('atol'), kwargs.pop('rtol'), kwargs.pop('method'),
                 **kwargs)
+        elif sensitivities is not None:
+            yout, sens, info = cvode_predefined_sensitivity(
+                rd, np.asarray(y0, dtype=np.float64).flatten(),
+                np.asarray(tout, dtype=np.float64).flatten(), list(sensitivities), **kwargs)
+            info['sens'] = sens
         else:
             yout, info = cvode_predefined(rd, np.asarray(y0).flatten(),
                                           np.asarray(tout).flatten(),
-                                          **kwargs)
+                                          out=out, **kwargs)
     except RuntimeError:
         yout = np.empty((len(tout), rd.N, rd.n), order='C')/0  # NaN
         info = {}
@@ -96,12 +125,214 @@ def integrate_cvode(rd, y0, tout, dense_output=None, **kwargs):
         kwargs['nprec_setup'] = rd.nprec_setup
         kwargs['nprec_solve'] = rd.nprec_solve
         kwargs['njacvec_dot'] = rd.njacvec_dot
+        kwargs['njacvec_setup'] = rd.njacvec_setup
+        kwargs['njacvec_dot_fd'] = rd.njacvec_dot_fd
         kwargs['nprec_solve_ilu'] = rd.nprec_solve_ilu
         kwargs['nprec_solve_lu'] = rd.nprec_solve_lu
+        kwargs['nprec_cache_hit'] = rd.nprec_cache_hit
+        kwargs['nprec_cache_miss'] = rd.nprec_cache_miss
     kwargs.update(info)
     return yout, tout, kwargs
 
 
+def _cvode_adaptive_interpolant(rd, y0, t0, tend, atol, rtol, method, **kwargs):
+    # as cvode_adaptive but also records the steps' polynomials (NordsieckInterpolant)
+    from ._chemreac import CvodeSession, NordsieckInterpolant
+    session = CvodeSession(rd, atol, rtol, method, **kwargs)
+    interp = NordsieckInterpolant(rd.N, rd.n)
+    chunks = []
+    info = session.stream(y0, np.array([t0, tend], dtype=np.float64),
+                          lambda t, y: chunks.append((t.copy(), y.copy())),
+                          adaptive=True, history=interp)
+    info['interpolant'] = interp
+    return (np.concatenate([t for t, _ in chunks]),
+            np.concatenate([y for _, y in chunks]), info)
+
+
+def integrate_cvode_stream(rd, y0, tout, sink, chunk_size=1024, dense_output=None, **kwargs):
+    """
+    As :func:`integrate_cvode` but hands the output to ``sink`` in chunks of at most
+    ``chunk_size`` rows instead of returning it, so that memory use does not grow with
+    the length of the trajectory (see :meth:`chemreac._chemreac.CvodeSession.stream`).
+
+    Parameters
+    ----------
+    rd : ReactionDiffusion
+    y0 : array_like
+    tout : array_like
+    sink : callable
+        ``sink(t, y)``, e.g. an instance of :class:`ChunkWriter`.
+    chunk_size : int
+    dense_output : bool
+        Report every internal step between ``tout[0]`` and ``tout[-1]`` (default:
+        ``len(tout) == 2``).
+    \\*\\*kwargs :
+        Solver settings as for :func:`integrate_cvode`.
+
+    Returns
+    -------
+    info : dict
+
+    """
+    from ._chemreac import CvodeSession
+    tout = np.asarray(tout, dtype=np.float64).flatten()
+    if dense_output is None:
+        dense_output = (len(tout) == 2)
+    atol = np.asarray(kwargs.pop('atol', DEFAULTS['atol'])).reshape(-1)
+    rtol = kwargs.pop('rtol', DEFAULTS['rtol'])
+    method = kwargs.pop('method', 'bdf')
+    session = CvodeSession(rd, atol, rtol, method, **kwargs)
+    info = session.stream(np.asarray(y0, dtype=np.float64).flatten(), tout, sink,
+                          chunk_size=chunk_size, adaptive=dense_output)
+    info['integrator'] = ['cvode']
+    return info
+
+
+def observable_weights(rd, species=None, bins=None, volume=False):
+    """
+    Weights of one observable (see :func:`integrate_cvode_observables`).
+
+    Parameters
+    ----------
+    rd : ReactionDiffusion
+    species : iterable of int, optional
+        Indices of the species included (default: all).
+    bins : iterable of int or boolean array of length ``rd.N``, optional
+        Bins included (default: all).
+    volume : bool
+        Weight by the bin volumes (see ``rd.bin_volumes``), i.e. the observable
+        is the amount (rather than the sum of the concentrations).
+
+    Returns
+    -------
+    Array of shape ``(rd.N, rd.n)``.
+
+    """
+    w = np.zeros((rd.N, rd.n))
+    bin_mask = np.zeros(rd.N, dtype=bool)
+    bin_mask[slice(None) if bins is None else np.asarray(bins)] = True
+    spec_mask = np.zeros(rd.n, dtype=bool)
+    spec_mask[slice(None) if species is None else np.asarray(species, dtype=int)] = True
+    w[np.ix_(bin_mask, spec_mask)] = 1
+    if volume:
+        w *= rd.bin_volumes()[:, None]
+    return w
+
+
+def integrate_cvode_observables(rd, y0, tout, observables, dense_output=None, record=True,
+                                **kwargs):
+    """
+    Integrates with CVODE evaluating observables natively at every output time (or, with
+    ``dense_output``, every internal step) instead of returning the trajectory (see
+    :meth:`chemreac._chemreac.CvodeSession.observe`).
+
+    Parameters
+    ----------
+    rd : ReactionDiffusion
+    y0 : array_like
+    tout : array_like
+    observables : dict
+        Mapping names to weights of shape ``(rd.N, rd.n)`` (see
+        :func:`observable_weights`), the observable being ``sum(weights*C)``.
+    dense_output : bool
+        Evaluate at every internal step between ``tout[0]`` and ``tout[-1]`` (default:
+        ``len(tout) == 2``).
+    record : bool
+        Keep the values at every point (otherwise only the running reductions).
+    \\*\\*kwargs :
+        Solver settings as for :func:`integrate_cvode`.
+
+    Returns
+    -------
+    result : dict
+        Mapping names to dicts with keys ``'min'``, ``'max'``, ``'t_min'``, ``'t_max'``,
+        ``'integral'`` (over time) and with ``record``: ``'values'``. With ``record``
+        the times are stored under the key ``'tout'``.
+    info : dict
+
+    Examples
+    --------
+    >>> obs = {'total_A': observable_weights(rd, [0], volume=True)}  # doctest: +SKIP
+    >>> res, info = integrate_cvode_observables(rd, y0, tout, obs)  # doctest: +SKIP
+    >>> res['total_A']['max']  # doctest: +SKIP
+
+    """
+    from ._chemreac import CvodeSession
+    tout = np.asarray(tout, dtype=np.float64).flatten()
+    if dense_output is None:
+        dense_output = (len(tout) == 2)
+    names = list(observables)
+    if record and 'tout' in names:
+        raise ValueError("'tout' is reserved for the times")
+    weights = np.array([np.asarray(observables[k], dtype=np.float64).reshape((rd.N, rd.n))
+                        for k in names])
+    atol = np.asarray(kwargs.pop('atol', DEFAULTS['atol'])).reshape(-1)
+    rtol = kwargs.pop('rtol', DEFAULTS['rtol'])
+    method = kwargs.pop('method', 'bdf')
+    session = CvodeSession(rd, atol, rtol, method, **kwargs)
+    obs, info = session.observe(np.asarray(y0, dtype=np.float64).flatten(), tout, weights,
+                                adaptive=dense_output, record=record)
+    info['integrator'] = ['cvode']
+    result = {}
+    for i, name in enumerate(names):
+        result[name] = {k: obs[k][i] for k in ('min', 'max', 't_min', 't_max', 'integral')}
+        if record:
+            result[name]['values'] = obs['values'][:, i]
+    if record:
+        result['tout'] = obs['tout']
+    return result, info
+
+
+class ChunkWriter(object):
+    """
+    Sink for :func:`integrate_cvode_stream` appending the chunks to a file.
+
+    Every chunk is stored as two consecutive ``.npy`` records (``t`` and ``y``), see
+    :func:`load_chunks`.
+
+    Examples
+    --------
+    >>> with ChunkWriter('traj.npys') as writer:  # doctest: +SKIP
+    ...     integrate_cvode_stream(rd, y0, tout, writer)
+    >>> t, y = load_chunks('traj.npys')  # doctest: +SKIP
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.nrows = 0
+        self._fh = open(path, 'wb')
+
+    def __call__(self, t, y):
+        np.save(self._fh, t)
+        np.save(self._fh, y)
+        self.nrows += len(t)
+
+    def close(self):
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def iter_chunks(path):
+    """ Iterates over the (t, y) chunks in a file written by :class:`ChunkWriter` """
+    with open(path, 'rb') as fh:
+        size = os.fstat(fh.fileno()).st_size
+        while fh.tell() < size:
+            t = np.load(fh)
+            yield t, np.load(fh)
+
+
+def load_chunks(path):
+    """ Returns (t, y) concatenated from a file written by :class:`ChunkWriter` """
+    ts, ys = zip(*iter_chunks(path))
+    return np.concatenate(ts), np.concatenate(ys)
+
+
 def _integrate_rk4(rd, y0, tout, **kwargs):
     """
     For demonstration purposes only, fixed step size
@@ -351,6 +582,79 @@ def _dedim(arg, key, unit_registry):
     return to_unitless(arg, get_derived_unit(unit_registry, key))
 
 
+def _integration_variables(rd, C0, tout, C0_is_log=False, tiny=None):
+    # -> y0 (dependent variables of rd), tout (unitless) & x (independent variable of rd),
+    # transformed as in Integration (but without sigm_damp and shifting tout[0] == 0 with logt)
+    if rd.unit_registry is not None:
+        C0 = _dedim(C0, 'concentration', rd.unit_registry)
+        tout = _dedim(tout, 'time', rd.unit_registry)
+    C0 = np.asarray(C0, dtype=np.float64).flatten()
+    if C0.size != rd.N*rd.n:
+        raise ValueError("C0 of incorrect size")
+    tout = np.asarray(tout, dtype=np.float64)
+    if rd.logy:
+        y0 = C0 if C0_is_log else rd.logb(C0 + (tiny or np.finfo(np.float64).tiny))
+    else:
+        y0 = rd.expb(C0) if C0_is_log else C0
+    if rd.logt:
+        if np.any(tout <= 0):
+            raise ValueError("tout needs to be positive with logt")
+        x = rd.logb(tout)
+    else:
+        x = tout
+    return y0, tout, x
+
+
+class DenseOutput(object):
+    """
+    Continuous solution (concentrations) between ``tout[0]`` and ``tout[-1]`` of an
+    integration, see :meth:`Integration.interpolate`.
+
+    Wraps a :class:`chemreac._chemreac.NordsieckInterpolant` (in the integration
+    variables), the back-transformation (``logt``, ``logy``) is applied only to the
+    points evaluated.
+
+    Parameters
+    ----------
+    interpolant : NordsieckInterpolant
+    rd : ReactionDiffusion
+    t0 : float
+        Offset of time used for ``logt`` (see ``info['t0_set']`` of :class:`Integration`).
+
+    """
+
+    def __init__(self, interpolant, rd, t0=0):
+        self.interpolant = interpolant
+        self.logt, self.logy = rd.logt, rd.logy
+        self.logb, self.expb = rd.logb, rd.expb
+        self.ln_b = np.log(2) if rd.use_log2 else 1
+        self.t0 = t0
+
+    def _x(self, t):
+        t = np.asarray(t, dtype=np.float64)
+        x = self.logb(t + self.t0) if self.logt else t
+        # round-off from the back-transformation of e.g. Integration.tout is tolerated
+        ends = self.interpolant.t[[0, -1]]
+        clipped = np.clip(x, *ends)
+        tol = 8*np.finfo(np.float64).eps*np.max(np.abs(ends))
+        return np.where(np.abs(clipped - x) <= tol, clipped, x)
+
+    def __call__(self, t):
+        """ Concentrations at ``t``, array of shape ``np.shape(t) + (N, n)`` """
+        y = self.interpolant(self._x(t))
+        return self.expb(y) if self.logy else y
+
+    def derivative(self, t):
+        """ Time derivatives of the concentrations at ``t`` """
+        t = np.asarray(t, dtype=np.float64)
+        y, dydx = self.interpolant(self._x(t), deriv=True)
+        if self.logy:
+            dydx = dydx*self.expb(y)*self.ln_b
+        if self.logt:
+            dydx = dydx/((t + self.t0)*self.ln_b)[..., None, None]
+        return dydx
+
+
 class Integration(object):
     """
     Model kinetcs by integrating system of ODEs using
@@ -399,13 +703,30 @@ class Integration(object):
             - 'time_cpu': execution time in seconds (cpu time).
             - 'atol': float or array, absolute tolerance(s).
             - 'rtol': float, relative tolerance
+        With ``rd.events`` (cvode) also: 'event_index', 'event_t' (linear time),
+        'event_C' (linear concentrations), 'event_y' and 'event_stop' (a terminal
+        event occurred: ``tout``, ``yout`` and ``Cout`` end at the last output time
+        reached, i.e. have ``info['nreached']`` rows).
     rd: ReactionDiffusion instance
         same instance as passed in Parameters.
 
+    interpolant: DenseOutput or None
+        Continuous solution, available when integrating with ``integrator='cvode'``,
+        ``dense_output=True`` and ``interpolant=True``.
+    sens: array or None
+        Forward sensitivities of ``yout`` (shape ``(nt, N, n, P)``), available when
+        integrating with ``integrator='cvode'`` and ``sensitivities=[...]`` (parameters
+        as in :func:`chemreac._chemreac.cvode_predefined_sensitivity`).
+    Csens: array or None
+        Sensitivities of ``Cout``, with respect to the linear initial concentrations
+        for ``('y0', ...)`` parameters.
+
     Methods
     -------
     _integrate()
         performs the integration, automatically called by __init__
+    interpolate(t)
+        concentrations at arbitrary times (see ``interpolant``)
 
 
     """
@@ -422,6 +743,8 @@ class Integration(object):
                  C0_is_log=False, tiny=None, integrator='scipy', **kwargs):
         if integrator not in self._callbacks:
             raise KeyError("Unknown integrator %s" % integrator)
+        if kwargs.get('sensitivities') is not None and integrator != 'cvode':
+            raise ValueError("sensitivities require integrator='cvode'")
         if rd.unit_registry is not None:  # nondimensionalisation
             C0 = _dedim(C0, 'concentration', rd.unit_registry)
             tout = _dedim(tout, 'time', rd.unit_registry)
@@ -438,6 +761,9 @@ class Integration(object):
         self.yout = None
         self.info = None
         self.Cout = None
+        self.interpolant = None
+        self.sens = None
+        self.Csens = None
         self._sanity_checks()
         self._integrate()
 
@@ -498,6 +824,9 @@ class Integration(object):
         # -------------------
         self.yout, self.internal_t, self.info = self._callbacks[self.integrator](self.rd, y0, t, **self.kwargs)
         self.info['t0_set'] = t0 if t0_set else False
+        if self.info.get('interpolant') is not None:
+            self.interpolant = DenseOutput(self.info.pop('interpolant'), self.rd,
+                                           t0 if t0_set else 0)
 
         # Post processing
         # ---------------
@@ -509,6 +838,50 @@ class Integration(object):
 
         # Back-transform integration output into linear concentration
         self.Cout = self.rd.expb(self.yout) if self.rd.logy else self.yout
+        if 'sens' in self.info:
+            self.sens = self.info.pop('sens')
+            self.Csens = self._linear_sens(y0)
+
+        if 'event_t' in self.info:  # events (see ReactionDiffusion.events)
+            if self.info['event_stop'] and 'nreached' in self.info:  # (predefined output)
+                nreached = self.info['nreached']
+                self.tout = self.tout[:nreached]
+                self.internal_t = self.internal_t[:nreached]
+                self.yout = self.yout[:nreached]
+                self.Cout = self.Cout[:nreached]
+            if self.rd.logt:
+                self.info['event_t'] = self.rd.expb(self.info['event_t']) - (t0 if t0_set else 0)
+            event_y = self.info['event_y']
+            self.info['event_C'] = self.rd.expb(event_y) if self.rd.logy else event_y
+
+    def _linear_sens(self, y0):
+        # dC/dp from dy/dp (logy: dC = C*ln(b)*dy), for initial values wrt. C0
+        if not self.rd.logy:
+            return self.sens
+        ln_b = np.log(2) if self.rd.use_log2 else 1
+        Csens = self.sens*(self.Cout*ln_b)[..., np.newaxis]
+        y0 = np.asarray(y0).flatten()
+        for j, (kind, index) in enumerate(self.kwargs['sensitivities']):
+            if kind == 'y0':
+                i = index if np.ndim(index) == 0 else index[0]*self.rd.n + index[1]
+                Csens[..., j] /= self.rd.expb(y0[i])*ln_b
+        return Csens
+
+    def interpolate(self, t, deriv=False):
+        """
+        Concentrations (and with ``deriv`` their time derivatives) at ``t`` (scalar or
+        array within the integrated interval) without re-integrating.
+
+        Requires the integration to be performed with ``interpolant=True`` (and
+        ``integrator='cvode'``, ``dense_output=True``).
+        """
+        if self.interpolant is None:
+            raise ValueError("Integrate with interpolant=True to use interpolate")
+        if self.rd.unit_registry is not None:
+            t = _dedim(t, 'time', self.rd.unit_registry)
+        if deriv:
+            return self.interpolant(t), self.interpolant.derivative(t)
+        return self.interpolant(t)
 
     def with_units(self, attr):
         if attr == 'tout':
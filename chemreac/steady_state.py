@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+chemreac.steady_state
+=====================
+
+This module provides :py:func:`steady_state` which locates steady states of the
+system of ODEs represented by a :py:class:`~chemreac.core.ReactionDiffusion`
+object directly (i.e. without integrating to long times), by damped Newton
+iterations with pseudo-transient continuation (see
+:py:func:`chemreac._chemreac.steady_state_newton`). When the iterations stall the
+system is integrated in time (CVODE) until the rates have dropped, after which
+the Newton iterations are restarted. :py:func:`continuation` traces steady states
+as a function of a rate constant or a field (e.g. the dose rate) and
+:py:func:`periodic_steady_state` finds the limit cycle reached under a repeated
+sequence of field strengths (e.g. dose pulses) by shooting.
+
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import time
+
+import numpy as np
+
+from .integrate import DEFAULTS, integrate_cvode, _dedim, _integration_variables
+
+
+def _max_rate(rd, x, y):
+    # max(abs(dC/dt)) (linear concentrations & time), see ReactionDiffusion.events
+    events = rd.events
+    try:
+        rd.events = [dict(kind='steady_state', value=0)]
+        return rd.roots(x, np.asarray(y, dtype=np.float64).flatten())[0]
+    finally:
+        rd.events = events
+
+
+def steady_state(rd, C0, t=0.0, C0_is_log=False, tiny=None, nfallback=3,
+                 fallback_reduction=1e-3, tend_fallback=None, newton_kwargs=None,
+                 **kwargs):
+    """
+    Steady state concentrations (``dC/dt = 0``) of ``rd``.
+
+    Parameters
+    ----------
+    rd : ReactionDiffusion
+    C0 : array_like
+        Initial guess (linear concentrations), e.g. the initial concentrations of
+        a closed system (conserved quantities are preserved by the iterations).
+    t : float
+        Time at which time dependent parameters are evaluated (needs to be positive
+        with ``rd.logt``).
+    C0_is_log : bool
+        ``C0`` given as logarithms of the concentrations.
+    tiny : float
+        Added to C0 when ``rd.logy==True`` and ``C0_is_log==False`` (see
+        :class:`chemreac.integrate.Integration`).
+    nfallback : int
+        Maximum number of times the time integration fallback is used.
+    fallback_reduction : float
+        The fallback integration stops when ``max(abs(dC/dt))`` has dropped by this
+        factor (terminal ``'steady_state'`` event, see ``rd.events``).
+    tend_fallback : float
+        Maximum duration of each fallback integration (default: ``1e6`` times
+        ``max(C)/max(abs(dC/dt))``). When ``max(abs(dC/dt))`` is zero at the last iterate
+        (e.g. concentrations underflowing with ``rd.logy``) it is taken as converged
+        instead.
+    newton_kwargs : dict
+        Keyword arguments passed to :func:`chemreac._chemreac.steady_state_newton`
+        (e.g. ``ftol_rel``, ``ftol_abs``, ``max_iter``), the tolerance is relative to
+        the residual of ``C0`` also after fallbacks.
+    \\*\\*kwargs :
+        Solver settings of the fallback integration, see
+        :func:`chemreac.integrate.integrate_cvode`.
+
+    Returns
+    -------
+    C : array of shape ``(rd.N, rd.n)`` (linear concentrations)
+    info : dict
+        ``success``, ``status`` (of the last Newton iterations), ``niter``,
+        ``nrejected``, ``nfev``, ``njev`` (in total), ``residuals`` (2-norm of
+        ``rhs``, for the initial guess of and after each iteration of every
+        Newton run, concatenated), ``dtaus`` (pseudo time steps),
+        ``nnewton`` (number of Newton runs), ``nfallback``, ``fallback_t``
+        (times integrated over), ``time_wall`` & ``time_cpu``.
+
+    Examples
+    --------
+    >>> C, info = steady_state(rd, C0)  # doctest: +SKIP
+    >>> info['niter'], info['residuals'][-1]  # doctest: +SKIP
+
+    """
+    from ._chemreac import steady_state_newton
+    y, t, x = _integration_variables(rd, C0, t, C0_is_log, tiny)
+    newton_kwargs = newton_kwargs or {}
+    kwargs['atol'] = kwargs.pop('atol', DEFAULTS['atol'])
+    kwargs['rtol'] = kwargs.pop('rtol', DEFAULTS['rtol'])
+
+    time_wall = time.time()
+    time_cpu = time.process_time()
+    runs, fallback_t = [], []
+    nfev = njev = 0
+    rates_vanish = False
+    while True:
+        y, newton_info = steady_state_newton(rd, y, x, **newton_kwargs)
+        runs.append(newton_info)
+        nfev += newton_info['nfev']
+        njev += newton_info['njev']
+        if newton_info['success'] or len(fallback_t) >= nfallback:
+            break
+        if len(runs) == 1:  # later runs converge relative to the initial guess' residual
+            newton_kwargs = dict(newton_kwargs, ftol_rel=0, ftol_abs=(
+                newton_kwargs.get('ftol_abs', 0) +
+                newton_kwargs.get('ftol_rel', 1e-10)*newton_info['residuals'][0]))
+        # Integrate from the last iterate until the rates have dropped
+        rate = _max_rate(rd, x, y)
+        if rate == 0:  # e.g. logy with concentrations underflowing: a steady state after all
+            rates_vanish = True
+            break
+        tend = tend_fallback
+        if tend is None:
+            Cmax = np.max(rd.expb(y) if rd.logy else np.abs(y))
+            tend = 1e6*Cmax/rate
+        events = rd.events
+        try:
+            rd.events = [dict(kind='steady_state', value=fallback_reduction*rate,
+                              direction=-1, terminal=True)]
+            xout = [x, rd.logb(t + tend) if rd.logt else t + tend]
+            yout, xout, int_info = integrate_cvode(rd, y, xout, dense_output=True,
+                                                   **dict(kwargs))
+        finally:
+            rd.events = events
+        nfev += int_info['nfev']
+        njev += int_info['njev']
+        if not int_info['success']:
+            break
+        fallback_t.append((rd.expb(xout[-1]) if rd.logt else xout[-1]) - t)
+        y = yout[-1, ...]
+
+    info = {
+        'success': runs[-1]['success'] or rates_vanish,
+        'status': 'converged' if rates_vanish else runs[-1]['status'],
+        'niter': sum(r['niter'] for r in runs),
+        'nrejected': sum(r['nrejected'] for r in runs),
+        'nfev': nfev,
+        'njev': njev,
+        'residuals': np.concatenate([r['residuals'] for r in runs]),
+        'dtaus': np.concatenate([r['dtaus'] for r in runs]),
+        'nnewton': len(runs),
+        'nfallback': len(fallback_t),
+        'fallback_t': np.array(fallback_t),
+        'time_wall': time.time() - time_wall,
+        'time_cpu': time.process_time() - time_cpu,
+    }
+    y = np.asarray(y).reshape((rd.N, rd.n))
+    return (rd.expb(y) if rd.logy else y), info
+
+
+def continuation(rd, C0, param, p_end, p0=None, factor=1.0, t=0.0, C0_is_log=False,
+                 tiny=None, **kwargs):
+    """
+    Steady states of ``rd`` along a branch where one parameter varies from ``p0`` to
+    ``p_end``, e.g. against the dose rate or a rate constant, by natural parameter or
+    pseudo-arclength continuation (see
+    :py:func:`chemreac._chemreac.steady_state_continuation`).
+
+    Parameters
+    ----------
+    rd : ReactionDiffusion
+    C0 : array_like
+        Guess for the steady state at ``p0`` (linear concentrations).
+    param : tuple
+        ``('k', ri)`` or ``('fields', fi)``.
+    p_end : float
+    p0 : float
+        Default: the current value in ``rd`` (over ``factor``).
+    factor : float
+        The value set in ``rd`` is ``factor*p``, e.g. the density for ``p`` being the
+        dose rate of ``('fields', 0)`` (cf. :class:`chemreac._odesys.ODESys`).
+    t, C0_is_log, tiny :
+        See :func:`steady_state`.
+    \\*\\*kwargs :
+        Settings passed to :func:`chemreac._chemreac.steady_state_continuation`
+        (e.g. ``arclength``, ``ds_max``, ``max_points``).
+
+    Returns
+    -------
+    p : array of shape ``(npoints,)``
+    C : array of shape ``(npoints, rd.N, rd.n)`` (linear concentrations)
+    info : dict
+        See :func:`chemreac._chemreac.steady_state_continuation`, with
+        ``time_wall`` & ``time_cpu``.
+
+    Examples
+    --------
+    >>> p, C, info = continuation(rd, C0, ('fields', 0), 1e3, factor=998)  # doctest: +SKIP
+    >>> p[info['folds']]  # turning points  # doctest: +SKIP
+
+    """
+    from ._chemreac import steady_state_continuation
+    y, _, x = _integration_variables(rd, C0, t, C0_is_log, tiny)
+    kind, index = param
+    if p0 is None:
+        p0 = (rd.k[index] if kind == 'k' else rd.fields[index][0])/factor
+    time_wall = time.time()
+    time_cpu = time.process_time()
+    params, yout, info = steady_state_continuation(rd, y, param, factor*p0, factor*p_end,
+                                                   x, **kwargs)
+    info['time_wall'] = time.time() - time_wall
+    info['time_cpu'] = time.process_time() - time_cpu
+    return params/factor, (rd.expb(yout) if rd.logy else yout), info
+
+
+def periodic_steady_state(rd, C0, durations, fields, factor=1.0, C0_is_log=False,
+                          tiny=None, **kwargs):
+    """
+    Periodic steady state of ``rd`` under the segments of constant field strength
+    ``fields`` (of lengths ``durations``) repeated indefinitely, e.g. the state at the
+    start of a pulse after many identical pulses, found by Newton iterations on the map
+    over one period (see :py:func:`chemreac._chemreac.cvode_periodic_steady_state`)
+    instead of integrating all the periods.
+
+    Parameters
+    ----------
+    rd : ReactionDiffusion
+    C0 : array_like
+        Initial guess (linear concentrations).
+    durations : array_like of shape ``(nseg,)``
+    fields : array_like of shape ``(nseg,)`` or ``(nseg, len(rd.g_values))``
+    factor : float
+        The fields set in ``rd`` are ``factor*fields``, e.g. the density for ``fields``
+        being dose rates (cf. :func:`continuation`).
+    C0_is_log, tiny :
+        See :func:`steady_state`.
+    \\*\\*kwargs :
+        Settings passed to :func:`chemreac._chemreac.cvode_periodic_steady_state`
+        (e.g. ``tol``, ``max_iter``, ``atol``, ``rtol``, ``method``).
+
+    Returns
+    -------
+    C : array of shape ``(rd.N, rd.n)`` (linear concentrations)
+    info : dict
+        See :func:`chemreac._chemreac.cvode_periodic_steady_state`, with ``time_wall`` &
+        ``time_cpu``.
+
+    Examples
+    --------
+    >>> C, info = periodic_steady_state(rd, C0, [1e-6, 1e-3], [1.0, 0.0],
+    ...                                 factor=998)  # doctest: +SKIP
+    >>> info['nperiods']  # doctest: +SKIP
+
+    """
+    from ._chemreac import cvode_periodic_steady_state
+    if rd.logt:
+        raise ValueError("periodic_steady_state does not support logt")
+    y, _, _ = _integration_variables(rd, C0, 0.0, C0_is_log, tiny)
+    if rd.unit_registry is not None:
+        durations = _dedim(durations, 'time', rd.unit_registry)
+    atol = np.asarray(kwargs.pop('atol', DEFAULTS['atol'])).reshape(-1)
+    rtol = kwargs.pop('rtol', DEFAULTS['rtol'])
+    method = kwargs.pop('method', 'bdf')
+    time_wall = time.time()
+    time_cpu = time.process_time()
+    y, info = cvode_periodic_steady_state(
+        rd, y, np.asarray(durations, dtype=np.float64),
+        factor*np.asarray(fields, dtype=np.float64), atol, rtol, method, **kwargs)
+    info['time_wall'] = time.time() - time_wall
+    info['time_cpu'] = time.process_time() - time_cpu
+    return (rd.expb(y) if rd.logy else y), info
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, division, absolute_import
+
+from itertools import product
+
+import numpy as np
+import pytest
+
+from chemreac import ReactionDiffusion
+from chemreac.adjoint import least_squares
+from chemreac.integrate import Integration
+
+
+@pytest.mark.parametrize("log", list(product([False, True], [False, True])))
+def test_least_squares(log):
+    # A -> B -> C in 3 bins with diffusion, B measured, gradient vs. forward sensitivities
+    logy, checkpointing = log
+    rd = ReactionDiffusion(3, [[0], [1]], [[1], [2]], k=[0.7, 0.3], N=3,
+                           D=[0.2, 0.1, 0.0], logy=logy)
+    C0 = [[1.0, 0.01, 0.01], [0.5, 0.01, 0.01], [0.2, 0.01, 0.01]]
+    tout = np.linspace(0, 3, 7)
+    data = np.full((tout.size, 3, 3), np.nan)
+    data[1:, :, 1] = 0.2
+    weights = np.linspace(1, 2, 7)[:, np.newaxis, np.newaxis]*[1, 2, 1]
+    params = [('k', 0), ('k', 1), ('D', 0), ('y0', (1, 0))]
+    kw = dict(atol=1e-12, rtol=1e-10)
+    G, grad, dGdC0, info = least_squares(rd, C0, tout, data, params, weights,
+                                         checkpointing=checkpointing, **kw)
+    assert info['success'] and grad.shape == (4,) and dGdC0.shape == (3, 3)
+    assert info['nfev_adj'] > 0
+
+    integr = Integration(rd, C0, tout, integrator='cvode', sensitivities=params, **kw)
+    res = np.where(np.isnan(data), 0, integr.Cout - np.nan_to_num(data))
+    W = np.where(np.isnan(data), 0, np.broadcast_to(weights, data.shape))
+    assert np.allclose(G, np.sum(W*res**2)/2, rtol=1e-8)
+    assert np.allclose(info['Cout'], integr.Cout, rtol=1e-8, atol=1e-12)
+    ref = np.einsum('tbs,tbsp->p', W*res, integr.Csens)
+    assert np.allclose(grad, ref, rtol=1e-6, atol=1e-12)
+    assert np.allclose(dGdC0[1, 0], grad[3], rtol=1e-8)
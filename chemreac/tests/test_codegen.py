@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pytest
+
+from chemreac import ReactionDiffusion
+from chemreac.codegen import CompiledReactionDiffusion, compile_kernel, render_kernel
+
+_compiler = os.environ.get('CXX', 'c++')
+requires_compiler = pytest.mark.skipif(
+    getattr(shutil, 'which', lambda _: True)(_compiler) is None,
+    reason="C++ compiler not found")
+
+
+def _get_args():
+    # 2A -> B, B + C -> 2C, C -> A (with inactive reactant C)
+    stoich_active = [[0, 0], [1, 2], [2]]
+    stoich_prod = [[1], [2, 2], [0]]
+    stoich_inact = [[], [], [2]]
+    kwargs = dict(N=3, D=[.1, .2, .3], stoich_inact=stoich_inact,
+                  modulated_rxns=[1], modulation=[[1.0, 2.0, 3.0]])
+    return (3, stoich_active, stoich_prod, [3.0, 5.0, 7.0]), kwargs
+
+
+def test_render_kernel():
+    src, pattern = render_kernel(2, [[0, 0]], [[1]])
+    assert 'k[0]*C[0]*C[0]' in src
+    assert 'pow' not in src
+    assert pattern == [(0, 0), (1, 0)]
+
+
+@requires_compiler
+@pytest.mark.parametrize("logy", [False, True])
+def test_CompiledReactionDiffusion(tmpdir, logy):
+    args, kwargs = _get_args()
+    rd = ReactionDiffusion(*args, logy=logy, **kwargs)
+    crd = CompiledReactionDiffusion(*args, logy=logy, cache_dir=str(tmpdir), **kwargs)
+    y = np.linspace(0.5, 1.5, rd.ny)
+    fref, fout = rd.alloc_fout(), crd.alloc_fout()
+    rd.f(0, y, fref)
+    crd.f(0, y, fout)
+    assert np.allclose(fout, fref, atol=1e-14, rtol=1e-14)
+    jref = rd.alloc_jout(banded=False, order='C')
+    jout = crd.alloc_jout(banded=False, order='C')
+    rd.dense_jac_rmaj(0, y, jref)
+    crd.dense_jac_rmaj(0, y, jout)
+    assert np.allclose(jout, jref, atol=1e-14, rtol=1e-14)
+
+
+@requires_compiler
+def test_compile_kernel__cache(tmpdir):
+    args, kwargs = _get_args()
+    crd = CompiledReactionDiffusion(*args, cache_dir=str(tmpdir), **kwargs)
+    mtime = os.path.getmtime(crd.kernel_path)
+    assert compile_kernel(crd, cache_dir=str(tmpdir)) == crd.kernel_path
+    assert os.path.getmtime(crd.kernel_path) == mtime
+    assert compile_kernel(crd, cache_dir=str(tmpdir), flags=['-O1']) != crd.kernel_path
+    crd2 = pickle.loads(pickle.dumps(crd))
+    assert crd2.kernel_path == crd.kernel_path
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+import pytest
+
+from chemreac import ReactionDiffusion
+from chemreac.fit import Experiment, fit
+from chemreac.integrate import Integration
+
+
+@pytest.mark.parametrize("method", ['lm', 'gn'])
+def test_fit(method):
+    # A -> B -> C, radiolytic production of A, two experiments with different C0, fields and tout
+    kw = dict(g_values=[[2e-3, 0, 0]], g_value_parents=[-1])
+    rd = ReactionDiffusion(3, [[0], [1]], [[1], [2]], k=[2.0, 0.3], fields=[[0.0]], **kw)
+    C0s = [[1.0, 0.0, 0.0], [0.5, 0.2, 0.0]]
+    touts = [np.linspace(0, 5, 11), np.linspace(0, 3, 7)]
+    fields = [[0.0], [100.0]]
+    experiments = []
+    for C0, tout, flds in zip(C0s, touts, fields):
+        rd_ref = ReactionDiffusion(3, [[0], [1]], [[1], [2]], k=[2.0, 0.3], fields=[flds], **kw)
+        integr = Integration(rd_ref, C0, tout, atol=1e-12, rtol=1e-10, integrator='cvode')
+        data = integr.Cout.copy()
+        data[0] = np.nan
+        experiments.append(Experiment(C0, tout, data, fields=flds))
+
+    params = [('k', 0), ('k', 1), ('g_values', (0, 0))]
+    p, info = fit(rd, experiments, params, p0=[1.0, 1.0, 1e-3], method=method,
+                  atol=1e-12, rtol=1e-10)
+    assert info['success'] and info['njev'] >= 2
+    assert np.allclose(p, [2.0, 0.3, 2e-3], rtol=1e-5)
+    assert info['cost'][-1] < 1e-12*info['cost'][0]
+    assert info['pcov'].shape == (3, 3)
+    assert len(info['residuals']) == 2 and info['residuals'][1].shape == (7, 1, 3)
+    assert np.allclose(info['Cout'][0][1:], experiments[0].data[1:], atol=1e-7)
+
+
+def test_fit__noise():
+    rd = ReactionDiffusion(2, [[0]], [[1]], k=[1.0], logy=True)
+    tout = np.linspace(0, 3, 31)
+    rng = np.random.RandomState(42)
+    sigma = 0.01
+    C = np.exp(-0.7*tout)
+    data = np.empty((tout.size, 1, 2))
+    data[:, 0, 0] = C + sigma*rng.randn(tout.size)
+    data[:, 0, 1] = np.nan
+    p, info = fit(rd, [Experiment([1.0, 1e-9], tout, data, weights=sigma**-2)], [('k', 0)])
+    assert info['success']
+    assert abs(p[0] - 0.7) < 4*np.sqrt(info['pcov'][0, 0])
+    assert 0.002 < np.sqrt(info['pcov'][0, 0]) < 0.008
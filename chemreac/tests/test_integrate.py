@@ -43,6 +43,342 @@ def test_decay(log):
     assert np.allclose(integr.Cout[:, 0, :], yref)
 
 
+def test_decay__memo_info():
+    rd = ReactionDiffusion(2, [[0]], [[1]], k=[0.13], logy=True)
+    integr = Integration(rd, [3.0, 1.0], np.linspace(0, 10, 11), integrator='cvode')
+    assert integr.info['nmemo_state_miss'] > 0
+    assert integr.info['nmemo_state_hit'] > 0  # Jacobian evaluated at state of last rhs call
+    assert integr.info['nmemo_rhs_hit'] >= 0
+
+
+def test_decay__nheap_alloc():
+    rd = ReactionDiffusion(2, [[0]], [[1]], k=[0.13], N=3, D=[.1, .2])
+    y0 = [3.0, 1.0]*3
+    kw = dict(integrator='cvode', iter_type='newton', linear_solver='gmres')
+    integr1 = Integration(rd, y0, np.linspace(0, 10, 11), **kw)
+    assert integr1.info['nheap_alloc'] > 0  # preconditioner storage
+    integr2 = Integration(rd, y0, np.linspace(0, 10, 11), **kw)
+    assert integr2.info['nheap_alloc'] == 0
+
+
+def test_clone__threads():
+    from concurrent.futures import ThreadPoolExecutor
+    rd = ReactionDiffusion(2, [[0]], [[1]], k=[0.13], N=5, D=[.1, .2], substance_names='AB')
+    y0 = np.linspace(1.0, 2.0, rd.n*rd.N)
+    tout = np.linspace(0, 10, 11)
+    ks = [0.1, 0.2, 0.3, 0.4]
+    ref = []
+    for k in ks:
+        rd.k = [k]
+        ref.append(Integration(rd, y0, tout, integrator='cvode').yout)
+
+    def work(k):
+        cpy = rd.clone()
+        assert cpy.substance_names == rd.substance_names
+        cpy.k = [k]
+        return Integration(cpy, y0, tout, integrator='cvode').yout
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(work, ks))
+    for yout, yref in zip(results, ref):
+        assert np.allclose(yout, yref, rtol=0, atol=0)
+    assert np.all(rd.k == ks[-1])  # clones do not share parameters
+
+
+def test_cvode_predefined_batch():
+    from chemreac._chemreac import cvode_predefined_batch
+    rd = ReactionDiffusion(2, [[0]], [[1]], k=[0.13], N=3, D=[.1, .2],
+                           g_values=[[0, 1e-3]], g_value_parents=[0], fields=[[0, 0, 0]])
+    y0s = np.linspace(1.0, 2.0, 4*rd.n*rd.N).reshape((4, rd.N, rd.n))
+    k_sets = [[0.1], [0.2], [0.3], [0.4]]
+    fields_sets = [[1.0], [2.0], [3.0], [4.0]]
+    tout = np.linspace(0, 10, 11)
+    yout, infos = cvode_predefined_batch(rd, y0s, tout, [1e-10], 1e-8, 'bdf', k_sets=k_sets,
+                                         fields_sets=fields_sets, nthreads=2)
+    assert yout.shape == (4, tout.size, rd.N, rd.n)
+    assert list(rd.k) == [0.13]  # not modified
+    for y0, k, fields, ybatch, info in zip(y0s, k_sets, fields_sets, yout, infos):
+        assert info['success'] and info['nreached'] == tout.size
+        assert info['nfev'] > 0 and info['ncalls'] == 1  # (per member, the session is per thread)
+        rd.k = k
+        rd.fields = [[fields[0]]*rd.N]
+        integr = Integration(rd, y0, tout, integrator='cvode', atol=[1e-10], rtol=1e-8)
+        assert np.allclose(ybatch, integr.yout, atol=1e-13, rtol=1e-13)
+
+
+def test_lockstep_predefined():
+    from chemreac._chemreac import lockstep_predefined
+    # A -> B, 2 B -> C with radiolytic production of A
+    rd = ReactionDiffusion(3, [[0], [1, 1]], [[1], [2]], k=[1.0, 3.0],
+                           g_values=[[1e-3, 0, 0]], g_value_parents=[-1], fields=[[0.0]])
+    k_sets = [[10**i, 3.0] for i in range(-1, 4)]
+    fields_sets = [[100.0*i] for i in range(5)]
+    C0 = [1.0, 0.1, 0.0]
+    tout = np.linspace(0, 3, 13)
+    Cout, info = lockstep_predefined(rd, C0, tout, [1e-10], 1e-8, k_sets=k_sets,
+                                     fields_sets=fields_sets, nsteps=5000)
+    assert Cout.shape == (5, tout.size, 1, 3)
+    assert np.all(info['success'])
+    assert np.all(info['nsteps'] > 0)
+    for k, fields, Cbatch in zip(k_sets, fields_sets, Cout):
+        rd.k = k
+        rd.fields = [fields]
+        integr = Integration(rd, C0, tout, integrator='cvode', atol=1e-10, rtol=1e-10)
+        assert np.allclose(Cbatch, integr.Cout, atol=1e-7, rtol=1e-6)
+
+
+def test_CvodeSession():
+    from chemreac._chemreac import CvodeSession, cvode_predefined, cvode_predefined_durations_fields
+    rd = ReactionDiffusion(2, [[0]], [[1]], k=[0.13], N=3, D=[.1, .2],
+                           g_values=[[0, 1e-3]], g_value_parents=[0], fields=[[0, 0, 0]])
+    tout = np.linspace(0, 10, 11)
+    session = CvodeSession(rd, [1e-10], 1e-8, 'bdf')
+    for i, scale in enumerate([1.0, 2.0, 3.0]):
+        y0 = scale*np.linspace(1.0, 2.0, rd.n*rd.N)
+        rd.fields = [[scale]*rd.N]
+        yout, info = session.predefined(y0, tout)
+        assert info['success'] and info['ncalls'] == i + 1
+        yref, _ = cvode_predefined(rd, y0, tout, [1e-10], 1e-8, 'bdf')
+        assert np.allclose(yout, yref, atol=1e-9, rtol=1e-7)
+    assert session.ncalls == 3 and session.last_step > 0
+
+    durations = np.array([1.0, 0.5, 2.0, 0.25]*10)
+    fields = np.array([0.0, 40.0, 0.0, 80.0]*10)
+    rd1 = ReactionDiffusion(2, [[0]], [[1]], k=[0.13], g_values=[[0, 1e-3]],
+                            g_value_parents=[0], fields=[[0]])
+    y0 = np.array([1.0, 0.0])
+    kw = dict(atol=[1e-10], rtol=1e-8, method='bdf', npoints=3)
+    tout, yout = cvode_predefined_durations_fields(rd1, y0, durations, fields, keep_step=True, **kw)
+    info_keep = rd1.last_integration_info
+    tref, yref = cvode_predefined_durations_fields(rd1, y0, durations, fields, **kw)
+    assert np.allclose(tout, tref)
+    assert np.allclose(yout, yref, atol=1e-6, rtol=1e-6)  # (different steps, 40 restarts)
+    for info in (info_keep, rd1.last_integration_info):
+        assert info['ncalls'] == durations.size and info['n_steps'] > durations.size
+
+
+def test_field_schedules():
+    from chemreac._chemreac import cvode_predefined_durations_fields
+    # A -> B, radiolytic production of A during pulses
+    durations = np.array([0.1, 0.9]*5)
+    doserates = np.array([50.0, 0.0]*5)
+    kw = dict(g_values=[[1e-3, 0]], g_value_parents=[-1])
+    rd_ref = ReactionDiffusion(2, [[0]], [[1]], k=[0.7], fields=[[0]], **kw)
+    tref, yref = cvode_predefined_durations_fields(
+        rd_ref, np.array([0.0, 0.0]), durations, doserates, atol=[1e-12], rtol=1e-10,
+        method='bdf', npoints=4)
+    assert rd_ref.fields == [[0]] and rd_ref.field_schedules == []  # restored
+    t_sched = np.concatenate(([0], np.cumsum(durations)[:-1]))
+    # d[A]/dt = p - k*[A] with p = g*doserate constant within each segment
+    k, p = 0.7, 1e-3*doserates
+    A0 = [0.0]
+    for pi, dur in zip(p, durations):
+        A0.append(pi/k + (A0[-1] - pi/k)*np.exp(-k*dur))
+    si = np.minimum(np.searchsorted(t_sched, tref, side='right') - 1, durations.size - 1)
+    dt = tref - t_sched[si]
+    A = p[si]/k + (np.array(A0)[si] - p[si]/k)*np.exp(-k*dt)
+    produced = np.concatenate(([0], np.cumsum(p*durations)))[si] + p[si]*dt
+    assert np.allclose(yref[:, 0, 0], A, atol=1e-10, rtol=1e-7)
+    assert np.allclose(yref[:, 0, 1], produced - A, atol=1e-10, rtol=1e-7)
+    rd = ReactionDiffusion(2, [[0]], [[1]], k=[0.7], fields=[[1.0]],
+                           field_schedules=[(t_sched, doserates)], **kw)
+    assert np.allclose(rd.schedule_breakpoints(0, 5), t_sched[1:])
+    integr = run(rd, [0.0, 0.0], tref, atol=1e-12, rtol=1e-10)
+    assert integr.info['success']
+    assert np.allclose(integr.yout, yref, atol=1e-10, rtol=1e-7)
+
+    rd2 = pickle.loads(pickle.dumps(rd))
+    t2, v2, linear2 = rd2.field_schedules[0]
+    assert np.all(t2 == t_sched) and np.all(v2 == doserates) and not linear2
+
+    # piecewise linear modulation of k (ramp to 2x at t=2): d[A]/dt = -k*m(t)*[A]
+    rd_mod = ReactionDiffusion(2, [[0]], [[1]], k=[0.7], modulated_rxns=[0], modulation=[[1.0]],
+                               modulation_schedules=[([0, 2], [1, 2], True)])
+    tout = np.linspace(0, 3, 7)
+    integr = run(rd_mod, [1.0, 0.0], tout, atol=1e-12, rtol=1e-10)
+    int_m = np.where(tout < 2, tout + tout**2/4, 3 + 2*(tout - 2))
+    assert np.allclose(integr.yout[:, 0, 0], np.exp(-0.7*int_m), atol=1e-8, rtol=1e-7)
+
+    # two field types, the modulation schedule applies at the times of all segments
+    rd_two = ReactionDiffusion(2, [[0]], [[1]], k=[0.7], g_values=[[1e-3, 0], [0, 2e-3]],
+                               g_value_parents=[-1, -1], fields=[[0], [0]], modulated_rxns=[0],
+                               modulation=[[1.0]], modulation_schedules=[([0, 2], [1, 2], True)])
+    fields = np.array([[50.0, 0.0], [0.0, 10.0]]*5)
+    tout, yout = cvode_predefined_durations_fields(
+        rd_two, np.array([0.0, 0.0]), durations, fields, atol=[1e-12], rtol=1e-10,
+        method='bdf', npoints=4)
+    assert rd_two.fields == [[0], [0]] and rd_two.field_schedules == []
+    rd_two.fields = [[1.0], [1.0]]
+    rd_two.field_schedules = [(t_sched, fields[:, 0]), (t_sched, fields[:, 1])]
+    integr = run(rd_two, [0.0, 0.0], tout, atol=1e-12, rtol=1e-10)
+    assert np.allclose(yout, integr.yout, atol=1e-10, rtol=1e-7)
+    with pytest.raises(ValueError):
+        cvode_predefined_durations_fields(rd_two, np.array([0.0, 0.0]), durations, doserates,
+                                          atol=[1e-12], rtol=1e-10, method='bdf')
+
+
+def test_integrate_cvode_stream(tmpdir):
+    from chemreac._chemreac import cvode_predefined
+    from chemreac.integrate import integrate_cvode_stream, ChunkWriter, load_chunks
+    rd = ReactionDiffusion(2, [[0]], [[1]], k=[0.13], N=3, D=[.1, .2])
+    y0 = np.linspace(1.0, 2.0, rd.n*rd.N)
+    tout = np.linspace(0, 10, 101)
+    yref, _ = cvode_predefined(rd, y0, tout, [1e-10], 1e-8, 'bdf')
+    chunks = []
+    info = integrate_cvode_stream(rd, y0, tout, lambda t, y: chunks.append((t.copy(), y.copy())),
+                                  chunk_size=16, atol=1e-10, rtol=1e-8)
+    assert info['success'] and info['nrows'] == tout.size
+    assert [len(t) for t, _ in chunks] == [16]*6 + [5]
+    assert np.all(np.concatenate([t for t, _ in chunks]) == tout)
+    assert np.allclose(np.concatenate([y for _, y in chunks]), yref, atol=1e-9, rtol=1e-7)
+
+    path = str(tmpdir.join('traj.npys'))
+    with ChunkWriter(path) as writer:
+        info = integrate_cvode_stream(rd, y0, [0, 10], writer, chunk_size=8, atol=1e-10, rtol=1e-8)
+    t, y = load_chunks(path)
+    assert info['success'] and writer.nrows == info['nrows'] == t.size > 8
+    assert np.all(np.diff(t) > 0) and t[-1] == 10
+    assert y.shape == (t.size, rd.N, rd.n)
+    assert np.allclose(y[-1], yref[-1], atol=1e-9, rtol=1e-7)
+
+    def bad_sink(t, y):
+        raise KeyError('stop')
+    with pytest.raises(KeyError):
+        integrate_cvode_stream(rd, y0, tout, bad_sink, chunk_size=4)
+
+    out = np.lib.format.open_memmap(str(tmpdir.join('yout.npy')), mode='w+', dtype=np.float64,
+                                    shape=(tout.size, rd.N, rd.n))
+    integr = Integration(rd, y0, tout, integrator='cvode', atol=1e-10, rtol=1e-8, out=out)
+    assert np.shares_memory(integr.yout, out)
+    out.flush()
+    assert np.allclose(np.load(str(tmpdir.join('yout.npy'))), yref, atol=1e-12, rtol=1e-12)
+    with pytest.raises(ValueError):
+        cvode_predefined(rd, y0, tout, [1e-10], 1e-8, 'bdf', out=np.empty((tout.size, rd.n, rd.N)).T)
+
+
+def test_integrate_cvode_observables():
+    from chemreac._chemreac import cvode_predefined
+    from chemreac.integrate import integrate_cvode_observables, observable_weights
+    rd = ReactionDiffusion(2, [[0]], [[1]], k=[0.13], N=3, D=[.1, .2], geom='s',
+                           x=[1.0, 1.5, 2.5, 3.0])
+    y0 = np.linspace(1.0, 2.0, rd.n*rd.N)
+    tout = np.linspace(0, 10, 101)
+    yref, _ = cvode_predefined(rd, y0, tout, [1e-10], 1e-8, 'bdf')
+    observables = {
+        'amount_A': observable_weights(rd, [0], volume=True),
+        'amount': observable_weights(rd, volume=True),
+        'B_outer': observable_weights(rd, [1], bins=[2]),
+    }
+    res, info = integrate_cvode_observables(rd, y0, tout, observables, atol=1e-10, rtol=1e-8)
+    assert info['success'] and info['nrows'] == tout.size
+    assert np.all(res['tout'] == tout)
+    amount_A = np.array([rd.integrated_conc(yref[i, :, 0]) for i in range(tout.size)])
+    assert np.allclose(res['amount_A']['values'], amount_A, rtol=1e-7)
+    assert np.allclose(res['B_outer']['values'], yref[:, 2, 1], atol=1e-9, rtol=1e-7)
+    assert abs(res['amount_A']['max'] - amount_A[0]) < 1e-12 and res['amount_A']['t_max'] == 0
+    assert abs(res['amount_A']['t_min'] - 10) < 1e-12
+    assert np.allclose(res['amount_A']['integral'], np.sum(np.diff(tout)*(amount_A[1:] + amount_A[:-1])/2), rtol=1e-7)
+
+    res2, info2 = integrate_cvode_observables(rd, y0, [0, 10], observables, record=False,
+                                              atol=1e-10, rtol=1e-8)
+    assert info2['success'] and info2['nrows'] > 2
+    assert 'tout' not in res2 and 'values' not in res2['amount_A']
+    assert np.allclose(res2['amount_A']['min'], amount_A[-1], rtol=1e-7)
+    assert np.allclose(res2['amount_A']['integral'], res['amount_A']['integral'], rtol=1e-2)
+
+    # total amount is conserved by the (flat, uniform grid) discretization
+    rd_flat = ReactionDiffusion(2, [[0]], [[1]], k=[0.13], N=3, D=[.1, .2])
+    amount = {'amount': observable_weights(rd_flat, volume=True)}
+    res3, info3 = integrate_cvode_observables(rd_flat, y0, tout, amount, atol=1e-10, rtol=1e-8)
+    assert info3['success']
+    assert np.allclose(res3['amount']['values'], res3['amount']['values'][0], rtol=1e-7)
+
+
+@pytest.mark.parametrize("log", LOG_COMOBS)
+def test_Integration_interpolate(log):
+    logy, logt, use_log2 = log
+    k0 = 0.13
+    rd = ReactionDiffusion(2, [[0]], [[1]], k=[k0], logy=logy, logt=logt, use_log2=use_log2)
+    y0 = [3.0, 1.0]
+    integr = Integration(rd, y0, [1e-3, 10], integrator='cvode', dense_output=True,
+                         interpolant=True, atol=1e-10, rtol=1e-10)
+    assert integr.info['success']
+    assert integr.interpolant.interpolant.nsteps == integr.tout.size - 1
+    # the steps themselves are reproduced
+    assert np.allclose(integr.interpolate(integr.tout), integr.Cout, rtol=1e-12, atol=1e-14)
+    t = np.linspace(1e-3, 10, 57)
+    Cref = np.empty((t.size, 1, 2))
+    Cref[:, 0, 0] = y0[0]*np.exp(-k0*(t - 1e-3))  # (y0 at t=1e-3)
+    Cref[:, 0, 1] = y0[1] + y0[0] - Cref[:, 0, 0]
+    C, dCdt = integr.interpolate(t, deriv=True)
+    assert C.shape == dCdt.shape == (t.size, 1, 2)
+    assert np.allclose(C, Cref, rtol=1e-7, atol=1e-9)
+    # (the first step is of order 1: its derivative is only accurate to about its length)
+    assert np.allclose(dCdt[1:, 0, 0], -k0*Cref[1:, 0, 0], rtol=1e-5, atol=1e-8)
+    assert np.allclose(dCdt[1:, 0, 1], k0*Cref[1:, 0, 0], rtol=1e-5, atol=1e-8)
+    assert np.allclose(dCdt[0, 0, 0], -k0*Cref[0, 0, 0], rtol=1e-3)
+    assert integr.interpolate(5.0).shape == (1, 2)
+    with pytest.raises(ValueError):
+        integr.interpolate(11.0)
+
+    plain = Integration(rd, y0, [1e-3, 10], integrator='cvode', dense_output=True)
+    assert plain.interpolant is None
+    with pytest.raises(ValueError):
+        plain.interpolate(1.0)
+
+
+def test_events():
+    from chemreac._chemreac import cvode_predefined
+    k0 = 0.13
+    y0 = np.array([3.0, 1.0])
+    events = [dict(kind='threshold', species=0, value=1.5, direction=-1),
+              dict(kind='amount', species=1, value=3.0, terminal=True)]
+    rd = ReactionDiffusion(2, [[0]], [[1]], k=[k0], events=events)
+    assert rd.events[0]['idx'] == [0] and rd.events[1]['w'] == [1.0]
+    assert np.allclose(rd.roots(0, y0), [1.5, -2.0])
+    tout = np.linspace(0, 30, 31)
+    yout, info = cvode_predefined(rd, y0, tout, [1e-10], 1e-8, 'bdf')
+    assert info['success'] and info['event_stop']
+    assert info['nreached'] == 9  # B reaches 3 at t = ln(3)/k0 ~= 8.45
+    assert list(info['event_index']) == [0, 1]
+    assert np.allclose(info['event_t'], [np.log(2)/k0, np.log(3)/k0], rtol=1e-6)
+    assert np.allclose(info['event_y'][:, 0, :], [[1.5, 2.5], [1.0, 3.0]], rtol=1e-6)
+    assert np.allclose(yout[:9, 0, 0], y0[0]*np.exp(-k0*tout[:9]), rtol=1e-6)
+    assert np.all(np.isnan(yout[9:]))  # not reached
+
+    rd.events = [dict(kind='threshold', species=0, value=1.5, direction=1)]  # never increasing
+    yout, info = cvode_predefined(rd, y0, tout, [1e-10], 1e-8, 'bdf')
+    assert info['nreached'] == tout.size and info['event_index'].size == 0
+
+    tol = 1e-3
+    t_ss = np.log(y0[0]*k0/tol)/k0
+    rd_ss = ReactionDiffusion(2, [[0]], [[1]], k=[k0], logy=True, logt=True, events=[
+        dict(kind='steady_state', value=tol, terminal=True)])
+    integr = Integration(rd_ss, y0, [1e-6, 1000], integrator='cvode', dense_output=True,
+                         atol=1e-10, rtol=1e-10)
+    assert integr.info['success'] and integr.info['event_stop']
+    assert abs(integr.info['event_t'][0] - t_ss) < 1e-5*t_ss
+    assert abs(integr.tout[-1] - t_ss) < 1e-5*t_ss
+    assert np.allclose(integr.info['event_C'][0, 0], [tol/k0, y0.sum() - tol/k0], rtol=1e-5)
+
+
+def test_events_terminal_truncates_Integration():
+    # A -> B, stops when B reaches 0.5 at t = ln(2)/k ~= 0.63, i.e. after tout[2]
+    k = 1.1
+    events = [dict(kind='threshold', species=1, value=0.5, terminal=True)]
+    rd = ReactionDiffusion(2, [[0]], [[1]], k=[k], N=3, D=[0, 0], events=events)
+    C0 = np.array([1.0, 0.0]*3)
+    tout = np.linspace(0, 2, 9)
+    integr = Integration(rd, C0, tout, integrator='cvode', atol=1e-10, rtol=1e-8)
+    assert integr.info['success'] and integr.info['event_stop']
+    assert integr.info['nreached'] == 3
+    assert integr.tout.shape == (3,)
+    assert integr.yout.shape == integr.Cout.shape == (3, 3, 2)
+    assert np.allclose(integr.tout, tout[:3])
+    assert np.allclose(integr.Cout[:, :, 0], np.exp(-k*tout[:3, None]), rtol=1e-6)
+    assert np.allclose(integr.info['event_t'], [np.log(2)/k], rtol=1e-6)
+
+
 def test_decay_solver_kwargs_env():
     key = 'CHEMREAC_INTEGRATION_KWARGS'
     try:
@@ -365,3 +701,49 @@ def test_from_ReactionSystem__fields():
         fields[fk]*g for fk, g in zip(fields, gvals)
     ]).reshape((1, -1)) for sk in rd.substance_names]).transpose(1, 2, 0)
     assert np.allclose(integr.Cout, Cref)
+
+
+@pytest.mark.parametrize("log", LOG_COMOBS)
+def test_Integration__sensitivities(log):
+    # A -> B: A = A0*exp(-k*t)
+    logy, logt, use_log2 = log
+    k0, A0 = 0.7, 3.0
+    rd = ReactionDiffusion(2, [[0]], [[1]], [k0], logy=logy, logt=logt, use_log2=use_log2)
+    tout = np.linspace(1e-3, 2, 7)
+    integr = Integration(rd, [A0, 0.1], tout, integrator='cvode', atol=1e-12, rtol=1e-10,
+                         sensitivities=[('k', 0), ('y0', 0)])
+    assert integr.sens.shape == (tout.size, 1, 2, 2)
+    A = integr.Cout[:, 0, 0]
+    dt = integr.tout - tout[0]  # (A0 at tout[0])
+    assert np.allclose(A, A0*np.exp(-k0*dt))
+    assert np.allclose(integr.Csens[:, 0, 0, 0], -dt*A, rtol=1e-6, atol=1e-9)
+    assert np.allclose(integr.Csens[:, 0, 1, 0], dt*A, rtol=1e-6, atol=1e-9)
+    assert np.allclose(integr.Csens[:, 0, 0, 1], np.exp(-k0*dt), rtol=1e-6)
+    assert np.allclose(integr.Csens[:, 0, 1, 1], 1 - np.exp(-k0*dt), rtol=1e-6, atol=1e-9)
+    if logy:
+        ln_b = np.log(2) if use_log2 else 1
+        assert np.allclose(integr.sens[:, 0, 0, 0], -dt/ln_b, rtol=1e-6, atol=1e-9)
+
+
+def test_Integration__sensitivities__diffusion_and_g_values():
+    # A diffuses in 5 bins and is produced by a field (non-uniform), A -> B
+    N = 5
+    kw = dict(N=N, D=[0.1, 0.0], k=[0.3], g_values=[[0.5, 0.0]], g_value_parents=[-1],
+              fields=[np.linspace(1, 2, N)], lrefl=True, rrefl=True)
+    params = [('D', 0), ('g_values', (0, 0)), ('k', 0)]
+    C0 = np.array([[1.0, 0.0]]*N)
+    C0[0, 0] = 2.0
+    tout = np.linspace(0, 1, 5)
+    settings = dict(integrator='cvode', atol=1e-12, rtol=1e-10)
+    rd = ReactionDiffusion(2, [[0]], [[1]], **kw)
+    integr = Integration(rd, C0, tout, sensitivities=params, **settings)
+    h = 1e-6
+    for j, (key, val) in enumerate([('D', [0.1, 0.0]), ('g_values', [[0.5, 0.0]]), ('k', [0.3])]):
+        Cs = []
+        for sign in (1, -1):
+            val_p = np.array(val)
+            val_p.flat[0] += sign*h
+            rd_p = ReactionDiffusion(2, [[0]], [[1]], **dict(kw, **{key: val_p.tolist()}))
+            Cs.append(Integration(rd_p, C0, tout, **settings).Cout)
+        assert np.allclose(integr.Csens[..., j], (Cs[0] - Cs[1])/(2*h), rtol=1e-5, atol=1e-7)
+    assert integr.info['success']
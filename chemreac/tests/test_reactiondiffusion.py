@@ -1019,3 +1019,19 @@ def test_per_bin_diffusion():
     y = [0, 1, 2, 1, 0]
     rd.f(0.0, np.asarray(y, dtype=np.float64), fout)
     assert np.all(fout[:2] == 0) and np.all(fout[-2:] == 0) and fout[2] < 0
+
+
+def test_efield__clears_memo():
+    kw = dict(N=5, D=[0.1], mobility=[0.5], lrefl=False, rrefl=False)
+    rd = ReactionDiffusion(1, [], [], [], **kw)
+    y = np.linspace(1, 2, 5)
+    fout = rd.alloc_fout()
+    rd.f(0.0, y, fout)
+    efield = np.linspace(-1, 1, 5)
+    rd.efield = efield
+    rd.f(0.0, y, fout)
+    rd_ref = ReactionDiffusion(1, [], [], [], **kw)
+    rd_ref.efield = efield
+    fref = rd_ref.alloc_fout()
+    rd_ref.f(0.0, y, fref)
+    assert np.allclose(fout, fref) and not np.allclose(fout, 0)
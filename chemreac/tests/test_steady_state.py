@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, division, absolute_import
+
+from itertools import product
+
+import numpy as np
+import pytest
+
+from chemreac import ReactionDiffusion
+from chemreac.integrate import Integration
+from chemreac._chemreac import cvode_predefined_durations_fields
+from chemreac.steady_state import steady_state, continuation, periodic_steady_state
+
+
+def _get_rd(**kwargs):
+    # A <-> B (kf=2, kb=1) in 3 bins with diffusion: uniform A = M/3, B = 2*M/3
+    return ReactionDiffusion(2, [[0], [1]], [[1], [0]], k=[2.0, 1.0], N=3, D=[0.1, 0.05],
+                             lrefl=True, rrefl=True, **kwargs)
+
+
+@pytest.mark.parametrize("log", list(product([True, False], [True, False])))
+def test_steady_state(log):
+    logy, use_log2 = log
+    rd = _get_rd(logy=logy, use_log2=use_log2)
+    C0 = np.array([[2, 0.01], [0.5, 0.01], [0.5, 0.01]])
+    C, info = steady_state(rd, C0)
+    assert info['success'] and info['status'] == 'converged'
+    assert info['nfallback'] == 0 and info['nnewton'] == 1
+    assert info['residuals'].size == info['niter'] + 1
+    assert info['residuals'][-1] <= 1e-10*info['residuals'][0]
+    assert info['dtaus'][-1] > info['dtaus'][0]
+    M = C0.sum()/3
+    assert np.allclose(C, [[M/3, 2*M/3]]*3, rtol=1e-6)
+
+    integr = Integration(rd, C0.flatten(), [0, 100], integrator='cvode',
+                         atol=1e-12, rtol=1e-10, nsteps=5000)
+    assert integr.info['success']
+    assert np.allclose(C, integr.Cout[-1, ...], rtol=1e-6)
+
+
+def test_steady_state__fallback():
+    events = [dict(kind='threshold', species=0, value=1.0)]
+    rd = _get_rd(events=events)
+    C0 = np.array([[2, 0.01], [0.5, 0.01], [0.5, 0.01]])
+    C, info = steady_state(rd, C0, newton_kwargs=dict(max_iter=1), nfallback=1)
+    assert not info['success'] and info['status'] == 'max_iter'
+    assert info['nfallback'] == 1 and info['nnewton'] == 2
+    assert info['fallback_t'][0] > 0
+    assert rd.events[0]['kind'] == 'threshold' and len(rd.events) == 1  # restored
+
+    C, info = steady_state(rd, C0, newton_kwargs=dict(max_iter=12), nfallback=5)
+    assert info['success'] and info['nfallback'] >= 1
+    assert info['niter'] == info['dtaus'].size
+    assert info['residuals'][-1] <= 1e-10*info['residuals'][0]
+    M = C0.sum()/3
+    assert np.allclose(C, [[M/3, 2*M/3]]*3, rtol=1e-6)
+
+    # A -> B with logy: d(ln[A])/dt = -k never vanishes, but dC/dt does once [A] underflows
+    rd_log = ReactionDiffusion(2, [[0]], [[1]], k=[0.5], logy=True)
+    C, info = steady_state(rd_log, [-800.0, 0.0], C0_is_log=True, newton_kwargs=dict(max_iter=3))
+    assert info['success'] and info['status'] == 'converged' and info['nfallback'] == 0
+    assert np.allclose(C, [[0, 1]])
+
+
+@pytest.mark.parametrize("logy", [False, True])
+def test_continuation(logy):
+    # dX/dt = p - 2.5 X + 3 X**2 - X**3 with p = 2*doserate: S-shaped branch
+    rd = ReactionDiffusion(1, [[0, 0], [0, 0, 0], [0]], [[0, 0, 0], [0, 0], []],
+                           k=[3.0, 1.0, 2.5], g_values=[[1.0]], g_value_parents=[-1],
+                           fields=[[0.7]], logy=logy)
+    p, C, info = continuation(rd, [0.05], ('fields', 0), 0.75, p0=0.05, factor=2.0)
+    assert info['success'] and info['status'] == 'reached_end'
+    assert rd.fields[0][0] == 0.7  # restored
+    assert p[0] == 0.05 and p[-1] == 0.75
+    assert C.shape == (p.size, 1, 1)
+    X = C[:, 0, 0]
+    assert np.allclose(2*p, 2.5*X - 3*X**2 + X**3, atol=1e-8)
+    assert len(info['folds']) == 2
+    assert np.allclose(2*p[info['folds']], [0.636, 0.364], atol=0.05)
+    assert info['niters'].size == p.size
+
+    p, C, info = continuation(rd, [0.05], ('k', 2), 2.0, arclength=False)  # k: 2.5 -> 2.0
+    assert info['success'] and np.all(np.diff(p) < 0)
+    assert p[0] == 2.5 and p[-1] == 2.0
+    X = C[:, 0, 0]
+    assert np.allclose(0.7 - p*X + 3*X**2 - X**3, 0, atol=1e-8)
+
+
+@pytest.mark.parametrize("logy", [False, True])
+def test_periodic_steady_state(logy):
+    # A produced by pulses of the field, A -> B, B ->, 2 A -> B
+    rd = ReactionDiffusion(2, [[0], [1], [0, 0]], [[1], [], [1]], k=[1.0, 0.5, 0.3],
+                           g_values=[[1.0, 0.0]], g_value_parents=[-1], fields=[[0.0]],
+                           logy=logy)
+    durations, fields = [0.2, 0.8], [2.5, 0.0]
+    kw = dict(atol=1e-12, rtol=1e-10)
+    C, info = periodic_steady_state(rd, [0.01, 0.01], durations, fields, factor=2.0, **kw)
+    assert info['success'] and info['status'] == 'converged'
+    assert info['nperiods'] < 30
+    assert info['residuals'].size == info['niter'] + 1
+    assert rd.fields[0][0] == 0.0  # restored
+    assert C.shape == (1, 2)
+
+    nper = 100
+    y0 = rd.logb([0.01, 0.01]) if logy else np.array([0.01, 0.01])
+    tout, yout = cvode_predefined_durations_fields(
+        rd, y0, np.tile(durations, nper), np.tile([5.0, 0.0], nper), [1e-12], 1e-10, 'bdf')
+    Cref = rd.expb(yout[-1, ...]) if logy else yout[-1, ...]
+    assert np.allclose(C, Cref, rtol=1e-6)
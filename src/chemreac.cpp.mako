@@ -41,6 +41,8 @@ using std::max;
 
 #define expb(arg) (use_log2 ? std::exp2(arg) : std::exp(arg))
 #define logb(arg) (use_log2 ? std::log2(arg) : std::pow(2, arg))
+// In kernels specialized on LOG2 (template parameter), resolved at compile time:
+#define EXPB(arg) (LOG2 ? std::exp2(arg) : std::exp(arg))
 
 #define GRAD_WEIGHT(bi, li) grad_weight[nstencil*(bi) + li]
 
@@ -93,6 +95,9 @@ ReactionDiffusion<Real_t>::ReactionDiffusion(
     work1(buffer_factory<double>(n*N)),
     work2(buffer_factory<double>(n*N)),
     work3(buffer_factory<double>(${"((nr/8)+1)*8*omp_get_num_threads()" if WITH_OPENMP else "nr"})),
+    work_jtimes(buffer_factory<double>(2*n*N)),
+    work_fout(buffer_factory<double>(n*N)),
+    work_fd(buffer_factory<double>(4*nstencil)),
     logy(logy), logt(logt), logx(logx), stoich_active(stoich_active),
     stoich_inact(stoich_inact), stoich_prod(stoich_prod),
     k(k),  D(D), z_chg(z_chg), mobility(mobility), x(x), lrefl(lrefl), rrefl(rrefl),
@@ -100,8 +105,11 @@ ReactionDiffusion<Real_t>::ReactionDiffusion(
     surf_chg(surf_chg), eps_rel(eps_rel), faraday_const(faraday_const),
     vacuum_permittivity(vacuum_permittivity),
     g_value_parents(g_value_parents), modulated_rxns(modulated_rxns), modulation(modulation),
+    eff_k(buffer_factory<Real_t>(N*nr)),
     ilu_limit(ilu_limit), n_jac_diags((n_jac_diags == 0) ? nsidep : n_jac_diags), use_log2(use_log2),
-    clip_to_pos(clip_to_pos)
+    clip_to_pos(clip_to_pos),
+    memo_y(buffer_factory<Real_t>(n*N)),
+    memo_f(buffer_factory<Real_t>(n*N))
 {
     if (N < 1) throw std::logic_error("One is the smallest number of bins.");
     if (N == 2) throw std::logic_error("2nd order PDE requires at least 3 stencil points.");
@@ -196,6 +204,45 @@ ReactionDiffusion<Real_t>::ReactionDiffusion(
         }
     }
 
+    // Net stoichiometry per reaction
+    net_stoich_ptr.push_back(0);
+    for (int rxni=0; rxni<nr; ++rxni){
+        vector<int> involved;
+        for (const auto& stoich : {stoich_active[rxni], stoich_inact[rxni], stoich_prod[rxni]})
+            involved.insert(involved.end(), stoich.begin(), stoich.end());
+        std::sort(involved.begin(), involved.end());
+        involved.erase(std::unique(involved.begin(), involved.end()), involved.end());
+        for (const auto si : involved){
+            const int coeff = count(stoich_prod[rxni].begin(), stoich_prod[rxni].end(), si) -
+                count(stoich_active[rxni].begin(), stoich_active[rxni].end(), si) -
+                count(stoich_inact[rxni].begin(), stoich_inact[rxni].end(), si);
+            if (coeff == 0)
+                continue;
+            net_stoich_si.push_back(si);
+            net_stoich_coeff.push_back(coeff);
+        }
+        net_stoich_ptr.push_back(net_stoich_si.size());
+    }
+
+    // Sparsity of reaction contributions to the Jacobian
+    jac_pair_ptr.push_back(0);
+    for (int rxni=0; rxni<nr; ++rxni){
+        if (net_stoich_ptr[rxni] == net_stoich_ptr[rxni+1])
+            continue; // reaction does not alter any concentration
+        vector<int> reactants(stoich_active[rxni]);
+        std::sort(reactants.begin(), reactants.end());
+        reactants.erase(std::unique(reactants.begin(), reactants.end()), reactants.end());
+        for (const auto dsi : reactants){
+            for (int i=net_stoich_ptr[rxni]; i<net_stoich_ptr[rxni+1]; ++i){
+                jac_pair_si.push_back(net_stoich_si[i]);
+                jac_pair_S.push_back(net_stoich_coeff[i]);
+            }
+            jac_pair_ri.push_back(rxni);
+            jac_pair_dsi.push_back(dsi);
+            jac_pair_ptr.push_back(jac_pair_si.size());
+        }
+    }
+
     // Handle g_values
     if (fields.size() != g_values.size())
         throw std::logic_error("fields and g_values need to be of equal length");
@@ -222,11 +269,111 @@ ReactionDiffusion<Real_t>::ReactionDiffusion(
     for (const auto& mdltn : this->modulation)
         if (mdltn.size() != (unsigned)N)
             throw std::logic_error("illegally sized vector in modulation");
+
+    if (auto_efield)
+        alloc_efield_jac_();
+    select_kernels_();
+}
+
+template<typename T>
+static buffer_t<T> buffer_copy_(const buffer_t<T>& src, std::size_t sz)
+{
+    auto dst = buffer_factory<T>(sz);
+    for (std::size_t i=0; i<sz; ++i)
+        dst[i] = src[i];
+    return dst;
+}
+
+template<typename Real_t>
+ReactionDiffusion<Real_t>::ReactionDiffusion(const ReactionDiffusion<Real_t>& ori):
+    AnyODE::OdeSysBase<Real_t>(ori),
+    n(ori.n), N(ori.N), nstencil(ori.nstencil), nsidep(ori.nsidep), nr(ori.nr),
+    coeff_active(buffer_copy_(ori.coeff_active, nr*n)),
+    coeff_prod(buffer_copy_(ori.coeff_prod, nr*n)),
+    coeff_total(buffer_copy_(ori.coeff_total, nr*n)),
+    coeff_inact(buffer_copy_(ori.coeff_inact, nr*n)),
+    net_stoich_ptr(ori.net_stoich_ptr), net_stoich_si(ori.net_stoich_si), net_stoich_coeff(ori.net_stoich_coeff),
+    jac_pair_ri(ori.jac_pair_ri), jac_pair_dsi(ori.jac_pair_dsi), jac_pair_ptr(ori.jac_pair_ptr),
+    jac_pair_si(ori.jac_pair_si), jac_pair_S(ori.jac_pair_S),
+    lap_weight(buffer_copy_(ori.lap_weight, nstencil*N)),
+    div_weight(buffer_copy_(ori.div_weight, nstencil*N)),
+    grad_weight(buffer_copy_(ori.grad_weight, nstencil*N)),
+    efield(buffer_copy_(ori.efield, N)),
+    netchg(buffer_factory<double>(N)),
+    gradD(buffer_copy_(ori.gradD, N*n)),
+    xc(buffer_copy_(ori.xc, nsidep + N + nsidep)),
+    work1(buffer_factory<double>(n*N)),
+    work2(buffer_factory<double>(n*N)),
+    work3(buffer_factory<double>(${"((nr/8)+1)*8*omp_get_num_threads()" if WITH_OPENMP else "nr"})),
+    work_jtimes(buffer_factory<double>(2*n*N)),
+    work_fout(buffer_factory<double>(n*N)),
+    work_fd(buffer_factory<double>(4*nstencil)),
+    n_factor_affected_k(ori.n_factor_affected_k), geom(ori.geom),
+    logy(ori.logy), logt(ori.logt), logx(ori.logx), stoich_active(ori.stoich_active),
+    stoich_inact(ori.stoich_inact), stoich_prod(ori.stoich_prod),
+    k(ori.k), D(ori.D), z_chg(ori.z_chg), mobility(ori.mobility), x(ori.x), lrefl(ori.lrefl), rrefl(ori.rrefl),
+    auto_efield(ori.auto_efield),
+    surf_chg(ori.surf_chg), eps_rel(ori.eps_rel), faraday_const(ori.faraday_const),
+    vacuum_permittivity(ori.vacuum_permittivity),
+    g_values(ori.g_values), g_value_parents(ori.g_value_parents), fields(ori.fields),
+    modulated_rxns(ori.modulated_rxns), modulation(ori.modulation),
+    field_schedules(ori.field_schedules), modulation_schedules(ori.modulation_schedules),
+    events(ori.events),
+    eff_k(buffer_factory<Real_t>(N*nr)),
+    m_upper_bounds(ori.m_upper_bounds), m_lower_bounds(ori.m_lower_bounds),
+    ilu_limit(ori.ilu_limit),
+    m_get_dx_max_factor(ori.m_get_dx_max_factor), m_get_dx_max_upper_limit(ori.m_get_dx_max_upper_limit),
+    m_get_dx0_factor(ori.m_get_dx0_factor), m_get_dx0_max_dx(ori.m_get_dx0_max_dx),
+    n_jac_diags(ori.n_jac_diags), use_log2(ori.use_log2), clip_to_pos(ori.clip_to_pos),
+    m_error_outside_bounds(ori.m_error_outside_bounds), m_jtimes_fd(ori.m_jtimes_fd),
+    m_efield_jac(ori.m_efield_jac),
+    memo_y(buffer_factory<Real_t>(n*N)),
+    memo_f(buffer_factory<Real_t>(n*N))
+{
+    this->current_info.clear();
+    if (ori.m_rxn_rhs_kernel || ori.m_rxn_jac_kernel)
+        set_rxn_kernels(ori.m_rxn_rhs_kernel, ori.m_rxn_jac_kernel, ori.m_rxn_jac_rows, ori.m_rxn_jac_cols);
+    if (auto_efield)
+        alloc_efield_jac_();
+    select_kernels_();
 }
 
 template<typename Real_t>
 ReactionDiffusion<Real_t>::~ReactionDiffusion(){}
 
+template<typename Real_t>
+void
+ReactionDiffusion<Real_t>::alloc_efield_jac_()
+{
+    for (auto ej : {&ej_last, &ej_jtimes, &ej_prec}){
+        ej->wv = buffer_factory<Real_t>(n*N);
+        ej->A1 = buffer_factory<Real_t>(n*N);
+        ej->A2 = buffer_factory<Real_t>(n*N*nstencil);
+        ej->G = buffer_factory<Real_t>(N);
+        ej->w = buffer_factory<Real_t>(N);
+        ej->dE = buffer_factory<Real_t>(N);
+        ej->biw = buffer_factory<int>(N*nstencil);
+    }
+}
+
+template<typename Real_t>
+void
+ReactionDiffusion<Real_t>::select_kernels_(){
+    // Kernel variants are specialized on (logy, logt, use_log2, clip_to_pos) so that
+    // the inner loops do not branch on these flags.
+    switch ((logy << 3) | (logt << 2) | (use_log2 << 1) | clip_to_pos){
+%for combo in range(16):
+<% flags = ', '.join('true' if combo & (1 << (3 - i)) else 'false' for i in range(4)) %>\
+    case ${combo}:
+        m_rhs_impl = &ReactionDiffusion<Real_t>::template rhs_<${flags}>;
+  %for token in ["dense_jac_rmaj", "dense_jac_cmaj", "banded_jac_cmaj", "compressed_jac_cmaj"]:
+        m_${token}_impl = &ReactionDiffusion<Real_t>::template ${token}_<${flags}>;
+  %endfor
+        break;
+%endfor
+    }
+}
+
 template<typename Real_t>
 int ReactionDiffusion<Real_t>::start_idx_(int bi) const {
     int starti;
@@ -261,8 +408,15 @@ ReactionDiffusion<Real_t>::zero_counters(){
     nprec_solve = 0;
     njacvec_dot = 0;
     njacvec_setup = 0;
+    njacvec_dot_fd = 0;
     nprec_solve_ilu = 0;
     nprec_solve_lu = 0;
+    nprec_cache_hit = 0;
+    nprec_cache_miss = 0;
+    nmemo_state_hit = 0;
+    nmemo_state_miss = 0;
+    nmemo_rhs_hit = 0;
+    nheap_alloc = 0;
 }
 
 template<typename Real_t>
@@ -289,6 +443,53 @@ ReactionDiffusion<Real_t>::get_mupper() const
     return this->get_mlower();
 }
 
+template<typename Real_t>
+int
+ReactionDiffusion<Real_t>::get_nroots() const
+{
+    return events.size();
+}
+
+template<typename Real_t>
+AnyODE::Status
+ReactionDiffusion<Real_t>::roots(Real_t x, const Real_t * const y, Real_t * const out)
+{
+    const Real_t ln_b = (use_log2) ? std::log(2.0) : 1;
+    auto linC = [&](int i) -> Real_t {
+        return (logy) ? (use_log2 ? std::exp2(y[i]) : std::exp(y[i])) : y[i];
+    };
+    for (unsigned ei=0; ei<events.size(); ++ei){
+        const auto& ev = events[ei];
+        switch(ev.kind){
+        case EventKind::THRESHOLD:
+            if (logy && ev.value > 0)
+                out[ei] = y[ev.idx[0]] - (use_log2 ? std::log2(ev.value) : std::log(ev.value));
+            else
+                out[ei] = linC(ev.idx[0]) - ev.value;
+            break;
+        case EventKind::AMOUNT:
+            out[ei] = -ev.value;
+            for (unsigned i=0; i<ev.idx.size(); ++i)
+                out[ei] += ev.w[i]*linC(ev.idx[i]);
+            break;
+        case EventKind::STEADY_STATE: {
+            Real_t * const fvec = AnyODE::buffer_get_raw_ptr(work_fout);
+            const auto status = rhs(x, y, fvec);  // memoized for the state of the last step
+            if (status != AnyODE::Status::success)
+                return status;
+            // dC/dt from dy/dx
+            const Real_t dxdt = (logt) ? 1/((use_log2 ? std::exp2(x) : std::exp(x))*ln_b) : 1;
+            Real_t fmax = 0;
+            for (int i=0; i<n*N; ++i)
+                fmax = std::max(fmax, std::abs(fvec[i]*dxdt*((logy) ? linC(i)*ln_b : 1)));
+            out[ei] = fmax - ev.value;
+            break;
+        }
+        }
+    }
+    return AnyODE::Status::success;
+}
+
 template<typename Real_t>
 Real_t
 ReactionDiffusion<Real_t>::get_dx_max(Real_t x, const Real_t * const y)
@@ -299,19 +500,16 @@ ReactionDiffusion<Real_t>::get_dx_max(Real_t x, const Real_t * const y)
     }
     %endfor
     const int ny = get_ny();
-    auto fvec = std::vector<Real_t>(ny);
-    auto hvec = std::vector<Real_t>(ny);
-    rhs(x, y, &fvec[0]);
+    Real_t * const fvec = AnyODE::buffer_get_raw_ptr(work_fout);
+    rhs(x, y, fvec);  // memoized when called for the state of the last rhs evaluation
+    auto result = std::numeric_limits<Real_t>::max();
     for (int idx=0; idx < ny; ++idx){
-        if (fvec[idx] == 0) {
-            hvec[idx] = std::numeric_limits<Real_t>::max();
-        } else if (fvec[idx] > 0) {
-            hvec[idx] = std::abs(m_upper_bounds[idx] - y[idx])/fvec[idx];
-        } else { // fvec[idx] < 0
-            hvec[idx] = std::abs((m_lower_bounds[idx] - y[idx])/fvec[idx]);
+        if (fvec[idx] > 0) {
+            result = std::min(result, std::abs(m_upper_bounds[idx] - y[idx])/fvec[idx]);
+        } else if (fvec[idx] < 0) {
+            result = std::min(result, std::abs((m_lower_bounds[idx] - y[idx])/fvec[idx]));
         }
     }
-    auto result = *std::min_element(std::begin(hvec), std::end(hvec));
     if (m_get_dx_max_factor != 0.0) {
         result *= std::abs(m_get_dx_max_factor);
     }
@@ -361,8 +559,8 @@ ReactionDiffusion<Real_t>::xc_bi_map_(int xci) const
 template<typename Real_t>
 void
 ReactionDiffusion<Real_t>::apply_fd_(int bi){
-    auto c = AnyODE::buffer_factory<Real_t>(3*nstencil);
-    auto lxc = AnyODE::buffer_factory<Real_t>(nstencil); // local shifted x-centers
+    Real_t * const c = AnyODE::buffer_get_raw_ptr(work_fd);
+    Real_t * const lxc = c + 3*nstencil; // local shifted x-centers
     int around = bi + nsidep;
     int start = bi;
     if (!lrefl) // shifted finite diff
@@ -372,7 +570,7 @@ ReactionDiffusion<Real_t>::apply_fd_(int bi){
 
     for (int li=0; li<nstencil; ++li) // li: local index
         lxc[li] = xc[start + li] - xc[around];
-    finitediff::populate_weights<Real_t>(0, AnyODE::buffer_get_raw_ptr(lxc), nstencil-1, 2, AnyODE::buffer_get_raw_ptr(c));
+    finitediff::populate_weights<Real_t>(0, lxc, nstencil-1, 2, c);
 
     const Real_t logbdenom = use_log2 ? 1/log(2) : 1;
 
@@ -421,6 +619,7 @@ ReactionDiffusion<Real_t>::apply_fd_(int bi){
 template<typename Real_t>
 Real_t
 ReactionDiffusion<Real_t>::get_mod_k(int bi, int ri) const{
+    // computed from k & modulation (eff_k is only refreshed by the kernels, see update_eff_k)
     Real_t tmp = k[ri];
     // Modulation
     int enumer = -1;
@@ -432,6 +631,113 @@ ReactionDiffusion<Real_t>::get_mod_k(int bi, int ri) const{
     return tmp;
 }
 
+template<typename Real_t>
+void
+ReactionDiffusion<Real_t>::update_eff_k(){
+    if (k.size() != (unsigned)nr)
+        throw std::length_error("k and stoich_prod of different sizes.");
+    if (modulation.size() != modulated_rxns.size())
+        throw std::logic_error("modulation size differs from modulated_rxns");
+    for (int bi=0; bi<N; ++bi)
+        for (int ri=0; ri<nr; ++ri)
+            eff_k[bi*nr + ri] = k[ri];
+    for (unsigned mi=0; mi<modulated_rxns.size(); ++mi){
+        const int ri = modulated_rxns[mi];
+        if (ri >= nr || ri < 0)
+            throw std::logic_error("illegal reaction index in modulated_rxns");
+        if (modulation[mi].size() != (unsigned)N)
+            throw std::logic_error("illegally sized vector in modulation");
+    }
+    if (modulation_schedules.size() != 0 && modulation_schedules.size() != modulated_rxns.size())
+        throw std::logic_error("modulation_schedules size differs from modulated_rxns");
+    m_sched_valid = false; // schedule factors are re-evaluated (sizes may have changed)
+    modulate_eff_k_();
+    m_eff_k_stale = false;
+    memo_f_valid = false;
+}
+
+template<typename Real_t>
+void
+ReactionDiffusion<Real_t>::modulate_eff_k_(){
+    // (Re-)applies modulation (and the current modulation_schedules factors) to eff_k
+    for (unsigned mi=0; mi<modulated_rxns.size(); ++mi)
+        for (int bi=0; bi<N; ++bi)
+            eff_k[bi*nr + modulated_rxns[mi]] = k[modulated_rxns[mi]];
+    for (unsigned mi=0; mi<modulated_rxns.size(); ++mi){
+        const Real_t fact = (modulation_schedules.size() > 0 && m_sched_valid) ? m_mod_fact[mi] : 1;
+        for (int bi=0; bi<N; ++bi)
+            eff_k[bi*nr + modulated_rxns[mi]] *= modulation[mi][bi]*fact;
+    }
+}
+
+template<typename Real_t>
+void
+ReactionDiffusion<Real_t>::set_schedule_time_(Real_t time){
+    // Evaluates field_schedules & modulation_schedules at time (physical time), updating
+    // eff_k when the modulation factors change.
+    if (field_schedules.empty() && modulation_schedules.empty())
+        return;
+    if (m_sched_valid && time == m_sched_time)
+        return;
+    if (field_schedules.size() != 0 && field_schedules.size() != fields.size())
+        throw std::logic_error("field_schedules size differs from fields");
+    if (modulation_schedules.size() != 0 && modulation_schedules.size() != modulated_rxns.size())
+        throw std::logic_error("modulation_schedules size differs from modulated_rxns");
+    m_field_fact.resize(field_schedules.size());
+    for (unsigned fi=0; fi<field_schedules.size(); ++fi)
+        m_field_fact[fi] = field_schedules[fi](time);
+    bool mod_changed = !m_sched_valid;
+    m_mod_fact.resize(modulation_schedules.size());
+    for (unsigned mi=0; mi<modulation_schedules.size(); ++mi){
+        const Real_t fact = modulation_schedules[mi](time);
+        if (fact != m_mod_fact[mi]){
+            m_mod_fact[mi] = fact;
+            mod_changed = true;
+        }
+    }
+    m_sched_time = time;
+    m_sched_valid = true;
+    if (mod_changed && modulation_schedules.size() > 0)
+        modulate_eff_k_();
+    memo_f_valid = false;
+}
+
+template<typename Real_t>
+vector<Real_t>
+ReactionDiffusion<Real_t>::schedule_breakpoints(Real_t x0, Real_t xend) const {
+    const Real_t t0 = (logt) ? (use_log2 ? std::exp2(x0) : std::exp(x0)) : x0;
+    const Real_t tend = (logt) ? (use_log2 ? std::exp2(xend) : std::exp(xend)) : xend;
+    vector<Real_t> result;
+    for (const auto& schedules : {&field_schedules, &modulation_schedules})
+        for (const auto& sched : *schedules)
+            for (const auto bp : sched.breakpoints(t0, tend))
+                result.push_back((logt) ? (use_log2 ? std::log2(bp) : std::log(bp)) : bp);
+    std::sort(result.begin(), result.end());
+    result.erase(std::unique(result.begin(), result.end()), result.end());
+    return result;
+}
+
+template<typename Real_t>
+void
+ReactionDiffusion<Real_t>::set_rxn_kernels(rxn_rhs_kernel_t<Real_t> rhs_kernel,
+                                           rxn_jac_kernel_t<Real_t> jac_kernel,
+                                           vector<int> jac_rows, vector<int> jac_cols){
+    // Passing nullptr for both kernels restores the generic implementation.
+    if (jac_rows.size() != jac_cols.size())
+        throw std::length_error("jac_rows and jac_cols of different sizes.");
+    for (unsigned i=0; i<jac_rows.size(); ++i)
+        if (jac_rows[i] < 0 || jac_rows[i] >= n || jac_cols[i] < 0 || jac_cols[i] >= n)
+            throw std::logic_error("Species index out of bounds in kernel sparsity pattern.");
+    if ((rhs_kernel == nullptr) != (jac_kernel == nullptr))
+        throw std::logic_error("Both or neither of rhs_kernel & jac_kernel need to be given.");
+    clear_memo();
+    m_rxn_rhs_kernel = rhs_kernel;
+    m_rxn_jac_kernel = jac_kernel;
+    m_rxn_jac_rows = jac_rows;
+    m_rxn_jac_cols = jac_cols;
+    work_kernel = buffer_factory<Real_t>((jac_rows.size() + 1)*${"omp_get_max_threads()" if WITH_OPENMP else "1"});
+}
+
 template<typename Real_t>
 void
 ReactionDiffusion<Real_t>::fill_local_r_(int bi, const Real_t * const ANYODE_RESTRICT C,
@@ -449,7 +755,7 @@ ReactionDiffusion<Real_t>::fill_local_r_(int bi, const Real_t * const ANYODE_RES
             tmp *= C[bi*n+si];
         }
         // Rate constant
-        local_r[rxni] = get_mod_k(bi, rxni)*tmp;
+        local_r[rxni] = eff_k[bi*nr + rxni]*tmp;
     }
 }
 
@@ -459,8 +765,9 @@ ReactionDiffusion<Real_t>::fill_local_r_(int bi, const Real_t * const ANYODE_RES
 
 #define Y(bi, si) y[(bi)*n+(si)]
 template<typename Real_t>
+template<bool LOG2>
 void
-ReactionDiffusion<Real_t>::populate_linC(Real_t * const ANYODE_RESTRICT linC,
+ReactionDiffusion<Real_t>::populate_linC_(Real_t * const ANYODE_RESTRICT linC,
                                          const Real_t * const ANYODE_RESTRICT y,
                                          bool apply_exp, bool recip) const
 {
@@ -469,7 +776,7 @@ ReactionDiffusion<Real_t>::populate_linC(Real_t * const ANYODE_RESTRICT linC,
         if (recip) {
             if (apply_exp) {
                 for (int si=0; si<n; ++si){
-                    linC[bi*n + si] = expb(-Y(bi, si));
+                    linC[bi*n + si] = EXPB(-Y(bi, si));
                 }
             } else {
                 for (int si=0; si<n; ++si){
@@ -479,7 +786,7 @@ ReactionDiffusion<Real_t>::populate_linC(Real_t * const ANYODE_RESTRICT linC,
         } else {
             if (apply_exp) {
                 for (int si=0; si<n; ++si){
-                    linC[bi*n + si] = expb(Y(bi, si));
+                    linC[bi*n + si] = EXPB(Y(bi, si));
                 }
             } else {
                 for (int si=0; si<n; ++si){
@@ -489,29 +796,29 @@ ReactionDiffusion<Real_t>::populate_linC(Real_t * const ANYODE_RESTRICT linC,
         }
     }
 }
-#define LINC(bi, si) linC[(bi)*n+(si)]
-#define RLINC(bi, si) rlinC[(bi)*n+(si)]
+template<typename Real_t>
+void
+ReactionDiffusion<Real_t>::populate_linC(Real_t * const ANYODE_RESTRICT linC,
+                                         const Real_t * const ANYODE_RESTRICT y,
+                                         bool apply_exp, bool recip) const
+{
+    if (use_log2)
+        populate_linC_<true>(linC, y, apply_exp, recip);
+    else
+        populate_linC_<false>(linC, y, apply_exp, recip);
+}
 
-#define DYDT(bi, si) dydt[(bi)*(n)+(si)]
 template<typename Real_t>
-AnyODE::Status
-ReactionDiffusion<Real_t>::rhs(Real_t t, const Real_t * const y, Real_t * const ANYODE_RESTRICT dydt)
+template<bool LOGY, bool LOG2, bool CLIP>
+void
+ReactionDiffusion<Real_t>::populate_work_linC_(const Real_t * const ANYODE_RESTRICT y)
 {
-    // note condifiontal call to free at end of this function
-    bool use_work = false;
-    if (logy) {
-        populate_linC(AnyODE::buffer_get_raw_ptr(work1), y, true);
-        populate_linC(AnyODE::buffer_get_raw_ptr(work2), y, true, true);
-        use_work = true;
-    }
-    if (clip_to_pos) {
-        if (!use_work) {
-            memcpy(AnyODE::buffer_get_raw_ptr(work1), y, sizeof(Real_t)*n*N);
-            for (int i=0; i<get_ny(); ++i){
-                work2[i] = 1.0/y[i];
-            }
-            use_work = true;
-        }
+    // linC (work1) & rlinC (work2), kept (memo_linC_valid) until the state changes
+    if (LOGY) {
+        populate_linC_<LOG2>(AnyODE::buffer_get_raw_ptr(work1), y, true, false);
+        populate_linC_<LOG2>(AnyODE::buffer_get_raw_ptr(work2), y, true, true);
+    }
+    if (CLIP) {
         for (int i=0; i<get_ny(); ++i){
             work1[i] = (y[i] < 0) ? 0 : y[i];
         }
@@ -519,6 +826,60 @@ ReactionDiffusion<Real_t>::rhs(Real_t t, const Real_t * const y, Real_t * const
             work2[i] = (y[i] < 0) ? INFINITY : y[i];
         }
     }
+    memo_linC_valid = true;
+}
+
+template<typename Real_t>
+bool
+ReactionDiffusion<Real_t>::memo_same_state_(const Real_t * const ANYODE_RESTRICT y)
+{
+    // Compares y with the state of the last call to rhs or a Jacobian routine,
+    // on mismatch the memoized quantities are invalidated.
+    const int ny = get_ny();
+    if (memo_y_valid && std::memcmp(y, AnyODE::buffer_get_raw_ptr(memo_y), sizeof(Real_t)*ny) == 0){
+        nmemo_state_hit++;
+        return true;
+    }
+    nmemo_state_miss++;
+    std::memcpy(AnyODE::buffer_get_raw_ptr(memo_y), y, sizeof(Real_t)*ny);
+    memo_y_valid = true;
+    memo_linC_valid = false;
+    memo_efield_valid = false;
+    memo_f_valid = false;
+    return false;
+}
+
+template<typename Real_t>
+void
+ReactionDiffusion<Real_t>::clear_memo()
+{
+    memo_y_valid = false;
+    memo_linC_valid = false;
+    memo_efield_valid = false;
+    memo_f_valid = false;
+}
+
+#define LINC(bi, si) linC[(bi)*n+(si)]
+#define RLINC(bi, si) rlinC[(bi)*n+(si)]
+
+#define DYDT(bi, si) dydt[(bi)*(n)+(si)]
+template<typename Real_t>
+template<bool LOGY, bool LOGT, bool LOG2, bool CLIP>
+AnyODE::Status
+ReactionDiffusion<Real_t>::rhs_(Real_t t, const Real_t * const y, Real_t * const ANYODE_RESTRICT dydt)
+{
+    if (m_eff_k_stale)
+        update_eff_k();
+    set_schedule_time_((LOGT) ? EXPB(t) : t);
+    if (memo_same_state_(y) && memo_f_valid && memo_t == t){
+        std::memcpy(dydt, AnyODE::buffer_get_raw_ptr(memo_f), sizeof(Real_t)*get_ny());
+        nmemo_rhs_hit++;
+        nfev++;
+        return AnyODE::Status::success;
+    }
+    const bool use_work = LOGY || CLIP;
+    if (use_work && !memo_linC_valid)
+        populate_work_linC_<LOGY, LOG2, CLIP>(y);
     const Real_t * const linC = (use_work) ? AnyODE::buffer_get_raw_ptr(work1) : y;
     const Real_t * const rlinC = (use_work) ? AnyODE::buffer_get_raw_ptr(work2) : nullptr;
     if (m_error_outside_bounds) {
@@ -543,10 +904,11 @@ ReactionDiffusion<Real_t>::rhs(Real_t t, const Real_t * const y, Real_t * const
             }
         }
     }
-    if (auto_efield){
+    if (auto_efield && !memo_efield_valid){
         calc_efield(linC);
+        memo_efield_valid = true;
     }
-    const Real_t expb_t = (logt) ? expb(t) : 0.0;
+    const Real_t expb_t = (LOGT) ? EXPB(t) : 0.0;
     ${"Real_t * const local_r = AnyODE::buffer_get_raw_ptr(work3);" if not WITH_OPENMP else ""}
     ${"#pragma omp parallel for schedule(static) if (N*n > 65536)" if WITH_OPENMP else ""}
     for (int bi=0; bi<N; ++bi){
@@ -558,25 +920,26 @@ ReactionDiffusion<Real_t>::rhs(Real_t t, const Real_t * const y, Real_t * const
 
         // Contributions from reactions
         // ----------------------------
-        fill_local_r_(bi, linC, local_r);
-        for (int rxni=0; rxni<nr; ++rxni){
-            // reaction index rxni
-            for (int si=0; si<n; ++si){
-                // species index si
-                const int overall = coeff_total[rxni*n + si];
-                if (overall != 0)
-                    DYDT(bi, si) += overall*local_r[rxni];
+        if (m_rxn_rhs_kernel) {
+            m_rxn_rhs_kernel(AnyODE::buffer_get_raw_ptr(eff_k) + bi*nr, linC + bi*n, dydt + bi*n);
+        } else {
+            fill_local_r_(bi, linC, local_r);
+            for (int rxni=0; rxni<nr; ++rxni){
+                // reaction index rxni
+                for (int i=net_stoich_ptr[rxni]; i<net_stoich_ptr[rxni+1]; ++i)
+                    DYDT(bi, net_stoich_si[i]) += net_stoich_coeff[i]*local_r[rxni];
             }
         }
         // Contribution from particle/electromagnetic fields
         for (unsigned fi=0; fi<this->fields.size(); ++fi){
-            if (fields[fi][bi] == 0)
+            const Real_t field = fields[fi][bi]*(field_schedules.empty() ? 1 : m_field_fact[fi]);
+            if (field == 0)
                 continue; // exit early
             const Real_t gfact = (g_value_parents[fi] == -1) ? \
                 1.0 : LINC(bi, g_value_parents[fi]);
             for (int si=0; si<n; ++si)
                 if (g_values[fi][si] != 0)
-                    DYDT(bi, si) += fields[fi][bi]*g_values[fi][si]*gfact;
+                    DYDT(bi, si) += field*g_values[fi][si]*gfact;
         }
 
         if (N>1){
@@ -601,21 +964,30 @@ ReactionDiffusion<Real_t>::rhs(Real_t t, const Real_t * const y, Real_t * const
             }
         }
         for (int si=0; si<n; ++si){
-            if (logy){
+            if (LOGY){
                 DYDT(bi, si) *= RLINC(bi, si);
-                if (!logt and use_log2)
+                if (!LOGT and LOG2)
                     DYDT(bi, si) /= log(2);
             }
-            if (logt){
+            if (LOGT){
                 DYDT(bi, si) *= expb_t;
-                if (!logy and use_log2)
+                if (!LOGY and LOG2)
                     DYDT(bi, si) *= log(2);
             }
         }
     }
+    std::memcpy(AnyODE::buffer_get_raw_ptr(memo_f), dydt, sizeof(Real_t)*get_ny());
+    memo_t = t;
+    memo_f_valid = true;
     nfev++;
     return AnyODE::Status::success;
 }
+template<typename Real_t>
+AnyODE::Status
+ReactionDiffusion<Real_t>::rhs(Real_t t, const Real_t * const y, Real_t * const ANYODE_RESTRICT dydt)
+{
+    return (this->*m_rhs_impl)(t, y, dydt);
+}
 #undef DYDT
 
 #define FOUT(bi, si) fout[(bi)*n+si]
@@ -628,10 +1000,21 @@ ReactionDiffusion<Real_t>::${token}(Real_t t,
                                     const Real_t * const ANYODE_RESTRICT fy,
                                     Real_t * const ANYODE_RESTRICT ja, long int ldj
                                     ${', double * const ANYODE_RESTRICT /* dfdt */' if token.startswith('dense') else ''})
+{
+    return (this->*m_${token}_impl)(t, y, fy, ja, ldj);
+}
+
+template<typename Real_t>
+template<bool LOGY, bool LOGT, bool LOG2, bool CLIP>
+AnyODE::Status
+ReactionDiffusion<Real_t>::${token}_(Real_t t,
+                                     const Real_t * const ANYODE_RESTRICT y,
+                                     const Real_t * const ANYODE_RESTRICT fy,
+                                     Real_t * const ANYODE_RESTRICT ja, long int ldj)
 {
     // Note: blocks are zeroed out, diagonals only incremented
-    // `t`: time (log(t) if logt=1)
-    // `y`: concentrations (log(conc) if logy=True)
+    // `t`: time (log(t) if LOGT=1)
+    // `y`: concentrations (log(conc) if LOGY=True)
     // `ja`: jacobian (allocated 1D array to hold dense or banded)
     // `ldj`: leading dimension of ja (useful for padding, ignored by compressed_*)
  %if token.startswith("compressed"):
@@ -651,44 +1034,30 @@ ReactionDiffusion<Real_t>::${token}(Real_t t,
  %else:
     #error "Unhandled token."
  %endif
-    const Real_t exp_t = (logt) ? expb(t) : 0.0;
-    const Real_t logbfactor = use_log2 ? log(2) : 1;
+    const Real_t exp_t = (LOGT) ? EXPB(t) : 0.0;
+    const Real_t logbfactor = LOG2 ? log(2) : 1;
+    if (m_eff_k_stale)
+        update_eff_k();
+    set_schedule_time_((LOGT) ? exp_t : t);
 
     Real_t * fout = nullptr;
-    if (logy){ // fy useful..
+    if (LOGY){ // fy useful..
         if (fy){
             fout = const_cast<Real_t *>(fy);
         } else {
-            fout = new Real_t[n*N];
-            rhs(t, y, fout);
-        }
-    }
-    bool use_work = false;
-    // note conditional call to free at end of this function
-    if (logy) {
-        populate_linC(AnyODE::buffer_get_raw_ptr(work1), y, true, false);
-        populate_linC(AnyODE::buffer_get_raw_ptr(work2), y, true, true);
-        use_work = true;
-    }
-    if (clip_to_pos) {
-        if (!use_work) {
-            memcpy(AnyODE::buffer_get_raw_ptr(work1), y, sizeof(Real_t)*n*N);
-            for (int i=0; i<get_ny(); ++i){
-                work2[i] = 1.0/y[i];
-            }
-            use_work = true;
-        }
-        for (int i=0; i<get_ny(); ++i){
-            work1[i] = (y[i] < 0) ? 0 : y[i];
-        }
-        for (int i=0; i<get_ny(); ++i){
-            work2[i] = (y[i] < 0) ? INFINITY : y[i];
+            fout = AnyODE::buffer_get_raw_ptr(work_fout);
+            rhs(t, y, fout);  // memoizes linC & efield for y
         }
     }
+    memo_same_state_(y);
+    const bool use_work = LOGY || CLIP;
+    if (use_work && !memo_linC_valid)
+        populate_work_linC_<LOGY, LOG2, CLIP>(y);
     const Real_t * const linC = (use_work) ? AnyODE::buffer_get_raw_ptr(work1) : y;
     const Real_t * const rlinC = (use_work) ? AnyODE::buffer_get_raw_ptr(work2) : nullptr;
-    if (auto_efield) {
+    if (auto_efield && !memo_efield_valid) {
         calc_efield(linC);
+        memo_efield_valid = true;
     }
 
     ${"#pragma omp parallel for schedule(static) if (N*n*n > 65536)" if WITH_OPENMP else ""}
@@ -696,37 +1065,39 @@ ReactionDiffusion<Real_t>::${token}(Real_t t,
         // Conc. in `bi:th` compartment
         // Contributions from reactions and fields
         // ---------------------------------------
-        for (int si=0; si<n; ++si){
-            // species si
-            for (int dsi=0; dsi<n; ++dsi){
-                // derivative wrt species dsi
+        for (int si=0; si<n; ++si)
+            for (int dsi=0; dsi<n; ++dsi)
                 jac.block(bi, si, dsi) = 0.0;
-                for (int rxni=0; rxni<nr; ++rxni){
-                    // reaction rxni
-                    const int Akj = coeff_active[rxni*n + dsi];
-                    const int Ski = coeff_total[rxni*n + si];
-                    if (Akj == 0 || Ski == 0)
-                        continue;
-                    Real_t qkj = get_mod_k(bi, rxni)*Akj*pow(LINC(bi, dsi), Akj-1);
-                    for (unsigned rnti=0; rnti < stoich_active[rxni].size(); ++rnti){
-                        const int rnti_si = stoich_active[rxni][rnti];
-                        if (rnti_si == dsi)
-                            continue;
-                        qkj *= LINC(bi, rnti_si);
-                    }
-                    jac.block(bi, si, dsi) += Ski*qkj;
-                    //std::cout << "jac.block(" << bi << ", " << si << ", " << dsi <<") = " << jac.block(bi, si, dsi) << "\n";
-                }
-                // Contribution from particle/electric fields
-                for (unsigned fi=0; fi<(this->fields.size()); ++fi){
-                    const int Ski = (g_values[fi][si] != 0.0) ? 1 : 0;
-                    const int Akj = ((int)dsi == g_value_parents[fi]) ? 1 : 0;
-                    const Real_t rk = fields[fi][bi]*g_values[fi][si];
-                    if (Ski == 0 || Akj == 0 || rk == 0)
-                        continue;
-                    jac.block(bi, si, dsi) += Akj*Ski*rk;
-                }
+        if (m_rxn_jac_kernel) {
+            Real_t * const vals = AnyODE::buffer_get_raw_ptr(work_kernel) + ${"(m_rxn_jac_rows.size() + 1)*omp_get_thread_num()" if WITH_OPENMP else "0"};
+            m_rxn_jac_kernel(AnyODE::buffer_get_raw_ptr(eff_k) + bi*nr, linC + bi*n, vals);
+            for (unsigned i=0; i<m_rxn_jac_rows.size(); ++i)
+                jac.block(bi, m_rxn_jac_rows[i], m_rxn_jac_cols[i]) += vals[i];
+        }
+        for (unsigned pi=0; pi<(m_rxn_jac_kernel ? 0 : jac_pair_ri.size()); ++pi){
+            // reaction rxni, derivative wrt species dsi
+            const int rxni = jac_pair_ri[pi];
+            const int dsi = jac_pair_dsi[pi];
+            const int Akj = coeff_active[rxni*n + dsi];
+            Real_t qkj = eff_k[bi*nr + rxni]*Akj*pow(LINC(bi, dsi), Akj-1);
+            for (unsigned rnti=0; rnti < stoich_active[rxni].size(); ++rnti){
+                const int rnti_si = stoich_active[rxni][rnti];
+                if (rnti_si == dsi)
+                    continue;
+                qkj *= LINC(bi, rnti_si);
             }
+            for (int ci=jac_pair_ptr[pi]; ci<jac_pair_ptr[pi+1]; ++ci)
+                jac.block(bi, jac_pair_si[ci], dsi) += jac_pair_S[ci]*qkj;
+        }
+        // Contribution from particle/electric fields
+        for (unsigned fi=0; fi<(this->fields.size()); ++fi){
+            const int dsi = g_value_parents[fi];
+            const Real_t field = fields[fi][bi]*(field_schedules.empty() ? 1 : m_field_fact[fi]);
+            if (dsi == -1 || field == 0)
+                continue;
+            for (int si=0; si<n; ++si)
+                if (g_values[fi][si] != 0.0)
+                    jac.block(bi, si, dsi) += field*g_values[fi][si];
         }
 
 
@@ -763,36 +1134,63 @@ ReactionDiffusion<Real_t>::${token}(Real_t t,
 
         // Logartihmic transformations
         // ---------------------------
-        if (logy || logt){
+        if (LOGY || LOGT){
             for (int si=0; si<n; ++si){
                 for (int dsi=0; dsi<n; ++dsi){
-                    if (logy){
+                    if (LOGY){
                         jac.block(bi, si, dsi) *= LINC(bi, dsi)*RLINC(bi, si);
                     }
-                    if (logt)
+                    if (LOGT)
                         jac.block(bi, si, dsi) *= exp_t*logbfactor;
-                    if (logy && dsi == si)
+                    if (LOGY && dsi == si)
                         jac.block(bi, si, si) -= FOUT(bi, si)*logbfactor;
                 }
                 for (int di=0; di<n_jac_diags; ++di){
                     if (bi > di){
-                        if (logy)
+                        if (LOGY)
                             jac.sub(di, bi-di-1, si) *= LINC(bi-di-1, si)*RLINC(bi, si);
-                        if (logt)
+                        if (LOGT)
                             jac.sub(di, bi-di-1, si) *= exp_t*logbfactor;
                     }
                     if (bi < N-di-1){
-                        if (logy)
+                        if (LOGY)
                             jac.sup(di, bi, si) *= LINC(bi+di+1, si)*RLINC(bi, si);
-                        if (logt)
+                        if (LOGT)
                             jac.sup(di, bi, si) *= exp_t*logbfactor;
                     }
                 }
             }
         }
     }
-    if (logy && !fy)
-        delete []fout;
+    if (efield_jac_active_()) {
+        efield_jac_update_<LOGY>(linC, rlinC, (LOGT) ? exp_t*logbfactor : 1);
+ %if not token.startswith("compressed"):
+        // Nonlocal contributions through efield${" (only those within the band)" if token.startswith("banded") else ""}
+        for (int bi=0; bi<N; ++bi){
+  %if token.startswith("banded"):
+            const int bj_lo = max(0, bi - n_jac_diags), bj_hi = min(N - 1, bi + n_jac_diags);
+  %else:
+            const int bj_lo = 0, bj_hi = N - 1;
+  %endif
+            for (int si=0; si<n; ++si){
+                for (int bj=bj_lo; bj<=bj_hi; ++bj){
+                    const Real_t coeff = efield_jac_coeff_(ej_last, bi, si, bj);
+                    if (coeff == 0)
+                        continue;
+                    for (int sj=0; sj<n; ++sj){
+  %if token.startswith("banded"):
+                        if (std::abs(bi*n + si - bj*n - sj) > n*n_jac_diags)
+                            continue;
+  %endif
+                        jac(bi*n + si, bj*n + sj) += coeff*ej_last.wv[bj*n + sj];
+                    }
+                }
+            }
+        }
+ %endif
+    } else {
+        ej_last.valid = false;
+    }
     njev++;
 #if defined(CHEMREAC_WITH_DATA_DUMPING)
     std::ostringstream fname;
@@ -819,6 +1217,38 @@ ReactionDiffusion<Real_t>::jtimes(const Real_t * const ANYODE_RESTRICT vec,
     )
 {
     // See 4.6.7 on page 67 (77) in cvs_guide.pdf (Sundials 2.5)
+    if (m_jtimes_fd) {
+        // Matrix-free: J*v ~= (f(y + sigma*v) - f(y))/sigma
+        const int ny = get_ny();
+        Real_t * const ypert = AnyODE::buffer_get_raw_ptr(work_jtimes);
+        Real_t * const fpert = ypert + ny;
+        Real_t vnorm = 0, ynorm = 0;
+        for (int i=0; i<ny; ++i){
+            vnorm += vec[i]*vec[i];
+            ynorm += y[i]*y[i];
+        }
+        njacvec_dot_fd++;
+        if (vnorm == 0) {
+            std::memset(out, 0, sizeof(Real_t)*ny);
+            return AnyODE::Status::success;
+        }
+        const Real_t sigma = std::sqrt(std::numeric_limits<Real_t>::epsilon())*(1 + std::sqrt(ynorm))/std::sqrt(vnorm);
+        AnyODE::Status status;
+        if (!fy) {
+            status = rhs(t, y, out);  // out temporarily holds f(y)
+            if (status != AnyODE::Status::success)
+                return status;
+        }
+        const Real_t * const f0 = (fy) ? fy : out;
+        for (int i=0; i<ny; ++i)
+            ypert[i] = y[i] + sigma*vec[i];
+        status = rhs(t, ypert, fpert);
+        if (status != AnyODE::Status::success)
+            return status;
+        for (int i=0; i<ny; ++i)
+            out[i] = (fpert[i] - f0[i])/sigma;
+        return AnyODE::Status::success;
+    }
     ignore(t);
     ignore(y);
     ignore(fy);
@@ -827,6 +1257,8 @@ ReactionDiffusion<Real_t>::jtimes(const Real_t * const ANYODE_RESTRICT vec,
         throw std::runtime_error("Forgot to call jtimes_setup?");
     }
     jac_times_cache->dot_vec(vec, out);
+    if (ej_jtimes.valid)
+        efield_jac_dot_(ej_jtimes, vec, out);
     njacvec_dot++;
     return AnyODE::Status::success;
 }
@@ -838,17 +1270,21 @@ ReactionDiffusion<Real_t>::jtimes_setup(Real_t t,
                                         const Real_t * const ANYODE_RESTRICT fy
     )
 {
-    ignore(t);
+    if (m_jtimes_fd)
+        return AnyODE::Status::success; // nothing to prepare
     if (!jac_times_cache){
         const int nsat = (geom == Geom::PERIODIC) ? nsidep : 0;
         const int ld = n;
         jac_times_cache = AnyODE::make_unique<block_diag_ilu::BlockDiagMatrix<Real_t>>(nullptr, N, n, nsidep, nsat, ld);
-        jac_times_cache->set_to(0.0); // compressed_jac_cmaj only increments diagonals
-        const int ld_dummy = 0;
-        compressed_jac_cmaj(t, y, fy, jac_times_cache->m_data, ld_dummy);
+        nheap_alloc++;
     }
+    jac_times_cache->set_to(0.0); // compressed_jac_cmaj only increments diagonals
+    const int ld_dummy = 0;
+    auto status = compressed_jac_cmaj(t, y, fy, jac_times_cache->m_data, ld_dummy);
+    std::swap(ej_jtimes, ej_last); // captured for jtimes
+    ej_last.valid = false;
     njacvec_setup++;
-    return AnyODE::Status::success;
+    return status;
 }
 
 template<typename Real_t>
@@ -866,14 +1302,19 @@ ReactionDiffusion<Real_t>::prec_setup(Real_t t,
         const int nsat = (geom == Geom::PERIODIC) ? nsidep : 0;
         const int ld = n;
         jac_cache = AnyODE::make_unique<block_diag_ilu::BlockDiagMatrix<Real_t>>(nullptr, N, n, nsidep, nsat, ld);
+        nheap_alloc++;
     }
     if (!jok){
         const int dummy = 0;
         jac_cache->set_to(0);
         status = compressed_jac_cmaj(t, y, fy, jac_cache->m_data, dummy);
-        update_prec_cache = true;
+        std::swap(ej_prec, ej_last); // captured for prec_factorize_
+        ej_last.valid = false;
+        jac_version++;
         jac_recomputed = true;
     } else jac_recomputed = false;
+    prec_valid = false;
+    prec_redecide = true;
     nprec_setup++;
     return status;
 }
@@ -883,6 +1324,21 @@ ReactionDiffusion<Real_t>::prec_setup(Real_t t,
 #undef DIV_WEIGHT
 #undef GRAD_WEIGHT
 
+template<typename Real_t>
+void
+ReactionDiffusion<Real_t>::prec_add_to_diag(const Real_t * const ANYODE_RESTRICT d)
+{
+    // Adds d (size n*N) to the diagonal of the Jacobian captured by the latest prec_setup
+    // (used by SteadyStateSolver with logy), the factorization is redone by prec_solve_left.
+    if (!jac_cache)
+        throw std::runtime_error("Forgot to call prec_setup?");
+    for (int bi=0; bi<N; ++bi)
+        for (int si=0; si<n; ++si)
+            jac_cache->block(bi, si, si) += d[bi*n + si];
+    jac_version++;
+    prec_valid = false;
+}
+
 template<typename Real_t>
 AnyODE::Status
 ReactionDiffusion<Real_t>::prec_solve_left(const Real_t t,
@@ -903,26 +1359,11 @@ ReactionDiffusion<Real_t>::prec_solve_left(const Real_t t,
     nprec_solve++;
 
     ignore(t); ignore(fy); ignore(y);
-    bool recompute = false;
-    if (!prec_cache){
-        const int nsat = (geom == Geom::PERIODIC) ? nsidep : 0;
-        const int ld = n;
-        prec_cache = AnyODE::make_unique<block_diag_ilu::BlockDiagMatrix<Real_t>>(nullptr, N, n, nsidep, nsat, ld);
-        recompute = true;
+    if (prec_valid && prec_jac_version == jac_version && prec_gamma == gamma) {
+        nprec_cache_hit++;
     } else {
-        if (update_prec_cache or (old_gamma != gamma))
-            recompute = true;
-    }
-    if (recompute){
-        old_gamma = gamma;
-        prec_cache->set_to_eye_plus_scaled_mtx(-gamma, *jac_cache);
-#if defined(CHEMREAC_WITH_DATA_DUMPING)
-        {
-            std::ostringstream fname;
-            fname << "prec_M_" << std::setfill('0') << std::setw(5) << nprec_solve << ".dat";
-            save_array(prec_cache->m_data, prec_cache->m_ndata, fname.str());
-        }
-#endif
+        nprec_cache_miss++;
+        prec_factorize_(gamma);
     }
 
 #if defined(CHEMREAC_WITH_DATA_DUMPING)
@@ -940,35 +1381,181 @@ ReactionDiffusion<Real_t>::prec_solve_left(const Real_t t,
 #endif
 
     int info;
-    if (prec_cache->average_diag_weight(0) > ilu_limit) {
-        block_diag_ilu::ILU<Real_t> ilu {*prec_cache};
+    if (prec_use_ilu) {
         nprec_solve_ilu++;
-        info = ilu.solve(r, z);
+        info = prec_ilu->solve(r, z);
+    } else if (prec_ext_used) {
+        nprec_solve_lu++;
+        const int m = n + 1;
+        Real_t * const rext = AnyODE::buffer_get_raw_ptr(prec_ext_work);
+        Real_t * const zext = rext + N*m;
+        for (int bi=0; bi<N; ++bi){
+            for (int si=0; si<n; ++si)
+                rext[bi*m + si] = r[bi*n + si];
+            rext[bi*m + n] = 0;
+        }
+        info = prec_ext_lu->solve(rext, zext);
+        for (int bi=0; bi<N; ++bi)
+            for (int si=0; si<n; ++si)
+                z[bi*n + si] = zext[bi*m + si];
     } else {
-        AnyODE::BandedMatrix<Real_t> bm {*prec_cache, get_mlower(), get_mupper()};
-        AnyODE::BandedLU<Real_t> lu {&bm};
-        lu.factorize();
         nprec_solve_lu++;
-        info = lu.solve(r, z);
+        info = prec_lu->solve(r, z);
+    }
+    if (info == 0 && prec_ext_used && ej_prec.flat) {
+        // Sherman-Morrison for the total charge term (u*v^T, v = ej_prec.wv)
+        const Real_t * const y2 = AnyODE::buffer_get_raw_ptr(prec_ext_work) + 2*N*(n + 1);
+        Real_t vz = 0;
+        for (int i=0; i<n*N; ++i)
+            vz += ej_prec.wv[i]*z[i];
+        vz /= prec_ext_denom;
+        for (int i=0; i<n*N; ++i)
+            z[i] -= vz*y2[i];
     }
     if (info == 0)
         return AnyODE::Status::success;
     return AnyODE::Status::recoverable_error;
 }
 
+template<typename Real_t>
+void
+ReactionDiffusion<Real_t>::prec_factorize_(Real_t gamma)
+{
+    // Assembles P = I - gamma*J from jac_cache and factorizes it (ILU or banded LU),
+    // the factorization is kept until the next prec_setup or change of gamma.
+    if (!jac_cache)
+        throw std::runtime_error("Forgot to call prec_setup?");
+    if (!prec_cache){
+        const int nsat = (geom == Geom::PERIODIC) ? nsidep : 0;
+        const int ld = n;
+        prec_cache = AnyODE::make_unique<block_diag_ilu::BlockDiagMatrix<Real_t>>(nullptr, N, n, nsidep, nsat, ld);
+        prec_ilu = AnyODE::make_unique<BlockILU<Real_t>>(prec_cache.get());
+        nheap_alloc += 2;
+    }
+    prec_cache->set_to_eye_plus_scaled_mtx(-gamma, *jac_cache);
+#if defined(CHEMREAC_WITH_DATA_DUMPING)
+    {
+        std::ostringstream fname;
+        fname << "prec_M_" << std::setfill('0') << std::setw(5) << nprec_solve << ".dat";
+        save_array(prec_cache->m_data, prec_cache->m_ndata, fname.str());
+    }
+#endif
+    if (prec_redecide) {
+        prec_use_ilu = prec_cache->average_diag_weight(0) > ilu_limit;
+        prec_redecide = false;
+    }
+    prec_valid = false;
+    prec_ext_used = ej_prec.valid;
+    if (prec_ext_used) {
+        efield_prec_factorize_(gamma);
+    } else if (prec_use_ilu) {
+        // factorizes prec_cache in place
+        if (prec_ilu->factorize())
+            throw std::runtime_error("ILU failed!");
+    } else {
+        if (!prec_banded) {
+            // get_mlower() is -1 for N == 1 (dense Jacobian), the single block has bandwidth n - 1
+            const int nb = (N > 1) ? get_mlower() : n - 1;
+            prec_banded = AnyODE::make_unique<AnyODE::BandedMatrix<Real_t>>(*prec_cache, nb, nb);
+            prec_lu = AnyODE::make_unique<AnyODE::BandedLU<Real_t>>(prec_banded.get());
+            nheap_alloc += 2;
+        } else {
+            prec_banded->read(*prec_cache);
+        }
+        prec_lu->factorize();
+    }
+    prec_jac_version = jac_version;
+    prec_gamma = gamma;
+    prec_valid = true;
+}
+
 template<typename Real_t>
 void
 ReactionDiffusion<Real_t>::per_rxn_contrib_to_fi(Real_t t, const Real_t * const ANYODE_RESTRICT y,
-                                              int si, Real_t * const ANYODE_RESTRICT out) const
+                                              int si, Real_t * const ANYODE_RESTRICT out)
 {
-    ignore(t);
-    auto local_r = AnyODE::buffer_factory<double>(nr);
-    fill_local_r_(0, y, AnyODE::buffer_get_raw_ptr(local_r));
+    if (m_eff_k_stale)
+        update_eff_k();
+    set_schedule_time_(t);
+    Real_t * const local_r = AnyODE::buffer_get_raw_ptr(work3);
+    fill_local_r_(0, y, local_r);
     for (int ri=0; ri<nr; ++ri){
-	out[ri] = coeff_total[ri*n+si]*local_r[ri];
+        out[ri] = 0;
+        for (int i=net_stoich_ptr[ri]; i<net_stoich_ptr[ri+1]; ++i)
+            if (net_stoich_si[i] == si)
+                out[ri] = net_stoich_coeff[i]*local_r[ri];
     }
 }
 
+template<typename Real_t>
+AnyODE::Status
+ReactionDiffusion<Real_t>::dfdp(Real_t t, const Real_t * const ANYODE_RESTRICT y, int kind, int index,
+                                Real_t * const ANYODE_RESTRICT out)
+{
+    // Partial derivative of rhs wrt. one parameter at fixed y (rhs is linear in each of them):
+    //   kind 0: k[index], 1: D[bi*n + index] in every bin bi (species index),
+    //   2: g_values[index / n][index % n]
+    const int ny = get_ny();
+    if (kind < 0 || kind > 2)
+        throw std::logic_error("dfdp: unknown parameter kind");
+    if (index < 0 || index >= ((kind == 0) ? nr : (kind == 1) ? n : static_cast<int>(g_values.size())*n))
+        throw std::logic_error("dfdp: parameter index out of bounds");
+    if (m_eff_k_stale)
+        update_eff_k();
+    const Real_t ln_b = (use_log2) ? std::log(2.0) : 1;
+    const Real_t expb_t = (logt) ? (use_log2 ? std::exp2(t) : std::exp(t)) : 0;
+    set_schedule_time_((logt) ? expb_t : t);
+    auto linC = [&](int i) -> Real_t {
+        if (logy)
+            return (use_log2) ? std::exp2(y[i]) : std::exp(y[i]);
+        return (clip_to_pos && y[i] < 0) ? 0 : y[i];
+    };
+    std::memset(out, 0, sizeof(Real_t)*ny);
+    for (int bi=0; bi<N; ++bi){
+        if (kind == 0){
+            Real_t r = 1; // rate of reaction index per unit rate constant
+            for (const auto si : stoich_active[index])
+                r *= linC(bi*n + si);
+            for (unsigned mi=0; mi<modulated_rxns.size(); ++mi)
+                if (modulated_rxns[mi] == index)
+                    r *= modulation[mi][bi]*((modulation_schedules.size() > 0 && m_sched_valid) ? m_mod_fact[mi] : 1);
+            for (int i=net_stoich_ptr[index]; i<net_stoich_ptr[index+1]; ++i)
+                out[bi*n + net_stoich_si[i]] += net_stoich_coeff[i]*r;
+        } else if (kind == 1){
+            if (N == 1)
+                break;
+            // D[:, index] shifted uniformly: gradD changes by the sum of the gradient weights
+            const int starti = start_idx_(bi);
+            Real_t lap = 0, grad = 0, gw = 0;
+            for (int li=0; li<nstencil; ++li){
+                const int biw = biw_(starti, li);
+                lap += lap_weight[nstencil*bi + li]*linC(biw*n + index);
+                grad += grad_weight[nstencil*bi + li]*linC(biw*n + index);
+                gw += grad_weight[nstencil*bi + li];
+            }
+            out[bi*n + index] = lap + grad*gw;
+        } else {
+            const int fi = index / n, si = index % n;
+            const Real_t field = fields[fi][bi]*(field_schedules.empty() ? 1 : m_field_fact[fi]);
+            const Real_t gfact = (g_value_parents[fi] == -1) ? 1.0 : linC(bi*n + g_value_parents[fi]);
+            out[bi*n + si] = field*gfact;
+        }
+    }
+    for (int i=0; i<ny; ++i){ // same transformation as in rhs
+        if (logy){
+            out[i] /= linC(i);
+            if (!logt && use_log2)
+                out[i] /= ln_b;
+        }
+        if (logt){
+            out[i] *= expb_t;
+            if (!logy && use_log2)
+                out[i] *= ln_b;
+        }
+    }
+    return AnyODE::Status::success;
+}
+
 template<typename Real_t>
 int
 ReactionDiffusion<Real_t>::get_geom_as_int() const
@@ -987,6 +1574,7 @@ void
 ReactionDiffusion<Real_t>::calc_efield(const Real_t * const linC)
 {
     // Prototype for self-generated electric field
+    memo_efield_valid = false; // callers computing efield for the memoized state set this
     const Real_t F = this->faraday_const; // Faraday's constant
     const Real_t pi = 3.14159265358979324;
     const Real_t eps = eps_rel*vacuum_permittivity;
@@ -1028,6 +1616,217 @@ ReactionDiffusion<Real_t>::calc_efield(const Real_t * const linC)
         }
     }
 }
+
+template<typename Real_t>
+bool
+ReactionDiffusion<Real_t>::efield_jac_active_() const
+{
+    return auto_efield && m_efield_jac && N > 1 && geom != Geom::PERIODIC;
+}
+
+template<typename Real_t>
+template<bool LOGY>
+void
+ReactionDiffusion<Real_t>::efield_jac_update_(const Real_t * const ANYODE_RESTRICT linC,
+                                              const Real_t * const ANYODE_RESTRICT rlinC,
+                                              Real_t row_scale)
+{
+    // Factors of K (see EfieldJacobian) for the state linC, consistent with calc_efield
+    EfieldJacobian<Real_t>& ej = ej_last;
+    const Real_t F = this->faraday_const;
+    const Real_t pi = 3.14159265358979324;
+    const Real_t eps = eps_rel*vacuum_permittivity;
+    Real_t nx, cx = logx ? expb(x[0]) : x[0];
+    for (int bi=0; bi<N; ++bi){
+        const Real_t r = logx ? expb(xc[nsidep+bi]) : xc[nsidep+bi];
+        nx = logx ? expb(x[bi+1]) : x[bi+1];
+        Real_t vol = 0;
+        switch(geom){
+        case Geom::FLAT:
+            ej.G[bi] = F/eps;
+            vol = nx - cx;
+            break;
+        case Geom::CYLINDRICAL:
+            ej.G[bi] = F/(2*pi*eps*r);
+            vol = pi*(nx*nx - cx*cx);
+            break;
+        case Geom::SPHERICAL:
+            ej.G[bi] = F/(4*pi*eps*r*r);
+            vol = 4*pi/3*(nx*nx*nx - cx*cx*cx);
+            break;
+        case Geom::PERIODIC:
+            ej.G[bi] = 0;
+        }
+        cx = nx;
+        for (int si=0; si<n; ++si)
+            ej.wv[bi*n + si] = z_chg[si]*vol*(LOGY ? linC[bi*n + si] : 1);
+    }
+    for (int bi=0; bi<N; ++bi){
+        const int starti = start_idx_(bi);
+        for (int li=0; li<nstencil; ++li)
+            ej.biw[bi*nstencil + li] = biw_(starti, li);
+        for (int si=0; si<n; ++si){
+            const Real_t scale = -mobility[si]*row_scale*(LOGY ? rlinC[bi*n + si] : 1);
+            Real_t a1 = 0;
+            for (int li=0; li<nstencil; ++li){
+                const Real_t dw = div_weight[nstencil*bi + li];
+                a1 += dw*linC[ej.biw[bi*nstencil + li]*n + si];
+                ej.A2[(bi*n + si)*nstencil + li] = scale*dw*linC[bi*n + si];
+            }
+            ej.A1[bi*n + si] = scale*a1;
+        }
+    }
+    ej.flat = (geom == Geom::FLAT);
+    ej.valid = true;
+}
+
+template<typename Real_t>
+Real_t
+ReactionDiffusion<Real_t>::efield_jac_coeff_(const EfieldJacobian<Real_t>& ej, int bi, int si, int bj,
+                                             bool excl_total) const
+{
+    // K[(bi,si), (bj,sj)]/wv[bj*n+sj], `excl_total`: c(b, j) + flat (total charge term excluded)
+    const bool flat = ej.flat;
+    auto c = [bj, flat, excl_total](int b) -> Real_t {
+        if (bj < b)
+            return (flat && excl_total) ? 2 : 1;
+        if (bj == b)
+            return (flat && excl_total) ? 1 : 0;
+        return (flat && !excl_total) ? -1 : 0;
+    };
+    Real_t coeff = ej.A1[bi*n + si]*ej.G[bi]*c(bi);
+    for (int li=0; li<nstencil; ++li){
+        const int biw = ej.biw[bi*nstencil + li];
+        coeff += ej.A2[(bi*n + si)*nstencil + li]*ej.G[biw]*c(biw);
+    }
+    return coeff;
+}
+
+template<typename Real_t>
+void
+ReactionDiffusion<Real_t>::efield_jac_dot_(EfieldJacobian<Real_t>& ej, const Real_t * const ANYODE_RESTRICT vec,
+                                           Real_t * const ANYODE_RESTRICT out) const
+{
+    // out += K*vec in O(n*N) using the enclosed charge (prefix sums)
+    Real_t tot = 0;
+    for (int bi=0; bi<N; ++bi){
+        ej.w[bi] = 0;
+        for (int si=0; si<n; ++si)
+            ej.w[bi] += ej.wv[bi*n + si]*vec[bi*n + si];
+        tot += ej.w[bi];
+    }
+    Real_t left = 0;
+    for (int bi=0; bi<N; ++bi){
+        ej.dE[bi] = ej.G[bi]*(ej.flat ? left - (tot - left - ej.w[bi]) : left);
+        left += ej.w[bi];
+    }
+    for (int bi=0; bi<N; ++bi){
+        for (int si=0; si<n; ++si){
+            Real_t acc = ej.A1[bi*n + si]*ej.dE[bi];
+            for (int li=0; li<nstencil; ++li)
+                acc += ej.A2[(bi*n + si)*nstencil + li]*ej.dE[ej.biw[bi*nstencil + li]];
+            out[bi*n + si] += acc;
+        }
+    }
+}
+
+template<typename Real_t>
+void
+ReactionDiffusion<Real_t>::efield_prec_factorize_(Real_t gamma)
+{
+    // Factorizes P = I - gamma*(J + K) where prec_cache holds I - gamma*J and K is given by ej_prec.
+    // With c(b, j) = alpha*[j < b] + beta*[j == b] - beta (flat: alpha=2, beta=1, otherwise: alpha=1, beta=0),
+    // the last (total charge) term is of rank one: -gamma*K_tot = u*wv^T with u = gamma*R, it is
+    // handled by Sherman-Morrison in prec_solve_left (the solution of P'*y2 = u is stored here).
+    const EfieldJacobian<Real_t>& ej = ej_prec;
+    const int m = n + 1;
+    if (!AnyODE::buffer_is_initialized(prec_ext_work)) {
+        prec_ext_work = buffer_factory<Real_t>(3*N*m);
+        nheap_alloc++;
+    }
+    Real_t * const uext = AnyODE::buffer_get_raw_ptr(prec_ext_work);
+    Real_t * const yext = uext + N*m;
+    Real_t * const y2 = uext + 2*N*m;
+    const Real_t alpha = ej.flat ? 2 : 1;
+    const Real_t beta = ej.flat ? 1 : 0;
+    if (prec_use_ilu) {
+        // Only the bin-local part of K is part of the incomplete factorization, the remaining
+        // coupling is left to the Krylov iterations (jtimes includes all of K).
+        for (int bi=0; bi<N; ++bi)
+            for (int si=0; si<n; ++si){
+                const Real_t coeff = gamma*efield_jac_coeff_(ej, bi, si, bi, true);
+                for (int sj=0; sj<n; ++sj)
+                    prec_cache->block(bi, si, sj) -= coeff*ej.wv[bi*n + sj];
+            }
+        if (prec_ilu->factorize())
+            throw std::runtime_error("ILU failed!");
+    } else {
+        // Bordered system with the (scaled) enclosed charge p_b = sigma*sum_{j<b} w_j as an extra
+        // unknown per bin: dE_b/G_b = alpha*p_b/sigma + beta*w_b, and p_b - p_{b-1} - sigma*w_{b-1} = 0.
+        int kb = max(nsidep, 1);
+        for (int i=0; i<N*nstencil; ++i)
+            kb = max(kb, std::abs(ej.biw[i] - i/nstencil));
+        const int bw = (kb + 1)*m - 1;
+        if (!prec_ext || prec_ext->m_kl != bw) {
+            prec_ext = AnyODE::make_unique<AnyODE::BandedMatrix<Real_t>>(nullptr, N*m, N*m, bw, bw);
+            prec_ext_lu = AnyODE::make_unique<AnyODE::BandedLU<Real_t>>(prec_ext.get());
+            nheap_alloc += 2;
+        }
+        Real_t sigma = 0;
+        for (int i=0; i<n*N; ++i)
+            sigma = max(sigma, std::abs(ej.A1[i]*ej.G[i/n]));
+        sigma = (sigma > 0) ? alpha*gamma*sigma : 1;
+        AnyODE::BandedMatrix<Real_t>& E = *prec_ext;
+        E.set_to(0);
+        for (int bi=0; bi<N; ++bi){
+            for (int bj=max(0, bi - nsidep); bj<=min(N - 1, bi + nsidep); ++bj)
+                for (int si=0; si<n; ++si)
+                    for (int sj=0; sj<n; ++sj)
+                        if (prec_cache->valid_index(bi*n + si, bj*n + sj))
+                            E(bi*m + si, bj*m + sj) = (*prec_cache)(bi*n + si, bj*n + sj);
+            for (int si=0; si<n; ++si){
+                for (int li=-1; li<nstencil; ++li){
+                    const int b = (li < 0) ? bi : ej.biw[bi*nstencil + li];
+                    const Real_t a = gamma*ej.G[b]*((li < 0) ? ej.A1[bi*n + si] : ej.A2[(bi*n + si)*nstencil + li]);
+                    E(bi*m + si, b*m + n) -= alpha*a/sigma;
+                    if (beta != 0)
+                        for (int sj=0; sj<n; ++sj)
+                            E(bi*m + si, b*m + sj) -= beta*a*ej.wv[b*n + sj];
+                }
+            }
+            E(bi*m + n, bi*m + n) = 1;
+            if (bi > 0) {
+                E(bi*m + n, (bi - 1)*m + n) = -1;
+                for (int sj=0; sj<n; ++sj)
+                    E(bi*m + n, (bi - 1)*m + sj) = -sigma*ej.wv[(bi - 1)*n + sj];
+            }
+        }
+        prec_ext_lu->factorize();
+    }
+    if (ej.flat) {
+        for (int bi=0; bi<N; ++bi){
+            for (int si=0; si<n; ++si){
+                Real_t R = ej.A1[bi*n + si]*ej.G[bi];
+                for (int li=0; li<nstencil; ++li)
+                    R += ej.A2[(bi*n + si)*nstencil + li]*ej.G[ej.biw[bi*nstencil + li]];
+                uext[(prec_use_ilu ? n : m)*bi + si] = gamma*R;
+            }
+            if (!prec_use_ilu)
+                uext[bi*m + n] = 0;
+        }
+        if (prec_use_ilu) {
+            prec_ilu->solve(uext, y2);
+        } else {
+            prec_ext_lu->solve(uext, yext);
+            for (int bi=0; bi<N; ++bi)
+                for (int si=0; si<n; ++si)
+                    y2[bi*n + si] = yext[bi*m + si];
+        }
+        prec_ext_denom = 1;
+        for (int i=0; i<n*N; ++i)
+            prec_ext_denom += ej.wv[i]*y2[i];
+    }
+}
 } // namespace chemreac
 
 template class chemreac::ReactionDiffusion<double>; // instantiate template
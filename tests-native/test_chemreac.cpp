@@ -5,6 +5,7 @@
 #include <algorithm> // min, max
 #include <cassert>
 #include "chemreac.hpp"
+#include "chemreac_lockstep.hpp"
 #include "test_utils.h"
 
 #ifdef _OPENMP
@@ -225,6 +226,7 @@ void bench_rhs(){
     }
 
     for (auto i = 0; i < ntimings; ++i){
+	rd.clear_memo(); // time the evaluation, not the memoized state
 	double * const dydt = &b[0];
 	const double * const y_ = &y[0];
 
@@ -255,6 +257,139 @@ void bench_rhs(){
     std::cout << "Average timing: " << std::accumulate(timings.begin(), timings.end(), 0.0)/ntimings << std::endl;
 }
 
+std::unique_ptr<ReactionDiffusion<double>> _get_sparse_network(int n, int N){
+    // 2n bimolecular reactions: A_i + A_{i+1} -> A_{i+2} + A_{i+3} (indices modulo n)
+    const int nr = 2*n;
+    vector<vector<int> > stoich_actv, stoich_inact, stoich_prod;
+    vector<double> k;
+    for (int ri=0; ri<nr; ++ri){
+        const int i = ri % n, j = (ri/n + 1 + ri) % n;
+        stoich_actv.push_back({i, j});
+        stoich_inact.push_back({});
+        stoich_prod.push_back({(i+2) % n, (j+3) % n});
+        k.push_back(1.0 + 1e-3*ri);
+    }
+    vector<double> D(N*n, 1e-3);
+    vector<int> z_chg(n, 0);
+    vector<double> mobility(n, 0.0);
+    vector<double> x;
+    for (int i=0; i<=N; ++i)
+        x.push_back(1.0 + (double)i*1.0/N);
+    return AnyODE::make_unique<ReactionDiffusion<double>>(
+        n, stoich_actv, stoich_prod, k, N, D, z_chg, mobility, x, stoich_inact, 0,
+        false, false, false, (N == 1) ? 1 : 3, true, true);
+}
+
+void bench_rhs_vs_n(){
+    // rhs cost as a function of number of species (sparse network)
+    const int N = 16, ntimings = 20;
+    for (int n : {100, 200, 400, 700, 1000}){
+        auto rdp = _get_sparse_network(n, N);
+        vector<double> y(n*N), f(n*N);
+        for (int i=0; i<n*N; ++i)
+            y[i] = 1.0 + 1e-3*(i % 17);
+        double best_timing = 1e6;
+        for (int i=0; i<ntimings; ++i){
+            rdp->clear_memo();
+#ifdef _OPENMP
+            double t0 = omp_get_wtime();
+            rdp->rhs(0.0, &y[0], &f[0]);
+            const double timing = omp_get_wtime()-t0;
+#else
+            timespec start, finish;
+            clock_gettime(CLOCK_PROCESS_CPUTIME_ID, &start);
+            rdp->rhs(0.0, &y[0], &f[0]);
+            clock_gettime(CLOCK_PROCESS_CPUTIME_ID, &finish);
+            const double timing = (finish.tv_sec-start.tv_sec) + 1e-9*(finish.tv_nsec-start.tv_nsec);
+#endif
+            best_timing = std::min(best_timing, timing);
+        }
+        std::cout << "n=" << n << " nr=" << rdp->nr << " N=" << N << " best rhs timing: " << best_timing << std::endl;
+    }
+}
+
+void bench_flag_combos(){
+    // rhs & compressed Jacobian for all 16 combinations of (logy, logt, use_log2, clip_to_pos)
+    const int n = 20, N = 2000, ntimings = 10;
+    vector<vector<int> > stoich_actv, stoich_inact, stoich_prod;
+    vector<double> k;
+    for (int ri=0; ri<2*n; ++ri){
+        stoich_actv.push_back({ri % n, (ri + 1) % n});
+        stoich_inact.push_back({});
+        stoich_prod.push_back({(ri + 2) % n});
+        k.push_back(1.0 + 1e-3*ri);
+    }
+    vector<double> D(N*n, 1e-3), mobility(n, 0.0), x;
+    vector<int> z_chg(n, 0);
+    for (int i=0; i<=N; ++i)
+        x.push_back(1.0 + (double)i*1.0/N);
+    for (int combo=0; combo<16; ++combo){
+        const bool logy = combo & 8, logt = combo & 4, use_log2 = combo & 2, clip_to_pos = combo & 1;
+        ReactionDiffusion<double> rd(n, stoich_actv, stoich_prod, k, N, D, z_chg, mobility, x, stoich_inact, 0,
+                                     logy, logt, false, 3, true, true, false, {0, 0}, 1.0, 9.64853399e4,
+                                     8.854187817e-12, {}, {}, {}, {}, {}, 1000.0, 1, use_log2, clip_to_pos);
+        vector<double> y(n*N), f(n*N), ja(n*n*N + 2*n*(N-1));
+        for (int i=0; i<n*N; ++i)
+            y[i] = logy ? -1e-3*(i % 17) : 1.0 + 1e-3*(i % 17);
+        double best_rhs = 1e6, best_jac = 1e6;
+        for (int i=0; i<ntimings; ++i){
+            timespec start, mid, finish;
+            rd.clear_memo();
+            clock_gettime(CLOCK_PROCESS_CPUTIME_ID, &start);
+            rd.rhs(0.5, &y[0], &f[0]);
+            clock_gettime(CLOCK_PROCESS_CPUTIME_ID, &mid);
+            rd.compressed_jac_cmaj(0.5, &y[0], &f[0], &ja[0], n);
+            clock_gettime(CLOCK_PROCESS_CPUTIME_ID, &finish);
+            best_rhs = std::min(best_rhs, (mid.tv_sec-start.tv_sec) + 1e-9*(mid.tv_nsec-start.tv_nsec));
+            best_jac = std::min(best_jac, (finish.tv_sec-mid.tv_sec) + 1e-9*(finish.tv_nsec-mid.tv_nsec));
+        }
+        std::cout << "logy=" << logy << " logt=" << logt << " use_log2=" << use_log2
+                  << " clip_to_pos=" << clip_to_pos << " best rhs timing: " << best_rhs
+                  << " best jac timing: " << best_jac << std::endl;
+    }
+}
+
+void bench_lockstep(){
+    // LockstepKinetics: all members at once vs. one member at a time (same network, n=20, N=1)
+    const int n = 20, nt = 11;
+    vector<vector<int> > stoich_actv, stoich_inact, stoich_prod;
+    vector<double> k;
+    for (int ri=0; ri<2*n; ++ri){
+        stoich_actv.push_back({ri % n, (ri + 1) % n});
+        stoich_inact.push_back({});
+        stoich_prod.push_back({(ri + 2) % n});
+        k.push_back(1.0 + 1e-3*ri);
+    }
+    ReactionDiffusion<double> rd(n, stoich_actv, stoich_prod, k, 1, vector<double>(n), vector<int>(n),
+                                 vector<double>(n), {0, 1}, stoich_inact, 0, false, false, false, 1);
+    vector<double> tout(nt);
+    for (int i=0; i<nt; ++i)
+        tout[i] = 0.1*i;
+    for (int nm : {1, 64, 1024}){
+        vector<double> y0(nm*n), yout(nm*nt*n), k_sets(nm*2*n);
+        for (int i=0; i<nm*n; ++i)
+            y0[i] = 1.0 + 1e-3*(i % 17);
+        for (int i=0; i<nm*2*n; ++i)
+            k_sets[i] = 1.0 + 1e-3*(i % 13);
+        timespec start, mid, finish;
+        clock_gettime(CLOCK_PROCESS_CPUTIME_ID, &start);
+        chemreac::LockstepKinetics<double> batch(rd, nm);
+        batch.set_k(&k_sets[0]);
+        batch.predefined(&y0[0], nt, &tout[0], &yout[0], {1e-10}, 1e-8);
+        clock_gettime(CLOCK_PROCESS_CPUTIME_ID, &mid);
+        for (int mi=0; mi<nm; ++mi){
+            chemreac::LockstepKinetics<double> single(rd, 1);
+            single.set_k(&k_sets[mi*2*n]);
+            single.predefined(&y0[mi*n], nt, &tout[0], &yout[mi*nt*n], {1e-10}, 1e-8);
+        }
+        clock_gettime(CLOCK_PROCESS_CPUTIME_ID, &finish);
+        std::cout << "nm=" << nm << " lockstep timing: "
+                  << (mid.tv_sec-start.tv_sec) + 1e-9*(mid.tv_nsec-start.tv_nsec)
+                  << " one at a time timing: "
+                  << (finish.tv_sec-mid.tv_sec) + 1e-9*(finish.tv_nsec-mid.tv_nsec) << std::endl;
+    }
+}
+
 std::unique_ptr<ReactionDiffusion<double>> _get_single_specie_system(int N, int z){
     int n = 1;
     vector<vector<int> > stoich_reac {};
@@ -309,6 +444,12 @@ int main(){
 #ifdef BENCHMARK
         std::cout << "bench_f..." << std::endl;
         bench_rhs();
+        std::cout << "bench_rhs_vs_n..." << std::endl;
+        bench_rhs_vs_n();
+        std::cout << "bench_flag_combos..." << std::endl;
+        bench_flag_combos();
+        std::cout << "bench_lockstep..." << std::endl;
+        bench_lockstep();
 #endif
     } catch (std::exception& e){
         std::cout << e.what() << std::endl;
@@ -1,6 +1,11 @@
 #define CATCH_CONFIG_MAIN  // This tells Catch to provide a main()
 #include "catch.hpp"
 #include "chemreac.hpp"
+#include "chemreac_batch.hpp"
+#include "chemreac_dense.hpp"
+#include "chemreac_lockstep.hpp"
+#include "chemreac_observables.hpp"
+#include "chemreac_steady.hpp"
 #include <array>
 
 #include "test_utils.h"
@@ -94,3 +99,761 @@ TEST_CASE( "jtimes", "[ReactionDiffusion]" ) {
         REQUIRE( std::abs(bref[i] - b[i]) < 1e-14 );
     }
 }
+
+TEST_CASE( "prec_solve_left", "[ReactionDiffusion]" ) {
+
+    auto rdp = get_four_species_system(3);
+    auto &rd = *rdp;
+    const int ny = 3*4;
+    std::array<double, ny> y;
+    for (int i=0; i<3; ++i){
+        y[4*i + 0] = 1.3;
+        y[4*i + 1] = 1e-4;
+        y[4*i + 2] = 0.7;
+        y[4*i + 3] = 1e-4;
+    }
+    std::array<double, ny*ny> J_data;
+    std::memset(J_data.data(), 0, J_data.size()*sizeof(double));
+    rd.dense_jac_rmaj(0.0, &y[0], nullptr, &J_data[0], ny);
+
+    std::array<double, ny> r {2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13};
+    std::array<double, ny> z;
+    const double gamma = 0.1;
+    bool jac_recomputed = false;
+    rd.prec_setup(0.0, &y[0], nullptr, false, jac_recomputed, gamma);
+    REQUIRE( jac_recomputed );
+    for (int rep=0; rep<3; ++rep){
+        z.fill(0.0);
+        rd.prec_solve_left(0.0, &y[0], nullptr, &r[0], &z[0], gamma, 0.0, nullptr);
+        for (int ri=0; ri<ny; ++ri){
+            double Pz = z[ri];
+            for (int ci=0; ci<ny; ++ci)
+                Pz -= gamma*J_data[ri*ny + ci]*z[ci];
+            REQUIRE( std::abs(Pz - r[ri]) < 1e-12 );
+        }
+    }
+    REQUIRE( rd.nprec_cache_miss == 1 );
+    REQUIRE( rd.nprec_cache_hit == 2 );
+    REQUIRE( rd.nprec_solve_lu + rd.nprec_solve_ilu == 3 );
+
+    rd.prec_solve_left(0.0, &y[0], nullptr, &r[0], &z[0], 2*gamma, 0.0, nullptr);
+    REQUIRE( rd.nprec_cache_miss == 2 );
+    rd.prec_setup(0.0, &y[0], nullptr, true, jac_recomputed, 2*gamma);
+    REQUIRE( !jac_recomputed );
+    rd.prec_solve_left(0.0, &y[0], nullptr, &r[0], &z[0], 2*gamma, 0.0, nullptr);
+    REQUIRE( rd.nprec_cache_miss == 3 );
+    REQUIRE( rd.nprec_cache_hit == 2 );
+}
+
+TEST_CASE( "jtimes_refresh_and_fd", "[ReactionDiffusion]" ) {
+
+    auto rdp = get_four_species_system(3);
+    auto &rd = *rdp;
+    const int ny = 3*4;
+    std::array<double, ny> y0, y1;
+    for (int i=0; i<3; ++i){
+        y0[4*i + 0] = 1.3; y1[4*i + 0] = 0.9;
+        y0[4*i + 1] = 1e-4; y1[4*i + 1] = 0.2;
+        y0[4*i + 2] = 0.7; y1[4*i + 2] = 1.1 + i;
+        y0[4*i + 3] = 1e-4; y1[4*i + 3] = 0.3;
+    }
+    std::array<double, ny> v {2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13};
+    std::array<double, ny*ny> J_data;
+    std::memset(J_data.data(), 0, J_data.size()*sizeof(double));
+    rd.dense_jac_rmaj(0.0, &y1[0], nullptr, &J_data[0], ny);
+    std::array<double, ny> ref;
+    for (int ri=0; ri<ny; ++ri){
+        ref[ri] = 0.0;
+        for (int ci=0; ci<ny; ++ci)
+            ref[ri] += J_data[ri*ny + ci]*v[ci];
+    }
+    std::array<double, ny> out;
+    rd.jtimes_setup(0.0, &y0[0], nullptr);
+    rd.jtimes_setup(0.0, &y1[0], nullptr);  // cache must be refreshed
+    rd.jtimes(&v[0], &out[0], 0.0, &y1[0], nullptr);
+    for (int i=0; i<ny; ++i)
+        REQUIRE( std::abs(out[i] - ref[i]) < 1e-13*(1 + std::abs(ref[i])) );
+    REQUIRE( rd.njacvec_setup == 2 );
+    REQUIRE( rd.njacvec_dot == 1 );
+
+    rd.m_jtimes_fd = true;
+    std::array<double, ny> fy;
+    rd.rhs(0.0, &y1[0], &fy[0]);
+    rd.jtimes_setup(0.0, &y1[0], &fy[0]);
+    rd.jtimes(&v[0], &out[0], 0.0, &y1[0], &fy[0]);
+    for (int i=0; i<ny; ++i)
+        REQUIRE( std::abs(out[i] - ref[i]) < 1e-6*(1 + std::abs(ref[i])) );
+    rd.jtimes(&v[0], &out[0], 0.0, &y1[0], nullptr);
+    for (int i=0; i<ny; ++i)
+        REQUIRE( std::abs(out[i] - ref[i]) < 1e-6*(1 + std::abs(ref[i])) );
+    REQUIRE( rd.njacvec_setup == 2 );
+    REQUIRE( rd.njacvec_dot_fd == 2 );
+}
+
+TEST_CASE( "dense_jac_rmaj_vs_finite_differences", "[ReactionDiffusion]" ) {
+    // A + B -> C; 2 C -> D + B; C + (D) -> A (D inactive); field with parent B
+    const int n = 4, N = 1;
+    std::vector<std::vector<int> > stoich_actv {{0, 1}, {2, 2}, {2}};
+    std::vector<std::vector<int> > stoich_inact {{}, {}, {3}};
+    std::vector<std::vector<int> > stoich_prod {{2}, {3, 1}, {0}};
+    std::vector<double> k {2.0, 3.0, 0.7};
+    std::vector<double> D(n, 0.0);
+    std::vector<int> z_chg(n, 0);
+    std::vector<double> mobility(n, 0.0);
+    std::vector<double> x {0, 1};
+    std::vector<std::vector<double> > g_values {{0.1, -0.3, 0.2, 0.0}};
+    std::vector<int> g_value_parents {1};
+    std::vector<std::vector<double> > fields {{5.0}};
+    chemreac::ReactionDiffusion<double> rd(
+        n, stoich_actv, stoich_prod, k, N, D, z_chg, mobility, x, stoich_inact,
+        0, false, false, false, 1, false, false, false, {0, 0}, 1.0, 9.64853399e4, 8.854187817e-12,
+        g_values, g_value_parents, fields);
+    std::array<double, n> y {0.3, 0.8, 1.1, 0.5};
+    std::array<double, n*n> J;
+    std::memset(J.data(), 0, J.size()*sizeof(double));
+    rd.dense_jac_rmaj(0.0, y.data(), nullptr, J.data(), n);
+    std::array<double, n> fp, fm, yp;
+    const double h = 1e-6;
+    for (int ci=0; ci<n; ++ci){
+        yp = y; yp[ci] += h;
+        rd.rhs(0.0, yp.data(), fp.data());
+        yp = y; yp[ci] -= h;
+        rd.rhs(0.0, yp.data(), fm.data());
+        for (int ri=0; ri<n; ++ri)
+            REQUIRE( std::abs(J[ri*n + ci] - (fp[ri] - fm[ri])/(2*h)) < 1e-8 );
+    }
+}
+
+TEST_CASE( "dfdp", "[ReactionDiffusion]" ) {
+    // A -> B (modulated), 2 A -> B, B -> A; field producing A & B; cylindrical, 3 bins
+    const int n = 2, N = 3, ny = n*N;
+    const auto make_rd = [&](std::vector<double> k, std::vector<double> D, std::vector<std::vector<double> > g_values,
+                             bool logy, bool logt, bool use_log2){
+        return chemreac::ReactionDiffusion<double>(
+            n, {{0}, {0, 0}, {1}}, {{1}, {1}, {0}}, k, N, D, {0, 0}, {0, 0}, {1, 2, 3.5, 4},
+            {{}, {}, {}}, 1, logy, logt, false, 3, true, true, false, {0, 0}, 1.0, 9.64853399e4,
+            8.854187817e-12, g_values, {-1}, {{2.0, 1.0, 0.5}}, {0}, {{1.0, 2.0, 3.0}}, 1000.0, 0,
+            use_log2);
+    };
+    const std::vector<double> k {2.0, 0.3, 0.7}, D {0.1, 0.05, 0.2, 0.05, 0.15, 0.1};
+    const std::vector<std::vector<double> > g {{0.5, 0.1}};
+    const std::vector<double> C {0.3, 0.8, 1.1, 0.5, 0.7, 0.2};
+    for (int flags=0; flags<8; ++flags){
+        const bool logy = flags & 1, logt = flags & 2, use_log2 = flags & 4;
+        auto rd = make_rd(k, D, g, logy, logt, use_log2);
+        std::vector<double> y(C), dfdp(ny), fp(ny), fm(ny);
+        if (logy)
+            for (auto& yi : y)
+                yi = use_log2 ? std::log2(yi) : std::log(yi);
+        const double t = logt ? -0.5 : 0.5;
+        const double h = 1e-6;
+        for (int kind=0; kind<3; ++kind){
+            const int np = (kind == 0) ? 3 : 2;
+            for (int index=0; index<np; ++index){
+                rd.dfdp(t, y.data(), kind, index, dfdp.data());
+                for (int sign : {1, -1}){
+                    auto kp(k); auto Dp(D); auto gp(g);
+                    if (kind == 0)
+                        kp[index] += sign*h;
+                    else if (kind == 1)
+                        for (int bi=0; bi<N; ++bi)
+                            Dp[bi*n + index] += sign*h;
+                    else
+                        gp[0][index] += sign*h;
+                    auto rdp = make_rd(kp, Dp, gp, logy, logt, use_log2);
+                    rdp.rhs(t, y.data(), (sign == 1) ? fp.data() : fm.data());
+                }
+                for (int i=0; i<ny; ++i)
+                    REQUIRE( std::abs(dfdp[i] - (fp[i] - fm[i])/(2*h)) < 1e-7*(1 + std::abs(dfdp[i])) );
+            }
+        }
+    }
+    auto rd = make_rd(k, D, g, false, false, false);
+    std::vector<double> out(ny);
+    REQUIRE_THROWS_AS( rd.dfdp(0, C.data(), 0, 3, out.data()), std::logic_error );
+    REQUIRE_THROWS_AS( rd.dfdp(0, C.data(), 3, 0, out.data()), std::logic_error );
+}
+
+TEST_CASE( "auto_efield_jac", "[ReactionDiffusion]" ) {
+    // A -> B (charges +1, -1), the field depends on the concentrations in all bins
+    const int n = 2, N = 7, ny = n*N;
+    std::vector<std::vector<int> > stoich_actv {{0}};
+    std::vector<std::vector<int> > stoich_prod {{1}};
+    std::vector<double> k {0.7};
+    std::vector<double> D(n*N, 0.1);
+    std::vector<int> z_chg {1, -1};
+    std::vector<double> mobility {0.3, 0.2};
+    std::vector<double> x;
+    for (int i=0; i<=N; ++i)
+        x.push_back(0.5 + i/double(N));
+    for (int geom : {0, 2}){
+        for (bool logy : {false, true}){
+            for (double ilu_limit : {1e9, 0.0}){
+                chemreac::ReactionDiffusion<double> rd(
+                    n, stoich_actv, stoich_prod, k, N, D, z_chg, mobility, x, {{}}, geom, logy,
+                    false, false, 3, true, true, true, {0.1, -0.2}, 1.0, 1.0, 1.0,
+                    {}, {}, {}, {}, {}, ilu_limit);
+                std::array<double, ny> y;
+                for (int i=0; i<ny; ++i)
+                    y[i] = (logy) ? std::log(0.5 + 0.1*i) : 0.5 + 0.1*i;
+                std::array<double, ny*ny> J;
+                std::memset(J.data(), 0, J.size()*sizeof(double));
+                rd.dense_jac_rmaj(0.0, y.data(), nullptr, J.data(), ny);
+                std::array<double, ny> fp, fm, yp;
+                const double h = 1e-6;
+                for (int ci=0; ci<ny; ++ci){
+                    yp = y; yp[ci] += h;
+                    rd.rhs(0.0, yp.data(), fp.data());
+                    yp = y; yp[ci] -= h;
+                    rd.rhs(0.0, yp.data(), fm.data());
+                    for (int ri=0; ri<ny; ++ri){
+                        const double fd = (fp[ri] - fm[ri])/(2*h);
+                        REQUIRE( std::abs(J[ri*ny + ci] - fd) < 1e-7*(1 + std::abs(fd)) );
+                    }
+                }
+
+                std::array<double, ny> v, out, ref;
+                for (int i=0; i<ny; ++i)
+                    v[i] = 1.0 + 0.3*i - 0.05*i*i;
+                for (int ri=0; ri<ny; ++ri){
+                    ref[ri] = 0.0;
+                    for (int ci=0; ci<ny; ++ci)
+                        ref[ri] += J[ri*ny + ci]*v[ci];
+                }
+                rd.jtimes_setup(0.0, y.data(), nullptr);
+                rd.jtimes(v.data(), out.data(), 0.0, y.data(), nullptr);
+                for (int i=0; i<ny; ++i)
+                    REQUIRE( std::abs(out[i] - ref[i]) < 1e-12*(1 + std::abs(ref[i])) );
+
+                const double gamma = 0.3;
+                bool jac_recomputed;
+                std::array<double, ny> z;
+                rd.prec_setup(0.0, y.data(), nullptr, false, jac_recomputed, gamma);
+                rd.prec_solve_left(0.0, y.data(), nullptr, v.data(), z.data(), gamma, 0.0, nullptr);
+                double err = 0;
+                for (int ri=0; ri<ny; ++ri){
+                    double Pz = z[ri];
+                    for (int ci=0; ci<ny; ++ci)
+                        Pz -= gamma*J[ri*ny + ci]*z[ci];
+                    err = std::max(err, std::abs(Pz - v[ri]));
+                }
+                if (ilu_limit > 1) {
+                    REQUIRE( rd.nprec_solve_lu == 1 );
+                    REQUIRE( err < 1e-12 );
+                } else {
+                    // incomplete factorization (only the bin-local part of the efield coupling):
+                    // the residual is at least halved compared to no preconditioning (z = v)
+                    REQUIRE( rd.nprec_solve_ilu == 1 );
+                    double err_noprec = 0;
+                    for (int ri=0; ri<ny; ++ri)
+                        err_noprec = std::max(err_noprec, std::abs(gamma*ref[ri]));
+                    REQUIRE( err < 0.5*err_noprec );
+                }
+            }
+        }
+    }
+}
+
+TEST_CASE( "eff_k", "[ReactionDiffusion]" ) {
+    // A -> B (modulated per bin), N=3 without diffusion
+    const int n = 2, N = 3;
+    std::vector<std::vector<int> > stoich_actv {{0}};
+    std::vector<std::vector<int> > stoich_inact {{}};
+    std::vector<std::vector<int> > stoich_prod {{1}};
+    std::vector<double> k {2.0};
+    std::vector<double> D(n*N, 0.0);
+    std::vector<int> z_chg(n, 0);
+    std::vector<double> mobility(n, 0.0);
+    std::vector<double> x {0, 1, 2, 3};
+    chemreac::ReactionDiffusion<double> rd(
+        n, stoich_actv, stoich_prod, k, N, D, z_chg, mobility, x, stoich_inact,
+        0, false, false, false, 3, true, true, false, {0, 0}, 1.0, 9.64853399e4, 8.854187817e-12,
+        {}, {}, {}, {0}, {{1.0, 2.0, 3.0}});
+    std::array<double, n*N> y {1, 0, 1, 0, 1, 0};
+    std::array<double, n*N> f;
+    for (int bi=0; bi<N; ++bi)
+        REQUIRE( std::abs(rd.get_mod_k(bi, 0) - 2.0*(bi+1)) < 1e-15 ); // before any rhs call
+    rd.rhs(0.0, y.data(), f.data());
+    for (int bi=0; bi<N; ++bi){
+        REQUIRE( std::abs(rd.get_mod_k(bi, 0) - 2.0*(bi+1)) < 1e-15 );
+        REQUIRE( std::abs(f[bi*n] + 2.0*(bi+1)) < 1e-15 );
+    }
+    rd.k[0] = 5.0;
+    rd.modulation[0][2] = 7.0;
+    REQUIRE( std::abs(rd.get_mod_k(2, 0) - 35.0) < 1e-15 ); // (not yet seen by the kernels)
+    rd.m_eff_k_stale = true;
+    rd.rhs(0.0, y.data(), f.data());
+    REQUIRE( std::abs(f[0*n + 1] - 5.0) < 1e-15 );
+    REQUIRE( std::abs(f[1*n + 1] - 10.0) < 1e-15 );
+    REQUIRE( std::abs(f[2*n + 1] - 35.0) < 1e-15 );
+    REQUIRE( !rd.m_eff_k_stale );
+}
+
+TEST_CASE( "schedules", "[ReactionDiffusion]" ) {
+    chemreac::Schedule<double> pc {{0, 1, 1.5, 4}, {2, 0, 3, 3}};
+    REQUIRE( pc(-1) == 2 );
+    REQUIRE( pc(0.5) == 2 );
+    REQUIRE( pc(1) == 0 );
+    REQUIRE( pc(1.49) == 0 );
+    REQUIRE( pc(3.9) == 3 );
+    REQUIRE( pc(9) == 3 );
+    REQUIRE( pc.breakpoints(0, 5) == std::vector<double>({1, 1.5}) );
+    chemreac::Schedule<double> pl {{0, 1, 2, 3}, {0, 2, 2, 0}, true};
+    REQUIRE( std::abs(pl(0.25) - 0.5) < 1e-15 );
+    REQUIRE( std::abs(pl(1.5) - 2) < 1e-15 );
+    REQUIRE( std::abs(pl(2.75) - 0.5) < 1e-15 );
+    REQUIRE( pl(7) == 0 );
+    REQUIRE( pl.breakpoints(0.5, 2.5) == std::vector<double>({1, 2}) );
+    REQUIRE( pl.breakpoints(-1, 9) == std::vector<double>({0, 1, 2, 3}) );
+
+    // A -> B (modulated), production of A (field), N=1
+    chemreac::ReactionDiffusion<double> rd(
+        2, {{0}}, {{1}}, {2.0}, 1, {0, 0}, {0, 0}, {0, 0}, {0, 1}, {{}}, 0, false, false, false,
+        1, true, true, false, {0, 0}, 1.0, 9.64853399e4, 8.854187817e-12, {{0.5, 0}}, {-1},
+        {{4.0}}, {0}, {{3.0}});
+    rd.field_schedules = {pc};
+    rd.modulation_schedules = {pl};
+    rd.m_eff_k_stale = true;
+    const double y[2] {1.0, 0.0};
+    double f[2], jac[4];
+    for (double t : {0.25, 1.25, 2.75, 0.25}){
+        rd.rhs(t, y, f);
+        REQUIRE( std::abs(f[0] - (4.0*pc(t)*0.5 - 6*pl(t))) < 1e-14 );
+        REQUIRE( std::abs(f[1] - 6*pl(t)) < 1e-14 );
+        rd.dense_jac_rmaj(t, y, f, jac, 2);
+        REQUIRE( std::abs(jac[0] + 6*pl(t)) < 1e-14 );
+    }
+    REQUIRE( rd.schedule_breakpoints(0.5, 3.5) == std::vector<double>({1, 1.5, 2, 3}) );
+    chemreac::ReactionDiffusion<double> cpy(rd);
+    cpy.rhs(2.75, y, f);
+    REQUIRE( std::abs(f[1] - 6*pl(2.75)) < 1e-14 );
+}
+
+// Kernels as rendered by chemreac.codegen for get_four_species_system
+static void four_species_rhs(const double * const k, const double * const C, double * const f){
+    const double r0 = k[0]*C[0];
+    const double r1 = k[1]*C[1]*C[2]*C[2];
+    f[0] += -r0;
+    f[1] += r0;
+    f[2] += -2*r1;
+    f[3] += r1;
+}
+
+static void four_species_jac(const double * const k, const double * const C, double * const vals){
+    vals[0] = -k[0];
+    vals[1] = k[0];
+    vals[2] = -2*k[1]*C[2]*C[2];
+    vals[3] = -2*k[1]*2*C[2]*C[1];
+    vals[4] = k[1]*C[2]*C[2];
+    vals[5] = k[1]*2*C[2]*C[1];
+}
+
+TEST_CASE( "set_rxn_kernels", "[ReactionDiffusion]" ) {
+    const int N = 3;
+    auto rdp = get_four_species_system(N);
+    const int ny = rdp->get_ny();
+    std::vector<double> y(ny), f_ref(ny), f(ny), j_ref(ny*ny), j(ny*ny);
+    for (int i=0; i<ny; ++i)
+        y[i] = 1.0 + 0.1*i;
+    rdp->rhs(0, &y[0], &f_ref[0]);
+    rdp->dense_jac_rmaj(0, &y[0], nullptr, &j_ref[0], ny);
+    rdp->set_rxn_kernels(four_species_rhs, four_species_jac, {0, 1, 2, 2, 3, 3}, {0, 0, 1, 2, 1, 2});
+    rdp->rhs(0, &y[0], &f[0]);
+    rdp->dense_jac_rmaj(0, &y[0], nullptr, &j[0], ny);
+    for (int i=0; i<ny; ++i)
+        REQUIRE( std::abs(f[i] - f_ref[i]) < 1e-14*(1 + std::abs(f_ref[i])) );
+    for (int i=0; i<ny*ny; ++i)
+        REQUIRE( std::abs(j[i] - j_ref[i]) < 1e-14*(1 + std::abs(j_ref[i])) );
+    REQUIRE_THROWS( rdp->set_rxn_kernels(four_species_rhs, nullptr, {}, {}) );
+    REQUIRE_THROWS( rdp->set_rxn_kernels(four_species_rhs, four_species_jac, {0, 4}, {0, 0}) );
+    rdp->set_rxn_kernels(nullptr, nullptr, {}, {}); // back to generic kernels
+    rdp->rhs(0, &y[0], &f[0]);
+    for (int i=0; i<ny; ++i)
+        REQUIRE( f[i] == f_ref[i] );
+}
+
+TEST_CASE( "memo_state", "[ReactionDiffusion]" ) {
+    const int N = 3;
+    auto rdp = get_four_species_system(N);
+    const int ny = rdp->get_ny();
+    std::vector<double> y(ny), f0(ny), f1(ny), ja(ny*ny), jb(ny*ny);
+    for (int i=0; i<ny; ++i)
+        y[i] = 1.0 + 0.1*i;
+    rdp->rhs(0, &y[0], &f0[0]);
+    REQUIRE( rdp->nmemo_state_miss == 1 );
+    rdp->rhs(0, &y[0], &f1[0]);
+    REQUIRE( rdp->nmemo_rhs_hit == 1 );
+    for (int i=0; i<ny; ++i)
+        REQUIRE( f0[i] == f1[i] );
+    rdp->dense_jac_rmaj(0, &y[0], &f0[0], &ja[0], ny);
+    REQUIRE( rdp->nmemo_state_hit == 2 );
+    rdp->clear_memo();
+    rdp->dense_jac_rmaj(0, &y[0], &f0[0], &jb[0], ny);
+    REQUIRE( rdp->nmemo_state_miss == 2 );
+    for (int i=0; i<ny*ny; ++i)
+        REQUIRE( ja[i] == jb[i] );
+    y[0] *= 1.1;
+    rdp->rhs(0, &y[0], &f1[0]);
+    REQUIRE( rdp->nmemo_state_miss == 3 );
+    REQUIRE( f1[0] != f0[0] );
+    rdp->rhs(1, &y[0], &f1[0]); // same state, other time
+    REQUIRE( rdp->nmemo_rhs_hit == 1 );
+}
+
+TEST_CASE( "nheap_alloc", "[ReactionDiffusion]" ) {
+    const int N = 5;
+    auto rdp = get_four_species_system(N);
+    auto &rd = *rdp;
+    const int ny = rd.get_ny();
+    std::vector<double> y(ny), f(ny), r(ny), z(ny), zref(ny), ja(ny*ny);
+    for (int i=0; i<ny; ++i){
+        y[i] = 1.0 + 0.1*i;
+        r[i] = 2.0 - 0.05*i;
+    }
+    bool jac_recomputed;
+    auto run = [&](int rep) {
+        y[0] += 0.01*rep;
+        rd.rhs(0, &y[0], &f[0]);
+        rd.dense_jac_rmaj(0, &y[0], nullptr, &ja[0], ny);
+        rd.jtimes_setup(0, &y[0], nullptr);
+        rd.jtimes(&r[0], &z[0], 0, &y[0], nullptr);
+        rd.prec_setup(0, &y[0], nullptr, false, jac_recomputed, 0.1 + 0.1*rep);
+        rd.prec_solve_left(0, &y[0], nullptr, &r[0], &z[0], 0.1 + 0.1*rep, 0.0, nullptr);
+    };
+    run(0);
+    REQUIRE( rd.nheap_alloc > 0 );  // caches & factorizations are allocated once
+    rd.zero_counters();
+    for (int rep=1; rep<4; ++rep)
+        run(rep);
+    REQUIRE( rd.nheap_alloc == 0 );
+    REQUIRE( rd.nprec_solve == 3 );
+    // BlockILU gives the same result as block_diag_ilu::ILU_inplace
+    const int nsat = 0, ld = 4;
+    block_diag_ilu::BlockDiagMatrix<double> jac {nullptr, N, 4, 1, nsat, ld};
+    block_diag_ilu::BlockDiagMatrix<double> P1 {nullptr, N, 4, 1, nsat, ld}, P2 {nullptr, N, 4, 1, nsat, ld};
+    jac.set_to(0.0);
+    rd.compressed_jac_cmaj(0, &y[0], nullptr, jac.m_data, 0);
+    P1.set_to_eye_plus_scaled_mtx(-0.7, jac);
+    P2.set_to_eye_plus_scaled_mtx(-0.7, jac);
+    block_diag_ilu::ILU_inplace<double> ilu_ref {&P1};
+    chemreac::BlockILU<double> ilu {&P2};
+    REQUIRE( ilu.factorize() == 0 );
+    ilu_ref.solve(&r[0], &zref[0]);
+    ilu.solve(&r[0], &z[0]);
+    for (int i=0; i<ny; ++i)
+        REQUIRE( z[i] == zref[i] );
+}
+
+TEST_CASE( "events", "[ReactionDiffusion]" ) {
+    // A -> B, N=1, logy
+    chemreac::ReactionDiffusion<double> rd(
+        2, {{0}}, {{1}}, {2.0}, 1, {0, 0}, {0, 0}, {0, 0}, {0, 1}, {{}}, 0, true, false, false, 1);
+    REQUIRE( rd.get_nroots() == 0 );
+    rd.events.emplace_back(0, std::vector<int>{1}, std::vector<double>{}, 0.5, 1, true);
+    rd.events.emplace_back(1, std::vector<int>{0, 1}, std::vector<double>{2, 1}, 3.0);
+    rd.events.emplace_back(2, std::vector<int>{}, std::vector<double>{}, 0.1, -1);
+    REQUIRE( rd.get_nroots() == 3 );
+    const double y[2] {std::log(1.5), std::log(0.25)};
+    double g[3];
+    REQUIRE( rd.roots(0, y, g) == AnyODE::Status::success );
+    REQUIRE( std::abs(g[0] - std::log(0.5)) < 1e-14 );  // log(0.25) - log(0.5)
+    REQUIRE( std::abs(g[1] - (2*1.5 + 0.25 - 3)) < 1e-14 );
+    REQUIRE( std::abs(g[2] - (2*1.5 - 0.1)) < 1e-14 );  // |dA/dt| = |dB/dt| = k*A
+    REQUIRE_THROWS_AS( chemreac::Event<double>(0, {0, 1}, {}, 1.0), std::length_error );
+    REQUIRE_THROWS_AS( chemreac::Event<double>(3, {0}, {}, 1.0), std::logic_error );
+    chemreac::ReactionDiffusion<double> cpy(rd);
+    REQUIRE( cpy.get_nroots() == 3 );
+}
+
+TEST_CASE( "Observables", "[Observables]" ) {
+    // 2 species, N=1, logy & logt
+    chemreac::ReactionDiffusion<double> rd(
+        2, {{0}}, {{1}}, {2.0}, 1, {0, 0}, {0, 0}, {0, 0}, {0, 1}, {{}}, 0, true, true, false, 1);
+    const double weights[3*2] {1, 1,   // total amount
+                               0, 2,   // weighted B
+                               0, 0};  // empty
+    chemreac::Observables<double> obs(rd, 3, weights);
+    REQUIRE( obs.ptr == std::vector<int>({0, 2, 3, 3}) );
+    REQUIRE( obs.idx == std::vector<int>({0, 1, 1}) );
+    // B = t**2, A = 5 - t**2 for t in 0.5, 1, 2 (given as logarithms)
+    for (double t : {0.5, 1.0, 2.0}){
+        const double y[2] {std::log(5 - t*t), std::log(t*t)};
+        obs.observe(std::log(t), y);
+    }
+    REQUIRE( obs.nrows == 3 );
+    REQUIRE( obs.values.size() == 9 );
+    REQUIRE( std::abs(obs.tout[2] - 2) < 1e-14 );
+    REQUIRE( std::abs(obs.values[0] - 5) < 1e-14 );
+    REQUIRE( std::abs(obs.values[4] - 2) < 1e-14 );
+    REQUIRE( obs.values[8] == 0 );
+    REQUIRE( std::abs(obs.integral[0] - 5*1.5) < 1e-13 );
+    REQUIRE( std::abs(obs.integral[1] - (0.5*(0.5 + 2)/2 + (2 + 8)/2)) < 1e-13 );
+    REQUIRE( std::abs(obs.vmin[1] - 0.5) < 1e-14 );
+    REQUIRE( std::abs(obs.tmin[1] - 0.5) < 1e-14 );
+    REQUIRE( std::abs(obs.vmax[1] - 8) < 1e-13 );
+    REQUIRE( std::abs(obs.tmax[1] - 2) < 1e-14 );
+    obs.reset();
+    REQUIRE( obs.nrows == 0 );
+    REQUIRE( obs.tout.empty() );
+    REQUIRE( obs.integral[0] == 0 );
+
+    chemreac::Observables<double> nrec(rd, 1, weights, false);
+    const double y[2] {0, 0};
+    nrec.observe(0, y);
+    nrec.observe(1, y);
+    REQUIRE( nrec.values.empty() );
+    REQUIRE( std::abs(nrec.integral[0] - 2*(std::exp(1) - 1)) < 1e-13 );
+}
+
+TEST_CASE( "NordsieckHistory", "[NordsieckHistory]" ) {
+    // y0 = x**3 (exact with q=3), y1 = 2 - x (q=1) over steps ending at 0.5, 1.5, 2
+    chemreac::NordsieckHistory<double> hist(2);
+    REQUIRE_THROWS_AS( hist.append(1, 1, nullptr), std::logic_error );
+    hist.start(0);
+    for (double tn : {0.5, 1.5, 2.0}){
+        const double c[4*2] {tn*tn*tn, 2 - tn, 3*tn*tn, -1, 3*tn, 0, 1, 0};
+        hist.append(tn, 3, c);
+    }
+    REQUIRE( hist.nsteps() == 3 );
+    REQUIRE( hist.step_index(0) == 0 );
+    REQUIRE( hist.step_index(0.5) == 0 );
+    REQUIRE( hist.step_index(0.7) == 1 );
+    REQUIRE( hist.step_index(2) == 2 );
+    REQUIRE_THROWS_AS( hist.step_index(2.1), std::out_of_range );
+    REQUIRE_THROWS_AS( hist.step_index(-0.1), std::out_of_range );
+    const double x[4] {0, 0.3, 1.2, 2};
+    double y[4*2], dydx[4*2];
+    hist.eval(4, x, y, dydx);
+    for (int i=0; i<4; ++i){
+        REQUIRE( std::abs(y[2*i] - x[i]*x[i]*x[i]) < 1e-14 );
+        REQUIRE( std::abs(y[2*i + 1] - (2 - x[i])) < 1e-14 );
+        REQUIRE( std::abs(dydx[2*i] - 3*x[i]*x[i]) < 1e-14 );
+        REQUIRE( std::abs(dydx[2*i + 1] + 1) < 1e-14 );
+    }
+    REQUIRE_THROWS_AS( hist.append(1.0, 1, y), std::logic_error );
+}
+
+TEST_CASE( "copy_constructor", "[ReactionDiffusion]" ) {
+    const int N = 5;
+    auto rdp = get_four_species_system(N);
+    auto &rd = *rdp;
+    rd.m_jtimes_fd = true;
+    rd.k[1] = 2.5;
+    rd.m_eff_k_stale = true;
+    const int ny = rd.get_ny();
+    std::vector<double> y(ny), f0(ny), f1(ny), j0(ny*ny), j1(ny*ny);
+    for (int i=0; i<ny; ++i)
+        y[i] = 1.0 + 0.1*i;
+    rd.rhs(0, &y[0], &f0[0]);
+    rd.dense_jac_rmaj(0, &y[0], nullptr, &j0[0], ny);
+
+    chemreac::ReactionDiffusion<double> cpy(rd);
+    REQUIRE( cpy.m_jtimes_fd );
+    REQUIRE( cpy.nfev == 0 );
+    cpy.rhs(0, &y[0], &f1[0]);
+    cpy.dense_jac_rmaj(0, &y[0], nullptr, &j1[0], ny);
+    REQUIRE( cpy.nmemo_state_miss == 1 );  // no memoized state inherited
+    for (int i=0; i<ny; ++i)
+        REQUIRE( f0[i] == f1[i] );
+    for (int i=0; i<ny*ny; ++i)
+        REQUIRE( j0[i] == j1[i] );
+    cpy.k[0] = 7.0;
+    cpy.m_eff_k_stale = true;
+    cpy.rhs(0, &y[0], &f1[0]);
+    rd.rhs(0, &y[0], &f0[0]);
+    REQUIRE( f0[0] != f1[0] );
+    REQUIRE( rd.k[0] == 0.05 );
+}
+
+TEST_CASE( "for_each_member", "[ReactionDiffusion]" ) {
+    const int N = 4, nmembers = 7;
+    auto rdp = get_four_species_system(N);
+    auto &rd = *rdp;
+    const int ny = rd.get_ny();
+    std::vector<double> y(ny), k_sets(nmembers*rd.nr), fout(nmembers*ny), fref(ny);
+    for (int i=0; i<ny; ++i)
+        y[i] = 1.0 + 0.1*i;
+    for (int i=0; i<nmembers*rd.nr; ++i)
+        k_sets[i] = 0.5 + i;
+    std::vector<int> nfev(nmembers);
+    auto errors = chemreac::for_each_member(rd, nmembers, 3, [&](int mi, chemreac::ReactionDiffusion<double>& mrd){
+        if (mi == 5)
+            throw std::runtime_error("member 5");
+        chemreac::set_member_params(mrd, &k_sets[mi*mrd.nr], static_cast<double *>(nullptr));
+        mrd.zero_counters();
+        mrd.rhs(0, &y[0], &fout[mi*ny]);
+        nfev[mi] = mrd.nfev;
+    });
+    REQUIRE( rd.nfev == 0 );
+    REQUIRE( rd.k[0] == 0.05 );
+    for (int mi=0; mi<nmembers; ++mi){
+        if (mi == 5){
+            REQUIRE( errors[mi] == "member 5" );
+            continue;
+        }
+        REQUIRE( errors[mi].empty() );
+        REQUIRE( nfev[mi] == 1 );
+        chemreac::set_member_params(rd, &k_sets[mi*rd.nr], static_cast<double *>(nullptr));
+        rd.rhs(0, &y[0], &fref[0]);
+        for (int i=0; i<ny; ++i)
+            REQUIRE( fout[mi*ny + i] == fref[i] );
+    }
+}
+
+TEST_CASE( "LockstepKinetics", "[LockstepKinetics]" ) {
+    // A -> B, 2 B -> C (modulated), production of A (field 0) and of C from B (field 1)
+    const int n = 3, nm = 5;
+    chemreac::ReactionDiffusion<double> rd(
+        n, {{0}, {1, 1}}, {{1}, {2}}, {0.7, 3.0}, 1, {0, 0, 0}, {0, 0, 0}, {0, 0, 0}, {0, 1},
+        {{}, {}}, 0, false, false, false, 1, true, true, false, {0, 0}, 1.0, 9.64853399e4,
+        8.854187817e-12, {{0.2, 0, 0}, {0, 0, 0.5}}, {-1, 1}, {{1.0}, {2.0}}, {1}, {{1.5}});
+    chemreac::LockstepKinetics<double> batch(rd, nm);
+    std::vector<double> k_sets(nm*2), fields_sets(nm*2), y(n*nm), f(n*nm), jac(n*n*nm);
+    for (int mi=0; mi<nm; ++mi){
+        k_sets[mi*2] = 0.5 + mi;
+        k_sets[mi*2 + 1] = 2.0 + 0.3*mi;
+        fields_sets[mi*2] = 0.1*mi;
+        fields_sets[mi*2 + 1] = 1.0 + mi;
+        for (int si=0; si<n; ++si)
+            y[si*nm + mi] = 1.0 + 0.1*si + 0.05*mi;
+    }
+    batch.set_k(&k_sets[0]);
+    batch.set_fields(&fields_sets[0]);
+    batch.rhs(&y[0], &f[0]);
+    batch.jac(&y[0], &jac[0]);
+    for (int mi=0; mi<nm; ++mi){
+        double ym[n], fref[n], jref[n*n];
+        for (int si=0; si<n; ++si)
+            ym[si] = y[si*nm + mi];
+        chemreac::set_member_params(rd, &k_sets[mi*2], &fields_sets[mi*2]);
+        rd.rhs(0, ym, fref);
+        rd.dense_jac_rmaj(0, ym, nullptr, jref, n);
+        for (int si=0; si<n; ++si)
+            REQUIRE( std::abs(f[si*nm + mi] - fref[si]) < 1e-14 );
+        for (int i=0; i<n*n; ++i)
+            REQUIRE( std::abs(jac[i*nm + mi] - jref[i]) < 1e-14 );
+    }
+
+    // A -> B with a constant source of A: A(t) = F/k + (A0 - F/k)*exp(-k*t)
+    chemreac::ReactionDiffusion<double> decay(
+        2, {{0}}, {{1}}, {1.0}, 1, {0, 0}, {0, 0}, {0, 0}, {0, 1}, {{}}, 0, false, false, false,
+        1, true, true, false, {0, 0}, 1.0, 9.64853399e4, 8.854187817e-12, {{1.0, 0}}, {-1}, {{0.0}});
+    const int nt = 11;
+    std::vector<double> tout(nt), y0(2*nm), yout(nm*nt*2), ks(nm), Fs(nm);
+    for (int i=0; i<nt; ++i)
+        tout[i] = 0.5*i;
+    for (int mi=0; mi<nm; ++mi){
+        ks[mi] = std::pow(10.0, mi - 1); // up to 1e3 (stiff)
+        Fs[mi] = 0.3*mi;
+        y0[mi*2] = 1.0 + mi;
+        y0[mi*2 + 1] = 0.5;
+    }
+    chemreac::LockstepKinetics<double> decay_batch(decay, nm);
+    decay_batch.set_k(&ks[0]);
+    decay_batch.set_fields(&Fs[0]);
+    auto nreached = decay_batch.predefined(&y0[0], nt, &tout[0], &yout[0], {1e-10}, 1e-8, 0, 0, 10000);
+    for (int mi=0; mi<nm; ++mi){
+        REQUIRE( nreached[mi] == nt );
+        REQUIRE( decay_batch.nsteps[mi] > 0 );
+        for (int ti=0; ti<nt; ++ti){
+            const double A = Fs[mi]/ks[mi] + (y0[mi*2] - Fs[mi]/ks[mi])*std::exp(-ks[mi]*tout[ti]);
+            const double B = y0[mi*2] + y0[mi*2 + 1] + Fs[mi]*tout[ti] - A;
+            REQUIRE( std::abs(yout[(mi*nt + ti)*2] - A) < 1e-6*(1 + A) );
+            REQUIRE( std::abs(yout[(mi*nt + ti)*2 + 1] - B) < 1e-6*(1 + B) );
+        }
+    }
+    // the stiffest member needs the most steps, the members are not tied to a common step size
+    REQUIRE( decay_batch.nsteps[0] < decay_batch.nsteps[nm - 1] );
+    auto few = decay_batch.predefined(&y0[0], nt, &tout[0], &yout[0], {1e-10}, 1e-8, 0, 0, 2);
+    REQUIRE( few[0] < nt );  // mxsteps exceeded
+}
+
+TEST_CASE( "SteadyStateSolver", "[SteadyStateSolver]" ) {
+    // A <-> B (kf=2, kb=1) in 3 bins with diffusion: uniform A = M/3, B = 2*A (M: mean total)
+    for (bool logy : {false, true}){
+        chemreac::ReactionDiffusion<double> rd(
+            2, {{0}, {1}}, {{1}, {0}}, {2.0, 1.0}, 3, {0.1, 0.05, 0.1, 0.05, 0.1, 0.05}, {0, 0},
+            {0, 0}, {0, 1, 2, 3},
+            {{}, {}}, 0, logy, false, false, 3, true, true);
+        std::vector<double> y {2, 0.01, 0.5, 0.01, 0.5, 0.01};
+        const double M = (2 + 0.5 + 0.5 + 3*0.01)/3;
+        if (logy)
+            for (auto& yi : y)
+                yi = std::log(yi);
+        chemreac::SteadyStateSolver<double> solver(&rd);
+        const auto status = solver.solve(0, &y[0]);
+        REQUIRE( status == chemreac::SteadyStateSolver<double>::CONVERGED );
+        REQUIRE( solver.niter > 0 );
+        REQUIRE( solver.residuals.size() == static_cast<std::size_t>(solver.niter + 1) );
+        REQUIRE( solver.dtaus.size() == static_cast<std::size_t>(solver.niter) );
+        REQUIRE( solver.residuals.back() <= 1e-10*solver.residuals.front() );
+        REQUIRE( solver.dtaus.back() > solver.dtaus.front() );  // approaches Newton's method
+        REQUIRE( solver.njev > 0 );
+        REQUIRE( solver.nfev >= solver.niter + 1 );
+        const double A0 = logy ? std::exp(y[0]) : y[0];
+        for (int bi=0; bi<3; ++bi){
+            const double A = logy ? std::exp(y[2*bi]) : y[2*bi];
+            const double B = logy ? std::exp(y[2*bi + 1]) : y[2*bi + 1];
+            REQUIRE( std::abs(A - A0) < 1e-8 );
+            REQUIRE( std::abs(B - 2*A) < 1e-8 );
+            REQUIRE( std::abs(A - M/3) < 1e-7 );  // conserved up to the inexact (ILU) early steps
+        }
+    }
+    // Too few iterations
+    chemreac::ReactionDiffusion<double> rd(
+        2, {{0}}, {{1}}, {2.0}, 1, {0, 0}, {0, 0}, {0, 0}, {0, 1}, {{}}, 0, false, false, false, 1);
+    std::vector<double> y {1, 0};
+    chemreac::SteadyStateSolver<double> solver(&rd);
+    solver.max_iter = 1;
+    REQUIRE( solver.solve(0, &y[0]) == chemreac::SteadyStateSolver<double>::MAX_ITER );
+    REQUIRE( solver.niter == 1 );
+    REQUIRE( y[0] < 1 );
+    REQUIRE( std::abs(y[0] + y[1] - 1) < 1e-14 );
+}
+
+TEST_CASE( "SteadyStateContinuation", "[SteadyStateContinuation]" ) {
+    // Schlögl type: dX/dt = p - 2.5 X + 3 X**2 - X**3 (p: field), S-shaped with turning points
+    // at X = 1 -+ sqrt(1/6) (p ~= 0.636 & 0.364)
+    const auto pX = [](double X){ return 2.5*X - 3*X*X + X*X*X; };
+    for (bool logy : {false, true}){
+        chemreac::ReactionDiffusion<double> rd(
+            1, {{0, 0}, {0, 0, 0}, {0}}, {{0, 0, 0}, {0, 0}, {}}, {3.0, 1.0, 2.5}, 1, {0}, {0}, {0},
+            {0, 1}, {{}, {}, {}}, 0, logy, false, false, 1, true, true, false, {0, 0}, 1.0,
+            9.64853399e4, 8.854187817e-12, {{1.0}}, {-1}, {{0.7}});
+        using Cont = chemreac::SteadyStateContinuation<double>;
+        Cont cont(&rd, Cont::FIELD, 0);
+        const double y0[1] {logy ? std::log(0.05) : 0.05};
+        REQUIRE( cont.run(0, y0, 0.1, 1.5) == Cont::REACHED_END );
+        REQUIRE( rd.fields[0][0] == 0.7 );  // restored
+        const std::size_t np = cont.params.size();
+        REQUIRE( np > 10 );
+        REQUIRE( cont.ys.size() == np );
+        REQUIRE( cont.niters.size() == np );
+        REQUIRE( cont.params.front() == 0.1 );
+        REQUIRE( cont.params.back() == 1.5 );
+        REQUIRE( cont.folds.size() == 2 );
+        for (std::size_t i=0; i<np; ++i){
+            const double X = logy ? std::exp(cont.ys[i]) : cont.ys[i];
+            REQUIRE( std::abs(pX(X) - cont.params[i]) < 1e-8 );
+        }
+        const double Xf0 = 1 - std::sqrt(1/6.), Xf1 = 1 + std::sqrt(1/6.);
+        const int f0 = cont.folds[0], f1 = cont.folds[1];
+        REQUIRE( std::abs(cont.params[f0] - pX(Xf0)) < 0.05 );
+        REQUIRE( std::abs(cont.params[f1] - pX(Xf1)) < 0.05 );
+
+        // natural parameter continuation (no turning points in [0.1, 0.5] on the lower branch)
+        cont.arclength = false;
+        REQUIRE( cont.run(0, y0, 0.1, 0.5) == Cont::REACHED_END );
+        REQUIRE( cont.folds.empty() );
+        for (std::size_t i=1; i<cont.params.size(); ++i)
+            REQUIRE( cont.params[i] > cont.params[i - 1] );
+        const double X = logy ? std::exp(cont.ys.back()) : cont.ys.back();
+        REQUIRE( std::abs(pX(X) - 0.5) < 1e-10 );
+        REQUIRE( X < Xf0 );
+    }
+    chemreac::ReactionDiffusion<double> rd(
+        2, {{0}}, {{1}}, {2.0}, 1, {0, 0}, {0, 0}, {0, 0}, {0, 1}, {{}}, 0, false, false, false, 1);
+    using Cont = chemreac::SteadyStateContinuation<double>;
+    REQUIRE_THROWS_AS( Cont(&rd, Cont::FIELD, 0), std::out_of_range );
+    REQUIRE_THROWS_AS( Cont(&rd, Cont::K, 1), std::out_of_range );
+}